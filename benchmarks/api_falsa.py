@@ -0,0 +1,222 @@
+"""
+Servidor local que imita la API de bots de Telegram para los benchmarks.
+
+Responde a getUpdates con los updates que se le inyectan (con long polling),
+devuelve mensajes válidos en sendMessage/editMessageText y True en el resto
+de métodos (answerCallbackQuery, banChatMember, setMyCommands...). Cuenta las
+llamadas por método para el informe.
+
+Uso:
+    api = ApiTelegramFalsa()
+    api.iniciar()
+    apihelper.API_URL = api.url_api
+    api.añadir_update({"message": {...}})
+"""
+import itertools
+import json
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+USUARIO_BOT = {"id": 1, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+
+
+class _Servidor(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Un bot que se detiene a mitad de un long polling no es un error del servidor
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)
+
+
+class ApiTelegramFalsa:
+    """Servidor HTTP con el comportamiento mínimo de la Bot API"""
+
+    def __init__(self, host="127.0.0.1", puerto=0, latencia=0.0):
+        """
+        Args:
+            host: Interfaz en la que escuchar
+            puerto: Puerto (0 = uno libre cualquiera)
+            latencia: Retardo artificial por petición en segundos (simula la red)
+        """
+        self.latencia = latencia
+        self.llamadas = Counter()
+        self.primera_llamada = {}  # método -> time.perf_counter() de la primera petición
+        self._updates = []
+        self._siguiente_update = 1
+        self._siguiente_mensaje = 1
+        self._condicion = threading.Condition()
+        self._lock = threading.Lock()
+        self._servidor = _Servidor((host, puerto), self._crear_manejador())
+        self._hilo = None
+
+    @property
+    def url_api(self):
+        """Valor para telebot.apihelper.API_URL"""
+        host, puerto = self._servidor.server_address[:2]
+        return f"http://{host}:{puerto}/bot{{0}}/{{1}}"
+
+    def iniciar(self):
+        self._hilo = threading.Thread(target=self._servidor.serve_forever, name="api_telegram_falsa", daemon=True)
+        self._hilo.start()
+        return self
+
+    def detener(self):
+        self._servidor.shutdown()
+        self._servidor.server_close()
+
+    def añadir_update(self, contenido):
+        """Encola un update (sin update_id) para el siguiente getUpdates"""
+        with self._condicion:
+            update = dict(contenido, update_id=self._siguiente_update)
+            self._siguiente_update += 1
+            self._updates.append(update)
+            self._condicion.notify_all()
+            return update["update_id"]
+
+    def añadir_updates(self, contenidos):
+        for contenido in contenidos:
+            self.añadir_update(contenido)
+
+    # ===== MÉTODOS DE LA API =====
+
+    def _get_updates(self, parametros):
+        offset = int(parametros.get("offset", 0) or 0)
+        limite = int(parametros.get("limit", 100) or 100)
+        espera = min(float(parametros.get("timeout", 0) or 0), 1.0)
+
+        with self._condicion:
+            # Los updates anteriores al offset ya están confirmados
+            if offset:
+                self._updates = [u for u in self._updates if u["update_id"] >= offset]
+            if not self._updates and espera:
+                self._condicion.wait(espera)
+            return self._updates[:limite]
+
+    def _mensaje(self, parametros, message_id=None):
+        with self._lock:
+            if message_id is None:
+                message_id = self._siguiente_mensaje
+                self._siguiente_mensaje += 1
+        chat_id = int(parametros.get("chat_id", 0) or 0)
+        return {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private" if chat_id > 0 else "supergroup"},
+            "from": USUARIO_BOT,
+            "text": parametros.get("text", ""),
+        }
+
+    def responder(self, metodo, parametros):
+        """Devuelve el 'result' de la llamada al método indicado"""
+        self.llamadas[metodo] += 1
+        self.primera_llamada.setdefault(metodo, time.perf_counter())
+        if self.latencia:
+            time.sleep(self.latencia)
+
+        if metodo == "getUpdates":
+            return self._get_updates(parametros)
+        if metodo == "getMe":
+            return USUARIO_BOT
+        if metodo in ("sendMessage", "sendPhoto", "sendDocument"):
+            return self._mensaje(parametros)
+        if metodo in ("editMessageText", "editMessageReplyMarkup"):
+            return self._mensaje(parametros, int(parametros.get("message_id", 0) or 0))
+        if metodo == "getChat":
+            return {"id": int(parametros.get("chat_id", 0) or 0), "type": "supergroup", "title": "Sala"}
+        if metodo == "getChatMember":
+            return {"user": dict(USUARIO_BOT, id=int(parametros.get("user_id", 0) or 0), is_bot=False),
+                    "status": "member"}
+        if metodo == "getChatAdministrators":
+            return []
+        if metodo == "exportChatInviteLink":
+            return "https://t.me/+bench"
+        if metodo == "createChatInviteLink":
+            return {"invite_link": "https://t.me/+bench", "creator": USUARIO_BOT,
+                    "creates_join_request": False, "is_primary": False, "is_revoked": False}
+        # answerCallbackQuery, banChatMember, setMyCommands, deleteWebhook, leaveChat...
+        return True
+
+    def _crear_manejador(self):
+        api = self
+
+        class Manejador(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Cabeceras y cuerpo van en escrituras separadas: sin esto Nagle añade ~40ms por respuesta
+            disable_nagle_algorithm = True
+
+            def _atender(self):
+                url = urlparse(self.path)
+                metodo = url.path.rsplit("/", 1)[-1]
+                parametros = {k: v[-1] for k, v in parse_qs(url.query).items()}
+
+                longitud = int(self.headers.get("Content-Length", 0) or 0)
+                if longitud:
+                    cuerpo = self.rfile.read(longitud)
+                    if self.headers.get("Content-Type", "").startswith("application/x-www-form-urlencoded"):
+                        parametros.update({k: v[-1] for k, v in parse_qs(cuerpo.decode("utf-8")).items()})
+
+                datos = json.dumps({"ok": True, "result": api.responder(metodo, parametros)}).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(datos)))
+                self.end_headers()
+                self.wfile.write(datos)
+
+            do_GET = _atender
+            do_POST = _atender
+
+            def log_message(self, format, *args):
+                pass
+
+        return Manejador
+
+
+# ===== CONSTRUCCIÓN DE UPDATES =====
+
+def _usuario(telegram_id):
+    return {"id": telegram_id, "is_bot": False, "first_name": f"Usuario{telegram_id}"}
+
+
+def update_mensaje(telegram_id, texto, chat_id=None):
+    """Update con un mensaje de texto (en el chat privado si no se indica otro)"""
+    chat_id = chat_id or telegram_id
+    mensaje = {
+        "message_id": int(time.time() * 1000) % 2_000_000_000,
+        "date": int(time.time()),
+        "chat": {"id": chat_id, "type": "private" if chat_id > 0 else "supergroup"},
+        "from": _usuario(telegram_id),
+        "text": texto,
+    }
+    if texto.startswith("/"):
+        comando = texto.split()[0]
+        mensaje["entities"] = [{"type": "bot_command", "offset": 0, "length": len(comando)}]
+    return {"message": mensaje}
+
+
+_contador_callbacks = itertools.count(1)
+
+
+def update_callback(telegram_id, datos, message_id=1, chat_id=None):
+    """Update con la pulsación de un botón inline"""
+    chat_id = chat_id or telegram_id
+    return {
+        "callback_query": {
+            "id": str(next(_contador_callbacks)),
+            "from": _usuario(telegram_id),
+            "chat_instance": str(chat_id),
+            "data": datos,
+            "message": {
+                "message_id": message_id,
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private" if chat_id > 0 else "supergroup"},
+                "from": USUARIO_BOT,
+                "text": "",
+            },
+        }
+    }
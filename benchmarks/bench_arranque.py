@@ -0,0 +1,216 @@
+"""
+Benchmark del arranque en frío de los dos bots.
+
+Mide dos cosas, siempre en procesos nuevos (sin caché de módulos):
+
+- Importación: ejecuta `python -X importtime -c "import main"` (y lo mismo con
+  bot_grupo_main), suma el tiempo acumulado y lista los módulos más caros.
+  Avisa si se carga alguna dependencia pesada que debería ser perezosa
+  (pandas, openpyxl, python-telegram-bot).
+- Hasta el primer update: arranca benchmarks/api_falsa.py con un /start ya
+  encolado, lanza el bloque __main__ del bot contra ella (con una base de
+  datos sintética y sin Excel) y mide desde que se crea el proceso hasta el
+  primer getUpdates y hasta que el bot responde al /start.
+
+Uso: python benchmarks/bench_arranque.py [--repeticiones N] [--limite 1.0] [--top 15]
+"""
+import sys
+import os
+import re
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+# Añadir directorio raíz al path
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+BOTS = {
+    "main": "main.py",
+    "bot_grupo_main": "bot_grupo_main.py",
+}
+
+# Dependencias que no deben cargarse al arrancar (se importan al primer uso)
+PESADOS = ("pandas", "openpyxl", "telegram")
+
+# Telegram ID sintético del usuario que envía el /start
+USUARIO_PRUEBA = 7_100_000_001
+
+_RE_IMPORTTIME = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def _entorno_hijo(directorio_logs=None):
+    """Entorno del proceso del bot: tokens ficticios y sin métricas ni resúmenes"""
+    entorno = dict(os.environ)
+    if directorio_logs:
+        entorno["LOG_DIR"] = directorio_logs
+    entorno.update({
+        "BOT_TOKEN": "100000:arranque-principal",
+        "TOKEN_GRUPO": "200000:arranque-grupos",
+        "METRICAS_PUERTO": "0",
+        "METRICAS_PUERTO_GRUPOS": "0",
+        "METRICAS_RESUMEN_INTERVALO": "0",
+        "TELEGRAM_RESUMEN_INTERVALO": "0",
+        "PYTHONDONTWRITEBYTECODE": "1",
+    })
+    entorno.setdefault("SMTP_SERVER", "smtp.invalid")
+    entorno.setdefault("SMTP_EMAIL", "bench@invalid")
+    entorno.setdefault("SMTP_PASSWORD", "bench")
+    return entorno
+
+
+# ===== IMPORTACIÓN =====
+
+def medir_importacion(modulo):
+    """
+    Importa 'modulo' en un proceso nuevo con -X importtime.
+
+    Returns:
+        dict con total (segundos), módulos [(acumulado, propio, nombre)] y pesados cargados
+    """
+    proceso = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {modulo}"],
+        cwd=RAIZ, env=_entorno_hijo(), capture_output=True, text=True, timeout=120
+    )
+    if proceso.returncode != 0:
+        raise RuntimeError(f"No se pudo importar {modulo}:\n{proceso.stderr[-2000:]}")
+
+    modulos = []
+    total = 0
+    for linea in proceso.stderr.splitlines():
+        coincidencia = _RE_IMPORTTIME.match(linea)
+        if not coincidencia:
+            continue
+        propio, acumulado, sangria, nombre = coincidencia.groups()
+        modulos.append((int(acumulado), int(propio), nombre))
+        # El acumulado del propio módulo incluye todo lo que importa
+        if nombre == modulo and len(sangria) == 1:
+            total = int(acumulado)
+
+    pesados = sorted({n for _, _, n in modulos if n.split(".")[0] in PESADOS})
+    return {"total": total / 1e6, "modulos": modulos, "pesados": pesados}
+
+
+# ===== HASTA EL PRIMER UPDATE =====
+
+def _ejecutar_bot(script, ruta_db):
+    """Proceso hijo: apunta el bot a la BD y la API de prueba y ejecuta su __main__"""
+    import runpy
+    from telebot import apihelper
+    import db.queries as consultas
+    import db.models as modelos
+    import utils.excel_manager as excel
+
+    apihelper.API_URL = os.environ["BENCH_API_URL"]
+    consultas.DB_PATH = ruta_db
+    modelos.DB_PATH = ruta_db
+    # No importar el Excel real sobre la base de datos sintética
+    excel.verificar_excel_disponible = lambda *args, **kwargs: False
+
+    runpy.run_path(os.path.join(RAIZ, script), run_name="__main__")
+
+
+def medir_primer_update(script, ruta_db, timeout=30):
+    """
+    Arranca 'script' contra la API falsa con un /start pendiente.
+
+    Returns:
+        dict con segundos hasta el primer getUpdates y hasta la respuesta al /start
+    """
+    from benchmarks.api_falsa import ApiTelegramFalsa, update_mensaje
+
+    api = ApiTelegramFalsa().iniciar()
+    api.añadir_update(update_mensaje(USUARIO_PRUEBA, "/start"))
+
+    # Los logs del bot van junto a la base de datos temporal
+    entorno = _entorno_hijo(os.path.dirname(ruta_db))
+    entorno["BENCH_API_URL"] = api.url_api
+    inicio = time.perf_counter()
+    proceso = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--hijo", script, ruta_db],
+        cwd=RAIZ, env=entorno, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True
+    )
+    try:
+        limite = inicio + timeout
+        while "sendMessage" not in api.primera_llamada:
+            if proceso.poll() is not None:
+                raise RuntimeError(f"{script} terminó antes de responder:\n{proceso.stderr.read()[-2000:]}")
+            if time.perf_counter() > limite:
+                raise TimeoutError(f"{script} no respondió al /start en {timeout}s")
+            time.sleep(0.002)
+    finally:
+        proceso.kill()
+        proceso.wait()
+        api.detener()
+
+    return {
+        "primer_get_updates": api.primera_llamada["getUpdates"] - inicio,
+        "respuesta": api.primera_llamada["sendMessage"] - inicio,
+        "llamadas_previas": sorted(
+            m for m, t in api.primera_llamada.items() if t < api.primera_llamada["getUpdates"]
+        ),
+    }
+
+
+# ===== INFORME =====
+
+def _mediana(valores):
+    valores = sorted(valores)
+    mitad = len(valores) // 2
+    if len(valores) % 2:
+        return valores[mitad]
+    return (valores[mitad - 1] + valores[mitad]) / 2
+
+
+def ejecutar(repeticiones=3, limite=1.0, top=15):
+    """Mide los dos bots; devuelve False si alguno supera el límite o carga dependencias pesadas"""
+    from benchmarks.datos_sinteticos import generar_base_datos
+
+    directorio = tempfile.mkdtemp(prefix="bench_arranque_")
+    correcto = True
+    try:
+        ruta_db = os.path.join(directorio, "tutoria_bench.db")
+        generar_base_datos(ruta_db)
+
+        for modulo, script in BOTS.items():
+            print(f"\n=== {script} ===")
+
+            importaciones = [medir_importacion(modulo) for _ in range(repeticiones)]
+            ultima = importaciones[-1]
+            print(f"Importación (-X importtime, mediana de {repeticiones}): "
+                  f"{_mediana([i['total'] for i in importaciones]) * 1000:.0f}ms")
+            print("Módulos más caros (acumulado / propio):")
+            for acumulado, propio, nombre in sorted(ultima["modulos"], reverse=True)[:top]:
+                print(f"  {acumulado / 1000:>8.1f}ms  {propio / 1000:>7.1f}ms  {nombre}")
+            if ultima["pesados"]:
+                correcto = False
+                print(f"⚠️ Dependencias pesadas cargadas al importar: {', '.join(ultima['pesados'])}")
+
+            arranques = [medir_primer_update(script, ruta_db) for _ in range(repeticiones)]
+            primer_get = _mediana([a["primer_get_updates"] for a in arranques])
+            respuesta = _mediana([a["respuesta"] for a in arranques])
+            print(f"Arranque en frío hasta el primer getUpdates: {primer_get * 1000:.0f}ms")
+            print(f"Arranque en frío hasta responder al primer update: {respuesta * 1000:.0f}ms")
+            print(f"Llamadas a la API antes del polling: {', '.join(arranques[-1]['llamadas_previas']) or '-'}")
+            if respuesta > limite:
+                correcto = False
+                print(f"⚠️ Supera el límite de {limite * 1000:.0f}ms")
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+
+    return correcto
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "--hijo":
+        _ejecutar_bot(sys.argv[2], sys.argv[3])
+        sys.exit(0)
+
+    parser = argparse.ArgumentParser(description="Benchmark del arranque en frío de los bots")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--limite", type=float, default=1.0, help="segundos máximos hasta responder al primer update")
+    parser.add_argument("--top", type=int, default=15, help="módulos más caros a mostrar")
+    args = parser.parse_args()
+    sys.exit(0 if ejecutar(args.repeticiones, args.limite, args.top) else 1)
@@ -0,0 +1,70 @@
+"""
+Benchmark de generación de correos de verificación en bloque.
+
+Simula el reenvío de códigos a muchos usuarios (p.ej. tras una caída del
+servidor SMTP) y mide cuántos correos por segundo se generan listos para
+enviar, comparando la construcción anterior (un EmailMessage nuevo con el
+HTML en un f-string por cada token, codificado por send_message) con la
+plantilla precompilada de utils/plantillas_correo.py.
+
+No envía nada: solo mide la generación de los bytes que recibe el servidor.
+
+Uso: python benchmarks/bench_correo.py [correos]
+"""
+import sys
+import os
+import time
+import random
+from email import policy
+from email.message import EmailMessage
+
+# Añadir directorio raíz al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.plantillas_correo import PLANTILLA_VERIFICACION, VERIFICACION_HTML, VERIFICACION_TEXTO
+
+
+def correo_anterior(email, token):
+    """Construcción anterior de send_verification_email, serializada como en send_message"""
+    msg = EmailMessage()
+    msg["From"] = PLANTILLA_VERIFICACION.remitente
+    msg["To"] = email
+    msg["Subject"] = "Token tutorChatBot"
+    html_content = VERIFICACION_HTML.format(token=token, minutos=3)
+    msg.set_content(VERIFICACION_TEXTO.format(token=token, minutos=3))
+    msg.add_alternative(html_content, subtype='html')
+    return msg.as_bytes(policy=policy.SMTP)
+
+
+def correo_plantilla(email, token):
+    return PLANTILLA_VERIFICACION.render(email, token=token, minutos=3).datos
+
+
+def medir(funcion, destinos, rondas=3):
+    """Devuelve los correos por segundo de la mejor ronda"""
+    mejor = float("inf")
+    for _ in range(rondas):
+        inicio = time.perf_counter()
+        for email, token in destinos:
+            funcion(email, token)
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return len(destinos) / mejor
+
+
+def ejecutar(correos=2000):
+    print("\n===== BENCHMARK DE CORREOS DE VERIFICACIÓN =====")
+    destinos = [(f"alumno{i}@correo.ugr.es", str(random.randint(100000, 999999))) for i in range(correos)]
+
+    por_segundo_anterior = medir(correo_anterior, destinos)
+    por_segundo_plantilla = medir(correo_plantilla, destinos)
+
+    print(f"{'generación':<28}{'correos/s':>12}{'µs/correo':>12}")
+    for nombre, por_segundo in [("EmailMessage por envío", por_segundo_anterior),
+                                ("plantilla precompilada", por_segundo_plantilla)]:
+        print(f"{nombre:<28}{por_segundo:>12.0f}{1e6 / por_segundo:>12.1f}")
+    print(f"\nMejora: {por_segundo_plantilla / por_segundo_anterior:.1f}x ({correos} correos)")
+
+
+if __name__ == "__main__":
+    correos = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    ejecutar(correos)
@@ -0,0 +1,330 @@
+"""
+Benchmark de extremo a extremo de los dos bots contra una API de Telegram falsa.
+
+Genera una base de datos sintética en un directorio temporal, arranca
+benchmarks/api_falsa.py y pone a los bots reales (main.py y bot_grupo_main.py)
+a hacer polling contra ella. Después inyecta recorridos de usuario por oleadas
+(cada paso se envía a todos los usuarios y se espera a que se procese):
+
+- Bot principal: registro (/start, correo, código), /tutoria, solicitud de
+  sala privada y aprobación por el profesor.
+- Bot de grupos: valoración de un profesor (/valorar_profesor y botones).
+
+Informa de updates/segundo, latencia de los handlers (p50/p95/p99) y
+sentencias SQL y llamadas a la API por update. Los correos de verificación
+se capturan en un SMTP falso: nunca se envía nada fuera de la máquina.
+
+Uso: python benchmarks/bench_e2e.py [--estudiantes N] [--profesores M] [--salas K] [--usuarios U]
+"""
+import sys
+import os
+import re
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+
+# Añadir directorio raíz al path
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+# Tokens ficticios: las peticiones van a la API falsa y nunca deben llevar los reales
+os.environ["BOT_TOKEN"] = "100000:bench-principal"
+os.environ["TOKEN_GRUPO"] = "200000:bench-grupos"
+os.environ.setdefault("SMTP_SERVER", "smtp.invalid")
+os.environ.setdefault("SMTP_EMAIL", "bench@invalid")
+os.environ.setdefault("SMTP_PASSWORD", "bench")
+# Sin endpoint de métricas ni resúmenes periódicos durante la medida
+os.environ["METRICAS_PUERTO"] = "0"
+os.environ["METRICAS_PUERTO_GRUPOS"] = "0"
+os.environ["METRICAS_RESUMEN_INTERVALO"] = "0"
+os.environ["TELEGRAM_RESUMEN_INTERVALO"] = "0"
+
+import smtplib
+from telebot import apihelper
+
+import db.queries as consultas
+import db.models as modelos
+import utils.metricas as metricas
+from benchmarks.api_falsa import ApiTelegramFalsa, update_mensaje, update_callback
+from benchmarks.datos_sinteticos import generar_base_datos
+
+
+class SMTPFalso:
+    """Sustituye a smtplib.SMTP y guarda los correos en memoria"""
+
+    enviados = []
+    _lock = threading.Lock()
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def ehlo(self, *args):
+        pass
+
+    def starttls(self, *args, **kwargs):
+        pass
+
+    def login(self, *args):
+        pass
+
+    def send_message(self, mensaje, *args, **kwargs):
+        with SMTPFalso._lock:
+            SMTPFalso.enviados.append(mensaje)
+
+    def sendmail(self, remitente, destinatarios, datos, *args, **kwargs):
+        with SMTPFalso._lock:
+            SMTPFalso.enviados.append(datos)
+
+    def quit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class Muestras:
+    """Recoge cada ejecución de handler que registra utils.metricas"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.ejecuciones = []  # (bot, handler, duracion, error, consultas_db, llamadas_api)
+        self._original = metricas.registrar_ejecucion
+
+    def instalar(self):
+        def registrar(bot_nombre, handler, duracion, error, consultas_db=0, llamadas_api=0):
+            with self.lock:
+                self.ejecuciones.append((bot_nombre, handler, duracion, error, consultas_db, llamadas_api))
+            self._original(bot_nombre, handler, duracion, error, consultas_db, llamadas_api)
+
+        metricas.registrar_ejecucion = registrar
+
+    def de_bot(self, bot_nombre):
+        with self.lock:
+            return [e for e in self.ejecuciones if e[0] == bot_nombre]
+
+
+class ContadorUpdates:
+    """Cuenta los updates que el bot termina de procesar"""
+
+    def __init__(self, bot):
+        self.total = 0
+        self._condicion = threading.Condition()
+        original = bot._run_middlewares_and_handler
+
+        def procesar(*args, **kwargs):
+            try:
+                return original(*args, **kwargs)
+            finally:
+                with self._condicion:
+                    self.total += 1
+                    self._condicion.notify_all()
+
+        bot._run_middlewares_and_handler = procesar
+
+    def esperar(self, objetivo, timeout):
+        with self._condicion:
+            return self._condicion.wait_for(lambda: self.total >= objetivo, timeout)
+
+
+def percentil(valores, p):
+    """Percentil por rango más cercano"""
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    indice = max(0, min(len(ordenados) - 1, int(round(p / 100 * len(ordenados) + 0.5)) - 1))
+    return ordenados[indice]
+
+
+def preparar_entorno(ruta_db, api):
+    """Apunta la BD, la API de Telegram y el SMTP a los sustitutos del benchmark"""
+    consultas.DB_PATH = ruta_db
+    modelos.DB_PATH = ruta_db
+    apihelper.API_URL = api.url_api
+    smtplib.SMTP = SMTPFalso
+
+    # No importar el Excel real sobre la base de datos sintética
+    import utils.excel_manager as excel
+    excel.verificar_excel_disponible = lambda *args, **kwargs: False
+
+
+def cargar_bot_principal():
+    """Importa main.py (registra sus handlers) y arranca lo que harían __main__ y setup_polling"""
+    import main
+    from utils.cola_mensajes import iniciar_despachador
+    main.inicializar_datos()
+    iniciar_despachador(main.bot)
+    return main.bot
+
+
+def cargar_bot_grupos():
+    """Importa bot_grupo_main.py y registra los handlers de su bloque __main__"""
+    import bot_grupo_main
+    from grupo_handlers.valoraciones import register_handlers as register_valoraciones_handlers
+    bot_grupo_main.actualizar_estructura_tablas()
+    register_valoraciones_handlers(bot_grupo_main.bot)
+    return bot_grupo_main.bot
+
+
+def arrancar_polling(bot):
+    hilo = threading.Thread(
+        target=bot.polling,
+        kwargs={"non_stop": True, "interval": 0, "timeout": 5, "long_polling_timeout": 1},
+        name=f"polling_{id(bot)}",
+        daemon=True
+    )
+    hilo.start()
+    return hilo
+
+
+class Recorridos:
+    """Ejecuta los pasos de los recorridos por oleadas y mide cada uno"""
+
+    def __init__(self, api, contador, timeout=120):
+        self.api = api
+        self.contador = contador
+        self.timeout = timeout
+        self.tiempos = []  # (recorrido, updates, segundos)
+
+    def oleada(self, nombre, updates):
+        if not updates:
+            return
+        objetivo = self.contador.total + len(updates)
+        inicio = time.perf_counter()
+        self.api.añadir_updates(updates)
+        if not self.contador.esperar(objetivo, self.timeout):
+            print(f"⚠️ {nombre}: tiempo de espera agotado ({self.contador.total}/{objetivo} updates)")
+        self.tiempos.append((nombre, len(updates), time.perf_counter() - inicio))
+
+
+def recorridos_bot_principal(rec, datos, usuarios):
+    from utils.tokens_verificacion import almacen as tokens
+
+    # Registro: /start, correo institucional y código de verificación
+    pendientes = datos["pendientes"][:usuarios]
+    rec.oleada("registro: /start", [update_mensaje(tid, "/start") for _, tid in pendientes])
+    rec.oleada("registro: correo", [update_mensaje(tid, email) for email, tid in pendientes])
+    rec.oleada("registro: código", [
+        update_mensaje(tid, tokens.pendiente(tid) or "000000") for _, tid in pendientes
+    ])
+
+    # /tutoria de los estudiantes registrados
+    estudiantes = datos["estudiantes"][:usuarios]
+    rec.oleada("/tutoria", [update_mensaje(tid, "/tutoria") for _, tid in estudiantes])
+
+    # Solicitud de sala privada y aprobación por el profesor
+    salas = datos["salas"]
+    solicitudes = [(est, salas[i % len(salas)]) for i, est in enumerate(estudiantes)]
+    rec.oleada("sala: solicitud", [
+        update_callback(est_tid, f"solicitar_sala_{sala_id}_{prof_id}")
+        for (_, est_tid), (sala_id, prof_id, _) in solicitudes
+    ])
+    rec.oleada("sala: aprobación", [
+        update_callback(prof_tid, f"aprobar_tutoria_{sala_id}_{est_id}")
+        for (est_id, _), (sala_id, _, prof_tid) in solicitudes
+    ])
+
+
+def recorridos_bot_grupos(rec, datos, usuarios):
+    estudiantes = datos["estudiantes"][:usuarios]
+    profesores = datos["profesores"]
+    rec.oleada("valoración: /valorar_profesor", [update_mensaje(tid, "/valorar_profesor") for _, tid in estudiantes])
+    rec.oleada("valoración: profesor", [
+        update_callback(tid, f"valorar_{profesores[i % len(profesores)][0]}") for i, (_, tid) in enumerate(estudiantes)
+    ])
+    rec.oleada("valoración: puntuación", [
+        update_callback(tid, f"puntos_{1 + i % 5}") for i, (_, tid) in enumerate(estudiantes)
+    ])
+    rec.oleada("valoración: sin comentario", [update_callback(tid, "comentario_no") for _, tid in estudiantes])
+    rec.oleada("valoración: anónima", [update_callback(tid, "anonimo_si") for _, tid in estudiantes])
+
+
+def informe(bot_nombre, rec, muestras, llamadas_api):
+    ejecuciones = muestras.de_bot(bot_nombre)
+    updates = sum(n for _, n, _ in rec.tiempos)
+    segundos = sum(t for _, _, t in rec.tiempos)
+
+    print(f"\n===== BOT {bot_nombre.upper()} =====")
+    print(f"{'recorrido':<32}{'updates':>9}{'segundos':>10}{'updates/s':>11}")
+    for nombre, n, t in rec.tiempos:
+        print(f"{nombre:<32}{n:>9}{t:>10.2f}{n / t if t else 0:>11.1f}")
+    print(f"{'TOTAL':<32}{updates:>9}{segundos:>10.2f}{updates / segundos if segundos else 0:>11.1f}")
+
+    duraciones = [e[2] * 1000 for e in ejecuciones]
+    print(f"\nLatencia de handlers ({len(duraciones)} ejecuciones, {sum(e[3] for e in ejecuciones)} errores):")
+    print(f"  p50 {percentil(duraciones, 50):.1f}ms  p95 {percentil(duraciones, 95):.1f}ms  "
+          f"p99 {percentil(duraciones, 99):.1f}ms  máx {max(duraciones, default=0):.1f}ms")
+    if ejecuciones:
+        print(f"  Sentencias SQL por update: {sum(e[4] for e in ejecuciones) / len(ejecuciones):.1f}")
+        print(f"  Llamadas a la API por update: {sum(e[5] for e in ejecuciones) / len(ejecuciones):.1f}")
+
+    print("\nPor handler (llamadas, p50, p95, SQL/update):")
+    por_handler = {}
+    for e in ejecuciones:
+        por_handler.setdefault(e[1], []).append(e)
+    for handler, lista in sorted(por_handler.items(), key=lambda h: -sum(e[2] for e in h[1])):
+        tiempos = [e[2] * 1000 for e in lista]
+        print(f"  {handler}: {len(lista)}, {percentil(tiempos, 50):.1f}ms, {percentil(tiempos, 95):.1f}ms, "
+              f"{sum(e[4] for e in lista) / len(lista):.1f}")
+
+    print("\nLlamadas recibidas por la API falsa:")
+    for metodo, n in llamadas_api.most_common():
+        print(f"  {metodo}: {n}")
+
+
+def ejecutar(estudiantes=200, profesores=20, salas=20, usuarios=50, latencia=0.0):
+    directorio = tempfile.mkdtemp(prefix="bench_tutorias_")
+    ruta_db = os.path.join(directorio, "tutoria_bench.db")
+    print(f"Generando base de datos sintética en {ruta_db}...")
+    datos = generar_base_datos(ruta_db, estudiantes=estudiantes, profesores=profesores,
+                               salas=salas, pendientes=usuarios)
+
+    muestras = Muestras()
+    muestras.instalar()
+
+    try:
+        # Bot principal
+        api = ApiTelegramFalsa(latencia=latencia).iniciar()
+        preparar_entorno(ruta_db, api)
+        bot = cargar_bot_principal()
+        rec_principal = Recorridos(api, ContadorUpdates(bot))
+        arrancar_polling(bot)
+        recorridos_bot_principal(rec_principal, datos, usuarios)
+        bot.stop_polling()
+        llamadas_principal = api.llamadas.copy()
+        api.detener()
+
+        # Bot de grupos (comparten utils.state_manager, así que van uno detrás de otro)
+        api = ApiTelegramFalsa(latencia=latencia).iniciar()
+        preparar_entorno(ruta_db, api)
+        bot = cargar_bot_grupos()
+        rec_grupos = Recorridos(api, ContadorUpdates(bot))
+        arrancar_polling(bot)
+        recorridos_bot_grupos(rec_grupos, datos, usuarios)
+        bot.stop_polling()
+        llamadas_grupos = api.llamadas.copy()
+        api.detener()
+
+        informe("principal", rec_principal, muestras, llamadas_principal)
+        informe("grupos", rec_grupos, muestras, llamadas_grupos)
+        print(f"\nCorreos de verificación capturados: {len(SMTPFalso.enviados)}")
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de extremo a extremo de los bots")
+    parser.add_argument("--estudiantes", type=int, default=200)
+    parser.add_argument("--profesores", type=int, default=20)
+    parser.add_argument("--salas", type=int, default=20)
+    parser.add_argument("--usuarios", type=int, default=50, help="usuarios simultáneos en cada recorrido")
+    parser.add_argument("--latencia", type=float, default=0.0, help="latencia artificial de la API en segundos")
+    args = parser.parse_args()
+    ejecutar(args.estudiantes, args.profesores, args.salas, args.usuarios, args.latencia)
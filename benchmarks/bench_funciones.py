@@ -0,0 +1,178 @@
+"""
+Micro-benchmarks de las funciones puras que se ejecutan en cada interacción,
+con línea base guardada para detectar regresiones.
+
+Cada caso se mide con timeit en varias rondas y se queda el mejor tiempo (en
+µs por llamada). Para que la línea base sirva en otra máquina, todos los tiempos se
+normalizan con un bucle de calibración en Python puro que se guarda junto a
+ella: se compara tiempo / calibración, no el tiempo absoluto.
+
+Uso:
+    python benchmarks/bench_funciones.py               # compara con la línea base
+    python benchmarks/bench_funciones.py --guardar     # guarda una línea base nueva
+    python benchmarks/bench_funciones.py --umbral 0.5  # tolera hasta un 50% más lento
+
+Sale con código 1 si algún caso supera la línea base en más del umbral
+(por defecto BENCH_UMBRAL o 0.3, es decir, un 30%).
+"""
+import sys
+import os
+import json
+import timeit
+import argparse
+import platform
+
+# Añadir directorio raíz al path
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from utils.markdown import escape_markdown, escape_markdown_v2, formato_validado
+from utils.horarios_utils import parsear_horario_string, convertir_horario_a_string, formatear_horario
+from handlers.tutorias import verificar_horario_tutoria
+from handlers.horarios import hay_solapamiento
+from handlers.registro import is_valid_email
+from benchmarks.bench_markdown import TEXTOS
+
+RUTA_BASE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "base_funciones.json")
+UMBRAL = float(os.getenv("BENCH_UMBRAL", "0.3"))
+
+# Entradas representativas (horarios reales de profesores, correos de alumnos)
+HORARIO_STR = "Lunes: 10:00-12:00, 16:00-18:00; Miércoles: 09:00-11:00; Viernes: 12:00-14:00"
+HORARIO_DICT = parsear_horario_string(HORARIO_STR)
+HORARIO_TUTORIA = "Lunes de 10:00 a 12:00, Miércoles 09:00-12:00, Jueves de 16:00 a 18:30"
+FRANJAS = ["09:00-10:00", "11:00-12:00", "16:00-18:00", "18:30-19:30"]
+
+CASOS = {
+    "escape_markdown/nombre": (escape_markdown, TEXTOS["nombre"]),
+    "escape_markdown/email": (escape_markdown, TEXTOS["email"]),
+    "escape_markdown/mensaje": (escape_markdown, TEXTOS["mensaje"]),
+    "escape_markdown_v2/sala": (escape_markdown_v2, TEXTOS["sala"]),
+    "escape_markdown_v2/mensaje": (escape_markdown_v2, TEXTOS["mensaje"]),
+    "formato_validado/mensaje": (lambda t: formato_validado(t, "Markdown"), TEXTOS["mensaje"]),
+    "parsear_horario_string": (parsear_horario_string, HORARIO_STR),
+    "convertir_horario_a_string": (convertir_horario_a_string, HORARIO_DICT),
+    "formatear_horario": (formatear_horario, HORARIO_STR),
+    "verificar_horario_tutoria": (verificar_horario_tutoria, HORARIO_TUTORIA),
+    "hay_solapamiento/libre": (lambda n: hay_solapamiento(FRANJAS, n), "12:00-13:00"),
+    "hay_solapamiento/solapa": (lambda n: hay_solapamiento(FRANJAS, n), "17:00-18:45"),
+    "is_valid_email/valido": (is_valid_email, "jose_maria.perez@correo.ugr.es"),
+    "is_valid_email/invalido": (is_valid_email, "jose maria@correo"),
+}
+
+
+def _bucle_calibracion():
+    """Trabajo fijo en Python puro con el que se normalizan los tiempos"""
+    total = 0
+    for i in range(1000):
+        total += i * i % 7
+    return total
+
+
+def medir(funcion, argumento, numero=None, repeticiones=2):
+    """
+    Devuelve (mejor tiempo por llamada en µs, llamadas por repetición).
+
+    Si no se indica 'numero', timeit lo ajusta para que cada repetición dure al menos 0,2s.
+    """
+    temporizador = timeit.Timer(lambda: funcion(argumento))
+    if numero is None:
+        numero, _ = temporizador.autorange()
+    tiempos = temporizador.repeat(repeat=repeticiones, number=numero)
+    return min(tiempos) / numero * 1e6, numero
+
+
+def medir_todo(rondas=5):
+    """
+    Mide la calibración y todos los casos; devuelve (calibración, {caso: µs}).
+
+    Los casos se recorren en varias rondas y se queda el mínimo de cada uno:
+    una racha de carga en la máquina afecta a una ronda, no a todas las
+    medidas de un mismo caso.
+    """
+    casos = {"calibracion": (lambda _: _bucle_calibracion(), None), **CASOS}
+    mejores = {nombre: float("inf") for nombre in casos}
+    numeros = {}
+    for _ in range(rondas):
+        for nombre, (funcion, argumento) in casos.items():
+            us, numeros[nombre] = medir(funcion, argumento, numeros.get(nombre))
+            mejores[nombre] = min(mejores[nombre], us)
+    calibracion = mejores.pop("calibracion")
+    return calibracion, mejores
+
+
+def guardar_base(calibracion, resultados, ruta=RUTA_BASE):
+    """Escribe la línea base en JSON"""
+    base = {
+        "python": platform.python_version(),
+        "calibracion_us": round(calibracion, 3),
+        "casos": {nombre: round(us, 4) for nombre, us in resultados.items()},
+    }
+    with open(ruta, "w", encoding="utf-8") as f:
+        json.dump(base, f, indent=2, ensure_ascii=False)
+        f.write("\n")
+
+
+def cargar_base(ruta=RUTA_BASE):
+    """Lee la línea base o devuelve None si no existe"""
+    if not os.path.exists(ruta):
+        return None
+    with open(ruta, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def comparar(calibracion, resultados, base, umbral=UMBRAL):
+    """
+    Imprime la comparación con la línea base.
+
+    Returns:
+        Lista de casos con regresión
+    """
+    escala = base["calibracion_us"] / calibracion
+    regresiones = []
+
+    print(f"{'caso':<34}{'base (µs)':>11}{'actual (µs)':>13}{'normal.':>10}{'cambio':>9}")
+    for nombre, us in resultados.items():
+        referencia = base["casos"].get(nombre)
+        normalizado = us * escala
+        if referencia is None:
+            print(f"{nombre:<34}{'-':>11}{us:>13.3f}{normalizado:>10.3f}{'nuevo':>9}")
+            continue
+        cambio = normalizado / referencia - 1
+        marca = ""
+        if cambio > umbral:
+            regresiones.append(nombre)
+            marca = "  ⚠️"
+        print(f"{nombre:<34}{referencia:>11.3f}{us:>13.3f}{normalizado:>10.3f}{cambio:>+8.0%}{marca}")
+
+    print(f"\nCalibración: {calibracion:.2f} µs (base {base['calibracion_us']:.2f} µs, Python {base.get('python', '?')})")
+    return regresiones
+
+
+def ejecutar(guardar=False, umbral=UMBRAL, rondas=5):
+    """Mide los casos y los guarda o compara; devuelve False si hay regresiones"""
+    print("\n===== MICRO-BENCHMARKS DE FUNCIONES =====")
+    calibracion, resultados = medir_todo(rondas)
+
+    base = None if guardar else cargar_base()
+    if base is None:
+        guardar_base(calibracion, resultados)
+        for nombre, us in resultados.items():
+            print(f"{nombre:<34}{us:>10.3f} µs")
+        print(f"\nLínea base guardada en {RUTA_BASE}")
+        return True
+
+    regresiones = comparar(calibracion, resultados, base, umbral)
+    if regresiones:
+        print(f"\n❌ Regresiones de más del {umbral:.0%}: {', '.join(regresiones)}")
+        return False
+    print(f"\n✅ Sin regresiones de más del {umbral:.0%}")
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Micro-benchmarks de las funciones puras con línea base")
+    parser.add_argument("--guardar", action="store_true", help="guarda los tiempos actuales como línea base")
+    parser.add_argument("--umbral", type=float, default=UMBRAL, help="regresión máxima tolerada (0.3 = 30%%)")
+    parser.add_argument("--rondas", type=int, default=5, help="pasadas por todos los casos (se queda el mínimo)")
+    args = parser.parse_args()
+    sys.exit(0 if ejecutar(args.guardar, args.umbral, args.rondas) else 1)
@@ -0,0 +1,94 @@
+"""
+Micro-benchmark del renderizado de Markdown.
+
+Compara las implementaciones anteriores de escape_markdown (un str.replace por
+carácter especial) y una versión con str.translate con las tablas precompiladas
+de utils/markdown.py, y mide el coste de la validación local frente a la
+versión en caché.
+
+Uso: python benchmarks/bench_markdown.py [repeticiones]
+"""
+import sys
+import os
+import timeit
+
+# Añadir directorio raíz al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.markdown import escape_markdown, escape_markdown_v2, markdown_valido, formato_validado
+
+
+def escape_markdown_replace(text):
+    """Implementación anterior de main.py y handlers/tutorias.py"""
+    if not text:
+        return ""
+    chars = ['_', '*', '`', '[', ']', '(', ')', '#', '+', '-', '.', '!']
+    for char in chars:
+        text = text.replace(char, '\\' + char)
+    return text
+
+
+def escape_markdown_v2_replace(text):
+    """Implementación anterior de grupo_handlers/utils.py"""
+    if not text:
+        return ""
+    special_chars = ['_', '*', '[', ']', '(', ')', '~', '`', '>', '#', '+', '-', '=', '|', '{', '}', '.', '!']
+    for char in special_chars:
+        text = text.replace(char, '\\' + char)
+    return text
+
+
+_TABLA_TRANSLATE = str.maketrans({c: '\\' + c for c in "_*`["})
+
+
+def escape_markdown_translate(text):
+    """Alternativa con str.translate (descartada: más lenta con texto no ASCII)"""
+    if not text:
+        return ""
+    return text.translate(_TABLA_TRANSLATE)
+
+
+# Textos representativos de los mensajes del bot
+TEXTOS = {
+    "nombre": "José María Pérez-Gómez",
+    "email": "jose_maria.perez@correo.ugr.es",
+    "sala": "Tutorías [IS] - Ingeniería del Software (2024-25)!",
+    "mensaje": (
+        "👨‍🏫 *Profesor: Ana García*\n📧 Email: ana\\_garcia@ugr.es\n"
+        "🕗 Horario: Lunes 10:00-12:00, Miércoles 16:00-18:00\n\n"
+        "📚 *Asignaturas:*\n• Bases de Datos (BD)\n  📢 [Avisos BD](https://t.me/+abc)\n"
+    ) * 4,
+}
+
+
+def medir(funcion, texto, repeticiones):
+    """Devuelve el tiempo medio por llamada en microsegundos"""
+    tiempo = min(timeit.repeat(lambda: funcion(texto), number=repeticiones, repeat=5))
+    return tiempo / repeticiones * 1e6
+
+
+def ejecutar(repeticiones=20000):
+    print("\n===== BENCHMARK DE MARKDOWN =====")
+    print(f"{'caso':<38}{'anterior (µs)':>14}{'nuevo (µs)':>12}{'mejora':>9}")
+
+    for nombre, texto in TEXTOS.items():
+        for etiqueta, anterior, nueva in [
+            ("escape", escape_markdown_replace, escape_markdown),
+            ("escape V2", escape_markdown_v2_replace, escape_markdown_v2),
+            ("translate", escape_markdown_translate, escape_markdown),
+        ]:
+            t_anterior = medir(anterior, texto, repeticiones)
+            t_nuevo = medir(nueva, texto, repeticiones)
+            print(f"{etiqueta + ' / ' + nombre:<38}{t_anterior:>14.2f}{t_nuevo:>12.2f}{t_anterior / t_nuevo:>8.1f}x")
+
+    print("\nValidación local del mensaje completo:")
+    texto = TEXTOS["mensaje"]
+    t_validar = medir(lambda t: markdown_valido(t, "Markdown"), texto, repeticiones)
+    t_cache = medir(lambda t: formato_validado(t, "Markdown"), texto, repeticiones)
+    print(f"  markdown_valido:  {t_validar:.2f} µs")
+    print(f"  formato_validado: {t_cache:.2f} µs (texto estático en caché)")
+
+
+if __name__ == "__main__":
+    repeticiones = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    ejecutar(repeticiones)
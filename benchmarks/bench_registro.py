@@ -0,0 +1,113 @@
+"""
+Benchmark del alta de usuarios al completar el registro.
+
+Compara la secuencia anterior de completar_registro (create_user, update_user,
+get_o_crear_carrera y, por asignatura, crear_matricula más una conexión para
+el UPDATE de Asignaturas: 3 + 2×N conexiones y commits) con
+db.queries.registrar_usuario (una conexión y un commit). Al final comprueba
+que un fallo a mitad no deja usuarios a medio registrar.
+
+Uso: python benchmarks/bench_registro.py [registros] [asignaturas_por_registro]
+"""
+import sys
+import os
+import time
+import sqlite3
+import shutil
+import tempfile
+
+# Añadir directorio raíz al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import queries as consultas
+from benchmarks.datos_sinteticos import generar_base_datos
+
+
+def registro_anterior(datos, telegram_id):
+    """Llamadas a la base de datos de la versión anterior de completar_registro"""
+    user_id = consultas.create_user(
+        nombre=datos['nombre'], apellidos=datos['apellidos'], tipo=datos['tipo'],
+        email=datos['email'], telegram_id=telegram_id, dni='', carrera=datos['carrera']
+    )
+    consultas.update_user(user_id, Carrera=datos['carrera'])
+    carrera_id = consultas.get_o_crear_carrera(datos['carrera'])
+    for asignatura_id in datos['asignaturas_seleccionadas']:
+        consultas.crear_matricula(user_id, asignatura_id)
+        cursor = consultas.get_db_connection().cursor()
+        cursor.execute("UPDATE Asignaturas SET Id_carrera = ? WHERE Id_asignatura = ? AND Id_carrera IS NULL",
+                       (carrera_id, asignatura_id))
+        cursor.connection.commit()
+        cursor.connection.close()
+
+
+def registro_transaccion(datos, telegram_id):
+    consultas.registrar_usuario(
+        nombre=datos['nombre'], apellidos=datos['apellidos'], tipo=datos['tipo'],
+        email=datos['email'], telegram_id=telegram_id, dni='', carrera=datos['carrera'],
+        asignaturas_ids=datos['asignaturas_seleccionadas']
+    )
+
+
+def medir(funcion, registros, asignaturas, por_registro, base_telegram):
+    """Devuelve los registros por segundo"""
+    inicio = time.perf_counter()
+    for i in range(registros):
+        datos = {
+            'nombre': f"Alumno{i}", 'apellidos': "Prueba Registro", 'tipo': 'estudiante',
+            'email': f"registro{base_telegram + i}@correo.ugr.es", 'carrera': "Ingeniería Informática",
+            'asignaturas_seleccionadas': [(i + k) % asignaturas + 1 for k in range(por_registro)],
+        }
+        funcion(datos, base_telegram + i)
+    return registros / (time.perf_counter() - inicio)
+
+
+def comprobar_atomicidad():
+    """Un fallo en las matrículas no debe dejar el usuario creado"""
+    conn = sqlite3.connect(consultas.DB_PATH)
+    conn.execute("""
+        CREATE TRIGGER fallo_matricula BEFORE INSERT ON Matriculas
+        WHEN NEW.Id_asignatura = -1 BEGIN SELECT RAISE(ABORT, 'fallo simulado'); END
+    """)
+    conn.commit()
+    try:
+        consultas.registrar_usuario("Fallo", "Simulado", "estudiante", "fallo@correo.ugr.es", 1,
+                                    carrera="Carrera de prueba atómica", asignaturas_ids=[1, -1])
+        print("❌ El fallo simulado no ha llegado a producirse")
+        return False
+    except sqlite3.Error:
+        pass
+    usuarios = conn.execute("SELECT COUNT(*) FROM Usuarios WHERE Email_UGR = 'fallo@correo.ugr.es'").fetchone()[0]
+    carreras = conn.execute("SELECT COUNT(*) FROM Carreras WHERE Nombre_carrera = 'Carrera de prueba atómica'").fetchone()[0]
+    conn.close()
+    correcto = usuarios == 0 and carreras == 0
+    print(f"{'✅' if correcto else '❌'} Fallo a mitad del registro: {usuarios} usuarios y {carreras} carreras guardados")
+    return correcto
+
+
+def ejecutar(registros=300, por_registro=5):
+    print("\n===== BENCHMARK DE REGISTRO =====")
+    directorio = tempfile.mkdtemp(prefix="bench_registro_")
+    try:
+        ruta_db = os.path.join(directorio, "tutoria_bench.db")
+        generar_base_datos(ruta_db)
+        consultas.DB_PATH = ruta_db
+        asignaturas = sqlite3.connect(ruta_db).execute("SELECT COUNT(*) FROM Asignaturas").fetchone()[0]
+
+        anterior = medir(registro_anterior, registros, asignaturas, por_registro, 9_000_000_000)
+        transaccion = medir(registro_transaccion, registros, asignaturas, por_registro, 9_100_000_000)
+
+        print(f"{registros} registros con {por_registro} asignaturas cada uno")
+        print(f"{'alta':<38}{'registros/s':>12}{'ms/registro':>13}")
+        for nombre, por_segundo in [("secuencia anterior (3 + 2×N commits)", anterior),
+                                    ("registrar_usuario (1 commit)", transaccion)]:
+            print(f"{nombre:<38}{por_segundo:>12.0f}{1000 / por_segundo:>13.2f}")
+        print(f"\nMejora: {transaccion / anterior:.1f}x")
+        return comprobar_atomicidad()
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    registros = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    por_registro = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    sys.exit(0 if ejecutar(registros, por_registro) else 1)
@@ -0,0 +1,321 @@
+"""
+Generador de bases de datos sintéticas con la estructura de tutoria_ugr.db.
+
+Crea estudiantes (registrados y pendientes de registro), profesores con
+horario de tutorías toda la semana, asignaturas, matrículas, salas de tutoría
+privadas con su enlace de invitación, miembros y valoraciones. Con la misma
+semilla genera siempre los mismos datos: las fechas (valoraciones, creación de
+salas, altas de miembros) se cuentan desde FECHA_REFERENCIA, no desde el reloj,
+así que dos ejecuciones dan la misma base de datos byte a byte.
+
+Las filas se generan de forma perezosa y se insertan con executemany en lotes
+dentro de una única transacción (con journal y sincronización desactivados
+durante la carga), así que los tamaños grandes (--escala grande: 100k
+estudiantes, 5k profesores...) tardan segundos. Opcionalmente escribe un
+Excel con el mismo formato que data/usuarios.xlsx para probar la importación.
+
+Uso:
+    python benchmarks/datos_sinteticos.py ruta.db [--escala grande] [--excel ruta.xlsx]
+    python benchmarks/datos_sinteticos.py ruta.db --estudiantes 5000 --profesores 200 --salas 300
+"""
+import sys
+import os
+import time
+import datetime
+import random
+import sqlite3
+import argparse
+from itertools import islice
+
+# Añadir directorio raíz al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import AREA_CARRERAS
+import db.models as modelos
+from db.queries import reconstruir_agregados_valoraciones
+
+# Identificadores de Telegram sintéticos (no coinciden con usuarios reales)
+TELEGRAM_BASE_ESTUDIANTES = 7_000_000_000
+TELEGRAM_BASE_PROFESORES = 8_000_000_000
+CHAT_BASE_SALAS = -1_009_000_000_000
+
+# Fecha "actual" de los datos generados (las valoraciones son del año anterior)
+FECHA_REFERENCIA = datetime.datetime(2025, 6, 30, 12, 0, 0)
+
+# Filas por executemany
+LOTE = 50_000
+
+DIAS = ("Lunes", "Martes", "Miércoles", "Jueves", "Viernes", "Sábado", "Domingo")
+HORARIO_COMPLETO = ", ".join(f"{dia} 00:00-23:59" for dia in DIAS)
+
+NOMBRES = ["Ana", "Luis", "María", "José", "Lucía", "Javier", "Carmen", "Pablo", "Elena", "Sergio",
+           "Marta", "David", "Laura", "Antonio", "Paula", "Manuel", "Sara", "Francisco", "Alba", "Jorge"]
+APELLIDOS = ["García", "Martínez", "López", "Sánchez", "Pérez", "Gómez", "Ruiz", "Díaz", "Moreno", "Muñoz",
+             "Álvarez", "Romero", "Navarro", "Torres", "Domínguez", "Vázquez", "Ramos", "Gil", "Serrano", "Molina"]
+COMENTARIOS = ["", "", "Muy claro explicando", "Resolvió todas mis dudas", "Llegó tarde a la tutoría",
+               "Recomendable", "Podría dar más ejemplos"]
+
+# Tamaños predefinidos
+ESCALAS = {
+    "pequeña": dict(estudiantes=200, profesores=20, salas=20, pendientes=50, valoraciones=500),
+    "mediana": dict(estudiantes=10_000, profesores=500, salas=1_000, pendientes=1_000,
+                    matriculas=5_000, valoraciones=20_000),
+    "grande": dict(estudiantes=100_000, profesores=5_000, salas=5_000, pendientes=5_000,
+                   matriculas=50_000, valoraciones=200_000),
+}
+
+
+def crear_estructura(ruta):
+    """Crea las tablas vacías en 'ruta' con el mismo script que la base de datos real"""
+    ruta_original = modelos.DB_PATH
+    modelos.DB_PATH = ruta
+    try:
+        modelos.create_database()
+    finally:
+        modelos.DB_PATH = ruta_original
+
+
+def _insertar(cursor, sql, filas):
+    """Inserta las filas de un generador en lotes de LOTE; devuelve cuántas se han insertado"""
+    total = 0
+    while True:
+        lote = list(islice(filas, LOTE))
+        if not lote:
+            return total
+        cursor.executemany(sql, lote)
+        total += len(lote)
+
+
+def generar_base_datos(ruta, estudiantes=200, profesores=20, salas=20, pendientes=50,
+                       asignaturas_por_estudiante=4, semilla=1234, asignaturas=None,
+                       matriculas=None, miembros_por_sala=5, valoraciones=0, ruta_excel=None):
+    """
+    Genera una base de datos sintética.
+
+    Args:
+        ruta: Fichero de destino (se sobrescribe)
+        estudiantes: Estudiantes ya registrados (con TelegramID)
+        profesores: Profesores registrados
+        salas: Salas de tutoría privadas
+        pendientes: Estudiantes en la BD pero aún sin registrar en el bot
+        asignaturas_por_estudiante: Matrículas por estudiante si no se indica 'matriculas'
+        semilla: Semilla del generador aleatorio
+        asignaturas: Número de asignaturas (por defecto 3 por profesor, mínimo 10)
+        matriculas: Total de matrículas de estudiantes (repartidas entre todos)
+        miembros_por_sala: Estudiantes activos en cada sala
+        valoraciones: Valoraciones de estudiantes a profesores
+        ruta_excel: Si se indica, escribe también el listado en Excel
+
+    Returns:
+        dict: Identificadores para los recorridos de los benchmarks y filas por tabla
+    """
+    aleatorio = random.Random(semilla)
+    if os.path.exists(ruta):
+        os.remove(ruta)
+    crear_estructura(ruta)
+
+    total_asignaturas = asignaturas or max(10, profesores * 3)
+    total_estudiantes = estudiantes + pendientes
+    if matriculas is None:
+        matriculas = total_estudiantes * min(asignaturas_por_estudiante, total_asignaturas)
+    carreras = [c for lista in AREA_CARRERAS.values() for c in lista]
+    area_de = {c: area for area, lista in AREA_CARRERAS.items() for c in lista}
+
+    # Atributos por usuario elegidos de antemano para que BD y Excel coincidan
+    nombres_profesores = [(aleatorio.choice(NOMBRES), f"{aleatorio.choice(APELLIDOS)} {aleatorio.choice(APELLIDOS)}")
+                          for _ in range(profesores)]
+    nombres_estudiantes = [(aleatorio.choice(NOMBRES), f"{aleatorio.choice(APELLIDOS)} {aleatorio.choice(APELLIDOS)}")
+                           for _ in range(total_estudiantes)]
+    carrera_estudiante = [aleatorio.randrange(len(carreras)) for _ in range(total_estudiantes)]
+
+    # Cada asignatura la imparte un profesor; las matrículas se reparten en turno rotatorio
+    profesor_de = [(a % profesores) + 1 for a in range(total_asignaturas)]
+    asignaturas_estudiante = [[] for _ in range(total_estudiantes)]
+    for i in range(matriculas):
+        j = i % total_estudiantes
+        asignaturas_estudiante[j].append(aleatorio.randrange(total_asignaturas) + 1)
+    for lista in asignaturas_estudiante:
+        lista[:] = sorted(set(lista))
+
+    # Id_usuario: profesores 1..P, estudiantes P+1..P+E
+    def id_estudiante(j):
+        return profesores + j + 1
+
+    conn = sqlite3.connect(str(ruta))
+    cursor = conn.cursor()
+    cursor.execute("PRAGMA journal_mode = OFF")
+    cursor.execute("PRAGMA synchronous = OFF")
+    cursor.execute("PRAGMA temp_store = MEMORY")
+    cursor.execute("PRAGMA cache_size = -200000")
+
+    inicio = time.perf_counter()
+    filas = {}
+    cursor.execute("BEGIN")
+
+    filas["Carreras"] = _insertar(cursor, "INSERT INTO Carreras (id_carrera, Nombre_carrera) VALUES (?, ?)",
+                                  ((i + 1, c) for i, c in enumerate(carreras)))
+
+    filas["Asignaturas"] = _insertar(
+        cursor,
+        "INSERT INTO Asignaturas (Id_asignatura, Nombre, Codigo_Asignatura, Id_carrera) VALUES (?, ?, ?, ?)",
+        ((a, f"Asignatura {a}", f"ASG{a:06d}", (a % len(carreras)) + 1) for a in range(1, total_asignaturas + 1))
+    )
+
+    filas["Usuarios"] = _insertar(
+        cursor,
+        """
+        INSERT INTO Usuarios (Id_usuario, Nombre, Apellidos, Tipo, Email_UGR, TelegramID, Registrado, Area, Carrera, Horario)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        (
+            (i + 1, nombre, apellidos, "profesor", f"profesor{i + 1}@ugr.es",
+             TELEGRAM_BASE_PROFESORES + i + 1, "SI", None, None, HORARIO_COMPLETO)
+            for i, (nombre, apellidos) in enumerate(nombres_profesores)
+        )
+    ) + _insertar(
+        cursor,
+        """
+        INSERT INTO Usuarios (Id_usuario, Nombre, Apellidos, Tipo, Email_UGR, TelegramID, Registrado, Area, Carrera)
+        VALUES (?, ?, ?, 'estudiante', ?, ?, ?, ?, ?)
+        """,
+        (
+            (id_estudiante(j), nombre, apellidos, f"estudiante{j + 1}@correo.ugr.es",
+             TELEGRAM_BASE_ESTUDIANTES + j + 1 if j < estudiantes else None,
+             "SI" if j < estudiantes else "NO",
+             area_de[carreras[carrera_estudiante[j]]], carreras[carrera_estudiante[j]])
+            for j, (nombre, apellidos) in enumerate(nombres_estudiantes)
+        )
+    )
+
+    filas["Horarios_Profesores"] = _insertar(
+        cursor,
+        "INSERT INTO Horarios_Profesores (Id_usuario, dia, hora_inicio, hora_fin) VALUES (?, ?, '00:00', '23:59')",
+        ((i, dia) for i in range(1, profesores + 1) for dia in DIAS)
+    )
+
+    filas["Matriculas"] = _insertar(
+        cursor,
+        "INSERT INTO Matriculas (Id_usuario, Id_asignatura, Curso, Tipo) VALUES (?, ?, '2024-25', 'docente')",
+        ((profesor_de[a - 1], a) for a in range(1, total_asignaturas + 1))
+    ) + _insertar(
+        cursor,
+        "INSERT INTO Matriculas (Id_usuario, Id_asignatura, Curso, Tipo) VALUES (?, ?, '2024-25', 'estudiante')",
+        ((id_estudiante(j), a) for j, lista in enumerate(asignaturas_estudiante) for a in lista)
+    )
+
+    # Salas privadas: profesor en turno rotatorio y una de sus asignaturas
+    referencia = FECHA_REFERENCIA.strftime("%Y-%m-%d %H:%M:%S")
+    salas_generadas = []
+    for k in range(1, salas + 1):
+        profesor_id = ((k - 1) % profesores) + 1
+        asignatura = profesor_id + profesores * aleatorio.randrange(max(1, total_asignaturas // profesores))
+        salas_generadas.append((k, profesor_id, min(asignatura, total_asignaturas)))
+    filas["Grupos_tutoria"] = _insertar(
+        cursor,
+        """
+        INSERT INTO Grupos_tutoria
+        (id_sala, Id_usuario, Nombre_sala, Tipo_sala, Id_asignatura, Chat_id, Enlace_invitacion, Proposito_sala,
+         Fecha_creacion)
+        VALUES (?, ?, ?, 'privada', ?, ?, ?, 'individual', ?)
+        """,
+        ((k, p, f"Tutoría privada {k}", a, str(CHAT_BASE_SALAS - k), f"https://t.me/+sala{k}", referencia)
+         for k, p, a in salas_generadas)
+    )
+
+    # Miembros: estudiantes registrados distintos en cada sala
+    por_sala = min(miembros_por_sala, estudiantes)
+    filas["Miembros_Grupo"] = _insertar(
+        cursor,
+        "INSERT INTO Miembros_Grupo (id_sala, Id_usuario, Estado, Fecha_union) VALUES (?, ?, 'activo', ?)",
+        ((k, id_estudiante(j), referencia) for k, _, _ in salas_generadas for j in aleatorio.sample(range(estudiantes), por_sala))
+    )
+
+    # Valoraciones de estudiantes registrados a profesores, con fechas del último año
+    filas["Valoraciones"] = _insertar(
+        cursor,
+        """
+        INSERT INTO Valoraciones (evaluador_id, profesor_id, puntuacion, comentario, fecha, es_anonimo, id_sala)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        """,
+        (
+            (id_estudiante(aleatorio.randrange(estudiantes)), aleatorio.randrange(profesores) + 1,
+             aleatorio.choices((1, 2, 3, 4, 5), weights=(1, 2, 4, 6, 5))[0], aleatorio.choice(COMENTARIOS),
+             (FECHA_REFERENCIA - datetime.timedelta(seconds=aleatorio.randrange(365 * 86400))).strftime("%Y-%m-%d %H:%M:%S"),
+             aleatorio.randrange(2), None)
+            for _ in range(valoraciones if estudiantes else 0)
+        )
+    )
+    # Agregados por profesor y sala (y por periodo), como los mantendría el bot
+    # al insertar cada valoración
+    reconstruir_agregados_valoraciones(cursor)
+    if filas["Valoraciones"]:
+        from db.analitica import reconstruir_periodos_valoraciones
+        reconstruir_periodos_valoraciones(cursor)
+
+    conn.commit()
+    cursor.execute("ANALYZE")
+    conn.close()
+    duracion = time.perf_counter() - inicio
+
+    if ruta_excel:
+        exportar_excel(ruta_excel, nombres_profesores, nombres_estudiantes, carreras, carrera_estudiante,
+                       area_de, profesor_de, asignaturas_estudiante)
+
+    return {
+        "profesores": [(i, TELEGRAM_BASE_PROFESORES + i) for i in range(1, profesores + 1)],
+        "estudiantes": [(id_estudiante(j), TELEGRAM_BASE_ESTUDIANTES + j + 1) for j in range(estudiantes)],
+        "pendientes": [(f"estudiante{j + 1}@correo.ugr.es", TELEGRAM_BASE_ESTUDIANTES + j + 1)
+                       for j in range(estudiantes, total_estudiantes)],
+        "salas": [(k, p, TELEGRAM_BASE_PROFESORES + p) for k, p, _ in salas_generadas],
+        "filas": filas,
+        "segundos": duracion,
+    }
+
+
+def exportar_excel(ruta_excel, nombres_profesores, nombres_estudiantes, carreras, carrera_estudiante,
+                   area_de, profesor_de, asignaturas_estudiante):
+    """Escribe el listado de usuarios con las columnas de data/usuarios.xlsx (modo solo escritura)"""
+    from openpyxl import Workbook
+
+    asignaturas_profesor = {}
+    for a, p in enumerate(profesor_de, start=1):
+        asignaturas_profesor.setdefault(p, []).append(f"Asignatura {a}")
+
+    libro = Workbook(write_only=True)
+    hoja = libro.create_sheet("Usuarios")
+    hoja.append(["Nombre", "Apellidos", "DNI", "Email", "Tipo", "Area", "Carrera", "Asignaturas", "Horario"])
+    for i, (nombre, apellidos) in enumerate(nombres_profesores, start=1):
+        hoja.append([nombre, apellidos, f"{50_000_000 + i:08d}", f"profesor{i}@ugr.es", "profesor", None, None,
+                     ";".join(asignaturas_profesor.get(i, [])), HORARIO_COMPLETO])
+    for j, (nombre, apellidos) in enumerate(nombres_estudiantes):
+        carrera = carreras[carrera_estudiante[j]]
+        hoja.append([nombre, apellidos, f"{60_000_000 + j:08d}", f"estudiante{j + 1}@correo.ugr.es", "estudiante",
+                     area_de[carrera], carrera, ";".join(f"Asignatura {a}" for a in asignaturas_estudiante[j]), None])
+    libro.save(ruta_excel)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Genera una base de datos sintética de tutorías")
+    parser.add_argument("ruta", help="fichero .db de destino (se sobrescribe)")
+    parser.add_argument("--escala", choices=sorted(ESCALAS), default="pequeña")
+    parser.add_argument("--estudiantes", type=int)
+    parser.add_argument("--profesores", type=int)
+    parser.add_argument("--salas", type=int)
+    parser.add_argument("--pendientes", type=int)
+    parser.add_argument("--matriculas", type=int)
+    parser.add_argument("--valoraciones", type=int)
+    parser.add_argument("--semilla", type=int, default=1234)
+    parser.add_argument("--excel", help="escribe también el listado en este .xlsx")
+    args = parser.parse_args()
+
+    parametros = dict(ESCALAS[args.escala])
+    for nombre in ("estudiantes", "profesores", "salas", "pendientes", "matriculas", "valoraciones"):
+        if getattr(args, nombre) is not None:
+            parametros[nombre] = getattr(args, nombre)
+
+    resultado = generar_base_datos(args.ruta, semilla=args.semilla, ruta_excel=args.excel, **parametros)
+    print(f"✅ Base de datos sintética creada en {args.ruta} ({resultado['segundos']:.1f}s)")
+    for tabla, n in resultado["filas"].items():
+        print(f"   {tabla}: {n}")
+    if args.excel:
+        print(f"✅ Listado Excel escrito en {args.excel}")
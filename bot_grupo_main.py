@@ -4,6 +4,7 @@ Inicialización, configuración y handlers básicos.
 """
 import telebot
 from telebot import types
+from telebot.apihelper import ApiTelegramException
 import threading
 import time
 import os
@@ -16,15 +17,22 @@ from dotenv import load_dotenv
 from grupo_handlers.grupos import GestionGrupos
 from grupo_handlers.valoraciones import register_handlers as register_valoraciones_handlers
 from grupo_handlers.usuarios import register_student_handlers
+from handlers.admin import register_handlers as register_admin_handlers
 from grupo_handlers.utils import (
     limpiar_estados_obsoletos, es_profesor, menu_profesor, menu_estudiante, 
-    configurar_logger, configurar_comandos_por_rol
+    configurar_comandos_por_rol
 )
 # Importar estados desde el manejador central
 from utils.state_manager import user_states, user_data, estados_timestamp, set_state, get_state, clear_state
+from utils.respuestas import enviar_mensaje, editar_o_enviar
+from utils.miembros import pagina_miembros, formatear_miembros, teclado_paginas, enviar_csv_miembros
+from utils.cola_mensajes import iniciar_despachador, BOT_GRUPOS
+from utils.avisos_valoracion import programar_valoracion, iniciar_avisos_valoracion
 
-# Configuración de logging
-logger = configurar_logger()
+# Configuración de logging (se completa con configurar_logging en __main__)
+from utils.logs import configurar_logging, evento
+from utils.perfilador import instalar_senal_perfil
+logger = logging.getLogger("bot_grupo")
 
 # Cargar token del bot de grupos
 base_dir = os.path.dirname(os.path.abspath(__file__))
@@ -51,11 +59,20 @@ if not BOT_TOKEN:
 from telebot import apihelper
 apihelper.ENABLE_MIDDLEWARE = True
 
+# Sesión HTTP compartida (keep-alive) para todas las llamadas a la API
+from utils.transporte_telegram import configurar_transporte
+configurar_transporte()
+
 # Inicializar el bot
 bot = telebot.TeleBot(BOT_TOKEN)
 
-# Establecer el nivel de logging de telebot a DEBUG
-telebot.logger.setLevel(logging.DEBUG)
+# Medir latencia, errores, consultas y llamadas a la API de cada handler
+from utils.metricas import instrumentar_bot, iniciar_metricas
+from utils.salud import registrar_bot
+from config import METRICAS_PUERTO_GRUPOS
+instrumentar_bot(bot, "grupos")
+# Publicar su estado en /health y /ready
+registrar_bot(bot, "grupos")
 
 # Mecanismo para prevenir instancias duplicadas del bot
 import socket
@@ -79,29 +96,32 @@ def prevent_duplicate_instances(port=12345):
         lock_socket.close()
     atexit.register(cleanup)
 
-# Prevenir múltiples instancias
-prevent_duplicate_instances()
-
 # Crear una función wrapper que maneje errores de Markdown
 def safe_send_message(chat_id, text, parse_mode=None, **kwargs):
-    if parse_mode == "Markdown":
-        try:
-            return bot.send_message(chat_id, text, parse_mode=parse_mode, **kwargs)
-        except Exception as e:
-            logger.warning(f"Error con Markdown, reintentando sin formato: {e}")
-            return bot.send_message(chat_id, text, parse_mode=None, **kwargs)
-    else:
-        return bot.send_message(chat_id, text, parse_mode=parse_mode, **kwargs)
+    """Envía un mensaje validando el Markdown antes (sin reintentos a ciegas)"""
+    return enviar_mensaje(bot, chat_id, text, parse_mode=parse_mode, **kwargs)
 
 # Importar funciones de la base de datos compartidas
-from db.queries import get_db_connection, get_user_by_telegram_id, crear_grupo_tutoria
+from db.queries import (
+    get_db_connection,
+    get_user_by_telegram_id,
+    get_usuario_cacheado,
+    get_sala_por_chat,
+    obtener_grupo_por_id,
+    contar_miembros_sala,
+    crear_grupo_tutoria,
+    terminar_sesion_miembro,
+    get_rol_comandos_usuario,
+    set_rol_comandos_usuario
+)
+from db.models import actualizar_estructura_tablas
 
 # Handlers básicos
 @bot.message_handler(commands=['start'])
 def send_welcome(message):
     chat_id = message.chat.id
     user_id = message.from_user.id
-    user = get_user_by_telegram_id(user_id)
+    user = get_usuario_cacheado(user_id)
     
     if not user:
         bot.send_message(
@@ -114,11 +134,7 @@ def send_welcome(message):
     # Actualizar interfaz según rol y tipo de chat
     if message.chat.type in ['group', 'supergroup']:
         # Estamos en un grupo
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM Grupos_tutoria WHERE Chat_id = ?", (str(chat_id),))
-        grupo = cursor.fetchone()
-        conn.close()
+        grupo = get_sala_por_chat(chat_id)
         
         if grupo:
             # Es un grupo de tutoría registrado
@@ -168,7 +184,7 @@ def send_welcome(message):
 @bot.message_handler(commands=['ayuda'])
 def ayuda_comando(message):
     chat_id = message.chat.id
-    bot.send_message(
+    safe_send_message(
         chat_id,
         "ℹ️ *Ayuda del Bot*\n\n"
         "🔹 Usa los siguientes comandos para interactuar con el bot:\n"
@@ -183,32 +199,22 @@ def actualizar_interfaz_usuario(user_id, chat_id=None):
     """Actualiza la interfaz completa según el rol del usuario."""
     comandos_profesor, comandos_estudiante = configurar_comandos_por_rol()
     try:
-        if es_profesor(user_id):
-            # Actualizar comandos visibles
-            scope = telebot.types.BotCommandScopeChat(user_id)
-            bot.set_my_commands(comandos_profesor, scope)
-            
-            # Si hay un chat_id, enviar menú de profesor
-            if chat_id:
-                bot.send_message(
-                    chat_id,
-                    "🔄 Interfaz actualizada para profesor",
-                    reply_markup=menu_profesor()
-                )
-            logger.info(f"Interfaz de profesor configurada para usuario {user_id}")
-        else:
-            # Actualizar comandos visibles
+        rol = 'profesor' if es_profesor(user_id) else 'estudiante'
+        
+        # Los comandos solo se publican en Telegram cuando cambia el rol del usuario
+        if get_rol_comandos_usuario(user_id) != rol:
             scope = telebot.types.BotCommandScopeChat(user_id)
-            bot.set_my_commands(comandos_estudiante, scope)
-            
-            # Si hay un chat_id, enviar menú de estudiante
-            if chat_id:
-                bot.send_message(
-                    chat_id,
-                    "🔄 Interfaz actualizada para estudiante",
-                    reply_markup=menu_estudiante()
-                )
-            logger.info(f"Interfaz de estudiante configurada para usuario {user_id}")
+            bot.set_my_commands(comandos_profesor if rol == 'profesor' else comandos_estudiante, scope)
+            set_rol_comandos_usuario(user_id, rol)
+        
+        # Si hay un chat_id, enviar menú según el rol
+        if chat_id:
+            bot.send_message(
+                chat_id,
+                f"🔄 Interfaz actualizada para {rol}",
+                reply_markup=menu_profesor() if rol == 'profesor' else menu_estudiante()
+            )
+        logger.info(f"Interfaz de {rol} configurada para usuario {user_id}")
     except Exception as e:
         logger.error(f"Error configurando interfaz para usuario {user_id}: {e}")
 
@@ -253,27 +259,22 @@ def configurar_grupo(message):
         return
 
     # Verificar si el grupo ya está configurado
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM Grupos_tutoria WHERE Chat_id = ?", (str(chat_id),))
-    grupo = cursor.fetchone()
-
-    if grupo:
+    if get_sala_por_chat(chat_id):
         bot.send_message(chat_id, "ℹ️ Este grupo ya está configurado como sala de tutoría.")
-        conn.close()
         return
 
     # Obtener ID del usuario profesor
-    cursor.execute("SELECT Id_usuario FROM Usuarios WHERE TelegramID = ? AND Tipo = 'profesor'", (str(user_id),))
-    profesor_row = cursor.fetchone()
+    profesor_row = get_usuario_cacheado(user_id)
 
-    if not profesor_row:
+    if not profesor_row or profesor_row['Tipo'] != 'profesor':
         bot.send_message(chat_id, "⚠️ Solo los profesores registrados pueden configurar grupos.")
-        conn.close()
         return
 
     profesor_id = profesor_row['Id_usuario']
 
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
     # CONSULTA MEJORADA: Obtener SOLO asignaturas sin sala de avisos asociada
     cursor.execute("""
         SELECT a.Id_asignatura, a.Nombre 
@@ -299,22 +300,20 @@ def configurar_grupo(message):
 
     tiene_privada = cursor.fetchone()['total'] > 0
 
-    # Depuración - Mostrar salas actuales
-    cursor.execute("""
-        SELECT g.id_sala, g.Nombre_sala, g.Id_asignatura, a.Nombre as Asignatura
-        FROM Grupos_tutoria g
-        LEFT JOIN Asignaturas a ON g.Id_asignatura = a.Id_asignatura
-        WHERE g.Id_usuario = ?
-    """, (profesor_id,))
-
-    salas_actuales = cursor.fetchall()
-    print(f"\n--- SALAS ACTUALES PARA PROFESOR ID {profesor_id} ---")
-    for sala in salas_actuales:
-        # Usar operador ternario para manejar valores nulos
-        nombre_asignatura = sala['Asignatura'] if sala['Asignatura'] is not None else 'N/A'
-        print(f"Sala ID: {sala['id_sala']}, Nombre: {sala['Nombre_sala']}, " + 
-              f"Asignatura ID: {sala['Id_asignatura']}, Asignatura: {nombre_asignatura}")
-    print("--- FIN SALAS ACTUALES ---\n")
+    # Depuración - Mostrar salas actuales (la consulta solo se hace si se van a escribir)
+    if logger.isEnabledFor(logging.DEBUG):
+        cursor.execute("""
+            SELECT g.id_sala, g.Nombre_sala, g.Id_asignatura, a.Nombre as Asignatura
+            FROM Grupos_tutoria g
+            LEFT JOIN Asignaturas a ON g.Id_asignatura = a.Id_asignatura
+            WHERE g.Id_usuario = ?
+        """, (profesor_id,))
+        for sala in cursor.fetchall():
+            evento(
+                logger, "sala actual", profesor=profesor_id, id_sala=sala['id_sala'],
+                nombre=sala['Nombre_sala'], asignatura=sala['Id_asignatura'],
+                nombre_asignatura=sala['Asignatura'] if sala['Asignatura'] is not None else 'N/A'
+            )
 
     conn.close()
 
@@ -337,9 +336,9 @@ def configurar_grupo(message):
     # Añadir opción de tutoría privada SOLO si no tiene una ya
     if not tiene_privada:
         markup.add(types.InlineKeyboardButton("Tutoría Privada", callback_data="config_tutoria_privada"))
-        print(f"✅ Usuario {user_id} NO tiene sala privada - Mostrando opción")
+        logger.debug("Usuario %s NO tiene sala privada - Mostrando opción", user_id)
     else:
-        print(f"⚠️ Usuario {user_id} YA tiene sala privada - Ocultando opción")
+        logger.debug("Usuario %s YA tiene sala privada - Ocultando opción", user_id)
 
     # Comprobar si no hay opciones disponibles
     if not asignaturas_disponibles and tiene_privada:
@@ -649,81 +648,92 @@ def handle_ver_estudiantes_cmd(message):
     user_id = message.from_user.id
     
     # Verificar que el usuario es profesor
-    user = get_user_by_telegram_id(user_id)
+    user = get_usuario_cacheado(user_id)
     if not user or user['Tipo'] != 'profesor':
         bot.send_message(chat_id, "⚠️ Solo los profesores pueden ver la lista de estudiantes")
         return
         
-    # Aquí va el código para mostrar la lista de estudiantes
-    # (el mismo que tenías en tu handler de callback)
     try:
-        # Obtener grupo y estudiantes
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
         # Verificar que este chat es un grupo registrado
-        cursor.execute(
-            "SELECT id_sala FROM Grupos_tutoria WHERE Chat_id = ?", 
-            (str(chat_id),)
-        )
-        sala = cursor.fetchone()
+        sala = get_sala_por_chat(chat_id)
         
         if not sala:
             bot.send_message(chat_id, "⚠️ Este grupo no está configurado como sala de tutoría")
-            conn.close()
             return
-            
-        sala_id = sala['id_sala']
         
-        # Obtener lista de estudiantes
-        cursor.execute("""
-            SELECT u.Nombre, u.Apellidos, u.TelegramID, m.Fecha_incorporacion, m.Estado
-            FROM Miembros_Grupo m
-            JOIN Usuarios u ON m.Id_usuario = u.Id_usuario
-            WHERE m.id_sala = ? AND u.Tipo = 'alumno'
-            ORDER BY m.Fecha_incorporacion DESC
-        """, (sala_id,))
-        
-        estudiantes = cursor.fetchall()
-        conn.close()
-        
-        if not estudiantes:
-            bot.send_message(
-                chat_id, 
-                "📊 *No hay estudiantes*\n\nAún no hay estudiantes en este grupo.",
-                parse_mode="Markdown"
-            )
-            return
-            
-        # Crear mensaje con lista de estudiantes
-        mensaje = "👨‍🎓 *Lista de estudiantes*\n\n"
-        
-        for i, est in enumerate(estudiantes, 1):
-            nombre_completo = f"{est['Nombre']} {est['Apellidos'] or ''}"
-            fecha = est['Fecha_incorporacion'].split()[0]  # Solo la fecha, no la hora
-            estado = "✅ Activo" if est['Estado'] == 'activo' else "❌ Inactivo"
-            
-            mensaje += f"{i}. *{nombre_completo}*\n"
-            mensaje += f"   • Desde: {fecha}\n"
-            mensaje += f"   • Estado: {estado}\n\n"
-        
-        bot.send_message(chat_id, mensaje, parse_mode="Markdown")
+        mostrar_pagina_estudiantes(chat_id, sala['id_sala'])
         
     except Exception as e:
         bot.send_message(chat_id, f"❌ Error al recuperar estudiantes: {str(e)}")
         logger.error(f"Error recuperando estudiantes del grupo {chat_id}: {e}")
 
+def mostrar_pagina_estudiantes(chat_id, sala_id, partes=(), message_id=None):
+    """Envía (o edita, al cambiar de página) una página de la lista de estudiantes activos"""
+    estudiantes, hay_anterior, hay_siguiente = pagina_miembros(sala_id, partes, tipo='estudiante')
+    
+    if not estudiantes:
+        editar_o_enviar(
+            bot,
+            chat_id,
+            "📊 *No hay estudiantes*\n\nAún no hay estudiantes en este grupo.",
+            message_id,
+            parse_mode="Markdown"
+        )
+        return
+    
+    total = contar_miembros_sala(sala_id, tipo='estudiante')
+    mensaje = f"👨‍🎓 *Lista de estudiantes* ({total} activos)\n\n" + formatear_miembros(estudiantes)
+    markup = teclado_paginas(
+        f"estudiantes_{sala_id}", estudiantes, hay_anterior, hay_siguiente,
+        filas_extra=((("📄 Exportar CSV", f"exportar_miembros_{sala_id}"),),)
+    )
+    editar_o_enviar(bot, chat_id, mensaje, message_id, parse_mode="Markdown", reply_markup=markup)
+
+@bot.callback_query_handler(func=lambda call: call.data.startswith("estudiantes_"))
+def handle_pagina_estudiantes(call):
+    """Cambia de página la lista de estudiantes (estudiantes_<sala>_<a|s>_<id>)"""
+    user = get_usuario_cacheado(call.from_user.id)
+    if not user or user['Tipo'] != 'profesor':
+        bot.answer_callback_query(call.id, "Solo los profesores pueden ver la lista de estudiantes.")
+        return
+    
+    partes = call.data.split("_")
+    mostrar_pagina_estudiantes(call.message.chat.id, int(partes[1]), partes[2:], call.message.message_id)
+    bot.answer_callback_query(call.id)
+
+@bot.callback_query_handler(func=lambda call: call.data.startswith("exportar_miembros_"))
+def handle_exportar_miembros(call):
+    """Envía la lista completa de miembros de la sala como CSV (solo a su profesor)"""
+    sala_id = int(call.data.split("_")[2])
+    user = get_usuario_cacheado(call.from_user.id)
+    sala = obtener_grupo_por_id(sala_id)
+    
+    if not user or not sala or sala['Id_usuario'] != user['Id_usuario']:
+        bot.answer_callback_query(call.id, "Solo el profesor de la sala puede exportar sus miembros.")
+        return
+    
+    # El CSV lleva correos y TelegramID: solo al chat privado del profesor, nunca al grupo
+    try:
+        if enviar_csv_miembros(bot, call.from_user.id, sala_id, sala['Nombre_sala']):
+            bot.answer_callback_query(call.id, "📄 Te he enviado el CSV por privado.")
+        else:
+            bot.answer_callback_query(call.id, "📊 La sala no tiene miembros que exportar.")
+    except ApiTelegramException as e:
+        logger.warning("No se pudo enviar el CSV de la sala %s al profesor por privado: %s", sala_id, e)
+        bot.answer_callback_query(
+            call.id, "⚠️ Abre un chat privado conmigo (pulsa Iniciar) y vuelve a exportar.", show_alert=True
+        )
+    except Exception as e:
+        logger.error("Error exportando los miembros de la sala %s: %s", sala_id, e)
+        bot.answer_callback_query(call.id, "❌ No se ha podido exportar la lista de miembros.")
+
 @bot.message_handler(func=lambda message: message.text == "❌ Terminar Tutoria")
 def handle_terminar_tutoria(message):
     """Maneja la acción de terminar tutoría según el rol del usuario"""
     chat_id = message.chat.id
     user_id = message.from_user.id
     
-    print(f"\n==================================================")
-    print(f"⚠️⚠️⚠️ BOTÓN TERMINAR TUTORÍA PRESIONADO ⚠️⚠️⚠️")
-    print(f"⚠️ Chat ID: {chat_id} | User ID: {user_id}")
-    print(f"⚠️ Usuario: {message.from_user.first_name}")
-    print("==================================================\n")
+    evento(logger, "inicio", handler="terminar_tutoria", chat_id=chat_id, user_id=user_id)
     
     try:
         # Verificar que estamos en una sala de tutoría
@@ -750,7 +760,7 @@ def handle_terminar_tutoria(message):
         # Comportamiento diferente según el rol
         if user['Tipo'] == 'profesor':
             # Es profesor: mostrar lista de alumnos para expulsar
-            print(f"👨‍🏫 {user_id} ES PROFESOR - Mostrando lista de estudiantes")
+            logger.debug("%s ES PROFESOR - Mostrando lista de estudiantes", user_id)
             
             # Crear lista de estudiantes para seleccionar
             markup = types.InlineKeyboardMarkup(row_width=1)
@@ -804,7 +814,7 @@ def handle_terminar_tutoria(message):
                 )
             
             except Exception as e:
-                print(f"❌ Error al obtener miembros del grupo: {e}")
+                logger.error("Error al obtener miembros del grupo: %s", e)
                 bot.send_message(
                     chat_id,
                     "No pude obtener la lista de estudiantes. Asegúrate de que tengo permisos de administrador."
@@ -812,7 +822,7 @@ def handle_terminar_tutoria(message):
         
         else:
             # Es estudiante: auto-expulsión
-            print(f"🎓 {user_id} ES ESTUDIANTE - Ejecutando auto-expulsión")
+            logger.debug("%s ES ESTUDIANTE - Ejecutando auto-expulsión", user_id)
             
             try:
                 # Obtener el nombre del estudiante
@@ -829,6 +839,10 @@ def handle_terminar_tutoria(message):
                 # Expulsar al usuario (ban temporal de 30 segundos)
                 until_date = int(time.time()) + 30
                 bot.ban_chat_member(chat_id, user_id, until_date=until_date)
+                marcar_sesion_terminada(chat_id, user_id)
+                
+                # Pedirle la valoración de la sesión (se agrupa y se envía en segundo plano)
+                programar_valoracion(chat_id, user_id)
                 
                 # Enviar mensaje privado al estudiante
                 try:
@@ -837,19 +851,33 @@ def handle_terminar_tutoria(message):
                         "Has finalizado tu sesión de tutoría. ¡Gracias por participar!"
                     )
                 except Exception as dm_error:
-                    print(f"No se pudo enviar mensaje privado al usuario: {dm_error}")
+                    logger.warning("No se pudo enviar mensaje privado al usuario: %s", dm_error)
                 
             except Exception as e:
-                print(f"❌ Error en auto-expulsión: {e}")
+                logger.error("Error en auto-expulsión: %s", e)
                 bot.send_message(
                     chat_id,
                     "No pude procesar tu solicitud. Asegúrate de que el bot sea administrador con permisos suficientes."
                 )
     
     except Exception as e:
-        print(f"❌❌❌ ERROR EN HANDLER TERMINAR TUTORÍA: {e}")
+        logger.exception("Error en el handler de terminar tutoría: %s", e)
         bot.send_message(chat_id, "Ocurrió un error al procesar tu solicitud.")
 
+def marcar_sesion_terminada(chat_id, telegram_id):
+    """
+    Deja al estudiante expulsado como 'inactivo' en Miembros_Grupo, para que su
+    próxima solicitud de tutoría vuelva a llegar al profesor
+    """
+    conn = get_db_connection()
+    try:
+        terminar_sesion_miembro(conn.cursor(), chat_id, telegram_id)
+        conn.commit()
+    except Exception as e:
+        logger.error("No se pudo marcar como inactivo a %s en el chat %s: %s", telegram_id, chat_id, e)
+    finally:
+        conn.close()
+
 @bot.callback_query_handler(func=lambda call: call.data.startswith("terminar_") or call.data == "cancelar_terminar")
 def handle_terminar_estudiante(call):
     """Procesa la selección del profesor para terminar la sesión de un estudiante"""
@@ -857,11 +885,7 @@ def handle_terminar_estudiante(call):
     message_id = call.message.message_id
     user_id = call.from_user.id
     
-    print(f"\n==================================================")
-    print(f"⚠️⚠️⚠️ CALLBACK TERMINAR ESTUDIANTE ⚠️⚠️⚠️")
-    print(f"⚠️ Chat ID: {chat_id} | User ID: {user_id}")
-    print(f"⚠️ Callback data: {call.data}")
-    print("==================================================\n")
+    evento(logger, "inicio", handler="terminar_estudiante", chat_id=chat_id, user_id=user_id, callback=call.data)
     
     try:
         # Verificar que es profesor
@@ -899,6 +923,10 @@ def handle_terminar_estudiante(call):
             # Expulsar al estudiante (ban temporal de 30 segundos)
             until_date = int(time.time()) + 30
             bot.ban_chat_member(chat_id, estudiante_id, until_date=until_date)
+            marcar_sesion_terminada(chat_id, estudiante_id)
+            
+            # Pedirle la valoración de la sesión (se agrupa y se envía en segundo plano)
+            programar_valoracion(chat_id, estudiante_id)
             
             # Enviar mensaje privado al estudiante
             try:
@@ -907,7 +935,7 @@ def handle_terminar_estudiante(call):
                     "El profesor ha finalizado tu sesión de tutoría. ¡Gracias por participar!"
                 )
             except Exception as dm_error:
-                print(f"No se pudo enviar mensaje privado al estudiante: {dm_error}")
+                logger.warning("No se pudo enviar mensaje privado al estudiante: %s", dm_error)
             
             # Confirmar al profesor
             bot.edit_message_text(
@@ -917,7 +945,7 @@ def handle_terminar_estudiante(call):
             )
             
         except Exception as e:
-            print(f"❌ Error al expulsar estudiante: {e}")
+            logger.error("Error al expulsar estudiante: %s", e)
             bot.edit_message_text(
                 "No pude finalizar la sesión del estudiante. Asegúrate de que tengo permisos de administrador.",
                 chat_id=chat_id,
@@ -925,7 +953,7 @@ def handle_terminar_estudiante(call):
             )
     
     except Exception as e:
-        print(f"❌❌❌ ERROR EN CALLBACK TERMINAR ESTUDIANTE: {e}")
+        logger.exception("Error en el callback de terminar estudiante: %s", e)
         bot.answer_callback_query(call.id, "Ocurrió un error al procesar tu solicitud.")
 
 # Handler para cuando un grupo es creado
@@ -934,10 +962,7 @@ def handle_group_creation(message):
     """Responde cuando se crea un nuevo grupo"""
     chat_id = message.chat.id
     
-    print("\n==================================================")
-    print(f"🆕🆕🆕 NUEVO GRUPO CREADO: {chat_id} 🆕🆕🆕")
-    print(f"🆕 Creado por: {message.from_user.first_name} (ID: {message.from_user.id})")
-    print("==================================================\n")
+    evento(logger, "nuevo grupo", logging.INFO, chat_id=chat_id, creado_por=message.from_user.id)
     
     bot.send_message(
         chat_id,
@@ -953,42 +978,6 @@ def handle_group_creation(message):
 
 
 # Registrar handlers externos
-if __name__ == "__main__":
-    print("\n==================================================")
-    print("🚀🚀🚀 INICIANDO BOT DE GRUPOS Y TUTORÍAS 🚀🚀🚀")
-    print("==================================================\n")
-    
-    # Eliminar cualquier webhook existente
-    bot.remove_webhook()
-    
-    # Iniciar el hilo de limpieza periódica
-    limpieza_thread = threading.Thread(target=limpieza_periodica)
-    limpieza_thread.daemon = True
-    limpieza_thread.start()
-    
-    try:
-        # Registrar handlers de usuarios primero para darle prioridad
-        from grupo_handlers.usuarios import register_student_handlers
-        register_student_handlers(bot)
-        print("✅ Handler de nuevos estudiantes registrado")
-        
-        # Registrar otros handlers
-        gestion_grupos = GestionGrupos(db_path="db/tutoria.db")
-        gestion_grupos.registrar_handlers(bot)
-        print("✅ Handlers de gestión de grupos registrados")
-        
-        register_valoraciones_handlers(bot)
-        print("✅ Handlers de valoraciones registrados")
-        
-        print("🤖 Bot iniciando polling...")
-        
-        # Usar polling normal con timeout extendido
-        bot.polling(none_stop=True, interval=0, timeout=60)
-        
-    except Exception as e:
-        logger.critical(f"Error crítico al iniciar el bot: {e}")
-        print(f"❌ ERROR CRÍTICO: {e}")
-
 @bot.my_chat_member_handler()
 def handle_bot_status_update(update):
     """Responde cuando el estado del bot cambia en un chat"""
@@ -997,11 +986,8 @@ def handle_bot_status_update(update):
         new_status = update.new_chat_member.status
         old_status = update.old_chat_member.status
         
-        print("\n==================================================")
-        print(f"🔄🔄🔄 ESTADO DEL BOT ACTUALIZADO EN CHAT: {chat_id} 🔄🔄🔄")
-        print(f"🔄 De: {update.from_user.first_name} (ID: {update.from_user.id})")
-        print(f"🔄 Estado anterior: {old_status} → Nuevo estado: {new_status}")
-        print("==================================================\n")
+        evento(logger, "estado del bot actualizado", logging.INFO, chat_id=chat_id,
+               por=update.from_user.id, anterior=old_status, nuevo=new_status)
         
         # El bot fue añadido al grupo (cambio de 'left' a otro estado)
         if old_status == 'left' and new_status != 'left':
@@ -1028,7 +1014,64 @@ def handle_bot_status_update(update):
             )
             
     except Exception as e:
-        print(f"❌ ERROR EN MANEJADOR MY_CHAT_MEMBER: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error en el manejador de my_chat_member: %s", e)
 
+if __name__ == "__main__":
+    print("\n==================================================")
+    print("🚀🚀🚀 INICIANDO BOT DE GRUPOS Y TUTORÍAS 🚀🚀🚀")
+    print("==================================================\n")
+    
+    # Logging asíncrono a consola y bot_grupos.log (niveles en LOG_NIVEL / LOG_NIVELES)
+    configurar_logging("bot_grupos.log")
+    
+    # Perfilado por muestreo bajo demanda con SIGUSR2 (también con /perfil)
+    instalar_senal_perfil("grupos")
+    
+    # Prevenir múltiples instancias
+    prevent_duplicate_instances()
+    
+    # Crear las tablas auxiliares que falten en la base de datos
+    actualizar_estructura_tablas()
+    
+    # Eliminar cualquier webhook existente
+    bot.remove_webhook()
+    
+    # Iniciar el hilo de limpieza periódica
+    limpieza_thread = threading.Thread(target=limpieza_periodica)
+    limpieza_thread.daemon = True
+    limpieza_thread.start()
+    
+    # Iniciar el envío de los mensajes encolados para este bot
+    iniciar_despachador(bot, BOT_GRUPOS)
+    
+    # Peticiones de valoración al terminar sesiones, por lotes hacia la cola de mensajes
+    iniciar_avisos_valoracion()
+    
+    # Endpoint local de métricas y resumen periódico en el log
+    iniciar_metricas(METRICAS_PUERTO_GRUPOS)
+    
+    try:
+        # Registrar handlers de usuarios primero para darle prioridad
+        from grupo_handlers.usuarios import register_student_handlers
+        register_student_handlers(bot)
+        print("✅ Handler de nuevos estudiantes registrado")
+        
+        # Registrar otros handlers
+        gestion_grupos = GestionGrupos(db_path="db/tutoria.db")
+        gestion_grupos.registrar_handlers(bot)
+        print("✅ Handlers de gestión de grupos registrados")
+        
+        register_valoraciones_handlers(bot)
+        print("✅ Handlers de valoraciones registrados")
+        
+        register_admin_handlers(bot, "grupos")
+        print("✅ Comandos de administración registrados")
+        
+        print("🤖 Bot iniciando polling...")
+        
+        # Usar polling normal con timeout extendido
+        bot.polling(none_stop=True, interval=0, timeout=60)
+        
+    except Exception as e:
+        logger.critical(f"Error crítico al iniciar el bot: {e}")
+        print(f"❌ ERROR CRÍTICO: {e}")
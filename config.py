@@ -22,6 +22,98 @@ GRUPO_BOT_TOKEN = "tu_token_del_bot_para_grupos_aquí"
 SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.gmail.com")
 SMTP_EMAIL = os.getenv("SMTP_EMAIL", "")
 SMTP_PASSWORD = os.getenv("SMTP_PASSWORD", "")
+SMTP_PUERTO = int(os.getenv("SMTP_PUERTO", "587"))
+
+# Envío de correo en segundo plano: sesiones SMTP persistentes, correos por lote
+# y segundos sin uso tras los que se cierra una sesión
+CORREO_SESIONES = int(os.getenv("CORREO_SESIONES", "2"))
+CORREO_LOTE = int(os.getenv("CORREO_LOTE", "10"))
+CORREO_MAX_INACTIVIDAD = float(os.getenv("CORREO_MAX_INACTIVIDAD", "60"))
+CORREO_TIMEOUT = float(os.getenv("CORREO_TIMEOUT", "20"))
+
+# Códigos de verificación del registro: validez, fallos antes de bloquear el
+# chat y el correo, duración del bloqueo y códigos que se pueden pedir por
+# ventana (por chat y por correo). Con TOKEN_PERSISTENCIA=1 se guardan en la BD
+TOKEN_VALIDEZ = int(os.getenv("TOKEN_VALIDEZ", "180"))  # segundos
+TOKEN_MAX_FALLOS = int(os.getenv("TOKEN_MAX_FALLOS", "5"))
+TOKEN_BLOQUEO = int(os.getenv("TOKEN_BLOQUEO", "900"))  # segundos
+TOKEN_MAX_ENVIOS = int(os.getenv("TOKEN_MAX_ENVIOS", "3"))
+TOKEN_VENTANA_ENVIOS = int(os.getenv("TOKEN_VENTANA_ENVIOS", "900"))  # segundos
+TOKEN_PERSISTENCIA = os.getenv("TOKEN_PERSISTENCIA", "0") == "1"
+
+# Configuración del transporte HTTP hacia la API de Telegram
+TELEGRAM_POOL_SIZE = int(os.getenv("TELEGRAM_POOL_SIZE", "8"))
+TELEGRAM_CONNECT_TIMEOUT = float(os.getenv("TELEGRAM_CONNECT_TIMEOUT", "5"))
+TELEGRAM_READ_TIMEOUT = float(os.getenv("TELEGRAM_READ_TIMEOUT", "30"))
+TELEGRAM_MAX_REINTENTOS = int(os.getenv("TELEGRAM_MAX_REINTENTOS", "3"))
+TELEGRAM_BACKOFF = float(os.getenv("TELEGRAM_BACKOFF", "0.5"))
+TELEGRAM_RESUMEN_INTERVALO = int(os.getenv("TELEGRAM_RESUMEN_INTERVALO", "900"))  # segundos, 0 = desactivado
+
+# Cola de salida de mensajes (Mensajes_Pendientes)
+COLA_LOTE = int(os.getenv("COLA_LOTE", "20"))
+COLA_MENSAJES_POR_SEGUNDO = float(os.getenv("COLA_MENSAJES_POR_SEGUNDO", "20"))
+COLA_MAX_INTENTOS = int(os.getenv("COLA_MAX_INTENTOS", "5"))
+COLA_INTERVALO = float(os.getenv("COLA_INTERVALO", "5"))  # segundos entre revisiones si no hay avisos
+COLA_DIAS_RETENCION = int(os.getenv("COLA_DIAS_RETENCION", "7"))
+
+# Peticiones de valoración al terminar una sesión: segundos que se esperan para
+# juntar en un lote los fines de sesión que llegan seguidos
+VALORACION_AGRUPAR = float(os.getenv("VALORACION_AGRUPAR", "3"))
+
+# Listados de miembros de las salas: miembros por página y bytes del CSV
+# exportado que se guardan en memoria antes de pasar a un fichero temporal
+MIEMBROS_POR_PAGINA = int(os.getenv("MIEMBROS_POR_PAGINA", "20"))
+MIEMBROS_CSV_MEMORIA = int(os.getenv("MIEMBROS_CSV_MEMORIA", str(1024 * 1024)))
+
+# Solicitudes de tutoría pendientes que se muestran (con sus botones) en /solicitudes
+SOLICITUDES_POR_MENSAJE = int(os.getenv("SOLICITUDES_POR_MENSAJE", "10"))
+# Segundos tras los que una solicitud sin responder se puede volver a enviar al profesor
+SOLICITUD_CADUCIDAD = int(os.getenv("SOLICITUD_CADUCIDAD", str(2 * 3600)))
+
+# Caché en memoria de salas (por Chat_id) y usuarios (por TelegramID): segundos
+# de validez de cada entrada (0 = desactivada) y entradas como máximo por caché
+CACHE_TTL = float(os.getenv("CACHE_TTL", "120"))
+CACHE_MAX_ENTRADAS = int(os.getenv("CACHE_MAX_ENTRADAS", "5000"))
+
+# Métricas de los handlers y estado de los bots (endpoint local /metrics,
+# /health y /ready, puerto 0 = desactivado)
+METRICAS_HOST = os.getenv("METRICAS_HOST", "127.0.0.1")
+METRICAS_PUERTO = int(os.getenv("METRICAS_PUERTO", "9101"))
+METRICAS_PUERTO_GRUPOS = int(os.getenv("METRICAS_PUERTO_GRUPOS", "9102"))
+METRICAS_RESUMEN_INTERVALO = int(os.getenv("METRICAS_RESUMEN_INTERVALO", "900"))  # segundos, 0 = desactivado
+# /health responde 503 si pasa este tiempo sin un getUpdates correcto (polling parado)
+SALUD_MAX_SIN_POLLING = int(os.getenv("SALUD_MAX_SIN_POLLING", "180"))  # segundos
+
+# Perfilado de consultas SQL (desactivado por defecto)
+SQL_PERFIL = os.getenv("SQL_PERFIL", "0") == "1"
+SQL_UMBRAL_LENTO_MS = float(os.getenv("SQL_UMBRAL_LENTO_MS", "50"))
+SQL_LOG_LENTO = BASE_DIR / "consultas_lentas.log"
+SQL_INFORME_TOP = int(os.getenv("SQL_INFORME_TOP", "20"))
+
+# Logging: nivel general, niveles por módulo ("modulo=NIVEL,...") y muestreo de
+# las trazas DEBUG (se escriben las de 1 de cada LOG_MUESTREO_DEBUG updates)
+LOG_DIR = pathlib.Path(os.getenv("LOG_DIR", BASE_DIR))
+LOG_NIVEL = os.getenv("LOG_NIVEL", "INFO").upper()
+LOG_NIVELES = os.getenv("LOG_NIVELES", "TeleBot=INFO")
+LOG_MUESTREO_DEBUG = int(os.getenv("LOG_MUESTREO_DEBUG", "10"))
+LOG_MAX_MB = int(os.getenv("LOG_MAX_MB", "10"))
+LOG_COPIAS = int(os.getenv("LOG_COPIAS", "5"))
+
+# Trazas por update (spans de handlers, SQL y API de Telegram): se traza 1 de
+# cada TRAZAS_MUESTREO updates (0 = desactivado). Se guardan las últimas
+# TRAZAS_BUFFER en memoria y, si se indica, en TRAZAS_FICHERO (JSONL en LOG_DIR)
+TRAZAS_MUESTREO = int(os.getenv("TRAZAS_MUESTREO", "0"))
+TRAZAS_BUFFER = int(os.getenv("TRAZAS_BUFFER", "200"))
+TRAZAS_FICHERO = os.getenv("TRAZAS_FICHERO", "")
+
+# Perfilado por muestreo bajo demanda (/perfil o SIGUSR2): duración por defecto y
+# máxima en segundos e intervalo entre muestras
+PERFIL_DURACION = int(os.getenv("PERFIL_DURACION", "30"))
+PERFIL_DURACION_MAX = int(os.getenv("PERFIL_DURACION_MAX", "300"))
+PERFIL_INTERVALO_MS = float(os.getenv("PERFIL_INTERVALO_MS", "10"))
+
+# Telegram IDs con acceso a los comandos de administración (/trazas, /perfil), separados por comas
+ADMIN_IDS = {int(i) for i in os.getenv("ADMIN_IDS", "").replace(" ", "").split(",") if i}
 
 # Mapping de áreas y carreras
 AREA_CARRERAS = {
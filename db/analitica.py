@@ -0,0 +1,179 @@
+"""
+Tendencias de las valoraciones por periodo (tabla Valoraciones_Periodos).
+
+El bot mantiene la tabla al día con cada valoración (db.queries.insertar_valoracion)
+y cada petición de valoración. Este módulo recalcula el histórico por lotes:
+lee Valoraciones una vez, calcula con numpy el inicio del día, semana, mes y
+cuatrimestre de todas las filas a la vez y agrupa con pandas, sin un GROUP BY
+por periodo sobre la columna de texto 'fecha'. Las peticiones de valoración
+(Solicitudes) no se pueden deducir de Valoraciones y se conservan.
+
+Uso:
+    python db/analitica.py --reconstruir
+    python db/analitica.py --periodo mes --profesor 12
+    python db/analitica.py --periodo cuatrimestre --asignatura 3
+"""
+import argparse
+import time
+import sys
+import os
+
+# Añadir directorio padre al path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db.queries import get_db_connection, get_tendencia_valoraciones, PERIODOS_VALORACION
+
+# Columnas de valoraciones (todas menos Solicitudes) que se recalculan
+_COLUMNAS = ('Total', 'Suma', 'Suma_cuadrados', 'Anonimas', 'Con_comentario')
+_CLAVE = ['Inicio', 'profesor_id', 'id_sala', 'Id_asignatura']
+
+
+def _inicios(fechas):
+    """
+    Inicio de cada periodo para un array de numpy datetime64[D].
+
+    Mismas reglas que db.queries.inicio_periodos: semana desde el lunes,
+    cuatrimestres desde el 1 de septiembre (hasta enero) y el 1 de febrero.
+    """
+    import numpy as np
+
+    dias = fechas.astype('int64')
+    # El 1970-01-01 fue jueves: (días + 3) % 7 es 0 en lunes
+    semanas = (dias - (dias + 3) % 7).astype('datetime64[D]')
+    meses = fechas.astype('datetime64[M]')
+    numero_mes = meses.astype('int64') % 12  # 0 = enero
+    meses_int = meses.astype('int64')
+    cuatrimestres = np.where(
+        numero_mes >= 8, meses_int - (numero_mes - 8),
+        np.where(numero_mes == 0, meses_int - 4, meses_int - (numero_mes - 1))
+    ).astype('datetime64[M]')
+
+    return {
+        'dia': fechas,
+        'semana': semanas,
+        'mes': meses.astype('datetime64[D]'),
+        'cuatrimestre': cuatrimestres.astype('datetime64[D]'),
+    }
+
+
+def calcular_periodos(valoraciones):
+    """
+    Agrega un DataFrame de valoraciones por periodo.
+
+    Args:
+        valoraciones: DataFrame con profesor_id, id_sala, Id_asignatura,
+            puntuacion, es_anonimo, comentario y fecha
+
+    Returns:
+        DataFrame con una fila por (Periodo, Inicio, profesor, sala, asignatura)
+    """
+    import numpy as np
+    import pandas as pd
+
+    fechas = pd.to_datetime(valoraciones['fecha'].str.slice(0, 10), format="%Y-%m-%d", errors="coerce")
+    validas = fechas.notna().to_numpy()
+    datos = valoraciones.loc[validas]
+    fechas = fechas[validas].to_numpy().astype('datetime64[D]')
+
+    puntuacion = datos['puntuacion'].to_numpy(dtype='int64')
+    base = pd.DataFrame({
+        'profesor_id': datos['profesor_id'].to_numpy(),
+        'id_sala': datos['id_sala'].fillna(0).to_numpy(dtype='int64'),
+        'Id_asignatura': datos['Id_asignatura'].fillna(0).to_numpy(dtype='int64'),
+        'Total': np.ones(len(datos), dtype='int64'),
+        'Suma': puntuacion,
+        'Suma_cuadrados': puntuacion * puntuacion,
+        'Anonimas': (datos['es_anonimo'].fillna(0).to_numpy() != 0).astype('int64'),
+        'Con_comentario': (datos['comentario'].fillna('').to_numpy() != '').astype('int64'),
+    })
+
+    partes = []
+    for periodo, inicios in _inicios(fechas).items():
+        base['Inicio'] = np.datetime_as_string(inicios, unit='D')
+        agrupado = base.groupby(_CLAVE, sort=False)[list(_COLUMNAS)].sum().reset_index()
+        agrupado.insert(0, 'Periodo', periodo)
+        partes.append(agrupado)
+    return pd.concat(partes, ignore_index=True)
+
+
+def reconstruir_periodos_valoraciones(cursor=None):
+    """
+    Recalcula las columnas de valoraciones de Valoraciones_Periodos desde Valoraciones.
+
+    Con cursor usa la transacción del llamador; sin él abre una conexión y confirma.
+
+    Returns:
+        Número de filas de periodos escritas
+    """
+    import pandas as pd
+
+    conn = None
+    if cursor is None:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+
+    try:
+        valoraciones = pd.read_sql_query("""
+            SELECT v.profesor_id, v.id_sala, g.Id_asignatura, v.puntuacion, v.es_anonimo, v.comentario, v.fecha
+            FROM Valoraciones v
+            LEFT JOIN Grupos_tutoria g ON g.id_sala = v.id_sala
+            WHERE v.profesor_id IS NOT NULL AND v.puntuacion BETWEEN 1 AND 5
+        """, cursor.connection)
+        periodos = calcular_periodos(valoraciones)
+
+        cursor.execute(f"UPDATE Valoraciones_Periodos SET {', '.join(f'{c} = 0' for c in _COLUMNAS)}")
+        columnas = ['Periodo'] + _CLAVE + list(_COLUMNAS)
+        cursor.executemany(
+            f"""
+            INSERT INTO Valoraciones_Periodos
+                (Periodo, Inicio, Profesor_id, Id_sala, Id_asignatura, {", ".join(_COLUMNAS)})
+            VALUES ({", ".join("?" * len(columnas))})
+            ON CONFLICT(Periodo, Profesor_id, Inicio, Id_sala, Id_asignatura) DO UPDATE SET
+                {", ".join(f"{c} = excluded.{c}" for c in _COLUMNAS)}
+            """,
+            periodos[columnas].itertuples(index=False, name=None)
+        )
+        cursor.execute("DELETE FROM Valoraciones_Periodos WHERE Total = 0 AND Solicitudes = 0")
+        if conn is not None:
+            conn.commit()
+        return len(periodos)
+    except Exception:
+        if conn is not None:
+            conn.rollback()
+        raise
+    finally:
+        if conn is not None:
+            conn.close()
+
+
+def imprimir_tendencia(tendencia):
+    print(f"{'inicio':<12}{'total':>7}{'media':>7}{'desv.':>7}{'anón.':>7}{'coment.':>9}{'respuesta':>11}")
+    for fila in tendencia:
+        respuesta = f"{fila['tasa_respuesta']:.0%}" if fila['tasa_respuesta'] is not None else "-"
+        if not fila['total']:
+            print(f"{fila['inicio']:<12}{0:>7}{'-':>7}{'-':>7}{'-':>7}{'-':>9}{respuesta:>11}")
+            continue
+        print(f"{fila['inicio']:<12}{fila['total']:>7}{fila['media']:>7.2f}{fila['desviacion']:>7.2f}"
+              f"{fila['anonimas']:>7.0%}{fila['con_comentario']:>9.0%}{respuesta:>11}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tendencias de las valoraciones por periodo")
+    parser.add_argument("--reconstruir", action="store_true", help="recalcula los periodos desde Valoraciones")
+    parser.add_argument("--periodo", choices=PERIODOS_VALORACION, default="semana")
+    parser.add_argument("--profesor", type=int, help="Id_usuario del profesor")
+    parser.add_argument("--sala", type=int, help="id_sala")
+    parser.add_argument("--asignatura", type=int, help="Id_asignatura")
+    parser.add_argument("--desde", help="primer periodo (YYYY-MM-DD)")
+    parser.add_argument("--hasta", help="último periodo (YYYY-MM-DD)")
+    args = parser.parse_args()
+
+    if args.reconstruir:
+        inicio = time.perf_counter()
+        filas = reconstruir_periodos_valoraciones()
+        print(f"✅ Valoraciones_Periodos reconstruida: {filas} filas en {time.perf_counter() - inicio:.2f}s")
+    else:
+        imprimir_tendencia(get_tendencia_valoraciones(
+            args.periodo, profesor_id=args.profesor, id_sala=args.sala, asignatura_id=args.asignatura,
+            desde=args.desde, hasta=args.hasta
+        ))
@@ -0,0 +1,74 @@
+"""
+Caché en memoria de filas de la base de datos, con tamaño máximo y caducidad.
+
+La usan db.queries.get_sala_por_chat y get_usuarios_por_telegram_ids para no
+repetir las mismas consultas en cada miembro nuevo, /start o /configurar_grupo.
+Las funciones de db.queries que modifican salas o usuarios invalidan la entrada
+(o toda la caché); los cambios hechos desde el otro bot o desde scripts se ven
+como tarde al caducar la entrada (CACHE_TTL).
+"""
+import collections
+import threading
+import time
+import sys
+import os
+
+# Añadir directorio padre al path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import CACHE_TTL, CACHE_MAX_ENTRADAS
+
+# Valor que devuelve obtener() cuando la clave no está (None es un valor válido: "no existe")
+NO_ESTA = object()
+
+
+class CacheTTL:
+    """Diccionario LRU con caducidad por entrada, seguro entre hilos"""
+
+    def __init__(self, nombre, maximo=CACHE_MAX_ENTRADAS, ttl=CACHE_TTL):
+        self.nombre = nombre
+        self.maximo = maximo
+        self.ttl = ttl
+        self._datos = collections.OrderedDict()  # clave: (caduca, valor)
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+
+    def obtener(self, clave):
+        """Valor guardado o NO_ESTA si no está o ha caducado"""
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None or entrada[0] <= time.monotonic():
+                if entrada is not None:
+                    del self._datos[clave]
+                self.fallos += 1
+                return NO_ESTA
+            self._datos.move_to_end(clave)
+            self.aciertos += 1
+            return entrada[1]
+
+    def poner(self, clave, valor):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._datos[clave] = (time.monotonic() + self.ttl, valor)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.maximo:
+                self._datos.popitem(last=False)
+
+    def invalidar(self, clave=None):
+        """Quita una clave o, sin clave, vacía la caché"""
+        with self._lock:
+            if clave is None:
+                self._datos.clear()
+            else:
+                self._datos.pop(clave, None)
+
+    def estadisticas(self):
+        with self._lock:
+            return {"entradas": len(self._datos), "aciertos": self.aciertos, "fallos": self.fallos}
+
+
+# Salas por Chat_id (texto) y usuarios por TelegramID (entero)
+salas = CacheTTL("salas")
+usuarios = CacheTTL("usuarios")
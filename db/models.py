@@ -1,14 +1,107 @@
 import sqlite3
 import os
+import sys
 from pathlib import Path
 
+# Añadir directorio padre al path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db.perfil import conectar
+
 # Ruta de la nueva base de datos
 DB_PATH = Path(__file__).parent.parent / "tutoria_ugr.db"
 
 def get_db_connection():
     """Obtiene una conexión a la base de datos"""
 
-    return sqlite3.connect(str(DB_PATH))
+    return conectar(DB_PATH)
+
+# Tablas auxiliares de los bots (se crean también en bases de datos ya existentes)
+TABLAS_AUXILIARES = '''
+    -- Rol con el que se publicaron los comandos de cada usuario en Telegram
+    CREATE TABLE IF NOT EXISTS Comandos_Usuario (
+        TelegramID INTEGER PRIMARY KEY,
+        Rol TEXT NOT NULL,
+        Fecha_actualizacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    
+    -- Cola de salida: avisos registrados junto al cambio que los provoca
+    CREATE TABLE IF NOT EXISTS Mensajes_Pendientes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        Clave TEXT NOT NULL UNIQUE,     -- Clave de idempotencia del envío
+        Bot TEXT NOT NULL DEFAULT 'principal',
+        Chat_id INTEGER NOT NULL,
+        Texto TEXT NOT NULL,
+        Parse_mode TEXT,
+        Reply_markup TEXT,              -- Teclado serializado en JSON
+        Estado TEXT NOT NULL DEFAULT 'pendiente' CHECK(Estado IN ('pendiente', 'enviado', 'fallido')),
+        Intentos INTEGER NOT NULL DEFAULT 0,
+        Proximo_intento REAL NOT NULL DEFAULT 0,
+        Ultimo_error TEXT,
+        Fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        Fecha_envio TIMESTAMP
+    );
+    CREATE INDEX IF NOT EXISTS idx_mensajes_pendientes_envio
+        ON Mensajes_Pendientes(Estado, Bot, Proximo_intento);
+    
+    -- Códigos de verificación y bloqueos del registro (solo con TOKEN_PERSISTENCIA=1)
+    CREATE TABLE IF NOT EXISTS Tokens_Verificacion (
+        Clave TEXT PRIMARY KEY,         -- 'token:<chat>' o 'bloqueo:<chat|email>:<id>'
+        Datos TEXT NOT NULL,            -- JSON
+        Caduca REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_tokens_verificacion_caduca
+        ON Tokens_Verificacion(Caduca);
+    
+    -- Agregados de Valoraciones por profesor y por sala, al día con cada valoración
+    CREATE TABLE IF NOT EXISTS Valoraciones_Agregadas (
+        Ambito TEXT NOT NULL CHECK(Ambito IN ('profesor', 'sala')),
+        Id INTEGER NOT NULL,            -- profesor_id o id_sala
+        Total INTEGER NOT NULL DEFAULT 0,
+        Suma INTEGER NOT NULL DEFAULT 0,
+        Suma_cuadrados INTEGER NOT NULL DEFAULT 0,
+        Estrellas_1 INTEGER NOT NULL DEFAULT 0,
+        Estrellas_2 INTEGER NOT NULL DEFAULT 0,
+        Estrellas_3 INTEGER NOT NULL DEFAULT 0,
+        Estrellas_4 INTEGER NOT NULL DEFAULT 0,
+        Estrellas_5 INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (Ambito, Id)
+    ) WITHOUT ROWID;
+    
+    -- Valoraciones por periodo (día, semana, mes y cuatrimestre) para ver tendencias
+    CREATE TABLE IF NOT EXISTS Valoraciones_Periodos (
+        Periodo TEXT NOT NULL CHECK(Periodo IN ('dia', 'semana', 'mes', 'cuatrimestre')),
+        Inicio TEXT NOT NULL,           -- Primer día del periodo (YYYY-MM-DD)
+        Profesor_id INTEGER NOT NULL,
+        Id_sala INTEGER NOT NULL DEFAULT 0,         -- 0: sin sala
+        Id_asignatura INTEGER NOT NULL DEFAULT 0,   -- 0: sin asignatura
+        Total INTEGER NOT NULL DEFAULT 0,
+        Suma INTEGER NOT NULL DEFAULT 0,
+        Suma_cuadrados INTEGER NOT NULL DEFAULT 0,
+        Anonimas INTEGER NOT NULL DEFAULT 0,
+        Con_comentario INTEGER NOT NULL DEFAULT 0,
+        Solicitudes INTEGER NOT NULL DEFAULT 0,     -- Peticiones de valoración enviadas
+        PRIMARY KEY (Periodo, Profesor_id, Inicio, Id_sala, Id_asignatura)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS idx_valoraciones_periodos_asignatura
+        ON Valoraciones_Periodos(Periodo, Id_asignatura, Inicio);
+    CREATE INDEX IF NOT EXISTS idx_valoraciones_periodos_sala
+        ON Valoraciones_Periodos(Periodo, Id_sala, Inicio);
+    
+    -- Miembros de cada sala por estado, para listarlos por páginas
+    CREATE INDEX IF NOT EXISTS idx_miembros_grupo_sala_estado
+        ON Miembros_Grupo(id_sala, Estado, Id_usuario);
+    
+    -- Cola de solicitudes de tutoría pendientes (solo esas filas) y salas de cada profesor
+    CREATE INDEX IF NOT EXISTS idx_miembros_grupo_pendientes
+        ON Miembros_Grupo(id_sala, Fecha_union) WHERE Estado = 'pendiente';
+    CREATE INDEX IF NOT EXISTS idx_grupos_tutoria_profesor
+        ON Grupos_tutoria(Id_usuario);
+    
+    -- Valoraciones de cada estudiante por sala (peticiones de valoración ya respondidas)
+    CREATE INDEX IF NOT EXISTS idx_valoraciones_evaluador_sala
+        ON Valoraciones(evaluador_id, id_sala, fecha);
+'''
 
 def create_database():
     """Crea la estructura completa de la base de datos"""
@@ -108,6 +201,7 @@ def create_database():
         FOREIGN KEY (Id_usuario) REFERENCES Usuarios(Id_usuario)
     );
     ''')
+    cursor.executescript(TABLAS_AUXILIARES)
     
     conn.commit()
     conn.close()
@@ -139,6 +233,26 @@ def actualizar_estructura_tablas():
         print("Actualizando Valoraciones: añadiendo columna id_sala")
         cursor.execute("ALTER TABLE Valoraciones ADD COLUMN id_sala INTEGER")
     
+    # Crear las tablas auxiliares que falten
+    cursor.executescript(TABLAS_AUXILIARES)
+    
+    # Agregados de valoraciones recién creados en una base de datos con valoraciones
+    cursor.execute("SELECT EXISTS(SELECT 1 FROM Valoraciones) AND NOT EXISTS(SELECT 1 FROM Valoraciones_Agregadas)")
+    if cursor.fetchone()[0]:
+        from db.queries import reconstruir_agregados_valoraciones
+        print("Actualizando Valoraciones_Agregadas: calculando desde Valoraciones")
+        reconstruir_agregados_valoraciones(cursor)
+    
+    # Y lo mismo con los periodos (reconstrucción por lotes con pandas)
+    cursor.execute("SELECT EXISTS(SELECT 1 FROM Valoraciones) AND NOT EXISTS(SELECT 1 FROM Valoraciones_Periodos)")
+    if cursor.fetchone()[0]:
+        print("Actualizando Valoraciones_Periodos: calculando desde Valoraciones")
+        try:
+            from db.analitica import reconstruir_periodos_valoraciones
+            reconstruir_periodos_valoraciones(cursor)
+        except ImportError as e:
+            print(f"⚠️ No se pueden calcular los periodos sin pandas: {e}")
+    
     conn.commit()
     conn.close()
     print("✅ Estructura de tablas actualizada correctamente")
@@ -0,0 +1,295 @@
+"""
+Perfilado opcional de las consultas SQL (se activa con SQL_PERFIL=1).
+
+Todas las conexiones se abren con conectar(), que cuando el perfilado está
+activo usa una conexión cuyos cursores miden cada sentencia: SQL normalizado,
+tiempo (ejecución + lectura de filas), filas devueltas o afectadas y función
+que la lanza. Con esos datos se genera un informe de las N sentencias más
+costosas y un log de consultas lentas (solo se añaden líneas) con el umbral
+SQL_UMBRAL_LENTO_MS.
+
+Las conexiones abiertas durante un update que se está trazando (utils.trazas)
+también usan estos cursores, para añadir cada sentencia como un span.
+
+Además, conectar() lleva la cuenta de las conexiones abiertas en cada momento
+(se publica en /health).
+"""
+import sqlite3
+import threading
+import time
+import re
+import json
+import atexit
+import logging
+import sys
+import os
+
+# Añadir directorio padre al path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import SQL_PERFIL, SQL_UMBRAL_LENTO_MS, SQL_LOG_LENTO, SQL_INFORME_TOP
+from utils.trazas import traza_actual
+
+logger = logging.getLogger(__name__)
+
+_RE_CADENAS = re.compile(r"'(?:[^']|'')*'")
+_RE_NUMEROS = re.compile(r"\b\d+(?:\.\d+)?\b")
+_RE_LISTAS = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_RE_ESPACIOS = re.compile(r"\s+")
+
+# Estadísticas por (sql normalizado, función): {ejecuciones, tiempo_total, tiempo_max, filas}
+_estadisticas = {}
+_lock_estadisticas = threading.Lock()
+_lock_log = threading.Lock()
+
+# Conexiones abiertas con conectar() que siguen sin cerrar, y total abiertas
+_conexiones = {"abiertas": 0, "total": 0}
+_lock_conexiones = threading.Lock()
+
+_ESTE_FICHERO = os.path.abspath(__file__)
+
+
+def normalizar_sql(sql):
+    """Quita literales y espacios para agrupar las sentencias iguales"""
+    sql = _RE_CADENAS.sub("?", sql)
+    sql = _RE_NUMEROS.sub("?", sql)
+    sql = _RE_LISTAS.sub("(?...)", sql)
+    return _RE_ESPACIOS.sub(" ", sql).strip()
+
+
+def _funcion_llamante():
+    """Devuelve 'modulo:función' del primer marco fuera de este fichero"""
+    marco = sys._getframe(2)
+    while marco is not None and os.path.abspath(marco.f_code.co_filename) == _ESTE_FICHERO:
+        marco = marco.f_back
+    if marco is None:
+        return "?"
+    fichero = os.path.splitext(os.path.basename(marco.f_code.co_filename))[0]
+    return f"{fichero}:{marco.f_code.co_name}"
+
+
+def _registrar(sql, funcion, duracion, filas):
+    """Acumula una ejecución y la apunta en el log si supera el umbral"""
+    with _lock_estadisticas:
+        clave = (sql, funcion)
+        datos = _estadisticas.get(clave)
+        if datos is None:
+            datos = {"ejecuciones": 0, "tiempo_total": 0.0, "tiempo_max": 0.0, "filas": 0}
+            _estadisticas[clave] = datos
+        datos["ejecuciones"] += 1
+        datos["tiempo_total"] += duracion
+        if duracion > datos["tiempo_max"]:
+            datos["tiempo_max"] = duracion
+        datos["filas"] += filas
+
+
+def _apuntar_lenta(sql, funcion, duracion, filas):
+    """Añade una línea JSON al log de consultas lentas"""
+    linea = json.dumps({
+        "fecha": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "ms": round(duracion * 1000, 2),
+        "filas": filas,
+        "funcion": funcion,
+        "sql": sql,
+    }, ensure_ascii=False)
+    try:
+        with _lock_log:
+            with open(SQL_LOG_LENTO, "a", encoding="utf-8") as f:
+                f.write(linea + "\n")
+    except OSError as e:
+        logger.error(f"No se pudo escribir en el log de consultas lentas: {e}")
+
+
+class CursorPerfilado(sqlite3.Cursor):
+    """Cursor que mide cada sentencia y las filas que se leen de ella"""
+
+    def _iniciar(self, sql):
+        self._sql = normalizar_sql(sql)
+        self._funcion = _funcion_llamante()
+        self._traza = traza_actual()
+        self._inicio = time.perf_counter()
+        self._duracion = 0.0
+        self._filas = 0
+
+    def _cerrar_sentencia(self):
+        """Registra la sentencia anterior antes de ejecutar otra (o al cerrar)"""
+        sql = getattr(self, "_sql", None)
+        if sql is None:
+            return
+        self._sql = None
+        if self._traza is not None:
+            self._traza.añadir("db", sql, self._inicio, self._duracion, filas=self._filas, funcion=self._funcion)
+        if not SQL_PERFIL:
+            return
+        _registrar(sql, self._funcion, self._duracion, self._filas)
+        if self._duracion * 1000 >= SQL_UMBRAL_LENTO_MS:
+            _apuntar_lenta(sql, self._funcion, self._duracion, self._filas)
+
+    def _medir(self, metodo, *args):
+        inicio = time.perf_counter()
+        try:
+            return metodo(self, *args)
+        finally:
+            self._duracion += time.perf_counter() - inicio
+
+    def execute(self, sql, parametros=()):
+        self._cerrar_sentencia()
+        self._iniciar(sql)
+        resultado = self._medir(sqlite3.Cursor.execute, sql, parametros)
+        if self.rowcount > 0:
+            self._filas = self.rowcount
+        return resultado
+
+    def executemany(self, sql, secuencia):
+        self._cerrar_sentencia()
+        self._iniciar(sql)
+        resultado = self._medir(sqlite3.Cursor.executemany, sql, secuencia)
+        if self.rowcount > 0:
+            self._filas = self.rowcount
+        return resultado
+
+    def executescript(self, script):
+        self._cerrar_sentencia()
+        self._iniciar("SCRIPT " + script[:200])
+        return self._medir(sqlite3.Cursor.executescript, script)
+
+    def fetchone(self):
+        fila = self._medir(sqlite3.Cursor.fetchone)
+        if fila is not None:
+            self._filas += 1
+        return fila
+
+    def fetchmany(self, size=None):
+        if size is None:
+            size = self.arraysize
+        filas = self._medir(sqlite3.Cursor.fetchmany, size)
+        self._filas += len(filas)
+        return filas
+
+    def fetchall(self):
+        filas = self._medir(sqlite3.Cursor.fetchall)
+        self._filas += len(filas)
+        return filas
+
+    def __next__(self):
+        fila = self._medir(sqlite3.Cursor.__next__)
+        self._filas += 1
+        return fila
+
+    def close(self):
+        self._cerrar_sentencia()
+        super().close()
+
+    def __del__(self):
+        try:
+            self._cerrar_sentencia()
+        except Exception:
+            pass
+
+
+class ConexionContada(sqlite3.Connection):
+    """Conexión que descuenta de las abiertas al cerrarse (o al liberarse sin cerrar)"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._contada = True
+        with _lock_conexiones:
+            _conexiones["abiertas"] += 1
+            _conexiones["total"] += 1
+
+    def _descontar(self):
+        if getattr(self, "_contada", False):
+            self._contada = False
+            with _lock_conexiones:
+                _conexiones["abiertas"] -= 1
+
+    def close(self):
+        self._descontar()
+        super().close()
+
+    def __del__(self):
+        self._descontar()
+
+
+class ConexionPerfilada(ConexionContada):
+    """Conexión cuyos cursores (también los de conn.execute) son CursorPerfilado"""
+
+    def cursor(self, factory=CursorPerfilado):
+        return super().cursor(factory)
+
+    # sqlite3 crea internamente un cursor base en conn.execute*, hay que redirigirlos
+    def execute(self, sql, parametros=()):
+        return self.cursor().execute(sql, parametros)
+
+    def executemany(self, sql, secuencia):
+        return self.cursor().executemany(sql, secuencia)
+
+    def executescript(self, script):
+        return self.cursor().executescript(script)
+
+
+def conectar(ruta, **kwargs):
+    """
+    Abre una conexión SQLite, perfilada si SQL_PERFIL está activo o si se está trazando el update.
+
+    Args:
+        ruta: Ruta del fichero de base de datos
+        **kwargs: Resto de argumentos de sqlite3.connect
+
+    Returns:
+        sqlite3.Connection
+    """
+    if SQL_PERFIL or traza_actual() is not None:
+        kwargs.setdefault("factory", ConexionPerfilada)
+    else:
+        kwargs.setdefault("factory", ConexionContada)
+    return sqlite3.connect(str(ruta), **kwargs)
+
+
+def uso_conexiones():
+    """Devuelve {abiertas, total}: conexiones sin cerrar ahora mismo y abiertas desde el arranque"""
+    with _lock_conexiones:
+        return dict(_conexiones)
+
+
+def obtener_estadisticas():
+    """Devuelve una copia de las estadísticas por (sql, función)"""
+    with _lock_estadisticas:
+        return {clave: dict(datos) for clave, datos in _estadisticas.items()}
+
+
+def reiniciar_estadisticas():
+    """Pone a cero las estadísticas de todas las sentencias"""
+    with _lock_estadisticas:
+        _estadisticas.clear()
+
+
+def informe_consultas(top=SQL_INFORME_TOP):
+    """Formatea las 'top' sentencias que más tiempo total han consumido"""
+    estadisticas = obtener_estadisticas()
+    if not estadisticas:
+        return "Sin consultas SQL registradas (¿SQL_PERFIL activo?)"
+
+    ordenadas = sorted(estadisticas.items(), key=lambda e: e[1]["tiempo_total"], reverse=True)
+    lineas = [f"Top {min(top, len(ordenadas))} consultas SQL (ejecuciones, total, media, máx, filas/ejecución):"]
+    for (sql, funcion), datos in ordenadas[:top]:
+        media = datos["tiempo_total"] / datos["ejecuciones"]
+        lineas.append(
+            f"  {datos['ejecuciones']:>6}  {datos['tiempo_total'] * 1000:>9.1f}ms  {media * 1000:>7.2f}ms  "
+            f"{datos['tiempo_max'] * 1000:>7.2f}ms  {datos['filas'] / datos['ejecuciones']:>6.1f}  "
+            f"[{funcion}] {sql[:120]}"
+        )
+    return "\n".join(lineas)
+
+
+def _informe_al_salir():
+    """Escribe el informe en el log al terminar el proceso"""
+    try:
+        logger.info(informe_consultas())
+    except Exception:
+        pass
+
+
+if SQL_PERFIL:
+    atexit.register(_informe_al_salir)
+    logger.info(f"Perfilado SQL activo (umbral de consulta lenta: {SQL_UMBRAL_LENTO_MS}ms, log: {SQL_LOG_LENTO})")
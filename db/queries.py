@@ -1,4 +1,5 @@
 import sqlite3
+import datetime
 from pathlib import Path
 import sys
 import os
@@ -10,13 +11,21 @@ logger = logging.getLogger(__name__)
 # Añadir directorio padre al path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from utils.metricas import en_actualizacion, contar_consulta
+from db.perfil import conectar
+from db import cache
+from config import SOLICITUD_CADUCIDAD
+
 # Ruta a la base de datos
 DB_PATH = Path(__file__).parent.parent / "tutoria_ugr.db"
 
 def get_db_connection():
     """Obtiene una conexión a la base de datos"""
-    conn = sqlite3.connect(str(DB_PATH), check_same_thread=False)
+    conn = conectar(DB_PATH, check_same_thread=False)
     conn.row_factory = sqlite3.Row
+    # Dentro de un handler instrumentado, contar las consultas del update
+    if en_actualizacion():
+        conn.set_trace_callback(contar_consulta)
     return conn
 
 # ===== FUNCIONES DE USUARIO =====
@@ -71,6 +80,8 @@ def create_user(nombre, tipo, email, telegram_id=None, apellidos=None, dni=None,
             (nombre, tipo, email, telegram_id, apellidos, dni, carrera, Area, registrado)
         )
         conn.commit()
+        if telegram_id is not None:
+            cache.usuarios.invalidar(int(telegram_id))
         return cursor.lastrowid
     except Exception as e:
         print(f"Error al crear usuario: {e}")
@@ -97,12 +108,73 @@ def update_user(user_id, **kwargs):
         conn.commit()
         success = cursor.rowcount > 0
         conn.close()
+        # La caché va por TelegramID (que también puede haber cambiado): se vacía entera
+        cache.usuarios.invalidar()
         return success
     except Exception as e:
         import logging
         logging.getLogger('db.queries').error(f"Error al actualizar usuario: {e}")
         return False
 
+def registrar_usuario(nombre, apellidos, tipo, email, telegram_id, dni='', carrera='', asignaturas_ids=()):
+    """
+    Registra un usuario con su carrera y sus matrículas en una sola transacción.
+
+    Sustituye a la secuencia create_user + update_user + get_o_crear_carrera +
+    crear_matricula por asignatura: todo va por la misma conexión y se confirma
+    con un único commit, o no se guarda nada si algo falla.
+
+    Args:
+        asignaturas_ids: Asignaturas seleccionadas; se matricula como 'estudiante'
+            o 'profesor' según el tipo y se asocian a la carrera si no tenían
+
+    Returns:
+        Id_usuario del nuevo usuario
+
+    Raises:
+        sqlite3.Error: si falla cualquier paso (tras deshacer la transacción)
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute(
+            """INSERT INTO Usuarios
+            (Nombre, Tipo, Email_UGR, TelegramID, Apellidos, DNI, Carrera, Registrado)
+            VALUES (?, ?, ?, ?, ?, ?, ?, 'NO')""",
+            (nombre, tipo, email, telegram_id, apellidos, dni, carrera)
+        )
+        user_id = cursor.lastrowid
+        cache.usuarios.invalidar(int(telegram_id))
+
+        # Carrera: se crea si no existe (Nombre_carrera es UNIQUE)
+        carrera_id = None
+        if carrera and carrera.strip():
+            cursor.execute("INSERT OR IGNORE INTO Carreras (Nombre_carrera) VALUES (?)", (carrera,))
+            cursor.execute("SELECT id_carrera FROM Carreras WHERE Nombre_carrera = ?", (carrera,))
+            carrera_id = cursor.fetchone()[0]
+
+        # Sin duplicados y en el orden de selección
+        asignaturas_ids = list(dict.fromkeys(a for a in asignaturas_ids if a is not None))
+        if tipo in ('estudiante', 'profesor') and asignaturas_ids:
+            cursor.executemany(
+                "INSERT INTO Matriculas (Id_usuario, Id_asignatura, Tipo) VALUES (?, ?, ?)",
+                [(user_id, asignatura_id, tipo) for asignatura_id in asignaturas_ids]
+            )
+            if carrera_id is not None:
+                cursor.executemany(
+                    "UPDATE Asignaturas SET Id_carrera = ? WHERE Id_asignatura = ? AND Id_carrera IS NULL",
+                    [(carrera_id, asignatura_id) for asignatura_id in asignaturas_ids]
+                )
+
+        conn.commit()
+        return user_id
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
 def update_horario_profesor(user_id, horario):
     """
     Actualiza el horario de un profesor en la tabla Usuarios
@@ -126,6 +198,7 @@ def update_horario_profesor(user_id, horario):
         
         conn.commit()
         conn.close()
+        cache.usuarios.invalidar()
         return True
     except Exception as e:
         import logging
@@ -277,6 +350,7 @@ def crear_grupo_tutoria(profesor_id, nombre_sala, tipo_sala, asignatura_id, chat
         ''', (profesor_id, nombre_sala, tipo_sala, asignatura_id, str(chat_id), enlace, proposito))
         
         conn.commit()
+        cache.salas.invalidar(str(chat_id))
         grupo_id = cursor.lastrowid
         return grupo_id
     except Exception as e:
@@ -303,6 +377,7 @@ def crear_grupo_tutoria_directo(conn, profesor_id, nombre_sala, tipo_sala, asign
         
         # Obtener el ID generado del grupo
         grupo_id = cursor.lastrowid
+        cache.salas.invalidar(str(chat_id))
         
         # Añadir al profesor como miembro del grupo (en lugar de usar Administradores_Grupo)
         cursor.execute("""
@@ -343,6 +418,8 @@ def actualizar_grupo_tutoria(grupo_id, **kwargs):
         
         success = cursor.rowcount > 0
         conn.commit()
+        # Puede haber cambiado el Chat_id: se vacía la caché de salas
+        cache.salas.invalidar()
         return success
     except Exception as e:
         conn.rollback()
@@ -351,6 +428,70 @@ def actualizar_grupo_tutoria(grupo_id, **kwargs):
     finally:
         conn.close()
 
+def get_sala_por_chat(chat_id):
+    """
+    Sala de tutoría del chat (fila de Grupos_tutoria) o None si el chat no es una sala.
+
+    Se guarda en la caché de salas, también el "no es una sala", hasta que la
+    invalide un cambio en la sala o caduque.
+    """
+    clave = str(chat_id)
+    sala = cache.salas.obtener(clave)
+    if sala is not cache.NO_ESTA:
+        return sala
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM Grupos_tutoria WHERE Chat_id = ?", (clave,))
+    sala = cursor.fetchone()
+    conn.close()
+
+    cache.salas.poner(clave, sala)
+    return sala
+
+def get_usuarios_por_telegram_ids(telegram_ids):
+    """
+    Usuarios registrados de una lista de TelegramID, con las mismas columnas que
+    get_user_by_telegram_id.
+
+    Los que no están en la caché se leen con una sola consulta IN. Los no
+    registrados no se guardan: se registran desde el bot principal y deben
+    reconocerse en cuanto lo hagan.
+
+    Returns:
+        dict: {TelegramID: fila de Usuarios}, solo con los registrados
+    """
+    usuarios = {}
+    faltan = []
+    for telegram_id in dict.fromkeys(int(t) for t in telegram_ids):
+        usuario = cache.usuarios.obtener(telegram_id)
+        if usuario is cache.NO_ESTA:
+            faltan.append(telegram_id)
+        else:
+            usuarios[telegram_id] = usuario
+
+    if faltan:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT u.*, hp.dia || ' de ' || hp.hora_inicio || ' a ' || hp.hora_fin AS Horario
+            FROM Usuarios u
+            LEFT JOIN Horarios_Profesores hp ON u.Id_usuario = hp.Id_usuario
+            WHERE u.TelegramID IN ({", ".join("?" * len(faltan))})
+        """, faltan)
+        for fila in cursor.fetchall():
+            # Con varios horarios, la primera fila (como get_user_by_telegram_id)
+            if fila['TelegramID'] not in usuarios:
+                usuarios[fila['TelegramID']] = fila
+                cache.usuarios.poner(fila['TelegramID'], fila)
+        conn.close()
+
+    return usuarios
+
+def get_usuario_cacheado(telegram_id):
+    """get_user_by_telegram_id pasando por la caché de usuarios"""
+    return get_usuarios_por_telegram_ids([telegram_id]).get(int(telegram_id))
+
 def obtener_grupos(profesor_id=None, asignatura_id=None):
     """
     Obtiene grupos de tutoría aplicando filtros opcionales
@@ -457,6 +598,243 @@ def añadir_estudiante_grupo(grupo_id, estudiante_id):
     finally:
         conn.close()
 
+# ===== MIEMBROS DE SALAS =====
+# Paginación por clave (keyset) sobre el índice Miembros_Grupo(id_sala, Estado,
+# Id_usuario): cada página continúa desde el último Id_usuario de la anterior,
+# sin OFFSET, así que cuesta lo mismo la primera página que la última.
+
+_COLUMNAS_MIEMBRO = """
+    m.Id_usuario, u.Nombre, u.Apellidos, u.Email_UGR, u.TelegramID, u.Tipo, m.Fecha_union, m.Estado
+"""
+
+def get_pagina_miembros(id_sala, despues_de=None, antes_de=None, limite=20, estado='activo', tipo=None):
+    """
+    Una página de miembros de una sala ordenados por Id_usuario.
+
+    Args:
+        despues_de: Id_usuario del último miembro de la página actual (página siguiente)
+        antes_de: Id_usuario del primer miembro de la página actual (página anterior)
+        limite: Miembros por página
+        estado: Estado de los miembros ('activo' por defecto)
+        tipo: Tipo de usuario ('estudiante', 'profesor') o None para todos
+
+    Returns:
+        tuple: (miembros, hay_anterior, hay_siguiente)
+    """
+    condiciones = ["m.id_sala = ?", "m.Estado = ?"]
+    parametros = [id_sala, estado]
+    if tipo:
+        condiciones.append("u.Tipo = ?")
+        parametros.append(tipo)
+    if antes_de is not None:
+        condiciones.append("m.Id_usuario < ?")
+        parametros.append(antes_de)
+        orden = "DESC"
+    else:
+        if despues_de is not None:
+            condiciones.append("m.Id_usuario > ?")
+            parametros.append(despues_de)
+        orden = "ASC"
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    # Una fila de más para saber si hay otra página en ese sentido
+    cursor.execute(f"""
+        SELECT {_COLUMNAS_MIEMBRO}
+        FROM Miembros_Grupo m
+        JOIN Usuarios u ON m.Id_usuario = u.Id_usuario
+        WHERE {" AND ".join(condiciones)}
+        ORDER BY m.Id_usuario {orden}
+        LIMIT ?
+    """, parametros + [limite + 1])
+    miembros = cursor.fetchall()
+    conn.close()
+
+    hay_mas = len(miembros) > limite
+    miembros = miembros[:limite]
+    if antes_de is not None:
+        return miembros[::-1], hay_mas, True
+    return miembros, despues_de is not None, hay_mas
+
+def contar_miembros_sala(id_sala, estado='activo', tipo=None):
+    """Número de miembros de una sala en un estado (cuenta sobre el índice)"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    if tipo:
+        cursor.execute("""
+            SELECT COUNT(*) FROM Miembros_Grupo m
+            JOIN Usuarios u ON m.Id_usuario = u.Id_usuario
+            WHERE m.id_sala = ? AND m.Estado = ? AND u.Tipo = ?
+        """, (id_sala, estado, tipo))
+    else:
+        cursor.execute("SELECT COUNT(*) FROM Miembros_Grupo WHERE id_sala = ? AND Estado = ?", (id_sala, estado))
+    total = cursor.fetchone()[0]
+    conn.close()
+    return total
+
+def iterar_miembros_sala(id_sala, lote=500):
+    """
+    Recorre todos los miembros de una sala (en cualquier estado) sin cargarlos
+    a la vez en memoria: lee de la base de datos de lote en lote.
+
+    Yields:
+        sqlite3.Row con las columnas de get_pagina_miembros
+    """
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT {_COLUMNAS_MIEMBRO}
+            FROM Miembros_Grupo m
+            JOIN Usuarios u ON m.Id_usuario = u.Id_usuario
+            WHERE m.id_sala = ?
+            ORDER BY m.Estado, m.Id_usuario
+        """, (id_sala,))
+        while True:
+            filas = cursor.fetchmany(lote)
+            if not filas:
+                break
+            yield from filas
+    finally:
+        conn.close()
+
+# ===== SOLICITUDES DE TUTORÍA =====
+# Una solicitud es la fila de Miembros_Grupo del estudiante en la sala, con
+# Estado 'pendiente'. Transiciones permitidas (cualquier otra se ignora):
+#   (sin fila), 'rechazado', 'inactivo', 'cancelado' --solicitar--> 'pendiente'
+#   'pendiente' (más antigua que SOLICITUD_CADUCIDAD) --solicitar--> 'pendiente'
+#   'pendiente' --aprobar--> 'activo'
+#   'pendiente' --rechazar--> 'rechazado'
+#   'pendiente' --cancelar (el estudiante)--> 'cancelado'
+#   'activo' --terminar la sesión (bot de grupos)--> 'inactivo'
+# Cada transición es un UPDATE por la clave única (id_sala, Id_usuario) que
+# solo se aplica si el estado de origen es el esperado. Las pendientes tienen un
+# índice parcial por sala y fecha, así que la cola de un profesor sale de una
+# consulta sin recorrer los miembros activos.
+
+ESTADOS_SOLICITABLES = ('rechazado', 'inactivo', 'cancelado')
+
+def solicitar_tutoria(cursor, sala_id, estudiante_id):
+    """
+    Registra la solicitud del estudiante en la sala, con el cursor (y la
+    transacción) del llamador.
+
+    Returns:
+        str: 'nueva' si se acaba de registrar la solicitud (o se reenvía una
+        pendiente caducada) o, si no, el Estado que ya tenía el estudiante en
+        la sala ('pendiente' o 'activo')
+    """
+    cursor.execute(f"""
+        INSERT INTO Miembros_Grupo (id_sala, Id_usuario, Fecha_union, Estado)
+        VALUES (?, ?, CURRENT_TIMESTAMP, 'pendiente')
+        ON CONFLICT(id_sala, Id_usuario) DO UPDATE SET
+            Estado = 'pendiente', Fecha_union = CURRENT_TIMESTAMP
+        WHERE Estado IN ({", ".join("?" * len(ESTADOS_SOLICITABLES))})
+           OR (Estado = 'pendiente' AND Fecha_union <= datetime('now', ?))
+    """, (sala_id, estudiante_id, *ESTADOS_SOLICITABLES, f"-{SOLICITUD_CADUCIDAD} seconds"))
+    if cursor.rowcount > 0:
+        return 'nueva'
+    cursor.execute("SELECT Estado FROM Miembros_Grupo WHERE id_sala = ? AND Id_usuario = ?", (sala_id, estudiante_id))
+    return cursor.fetchone()['Estado']
+
+def get_solicitudes_pendientes(profesor_id, hasta=None, solicitudes=None, cursor=None):
+    """
+    Cola de solicitudes pendientes de las salas de un profesor, de la más antigua
+    a la más reciente, con los datos del estudiante y de la sala.
+
+    Args:
+        hasta: Solo las solicitadas hasta esta fecha ('YYYY-MM-DD HH:MM:SS')
+        solicitudes: Solo estos pares (sala_id, estudiante_id)
+        cursor: Cursor de la transacción del llamador (si no, abre una conexión)
+
+    Returns:
+        list: Filas con id_sala, Id_usuario, Fecha_union, Nombre, Apellidos,
+        Email_UGR, TelegramID, Nombre_sala y Enlace_invitacion
+    """
+    condiciones = ["g.Id_usuario = ?"]
+    parametros = [profesor_id]
+    if hasta is not None:
+        condiciones.append("m.Fecha_union <= ?")
+        parametros.append(hasta)
+    if solicitudes is not None:
+        if not solicitudes:
+            return []
+        condiciones.append(f"(m.id_sala, m.Id_usuario) IN (VALUES {', '.join('(?, ?)' for _ in solicitudes)})")
+        parametros.extend(valor for par in solicitudes for valor in par)
+
+    conn = None
+    if cursor is None:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+    try:
+        cursor.execute(f"""
+            SELECT m.id_sala, m.Id_usuario, m.Fecha_union,
+                   u.Nombre, u.Apellidos, u.Email_UGR, u.TelegramID,
+                   g.Nombre_sala, g.Enlace_invitacion
+            FROM Grupos_tutoria g
+            JOIN Miembros_Grupo m ON m.id_sala = g.id_sala AND m.Estado = 'pendiente'
+            JOIN Usuarios u ON u.Id_usuario = m.Id_usuario
+            WHERE {" AND ".join(condiciones)}
+            ORDER BY m.Fecha_union, m.id_miembro
+        """, parametros)
+        return cursor.fetchall()
+    finally:
+        if conn is not None:
+            conn.close()
+
+def resolver_solicitudes(cursor, solicitudes, aprobar):
+    """
+    Aprueba ('activo') o rechaza ('rechazado') solicitudes pendientes con el
+    cursor (y la transacción) del llamador.
+
+    Args:
+        solicitudes: Pares (sala_id, estudiante_id)
+
+    Returns:
+        list: Pares que estaban pendientes y se han resuelto ahora
+    """
+    estado = 'activo' if aprobar else 'rechazado'
+    resueltas = []
+    for sala_id, estudiante_id in solicitudes:
+        cursor.execute(
+            "UPDATE Miembros_Grupo SET Estado = ? WHERE id_sala = ? AND Id_usuario = ? AND Estado = 'pendiente'",
+            (estado, sala_id, estudiante_id)
+        )
+        if cursor.rowcount > 0:
+            resueltas.append((sala_id, estudiante_id))
+    return resueltas
+
+def cancelar_solicitud(cursor, sala_id, estudiante_id):
+    """
+    Cancela la solicitud pendiente del estudiante en la sala, con el cursor (y
+    la transacción) del llamador.
+
+    Returns:
+        bool: True si la solicitud estaba pendiente y se ha cancelado
+    """
+    cursor.execute(
+        "UPDATE Miembros_Grupo SET Estado = 'cancelado' WHERE id_sala = ? AND Id_usuario = ? AND Estado = 'pendiente'",
+        (sala_id, estudiante_id)
+    )
+    return cursor.rowcount > 0
+
+def terminar_sesion_miembro(cursor, chat_id, telegram_id):
+    """
+    Marca como 'inactivo' al estudiante de la sala cuya sesión ha terminado,
+    con el cursor (y la transacción) del llamador. Así su siguiente solicitud
+    vuelve a pasar por el profesor.
+
+    Returns:
+        bool: True si el estudiante estaba activo en la sala
+    """
+    cursor.execute("""
+        UPDATE Miembros_Grupo SET Estado = 'inactivo'
+        WHERE Estado = 'activo'
+          AND id_sala = (SELECT id_sala FROM Grupos_tutoria WHERE Chat_id = ?)
+          AND Id_usuario = (SELECT Id_usuario FROM Usuarios WHERE TelegramID = ?)
+    """, (str(chat_id), telegram_id))
+    return cursor.rowcount > 0
+
 # ===== PROFESORES Y HORARIOS =====
 def obtener_profesores_por_asignaturas(asignaturas_ids):
     """Obtiene profesores que imparten las asignaturas especificadas"""
@@ -696,3 +1074,298 @@ def get_profesores_asignatura(asignatura_id):
     conn.close()
     
     return profesores if profesores else []
+
+
+# ===== FUNCIONES DE COMANDOS POR USUARIO =====
+def get_rol_comandos_usuario(telegram_id):
+    """Devuelve el rol con el que se publicaron los comandos del usuario (o None)"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute("SELECT Rol FROM Comandos_Usuario WHERE TelegramID = ?", (telegram_id,))
+        fila = cursor.fetchone()
+        return fila['Rol'] if fila else None
+    except sqlite3.OperationalError:
+        # La tabla aún no existe: se tratará como si nunca se hubieran publicado
+        return None
+    finally:
+        conn.close()
+
+def set_rol_comandos_usuario(telegram_id, rol):
+    """Registra el rol con el que se acaban de publicar los comandos del usuario"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute("""
+            INSERT INTO Comandos_Usuario (TelegramID, Rol, Fecha_actualizacion)
+            VALUES (?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(TelegramID) DO UPDATE SET Rol = excluded.Rol,
+                Fecha_actualizacion = excluded.Fecha_actualizacion
+        """, (telegram_id, rol))
+        conn.commit()
+    except sqlite3.Error as e:
+        logger.error(f"Error al guardar el rol de comandos de {telegram_id}: {e}")
+    finally:
+        conn.close()
+
+# ===== FUNCIONES DE VALORACIONES =====
+# Columnas de Valoraciones_Agregadas con el histograma de estrellas
+_ESTRELLAS = ", ".join(f"Estrellas_{n}" for n in range(1, 6))
+
+def insertar_valoracion(cursor, evaluador_id, profesor_id, puntuacion, comentario, fecha, es_anonimo, id_sala=None):
+    """
+    Inserta una valoración y suma su puntuación a los agregados del profesor y
+    de la sala, con el cursor (y la transacción) del llamador.
+
+    Returns:
+        id_valoracion de la nueva fila
+    """
+    cursor.execute(
+        """
+        INSERT INTO Valoraciones 
+        (evaluador_id, profesor_id, puntuacion, comentario, fecha, es_anonimo, id_sala) 
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        """,
+        (evaluador_id, profesor_id, puntuacion, comentario, fecha, es_anonimo, id_sala)
+    )
+    id_valoracion = cursor.lastrowid
+
+    estrellas = [int(puntuacion == n) for n in range(1, 6)]
+    ambitos = [('profesor', profesor_id)] + ([('sala', id_sala)] if id_sala is not None else [])
+    cursor.executemany(
+        f"""
+        INSERT INTO Valoraciones_Agregadas (Ambito, Id, Total, Suma, Suma_cuadrados, {_ESTRELLAS})
+        VALUES (?, ?, 1, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(Ambito, Id) DO UPDATE SET
+            Total = Total + 1,
+            Suma = Suma + excluded.Suma,
+            Suma_cuadrados = Suma_cuadrados + excluded.Suma_cuadrados,
+            {", ".join(f"Estrellas_{n} = Estrellas_{n} + excluded.Estrellas_{n}" for n in range(1, 6))}
+        """,
+        [(ambito, id_, puntuacion, puntuacion * puntuacion, *estrellas) for ambito, id_ in ambitos]
+    )
+    sumar_periodos_valoracion(cursor, fecha, profesor_id, id_sala, puntuacion=puntuacion,
+                              es_anonimo=es_anonimo, comentario=comentario)
+    return id_valoracion
+
+def reconstruir_agregados_valoraciones(cursor=None):
+    """
+    Recalcula Valoraciones_Agregadas desde cero a partir de Valoraciones.
+
+    Con cursor usa la transacción del llamador; sin él abre una conexión y confirma.
+
+    Returns:
+        Número de filas de agregados (profesores + salas)
+    """
+    conn = None
+    if cursor is None:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+
+    try:
+        cursor.execute("DELETE FROM Valoraciones_Agregadas")
+        for ambito, columna in (('profesor', 'profesor_id'), ('sala', 'id_sala')):
+            cursor.execute(f"""
+                INSERT INTO Valoraciones_Agregadas (Ambito, Id, Total, Suma, Suma_cuadrados, {_ESTRELLAS})
+                SELECT '{ambito}', {columna}, COUNT(*), SUM(puntuacion), SUM(puntuacion * puntuacion),
+                       {", ".join(f"SUM(puntuacion = {n})" for n in range(1, 6))}
+                FROM Valoraciones
+                WHERE {columna} IS NOT NULL AND puntuacion BETWEEN 1 AND 5
+                GROUP BY {columna}
+            """)
+        cursor.execute("SELECT COUNT(*) FROM Valoraciones_Agregadas")
+        filas = cursor.fetchone()[0]
+        if conn is not None:
+            conn.commit()
+        return filas
+    except Exception:
+        if conn is not None:
+            conn.rollback()
+        raise
+    finally:
+        if conn is not None:
+            conn.close()
+
+# Periodos de Valoraciones_Periodos y columnas que se suman en cada uno
+PERIODOS_VALORACION = ('dia', 'semana', 'mes', 'cuatrimestre')
+_COLUMNAS_PERIODO = ('Total', 'Suma', 'Suma_cuadrados', 'Anonimas', 'Con_comentario', 'Solicitudes')
+
+def inicio_periodos(fecha):
+    """
+    Primer día de cada periodo que contiene la fecha.
+
+    La semana empieza en lunes y el cuatrimestre el 1 de septiembre (hasta enero)
+    o el 1 de febrero (hasta agosto), como el curso de la UGR.
+
+    Args:
+        fecha: datetime, date o texto 'YYYY-MM-DD[ HH:MM:SS]'
+
+    Returns:
+        dict: {periodo: 'YYYY-MM-DD'}
+    """
+    if isinstance(fecha, str):
+        fecha = datetime.date.fromisoformat(fecha[:10])
+    elif isinstance(fecha, datetime.datetime):
+        fecha = fecha.date()
+
+    if fecha.month >= 9:
+        cuatrimestre = datetime.date(fecha.year, 9, 1)
+    elif fecha.month == 1:
+        cuatrimestre = datetime.date(fecha.year - 1, 9, 1)
+    else:
+        cuatrimestre = datetime.date(fecha.year, 2, 1)
+
+    return {
+        'dia': fecha.isoformat(),
+        'semana': (fecha - datetime.timedelta(days=fecha.weekday())).isoformat(),
+        'mes': fecha.replace(day=1).isoformat(),
+        'cuatrimestre': cuatrimestre.isoformat(),
+    }
+
+def sumar_periodos_valoracion(cursor, fecha, profesor_id, id_sala=None, puntuacion=None,
+                              es_anonimo=0, comentario=None, solicitudes=0):
+    """
+    Suma una valoración (o una petición de valoración, con puntuacion None y
+    solicitudes=1) a los periodos de Valoraciones_Periodos que contienen la
+    fecha, con el cursor (y la transacción) del llamador.
+
+    La asignatura se toma de la sala, si la hay.
+    """
+    id_asignatura = 0
+    if id_sala is not None:
+        cursor.execute("SELECT Id_asignatura FROM Grupos_tutoria WHERE id_sala = ?", (id_sala,))
+        fila = cursor.fetchone()
+        id_asignatura = (fila[0] if fila else None) or 0
+
+    valores = (
+        1 if puntuacion is not None else 0,
+        puntuacion or 0,
+        (puntuacion or 0) ** 2,
+        1 if puntuacion is not None and es_anonimo else 0,
+        1 if puntuacion is not None and comentario else 0,
+        solicitudes,
+    )
+    cursor.executemany(
+        f"""
+        INSERT INTO Valoraciones_Periodos
+            (Periodo, Inicio, Profesor_id, Id_sala, Id_asignatura, {", ".join(_COLUMNAS_PERIODO)})
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(Periodo, Profesor_id, Inicio, Id_sala, Id_asignatura) DO UPDATE SET
+            {", ".join(f"{c} = {c} + excluded.{c}" for c in _COLUMNAS_PERIODO)}
+        """,
+        [(periodo, inicio, profesor_id, id_sala or 0, id_asignatura, *valores)
+         for periodo, inicio in inicio_periodos(fecha).items()]
+    )
+
+def get_tendencia_valoraciones(periodo='semana', profesor_id=None, id_sala=None, asignatura_id=None,
+                               desde=None, hasta=None):
+    """
+    Evolución de las valoraciones por periodo, filtrada por profesor, sala y/o asignatura.
+
+    Args:
+        periodo: 'dia', 'semana', 'mes' o 'cuatrimestre'
+        desde, hasta: Fechas 'YYYY-MM-DD' (inclusive) del inicio de los periodos
+
+    Returns:
+        list: Un dict por periodo, en orden, con 'inicio', 'total', 'media',
+        'desviacion', 'anonimas' y 'con_comentario' (proporciones), 'solicitudes'
+        y 'tasa_respuesta' (None si no se han registrado peticiones)
+    """
+    if periodo not in PERIODOS_VALORACION:
+        raise ValueError(f"Periodo no válido: {periodo}")
+
+    condiciones, parametros = ["Periodo = ?"], [periodo]
+    for columna, valor in (('Profesor_id', profesor_id), ('Id_sala', id_sala), ('Id_asignatura', asignatura_id)):
+        if valor is not None:
+            condiciones.append(f"{columna} = ?")
+            parametros.append(valor)
+    if desde is not None:
+        condiciones.append("Inicio >= ?")
+        parametros.append(desde)
+    if hasta is not None:
+        condiciones.append("Inicio <= ?")
+        parametros.append(hasta)
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute(f"""
+            SELECT Inicio, {", ".join(f"SUM({c}) AS {c}" for c in _COLUMNAS_PERIODO)}
+            FROM Valoraciones_Periodos
+            WHERE {" AND ".join(condiciones)}
+            GROUP BY Inicio
+            ORDER BY Inicio
+        """, parametros)
+        
+        tendencia = []
+        for fila in cursor.fetchall():
+            total = fila['Total']
+            media = fila['Suma'] / total if total else None
+            tendencia.append({
+                'inicio': fila['Inicio'],
+                'total': total,
+                'media': media,
+                'desviacion': max(0.0, fila['Suma_cuadrados'] / total - media * media) ** 0.5 if total else None,
+                'anonimas': fila['Anonimas'] / total if total else None,
+                'con_comentario': fila['Con_comentario'] / total if total else None,
+                'solicitudes': fila['Solicitudes'],
+                'tasa_respuesta': total / fila['Solicitudes'] if fila['Solicitudes'] else None,
+            })
+        return tendencia
+    except sqlite3.OperationalError as e:
+        # Base de datos sin la tabla de periodos (aún no se ha actualizado la estructura)
+        logger.warning(f"No se puede leer la tendencia de valoraciones: {e}")
+        return []
+    finally:
+        conn.close()
+
+def get_valoraciones_agregadas(ids, ambito='profesor'):
+    """
+    Devuelve las valoraciones agregadas de varios profesores (o salas) con una sola lectura.
+
+    Returns:
+        dict: {id: {'total', 'media', 'desviacion', 'estrellas': [n1, ..., n5]}};
+        los que no tienen valoraciones no aparecen
+    """
+    ids = list(dict.fromkeys(ids))
+    if not ids:
+        return {}
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    try:
+        placeholders = ','.join(['?'] * len(ids))
+        cursor.execute(f"""
+            SELECT Id, Total, Suma, Suma_cuadrados, {_ESTRELLAS}
+            FROM Valoraciones_Agregadas
+            WHERE Ambito = ? AND Id IN ({placeholders}) AND Total > 0
+        """, [ambito] + ids)
+        
+        agregados = {}
+        for fila in cursor.fetchall():
+            total = fila['Total']
+            media = fila['Suma'] / total
+            varianza = max(0.0, fila['Suma_cuadrados'] / total - media * media)
+            agregados[fila['Id']] = {
+                'total': total,
+                'media': media,
+                'desviacion': varianza ** 0.5,
+                'estrellas': [fila[f'Estrellas_{n}'] for n in range(1, 6)],
+            }
+        return agregados
+    except sqlite3.OperationalError as e:
+        # Base de datos sin la tabla de agregados (aún no se ha actualizado la estructura)
+        logger.warning(f"No se pueden leer las valoraciones agregadas: {e}")
+        return {}
+    finally:
+        conn.close()
+
+def formatear_valoracion(agregado):
+    """Texto corto con la media para listados: '⭐ 4.3 (12)' o '' sin valoraciones"""
+    if not agregado:
+        return ""
+    return f"⭐ {agregado['media']:.1f} ({agregado['total']})"
@@ -3,13 +3,18 @@ import os
 # Añadir el directorio raíz al path para importar desde db
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from db.queries import get_db_connection
+from db.perfil import conectar
 
 import time
 import sqlite3
 import traceback
 from telebot import types
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import CallbackContext, ConversationHandler, CommandHandler, CallbackQueryHandler, MessageHandler, filters, ChatMemberHandler
+from utils.importacion import importar_diferido
+# python-telegram-bot solo se usa en los flujos de conversación; se carga al primer uso
+Update, InlineKeyboardButton, InlineKeyboardMarkup = importar_diferido(
+    "telegram", "Update", "InlineKeyboardButton", "InlineKeyboardMarkup"
+)
+CallbackContext, ConversationHandler = importar_diferido("telegram.ext", "CallbackContext", "ConversationHandler")
 import logging
 
 # Estados para el flujo de conversación
@@ -34,7 +39,7 @@ class GestionGrupos:
     
     def obtener_asignaturas_profesor(self, id_profesor: int):
         """Obtiene las asignaturas que imparte un profesor"""
-        conn = sqlite3.connect(self.db_path)
+        conn = conectar(self.db_path)
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -52,7 +57,7 @@ class GestionGrupos:
                       id_asignatura: int = None, es_tutoria: bool = False):
         """Guarda la información del grupo en la base de datos"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = conectar(self.db_path)
             cursor = conn.cursor()
             
             # Determinar el tipo de sala según es_tutoria
@@ -87,7 +92,7 @@ class GestionGrupos:
         - Lista de IDs de asignaturas con sala ya creada
         - Booleano indicando si ya tiene sala de tutorías
         """
-        conn = sqlite3.connect(self.db_path)
+        conn = conectar(self.db_path)
         cursor = conn.cursor()
         
         # Verificar salas por asignatura
@@ -141,7 +146,7 @@ class GestionGrupos:
             self.guardar_grupo(nombre_grupo, enlace_grupo, id_profesor, id_asignatura, False)
             
             # Obtener nombre de la asignatura
-            conn = sqlite3.connect(self.db_path)
+            conn = conectar(self.db_path)
             cursor = conn.cursor()
             cursor.execute("SELECT nombre FROM asignaturas WHERE id = ?", (id_asignatura,))
             nombre_asignatura = cursor.fetchone()[0]
@@ -156,7 +161,7 @@ class GestionGrupos:
     
     def es_sala_tutoria(self, chat_id):
         """Verifica si un chat es una sala de tutoría"""
-        conn = sqlite3.connect(self.db_path)
+        conn = conectar(self.db_path)
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -171,7 +176,7 @@ class GestionGrupos:
     
     def es_profesor(self, user_id):
         """Verifica si un usuario es profesor"""
-        conn = sqlite3.connect(self.db_path)
+        conn = conectar(self.db_path)
         cursor = conn.cursor()
         
         # Cambiado de 'rol' a 'Tipo' para ser consistente con el resto del código
@@ -439,7 +444,7 @@ class GestionGrupos:
             return ConversationHandler.END
         
         # Obtener salas del profesor
-        conn = sqlite3.connect(self.db_path)
+        conn = conectar(self.db_path)
         cursor = conn.cursor()
         cursor.execute('''
             SELECT g.id_sala, g.Nombre_sala, a.nombre, g.Id_asignatura
@@ -488,7 +493,7 @@ class GestionGrupos:
             return ConversationHandler.END
         
         # Obtener salas del profesor
-        conn = sqlite3.connect(self.db_path)
+        conn = conectar(self.db_path)
         cursor = conn.cursor()
         cursor.execute('''
             SELECT g.id_sala, g.Nombre_sala, 
@@ -588,7 +593,7 @@ class GestionGrupos:
         nueva_asignatura_id = int(query.data.split('_')[1])
         
         # Obtener nombre de la asignatura
-        conn = sqlite3.connect(self.db_path)
+        conn = conectar(self.db_path)
         cursor = conn.cursor()
         cursor.execute("SELECT nombre FROM asignaturas WHERE id = ?", (nueva_asignatura_id,))
         nombre_asignatura = cursor.fetchone()[0]
@@ -629,7 +634,7 @@ class GestionGrupos:
         nueva_asignatura_nombre = context.user_data['nueva_asignatura']['nombre']
         
         # Actualizar la asignatura en la base de datos
-        conn = sqlite3.connect(self.db_path)
+        conn = conectar(self.db_path)
         cursor = conn.cursor()
         
         try:
@@ -735,7 +740,7 @@ class GestionGrupos:
         sala_id = int(query.data.split('_')[1])
         
         # Obtener información de la sala
-        conn = sqlite3.connect(self.db_path)
+        conn = conectar(self.db_path)
         cursor = conn.cursor()
         
         try:
@@ -813,7 +818,7 @@ class GestionGrupos:
         expulsar_miembros = (accion == "expulsar")
         
         # Eliminar sala de la base de datos
-        conn = sqlite3.connect(self.db_path)
+        conn = conectar(self.db_path)
         cursor = conn.cursor()
         
         try:
@@ -848,9 +853,7 @@ class GestionGrupos:
     def registrar_handlers(self, bot):
         """Registra los handlers necesarios para la gestión de grupos en telebot"""
         
-        print("\n==================================================")
-        print("🔧🔧🔧 REGISTRANDO HANDLERS DE GESTION_GRUPOS 🔧🔧🔧")
-        print("==================================================\n")
+        self.logger.info("Registrando handlers de gestión de grupos")
         
         # IMPORTANTE: ELIMINAR cualquier handler de new_chat_members aquí
         # para que no entre en conflicto con el que ya está definido en bot_grupo_main.py
@@ -858,17 +861,17 @@ class GestionGrupos:
         # Comandos
         @bot.message_handler(commands=['finalizar'])
         def finalizar_handler(message):
-            print("🔄 Comando finalizar recibido")
+            self.logger.debug("Comando finalizar recibido")
             self.finalizar_sesion(message)
         
         @bot.message_handler(commands=['eliminar_sala'])
         def eliminar_sala_handler(message):
-            print("🔄 Comando eliminar_sala recibido")
+            self.logger.debug("Comando eliminar_sala recibido")
             self.eliminar_sala(message)
         
         @bot.message_handler(commands=['cambiar_asignatura'])
         def cambiar_asignatura_handler(message):
-            print("🔄 Comando cambiar_asignatura recibido")
+            self.logger.debug("Comando cambiar_asignatura recibido")
             self.cambiar_asignatura_sala(message)
         
         # IMPORTANTE: NO registrar un handler para new_chat_members aquí
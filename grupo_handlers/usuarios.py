@@ -5,7 +5,6 @@ cuando entran a un grupo donde está el bot.
 """
 import telebot
 from telebot import types
-import traceback
 import logging
 import sqlite3
 import os
@@ -17,7 +16,8 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 
 # Ahora puedes importar desde db
-from db.queries import get_db_connection
+from db.queries import get_db_connection, get_sala_por_chat, get_usuarios_por_telegram_ids
+from utils.logs import evento
 
 # Configurar logging
 logger = logging.getLogger(__name__)
@@ -26,26 +26,25 @@ def register_student_handlers(bot):
     """
     Registra los handlers para gestionar nuevos estudiantes.
     """
-    print("\n==================================================")
-    print("👨‍🎓👨‍🎓👨‍🎓 REGISTRANDO HANDLER DE NUEVOS ESTUDIANTES 👨‍🎓👨‍🎓👨‍🎓")
-    print("==================================================\n")
+    logger.info("Registrando handler de nuevos estudiantes")
 
-    # ID del bot para comparaciones
-    BOT_ID = None
-    try:
-        BOT_ID = bot.get_me().id
-        print(f"👾 ID del bot: {BOT_ID}")
-    except Exception as e:
-        print(f"No se pudo obtener ID del bot: {e}")
+    # ID del bot para comparaciones. Se pide con el primer miembro nuevo y no al
+    # registrar, para que arrancar no dependa de una llamada a getMe
+    def id_del_bot():
+        try:
+            return bot.user.id  # telebot guarda el resultado de getMe
+        except Exception as e:
+            logger.warning("No se pudo obtener ID del bot: %s", e)
+            return None
 
     # Middleware para logging (opcional - puedes dejarlo)
     @bot.middleware_handler(update_types=['message'])
     def log_new_members(bot_instance, update):
         """Middleware para registrar todos los eventos new_chat_members"""
         if hasattr(update, 'message') and hasattr(update.message, 'content_type') and update.message.content_type == 'new_chat_members':
-            print(f"\n🔍 MIDDLEWARE: DETECTADO new_chat_members en chat {update.message.chat.id}")
             for member in update.message.new_chat_members:
-                print(f"➡️ Nuevo miembro: {member.first_name} (ID: {member.id}, is_bot: {getattr(member, 'is_bot', 'N/A')})")
+                evento(logger, "nuevo miembro", chat_id=update.message.chat.id, user_id=member.id,
+                       is_bot=getattr(member, 'is_bot', 'N/A'))
 
     # MANTÉN SOLO UNO DE LOS DOS HANDLERS:
     # Handler principal para new_chat_members
@@ -54,38 +53,38 @@ def register_student_handlers(bot):
         """Handler principal para gestionar nuevos miembros en grupos"""
         try:
             chat_id = message.chat.id
-            print(f"\n🎓 NUEVO MIEMBRO DETECTADO EN CHAT {chat_id}")
             
+            # Ignorar al propio bot
+            miembros = []
             for new_member in message.new_chat_members:
-                user_id = new_member.id
-                print(f"👤 Procesando: {new_member.first_name} (ID: {user_id})")
-                
-                # Ignorar si es el propio bot
-                if user_id == BOT_ID:
-                    print(f"🤖 Es el propio bot, ignorando")
+                evento(logger, "procesando miembro", chat_id=chat_id, user_id=new_member.id)
+                if new_member.is_bot and new_member.id == id_del_bot():
+                    logger.debug("Es el propio bot, ignorando")
                     continue
-
-                # Obtener información del grupo
-                conn = get_db_connection()
-                cursor = conn.cursor()
-                
-                # Verificar si el grupo es un grupo de tutorías
-                cursor.execute("SELECT * FROM Grupos_tutoria WHERE Chat_id = ?", (str(chat_id),))
-                grupo = cursor.fetchone()
-
-                if not grupo:
-                    # No es un grupo registrado - no hacer nada especial
-                    print(f"ℹ️ Grupo {chat_id} no es una sala de tutoría")
-                    conn.close()
-                    continue
-
-                # Verificar si el usuario está registrado
-                cursor.execute("SELECT * FROM Usuarios WHERE TelegramID = ?", (user_id,))
-                usuario = cursor.fetchone()
+                miembros.append(new_member)
+            
+            if not miembros:
+                return
+            
+            # Verificar si el grupo es un grupo de tutorías (caché por chat)
+            grupo = get_sala_por_chat(chat_id)
+            
+            if not grupo:
+                # No es un grupo registrado - no hacer nada especial
+                logger.debug("Grupo %s no es una sala de tutoría", chat_id)
+                return
+            
+            # Todos los miembros nuevos del update con una sola consulta (caché por TelegramID)
+            usuarios = get_usuarios_por_telegram_ids([m.id for m in miembros])
+            nuevos_en_sala = []
+            
+            for new_member in miembros:
+                user_id = new_member.id
+                usuario = usuarios.get(user_id)
 
                 if not usuario:
                     # Usuario no registrado - enviar mensaje informativo
-                    print(f"⚠️ Usuario {user_id} no registrado en el sistema")
+                    logger.debug("Usuario %s no registrado en el sistema", user_id)
                     bot.send_message(
                         chat_id, 
                         f"👋 Bienvenido/a {new_member.first_name}.\n\n"
@@ -93,18 +92,16 @@ def register_student_handlers(bot):
                         f"con el bot principal.",
                         parse_mode="Markdown"
                     )
-                    conn.close()
                     continue
 
                 # Verificar si es estudiante
                 if usuario['Tipo'] != 'estudiante':
-                    print(f"ℹ️ Usuario {user_id} no es estudiante, es {usuario['Tipo']}")
-                    conn.close()
+                    logger.debug("Usuario %s no es estudiante, es %s", user_id, usuario['Tipo'])
                     continue
                     
                 # Es un estudiante registrado - procesar correctamente
                 nombre_completo = f"{usuario['Nombre']} {usuario['Apellidos'] or ''}".strip()
-                print(f"✅ Nuevo estudiante en grupo {chat_id}: {nombre_completo}")
+                logger.debug("Nuevo estudiante en grupo %s: %s", chat_id, nombre_completo)
                 
                 # Mensaje de bienvenida personalizado para estudiantes
                 mensaje = (
@@ -115,15 +112,7 @@ def register_student_handlers(bot):
 
                 # Registrar al estudiante en la base de datos si es sala individual
                 if grupo['Proposito_sala'] == 'individual':
-                    try:
-                        cursor.execute("""
-                            INSERT INTO Miembros_Grupo (id_sala, Id_usuario, Fecha_union, Estado)
-                            VALUES (?, ?, CURRENT_TIMESTAMP, 'activo')
-                        """, (grupo['id_sala'], usuario['Id_usuario']))
-                        conn.commit()
-                        print(f"✅ Estudiante {nombre_completo} registrado en sala {grupo['id_sala']}")
-                    except Exception as e:
-                        print(f"❌ Error al registrar estudiante en grupo: {e}")
+                    nuevos_en_sala.append((grupo['id_sala'], usuario['Id_usuario']))
                 
                 # Crear un teclado personalizado con el botón de finalizar tutoría
                 markup = types.ReplyKeyboardMarkup(resize_keyboard=True, one_time_keyboard=False)
@@ -137,13 +126,27 @@ def register_student_handlers(bot):
                     reply_markup=markup,
                     parse_mode="Markdown"
                 )
-                print(f"✅ Mensaje de bienvenida enviado a {nombre_completo}")
+                logger.debug("Mensaje de bienvenida enviado a %s", nombre_completo)
 
-                conn.close()
+            # Altas en Miembros_Grupo de todo el update en una transacción
+            # (quien ya era miembro de la sala se queda como estaba)
+            if nuevos_en_sala:
+                conn = get_db_connection()
+                try:
+                    cursor = conn.executemany("""
+                        INSERT OR IGNORE INTO Miembros_Grupo (id_sala, Id_usuario, Fecha_union, Estado)
+                        VALUES (?, ?, CURRENT_TIMESTAMP, 'activo')
+                    """, nuevos_en_sala)
+                    conn.commit()
+                    evento(logger, "estudiantes añadidos a sala", logging.INFO, sala=grupo['id_sala'],
+                           usuarios=[id_usuario for _, id_usuario in nuevos_en_sala], altas=cursor.rowcount)
+                except Exception as e:
+                    conn.rollback()
+                    logger.error("Error al registrar estudiantes en grupo: %s", e)
+                finally:
+                    conn.close()
 
         except Exception as e:
-            print(f"❌ ERROR EN HANDLER NEW_CHAT_MEMBERS: {e}")
-            traceback.print_exc()
+            logger.exception("Error en el handler de new_chat_members: %s", e)
 
-    print("✅ Handler de nuevos estudiantes registrado correctamente")
     return True
\ No newline at end of file
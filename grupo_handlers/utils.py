@@ -16,14 +16,9 @@ root_path = str(Path(__file__).parent.parent.absolute())
 if root_path not in sys.path:
     sys.path.insert(0, root_path)
 
-# Cargar state_manager usando importación dinámica para evitar problemas de rutas
-import importlib.util
-state_manager_path = Path(__file__).parent.parent / "utils" / "state_manager.py"
-spec = importlib.util.spec_from_file_location("state_manager", state_manager_path)
-state_manager = importlib.util.module_from_spec(spec)
-spec.loader.exec_module(state_manager)
-
-# Obtener las variables de estado
+# Obtener las variables de estado del manejador central (el mismo módulo que
+# importan los bots; cargarlo aparte crearía otra copia de los diccionarios)
+from utils import state_manager
 user_states = state_manager.user_states
 user_data = state_manager.user_data
 estados_timestamp = state_manager.estados_timestamp
@@ -31,80 +26,59 @@ estados_timestamp = state_manager.estados_timestamp
 # Importar funciones de la base de datos compartidas
 from db.queries import (
     get_user_by_telegram_id, 
+    get_usuario_cacheado,
     get_db_connection,
     create_user,
     crear_grupo_tutoria,
     añadir_estudiante_grupo
 )
+from utils.respuestas import enviar_mensaje
+from utils.teclados import teclado_respuesta
 
 # Constantes
 MAX_ESTADO_DURACION = 3600  # 1 hora en segundos
 
-def configurar_logger():
-    """Configura y devuelve el logger"""
-    logger = logging.getLogger("bot_grupo")
-    
-    if not logger.handlers:
-        handler = logging.FileHandler("bot_grupos.log")
-        formatter = logging.Formatter('%(asctime)s [%(levelname)s] %(message)s')
-        handler.setFormatter(formatter)
-        
-        logger.addHandler(handler)
-        logger.addHandler(logging.StreamHandler())
-        logger.setLevel(logging.DEBUG)
-    
-    return logger
-
-# Obtener logger
-logger = configurar_logger()
+# Obtener logger (los manejadores los pone utils.logs al arrancar el bot)
+logger = logging.getLogger("bot_grupo")
 
 # Funciones de interfaz de usuario
+# Los menús son fijos: se construyen y serializan una sola vez
+_MENU_PROFESOR = teclado_respuesta((("❌ Terminar Tutoria",),))
+_MENU_ESTUDIANTE = teclado_respuesta((("❌ Terminar Tutoria",),))
+
 def menu_profesor():
     """Devuelve un teclado personalizado para profesores en un grupo"""
-    # Crear un teclado personalizado con solo el botón de terminar tutoría
-    markup = types.ReplyKeyboardMarkup(resize_keyboard=True, row_width=1)
-    
-    # Añadir solo el botón de terminar tutoría
-    markup.add(
-        types.KeyboardButton("❌ Terminar Tutoria")
-    )
-    
-    return markup
+    # Teclado con solo el botón de terminar tutoría
+    return _MENU_PROFESOR
 
 def menu_estudiante():
     """Crea un menú con botones específicos para estudiantes."""
-    markup = types.ReplyKeyboardMarkup(resize_keyboard=True, row_width=2)
-    markup.add(
-        types.KeyboardButton("❌ Terminar Tutoria")
-    )
-    return markup
+    return _MENU_ESTUDIANTE
+
+# Comandos por rol, fijos: tuplas para que ningún llamador pueda modificarlos
+_COMANDOS_PROFESOR = (
+    types.BotCommand('/start', 'Iniciar el bot'),
+    types.BotCommand('/ayuda', 'Mostrar ayuda del bot'),
+    types.BotCommand('/estudiantes', 'Ver lista de estudiantes'),
+    types.BotCommand('/estadisticas', 'Ver estadísticas de tutorías'),
+    types.BotCommand('/finalizar', 'Finalizar una sesión de tutoría'),
+    types.BotCommand('/cambiar_asignatura', 'Cambiar asignatura de una sala'),
+    types.BotCommand('/eliminar_sala', 'Eliminar configuración de una sala')
+)
+_COMANDOS_ESTUDIANTE = (
+    types.BotCommand('/start', 'Iniciar el bot'),
+    types.BotCommand('/ayuda', 'Mostrar ayuda del bot'),
+    types.BotCommand('/finalizar', 'Finalizar una sesión de tutoría')
+)
 
 def configurar_comandos_por_rol():
-    """Devuelve listas de comandos específicos para profesores y estudiantes."""
-    # Comandos para profesores
-    comandos_profesor = [
-        types.BotCommand('/start', 'Iniciar el bot'),
-        types.BotCommand('/ayuda', 'Mostrar ayuda del bot'),
-        types.BotCommand('/estudiantes', 'Ver lista de estudiantes'),
-        types.BotCommand('/estadisticas', 'Ver estadísticas de tutorías'),
-        types.BotCommand('/finalizar', 'Finalizar una sesión de tutoría'),
-        types.BotCommand('/cambiar_asignatura', 'Cambiar asignatura de una sala'),
-        types.BotCommand('/eliminar_sala', 'Eliminar configuración de una sala')
-    ]
-    
-    # Comandos para estudiantes
-    comandos_estudiante = [
-        types.BotCommand('/start', 'Iniciar el bot'),
-        types.BotCommand('/ayuda', 'Mostrar ayuda del bot'),
-        types.BotCommand('/finalizar', 'Finalizar una sesión de tutoría')
-    ]
-    
-    return comandos_profesor, comandos_estudiante
+    """Devuelve las tuplas de comandos específicos para profesores y estudiantes."""
+    return _COMANDOS_PROFESOR, _COMANDOS_ESTUDIANTE
 
 # Funciones de verificación y estado
 def es_profesor(user_id):
     """Verifica si el usuario es un profesor"""
-    user = get_user_by_telegram_id(user_id)
+    user = get_usuario_cacheado(user_id)
     if user and user['Tipo'] == 'profesor':
         return True
     return False
@@ -211,35 +185,9 @@ def guardar_usuario_en_grupo(user_id, username, chat_id):
         return False
 
 # Funciones de formateo de mensajes
-def escape_markdown(text):
-    """Escapa caracteres especiales de Markdown"""
-    if not text:
-        return ""
-    # Caracteres especiales en Markdown V2
-    special_chars = ['_', '*', '[', ']', '(', ')', '~', '`', '>', '#', '+', '-', '=', '|', '{', '}', '.', '!']
-    for char in special_chars:
-        text = text.replace(char, '\\' + char)
-    return text
-
 def send_markdown_message(bot, chat_id, text, reply_markup=None):
-    """Envía un mensaje con Markdown escapando correctamente los caracteres especiales"""
-    try:
-        # Intentar enviar con Markdown
-        return bot.send_message(
-            chat_id,
-            text,
-            parse_mode="Markdown",
-            reply_markup=reply_markup
-        )
-    except Exception as e:
-        # Si falla, intentar sin formato
-        logger.warning(f"Error al enviar mensaje con Markdown: {e}")
-        return bot.send_message(
-            chat_id,
-            text,
-            parse_mode=None,
-            reply_markup=reply_markup
-        )
+    """Envía un mensaje con Markdown, validado localmente antes de enviarlo"""
+    return enviar_mensaje(bot, chat_id, text, parse_mode="Markdown", reply_markup=reply_markup)
 
 # Un lock global para sincronizar acceso a la base de datos
 db_lock = threading.RLock()
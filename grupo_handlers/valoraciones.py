@@ -7,7 +7,16 @@ import time
 
 # Añadir directorio padre al path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from db.queries import get_db_connection, get_user_by_telegram_id
+from db.queries import (
+    get_db_connection,
+    get_user_by_telegram_id,
+    insertar_valoracion,
+    get_valoraciones_agregadas,
+    formatear_valoracion
+)
+from utils.respuestas import editar_o_enviar
+from utils.avisos_valoracion import programar_valoracion
+from utils.teclados import teclado_inline, teclado_inline_columna
 
 
 # Crear estas variables localmente en vez de importarlas
@@ -15,6 +24,11 @@ user_states = {}
 user_data = {}
 estados_timestamp = {}
 
+# Teclados fijos del flujo de valoración (se serializan una sola vez)
+TECLADO_PUNTUACION = teclado_inline((tuple((f"{n}⭐", f"puntos_{n}") for n in range(1, 6)),))
+TECLADO_COMENTARIO = teclado_inline(((("Sí", "comentario_si"), ("No", "comentario_no")),))
+TECLADO_ANONIMO = teclado_inline(((("Sí, anónima", "anonimo_si"), ("No, mostrar mi nombre", "anonimo_no")),))
+
 # Añadir timestamp cuando se establece un estado
 def set_user_state(chat_id, state):
     user_states[chat_id] = state
@@ -69,14 +83,15 @@ def register_handlers(bot):
             )
             return
         
-        # Mostrar lista de profesores
-        markup = types.InlineKeyboardMarkup(row_width=1)
+        # Media de cada profesor (una sola lectura de los agregados)
+        valoraciones = get_valoraciones_agregadas([prof['Id_usuario'] for prof in profesores])
         
-        for prof in profesores:
-            markup.add(types.InlineKeyboardButton(
-                text=prof['Nombre'],
-                callback_data=f"valorar_{prof['Id_usuario']}"
-            ))
+        # Mostrar lista de profesores (teclado memorizado por contenido)
+        markup = teclado_inline_columna([
+            (f"{prof['Nombre']} {formatear_valoracion(valoraciones.get(prof['Id_usuario']))}".strip(),
+             f"valorar_{prof['Id_usuario']}")
+            for prof in profesores
+        ])
         
         bot.send_message(
             chat_id,
@@ -89,7 +104,11 @@ def register_handlers(bot):
     @bot.callback_query_handler(func=lambda call: call.data.startswith("valorar_"))
     def handle_seleccion_profesor_valoracion(call):
         chat_id = call.message.chat.id
-        profesor_id = int(call.data.split("_")[1])
+        # valorar_<profesor> desde /valorar_profesor o valorar_<profesor>_<sala> desde
+        # la petición enviada al terminar una sesión
+        partes = call.data.split("_")
+        profesor_id = int(partes[1])
+        sala_id = int(partes[2]) if len(partes) > 2 else None
         
         # Obtener datos del profesor
         conn = get_db_connection()
@@ -98,25 +117,20 @@ def register_handlers(bot):
         profesor = cursor.fetchone()
         conn.close()
         
-        user_data[chat_id] = {"profesor_id": profesor_id, "profesor_nombre": profesor['Nombre']}
+        user_data[chat_id] = {"profesor_id": profesor_id, "profesor_nombre": profesor['Nombre'], "sala_id": sala_id}
         
         # Solicitar puntuación
-        markup = types.InlineKeyboardMarkup(row_width=5)
-        buttons = [
-            types.InlineKeyboardButton("1⭐", callback_data="puntos_1"),
-            types.InlineKeyboardButton("2⭐", callback_data="puntos_2"),
-            types.InlineKeyboardButton("3⭐", callback_data="puntos_3"),
-            types.InlineKeyboardButton("4⭐", callback_data="puntos_4"),
-            types.InlineKeyboardButton("5⭐", callback_data="puntos_5")
-        ]
-        markup.add(*buttons)
+        markup = TECLADO_PUNTUACION
         
-        bot.send_message(
+        # Cada paso del flujo edita el mismo mensaje
+        editar_o_enviar(
+            bot,
             chat_id,
             f"Vas a valorar a: *{profesor['Nombre']}*\n\n"
             "¿Qué puntuación le darías del 1 al 5?",
-            reply_markup=markup,
-            parse_mode="Markdown"
+            call.message.message_id,
+            parse_mode="Markdown",
+            reply_markup=markup
         )
         
         bot.answer_callback_query(call.id)
@@ -129,19 +143,17 @@ def register_handlers(bot):
         user_data[chat_id]["puntuacion"] = puntuacion
         
         # Preguntar si desea dejar un comentario
-        markup = types.InlineKeyboardMarkup(row_width=2)
-        markup.add(
-            types.InlineKeyboardButton("Sí", callback_data="comentario_si"),
-            types.InlineKeyboardButton("No", callback_data="comentario_no")
-        )
+        markup = TECLADO_COMENTARIO
         
         # Mostramos las estrellas de forma visual
         estrellas = "⭐" * puntuacion
         
-        bot.send_message(
+        editar_o_enviar(
+            bot,
             chat_id,
             f"Has dado una puntuación de {estrellas}\n\n"
             "¿Deseas añadir un comentario adicional?",
+            call.message.message_id,
             reply_markup=markup
         )
         
@@ -153,14 +165,16 @@ def register_handlers(bot):
         opcion = call.data.split("_")[1]
         
         if opcion == "si":
-            bot.send_message(
+            editar_o_enviar(
+                bot,
                 chat_id,
-                "Por favor, escribe tu comentario sobre el profesor:"
+                "Por favor, escribe tu comentario sobre el profesor:",
+                call.message.message_id
             )
             set_user_state(chat_id, "escribiendo_comentario")
         else:
             # No quiere dejar comentario, preguntar si valoración anónima
-            preguntar_valoracion_anonima(chat_id, bot)
+            preguntar_valoracion_anonima(chat_id, bot, call.message.message_id)
         
         bot.answer_callback_query(call.id)
     
@@ -174,17 +188,15 @@ def register_handlers(bot):
         # Preguntar si valoración anónima
         preguntar_valoracion_anonima(chat_id, bot)
     
-    def preguntar_valoracion_anonima(chat_id, bot):
-        markup = types.InlineKeyboardMarkup(row_width=2)
-        markup.add(
-            types.InlineKeyboardButton("Sí, anónima", callback_data="anonimo_si"),
-            types.InlineKeyboardButton("No, mostrar mi nombre", callback_data="anonimo_no")
-        )
+    def preguntar_valoracion_anonima(chat_id, bot, message_id=None):
+        markup = TECLADO_ANONIMO
         
-        bot.send_message(
+        editar_o_enviar(
+            bot,
             chat_id,
             "¿Deseas que tu valoración sea anónima?\n\n"
             "Si eliges 'No', el profesor podrá ver tu nombre.",
+            message_id,
             reply_markup=markup
         )
     
@@ -206,26 +218,26 @@ def register_handlers(bot):
             comentario = user_data[chat_id].get("comentario", "")
             fecha = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             
-            cursor.execute(
-                """
-                INSERT INTO Valoraciones 
-                (evaluador_id, profesor_id, puntuacion, comentario, fecha, es_anonimo, id_sala) 
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-                """,
-                (evaluador_id, profesor_id, puntuacion, comentario, fecha, es_anonimo, user_data[chat_id].get("sala_id"))
+            # La valoración y los agregados del profesor y la sala, en la misma transacción
+            insertar_valoracion(
+                cursor, evaluador_id, profesor_id, puntuacion, comentario, fecha, es_anonimo,
+                user_data[chat_id].get("sala_id")
             )
             conn.commit()
             
-            bot.send_message(
+            editar_o_enviar(
+                bot,
                 chat_id,
                 "✅ ¡Valoración guardada correctamente!\n\n"
                 f"Has valorado a *{user_data[chat_id]['profesor_nombre']}* con "
                 f"{puntuacion} estrellas.\n\n"
                 "Gracias por tu feedback.",
+                call.message.message_id,
                 parse_mode="Markdown"
             )
             
         except Exception as e:
+            conn.rollback()
             bot.send_message(
                 chat_id,
                 f"❌ Error al guardar la valoración: {str(e)}"
@@ -239,53 +251,27 @@ def register_handlers(bot):
         bot.answer_callback_query(call.id)
         
 # Al final del archivo, añade esta función para que sea importable desde otros módulos
-def iniciar_valoracion_profesor(bot, profesor_id, estudiante_id, sala_id=None):
-    """Inicia el proceso de valoración de un profesor desde otro módulo"""
-    # Buscar usuario por id
+def iniciar_valoracion_profesor(bot, profesor_id, estudiante_id, sala_id):
+    """
+    Programa la petición de valoración de una tutoría desde otro módulo.
+
+    La petición se agrupa y se envía en segundo plano (utils.avisos_valoracion);
+    no se envía si el estudiante ya ha valorado hoy la sesión en esa sala.
+    """
     conn = get_db_connection()
     cursor = conn.cursor()
-    cursor.execute("SELECT * FROM Usuarios WHERE Id_usuario = ?", (estudiante_id,))
-    estudiante = cursor.fetchone()
+    cursor.execute("""
+        SELECT e.TelegramID, g.Chat_id
+        FROM Usuarios e
+        JOIN Grupos_tutoria g ON g.id_sala = ? AND g.Id_usuario = ?
+        WHERE e.Id_usuario = ?
+    """, (sala_id, profesor_id, estudiante_id))
+    fila = cursor.fetchone()
+    conn.close()
     
-    # Si no hay TelegramID, no podemos enviar mensaje
-    if not estudiante or not estudiante.get('TelegramID'):
+    # Sin TelegramID o sin sala del profesor no hay a quién ni sobre qué preguntar
+    if not fila or not fila['TelegramID'] or not fila['Chat_id']:
         return False
     
-    chat_id = estudiante['TelegramID']
-    
-    # Obtener datos del profesor
-    cursor.execute("SELECT * FROM Usuarios WHERE Id_usuario = ?", (profesor_id,))
-    profesor = cursor.fetchone()
-    
-    if not profesor:
-        bot.send_message(chat_id, "❌ Profesor no encontrado")
-        return False
-    
-    # Guardar datos para el flujo de valoración
-    user_data[chat_id] = {
-        "profesor_id": profesor_id, 
-        "profesor_nombre": profesor['Nombre'],
-        "estudiante_id": estudiante_id,
-        "sala_id": sala_id
-    }
-    
-    # Mostrar opciones de valoración (con estrellas)
-    markup = types.InlineKeyboardMarkup(row_width=1)
-    buttons = [
-        types.InlineKeyboardButton("⭐", callback_data="puntos_1"),
-        types.InlineKeyboardButton("⭐⭐", callback_data="puntos_2"),
-        types.InlineKeyboardButton("⭐⭐⭐", callback_data="puntos_3"),
-        types.InlineKeyboardButton("⭐⭐⭐⭐", callback_data="puntos_4"),
-        types.InlineKeyboardButton("⭐⭐⭐⭐⭐", callback_data="puntos_5")
-    ]
-    markup.add(*buttons)
-    
-    # Enviar nuevo mensaje
-    bot.send_message(
-        chat_id=chat_id,
-        text=f"Vas a valorar la tutoría con: *{profesor['Nombre']}*\n\n¿Qué puntuación le darías?",
-        reply_markup=markup,
-        parse_mode="Markdown"
-    )
-    
-    return True
\ No newline at end of file
+    programar_valoracion(fila['Chat_id'], fila['TelegramID'])
+    return True
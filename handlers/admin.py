@@ -0,0 +1,102 @@
+"""
+Comandos de administración, comunes a los dos bots.
+
+Solo responden a los Telegram IDs de ADMIN_IDS; para el resto de usuarios el
+comando no existe y el mensaje sigue a los demás handlers.
+"""
+import io
+import logging
+import sys
+import os
+
+# Añadir directorio padre al path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import ADMIN_IDS, PERFIL_DURACION, PERFIL_DURACION_MAX
+from utils.respuestas import enviar_mensaje
+from utils.trazas import obtener_trazas, resumen_trazas, exportar_jsonl
+from utils.perfilador import iniciar_perfil
+from db.queries import reconstruir_agregados_valoraciones
+from db.analitica import reconstruir_periodos_valoraciones
+
+logger = logging.getLogger(__name__)
+
+# Trazas que se resumen en el mensaje si no se indica otro número (y máximo, por la longitud)
+TRAZAS_RESUMEN = 10
+TRAZAS_RESUMEN_MAX = 25
+
+
+def es_admin(message):
+    """Indica si el mensaje lo envía un administrador"""
+    return message.from_user is not None and message.from_user.id in ADMIN_IDS
+
+
+def register_handlers(bot, bot_nombre):
+    """Registra los comandos de administración ('bot_nombre' distingue los ficheros de cada bot)"""
+
+    @bot.message_handler(commands=['trazas'], func=es_admin)
+    def handle_trazas(message):
+        """
+        /trazas [n]: resume las últimas n trazas por update y adjunta todo el
+        buffer en JSONL (spans de handlers, SQL y API de Telegram)
+        """
+        partes = message.text.split()
+        limite = int(partes[1]) if len(partes) > 1 and partes[1].isdigit() else TRAZAS_RESUMEN
+        limite = max(1, min(limite, TRAZAS_RESUMEN_MAX))
+
+        enviar_mensaje(bot, message.chat.id, resumen_trazas(limite))
+
+        trazas = obtener_trazas()
+        if trazas:
+            fichero = io.BytesIO(exportar_jsonl(trazas).encode("utf-8"))
+            bot.send_document(message.chat.id, fichero, visible_file_name="trazas.jsonl")
+        logger.info("Trazas enviadas a %s (%d en el buffer)", message.from_user.id, len(trazas))
+
+    @bot.message_handler(commands=['perfil'], func=es_admin)
+    def handle_perfil(message):
+        """
+        /perfil [segundos]: perfila el proceso por muestreo y envía el fichero
+        collapsed (para flamegraph.pl o speedscope) al terminar
+        """
+        chat_id = message.chat.id
+        partes = message.text.split()
+        duracion = int(partes[1]) if len(partes) > 1 and partes[1].isdigit() else PERFIL_DURACION
+        duracion = max(1, min(duracion, PERFIL_DURACION_MAX))
+
+        def entregar(ruta, muestras):
+            if ruta is None:
+                enviar_mensaje(bot, chat_id, "❌ El perfilado ha fallado, revisa el log.")
+                return
+            with open(ruta, "rb") as fichero:
+                bot.send_document(chat_id, fichero, caption=f"Perfil de {bot_nombre}: {muestras} muestras")
+
+        ruta = iniciar_perfil(bot_nombre, duracion, al_terminar=entregar)
+        if ruta is None:
+            enviar_mensaje(bot, chat_id, "⚠️ Ya hay un perfilado en marcha.")
+            return
+        enviar_mensaje(
+            bot, chat_id,
+            f"⏱️ Perfilando {bot_nombre} durante {duracion}s, "
+            f"te enviaré {ruta.name} al terminar."
+        )
+
+    @bot.message_handler(commands=['reconstruir_valoraciones'], func=es_admin)
+    def handle_reconstruir_valoraciones(message):
+        """
+        /reconstruir_valoraciones: recalcula los agregados por profesor y por
+        sala y los periodos desde la tabla Valoraciones (tras cargas o
+        correcciones a mano)
+        """
+        try:
+            filas = reconstruir_agregados_valoraciones()
+            filas_periodos = reconstruir_periodos_valoraciones()
+        except Exception as e:
+            logger.exception("Error al reconstruir los agregados de valoraciones")
+            enviar_mensaje(bot, message.chat.id, f"❌ Error al reconstruir las valoraciones: {e}")
+            return
+        logger.info("Agregados de valoraciones reconstruidos por %s: %d filas, %d periodos",
+                    message.from_user.id, filas, filas_periodos)
+        enviar_mensaje(
+            bot, message.chat.id,
+            f"✅ Valoraciones agregadas reconstruidas ({filas} profesores y salas, {filas_periodos} periodos)."
+        )
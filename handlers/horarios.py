@@ -12,9 +12,10 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from db.models import get_db_connection
 
 from db.queries import update_user, get_user_by_telegram_id, update_horario_profesor
+from utils.respuestas import enviar_mensaje, editar_o_enviar
+from utils.teclados import teclado_inline, teclado_inline_columna, QUITAR_TECLADO
 
-# Configuración del logger
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+# Configuración del logger (los manejadores los pone utils.logs al arrancar el bot)
 logger = logging.getLogger(__name__)
 
 # Estados para la conversación
@@ -96,7 +97,7 @@ def cargar_horario_bd(chat_id):
     """Carga el horario desde la base de datos"""
     try:
         # DIAGNÓSTICO: Imprimir valores para depuración
-        print(f"Intentando cargar horario para chat_id: {chat_id}")
+        logger.debug("Intentando cargar horario para chat_id: %s", chat_id)
         
         conn = get_db_connection()
         cursor = conn.cursor()
@@ -110,17 +111,17 @@ def cargar_horario_bd(chat_id):
         usuario = cursor.fetchone()
         
         if not usuario:
-            print(f"No se encontró usuario con telegram_id {chat_id}")
+            logger.debug("No se encontró usuario con telegram_id %s", chat_id)
             conn.close()
             return {}
         
         # Ahora podemos acceder por nombre de columna
         user_id = usuario['Id_usuario']
-        print(f"ID de usuario encontrado: {user_id}")
+        logger.debug("ID de usuario encontrado: %s", user_id)
         
         # DIAGNÓSTICO: Verificar si hay un valor directo en el campo Horario
         if usuario['Horario']:
-            print(f"Horario encontrado en campo Usuarios.Horario: {usuario['Horario']}")
+            logger.debug("Horario encontrado en campo Usuarios.Horario: %s", usuario['Horario'])
             # Intenta convertir el formato de cadena a diccionario
             try:
                 horario_dict = {}
@@ -132,20 +133,20 @@ def cargar_horario_bd(chat_id):
                         if dia not in horario_dict:
                             horario_dict[dia] = []
                         horario_dict[dia].append(horas)
-                print(f"Horario convertido a diccionario: {horario_dict}")
+                logger.debug("Horario convertido a diccionario: %s", horario_dict)
                 return horario_dict
             except Exception as e:
-                print(f"Error al convertir horario de cadena: {e}")
+                logger.error("Error al convertir horario de cadena: %s", e)
         
         # DIAGNÓSTICO: Si no hay horario en el campo directo, buscar en la tabla Horarios_Profesores
-        print("Buscando en tabla Horarios_Profesores...")
+        logger.debug("Buscando en tabla Horarios_Profesores...")
         cursor.execute(
             "SELECT dia, hora_inicio, hora_fin FROM Horarios_Profesores WHERE Id_usuario = ?",
             (user_id,)
         )
         
         horarios = cursor.fetchall()
-        print(f"Registros encontrados en Horarios_Profesores: {len(horarios) if horarios else 0}")
+        logger.debug("Registros encontrados en Horarios_Profesores: %s", len(horarios) if horarios else 0)
         
         conn.close()
         
@@ -160,12 +161,10 @@ def cargar_horario_bd(chat_id):
                 
             horario_dict[dia].append(franja)
             
-        print(f"Horario final recuperado: {horario_dict}")
+        logger.debug("Horario final recuperado: %s", horario_dict)
         return horario_dict
     except Exception as e:
-        print(f"Error al cargar horario de BD: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error al cargar horario de BD: %s", e)
         return {}
 
 def hay_solapamiento(franjas_existentes, nueva_franja):
@@ -201,6 +200,25 @@ def convertir_a_minutos(hora_str):
     horas, minutos = map(int, hora_str.split(":"))
     return horas * 60 + minutos
 
+DIAS_SEMANA = ["Lunes", "Martes", "Miércoles", "Jueves", "Viernes"]
+
+# Selector de días: fijo, se construye y serializa una sola vez
+TECLADO_DIAS = teclado_inline((
+    tuple((dia, f"dia_{dia}") for dia in DIAS_SEMANA[0:2]),
+    tuple((dia, f"dia_{dia}") for dia in DIAS_SEMANA[2:4]),
+    tuple((dia, f"dia_{dia}") for dia in DIAS_SEMANA[4:]),
+    (("💾 Guardar horario", "guardar_horario"),),
+    (("❌ Cancelar", "cancelar_horario"),)
+))
+
+def teclado_gestion_dia(dia):
+    """Opciones para gestionar las franjas de un día (memorizado por día)"""
+    return teclado_inline_columna([
+        ("➕ Añadir franja horaria", f"add_franja_{dia}"),
+        ("🗑️ Eliminar franja horaria", f"del_franja_{dia}"),
+        ("🔙 Volver a selección de días", "volver_dias")
+    ])
+
 def register_handlers(bot):
     """Registra los manejadores para la configuración de horarios"""
     
@@ -229,12 +247,7 @@ def register_handlers(bot):
         user_data[chat_id]['horario'] = cargar_horario_bd(chat_id)
     
         # Mostrar opciones de días de la semana
-        markup = types.InlineKeyboardMarkup(row_width=2)
-        dias = ["Lunes", "Martes", "Miércoles", "Jueves", "Viernes"]
-        botones_dias = [types.InlineKeyboardButton(dia, callback_data=f"dia_{dia}") for dia in dias]
-        markup.add(*botones_dias)
-        markup.add(types.InlineKeyboardButton("💾 Guardar horario", callback_data="guardar_horario"))
-        markup.add(types.InlineKeyboardButton("❌ Cancelar", callback_data="cancelar_horario"))
+        markup = TECLADO_DIAS
         
         # Mostrar horario actual si existe
         if user_data[chat_id]['horario']:
@@ -264,12 +277,7 @@ def register_handlers(bot):
             mensaje = f"📅 *{dia}*\n\nNo hay franjas horarias configuradas para este día.\n\n¿Qué deseas hacer?"
         
         # Botones para gestionar franjas
-        markup = types.InlineKeyboardMarkup(row_width=1)
-        markup.add(
-            types.InlineKeyboardButton("➕ Añadir franja horaria", callback_data=f"add_franja_{dia}"),
-            types.InlineKeyboardButton("🗑️ Eliminar franja horaria", callback_data=f"del_franja_{dia}"),
-            types.InlineKeyboardButton("🔙 Volver a selección de días", callback_data="volver_dias")
-        )
+        markup = teclado_gestion_dia(dia)
         
         bot.edit_message_text(
             chat_id=chat_id,
@@ -287,12 +295,7 @@ def register_handlers(bot):
         chat_id = call.message.chat.id
         
         # Mostrar opciones de días de la semana nuevamente
-        markup = types.InlineKeyboardMarkup(row_width=2)
-        dias = ["Lunes", "Martes", "Miércoles", "Jueves", "Viernes"]
-        botones_dias = [types.InlineKeyboardButton(dia, callback_data=f"dia_{dia}") for dia in dias]
-        markup.add(*botones_dias)
-        markup.add(types.InlineKeyboardButton("💾 Guardar horario", callback_data="guardar_horario"))
-        markup.add(types.InlineKeyboardButton("❌ Cancelar", callback_data="cancelar_horario"))
+        markup = TECLADO_DIAS
         
         # Mostrar horario actual si existe
         if user_data[chat_id]['horario']:
@@ -320,16 +323,17 @@ def register_handlers(bot):
         # Guardar el día actual
         user_data[chat_id]["dia_actual"] = dia
         
-        # Solicitar la nueva franja horaria
-        markup = types.ReplyKeyboardMarkup(resize_keyboard=True, one_time_keyboard=True)
-        markup.add("🔙 Cancelar")
+        # Solicitar la nueva franja horaria editando el mismo mensaje
+        markup = teclado_inline_columna([("🔙 Cancelar", f"volver_gestion_{dia}")])
         
-        bot.send_message(
+        editar_o_enviar(
+            bot,
             chat_id,
             f"Introduce la franja horaria para *{dia}* en formato HH:MM-HH:MM\n"
             "Por ejemplo: 09:00-11:00",
-            reply_markup=markup,
-            parse_mode="Markdown"
+            call.message.message_id,
+            parse_mode="Markdown",
+            reply_markup=markup
         )
         
         set_state(chat_id, INTRODUCIR_FRANJA)
@@ -347,12 +351,11 @@ def register_handlers(bot):
             return
         
         # Mostrar botones para seleccionar la franja a eliminar
-        markup = types.InlineKeyboardMarkup(row_width=1)
-        for franja in user_data[chat_id]["horario"][dia]:
-            markup.add(types.InlineKeyboardButton(franja, callback_data=f"eliminar_{dia}_{franja}"))
+        botones = [(franja, f"eliminar_{dia}_{franja}") for franja in user_data[chat_id]["horario"][dia]]
         
         # Añadir botón de volver con callback_data específico para este día
-        markup.add(types.InlineKeyboardButton("🔙 Volver", callback_data=f"volver_gestion_{dia}"))
+        botones.append(("🔙 Volver", f"volver_gestion_{dia}"))
+        markup = teclado_inline_columna(botones)
         
         bot.edit_message_text(
             chat_id=chat_id,
@@ -379,12 +382,7 @@ def register_handlers(bot):
             mensaje = f"📅 *{dia}*\n\nNo hay franjas horarias configuradas para este día.\n\n¿Qué deseas hacer?"
         
         # Botones para gestionar franjas
-        markup = types.InlineKeyboardMarkup(row_width=1)
-        markup.add(
-            types.InlineKeyboardButton("➕ Añadir franja horaria", callback_data=f"add_franja_{dia}"),
-            types.InlineKeyboardButton("🗑️ Eliminar franja horaria", callback_data=f"del_franja_{dia}"),
-            types.InlineKeyboardButton("🔙 Volver a selección de días", callback_data="volver_dias")
-        )
+        markup = teclado_gestion_dia(dia)
         
         bot.edit_message_text(
             chat_id=chat_id,
@@ -472,42 +470,13 @@ def register_handlers(bot):
         texto = message.text.strip()
         dia = user_data[chat_id]["dia_actual"]
         
-        # Cancelar la acción
-        if texto == "🔙 Cancelar":
-            # En lugar de crear manualmente un CallbackQuery, simplemente muestra
-            # de nuevo las opciones del día seleccionado
-            # Preparar mensaje y opciones para gestionar franjas horarias
-            if dia in user_data[chat_id]["horario"] and user_data[chat_id]["horario"][dia]:
-                franjas = user_data[chat_id]["horario"][dia]
-                franjas_texto = "\n".join([f"• {franja}" for franja in franjas])
-                mensaje = f"📅 *{dia}*\n\nFranjas horarias configuradas:\n{franjas_texto}\n\n¿Qué deseas hacer?"
-            else:
-                mensaje = f"📅 *{dia}*\n\nNo hay franjas horarias configuradas para este día.\n\n¿Qué deseas hacer?"
-            
-            # Botones para gestionar franjas
-            markup = types.InlineKeyboardMarkup(row_width=1)
-            markup.add(
-                types.InlineKeyboardButton("➕ Añadir franja horaria", callback_data=f"add_franja_{dia}"),
-                types.InlineKeyboardButton("🗑️ Eliminar franja horaria", callback_data=f"del_franja_{dia}"),
-                types.InlineKeyboardButton("🔙 Volver a selección de días", callback_data="volver_dias")
-            )
-            
-            bot.send_message(
-                chat_id,
-                mensaje,
-                reply_markup=markup,
-                parse_mode="Markdown"
-            )
-            set_state(chat_id, GESTION_FRANJAS)
-            return
-        
         # Validar formato de la franja horaria
         if not re.match(r'^\d{1,2}:\d{2}-\d{1,2}:\d{2}$', texto):
             bot.send_message(
                 chat_id,
                 "⚠️ Formato incorrecto. Usa el formato HH:MM-HH:MM\n"
                 "Ejemplo: 09:00-11:30",
-                reply_markup=types.ReplyKeyboardRemove()
+                reply_markup=QUITAR_TECLADO
             )
             return
         
@@ -521,7 +490,7 @@ def register_handlers(bot):
                 bot.send_message(
                     chat_id,
                     "⚠️ Hora de inicio inválida. Debe estar entre 00:00 y 23:59.",
-                    reply_markup=types.ReplyKeyboardRemove()
+                    reply_markup=QUITAR_TECLADO
                 )
                 return
                 
@@ -529,7 +498,7 @@ def register_handlers(bot):
                 bot.send_message(
                     chat_id,
                     "⚠️ Hora de fin inválida. Debe estar entre 00:00 y 23:59.",
-                    reply_markup=types.ReplyKeyboardRemove()
+                    reply_markup=QUITAR_TECLADO
                 )
                 return
                 
@@ -537,7 +506,7 @@ def register_handlers(bot):
                 bot.send_message(
                     chat_id,
                     "⚠️ La hora de inicio debe ser anterior a la hora de fin.",
-                    reply_markup=types.ReplyKeyboardRemove()
+                    reply_markup=QUITAR_TECLADO
                 )
                 return
 
@@ -551,7 +520,7 @@ def register_handlers(bot):
                     chat_id,
                     f"⚠️ Ya tienes configurada la franja {texto} para {dia}.\n"
                     "Por favor, introduce una franja horaria diferente.",
-                    reply_markup=types.ReplyKeyboardRemove()
+                    reply_markup=QUITAR_TECLADO
                 )
                 return
             
@@ -561,32 +530,24 @@ def register_handlers(bot):
                     chat_id,
                     f"⚠️ La franja {texto} se solapa con otro horario existente para {dia}.\n"
                     "Por favor, introduce una franja horaria que no se solape.",
-                    reply_markup=types.ReplyKeyboardRemove()
+                    reply_markup=QUITAR_TECLADO
                 )
                 return
         
             # Añadir la franja al horario
             user_data[chat_id]["horario"][dia].append(texto)
             
-            # Enviar confirmación y opciones
-            bot.send_message(
-                chat_id,
-                f"✅ Franja {texto} añadida a {dia}",
-                parse_mode="Markdown",
-                reply_markup=types.ReplyKeyboardRemove()
-            )
+            # Enviar confirmación y opciones post-añadir en un solo mensaje
+            markup = teclado_inline_columna([
+                ("➕ Añadir otra franja", f"add_franja_{dia}"),
+                ("🔙 Volver a selección de días", "volver_dias"),
+                ("💾 Guardar todo el horario", "guardar_horario")
+            ])
             
-            # Opciones post-añadir
-            markup = types.InlineKeyboardMarkup(row_width=1)
-            markup.add(
-                types.InlineKeyboardButton("➕ Añadir otra franja", callback_data=f"add_franja_{dia}"),
-                types.InlineKeyboardButton("🔙 Volver a selección de días", callback_data="volver_dias"),
-                types.InlineKeyboardButton("💾 Guardar todo el horario", callback_data="guardar_horario")
-            )
-            
-            bot.send_message(
+            enviar_mensaje(
+                bot,
                 chat_id,
-                "¿Qué deseas hacer ahora?",
+                f"✅ Franja {texto} añadida a {dia}\n\n¿Qué deseas hacer ahora?",
                 reply_markup=markup
             )
             
@@ -596,7 +557,7 @@ def register_handlers(bot):
             bot.send_message(
                 chat_id,
                 f"⚠️ Error en el formato de hora: {e}",
-                reply_markup=types.ReplyKeyboardRemove()
+                reply_markup=QUITAR_TECLADO
             )
             return
 
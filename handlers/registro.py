@@ -4,11 +4,8 @@ import re
 import sys
 import os
 import time
-import random
 import logging
 from datetime import datetime
-from email.message import EmailMessage
-import smtplib
 from pathlib import Path
 
 # Añadir directorio raíz al path para resolver importaciones
@@ -19,37 +16,39 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # Importar módulos necesarios
 from utils.excel_manager import buscar_usuario_por_email, cargar_excel, verificar_email_en_excel, importar_datos_por_email
-import pandas as pd
+from utils.logs import evento
+from utils.correo import enviar_correo
+from utils.plantillas_correo import PLANTILLA_VERIFICACION
+from config import TOKEN_BLOQUEO, TOKEN_VALIDEZ
 from db.queries import (
     get_user_by_telegram_id, 
-    create_user, 
-    crear_matricula,  
-    get_db_connection,
-    update_user,
-    get_o_crear_carrera
+    registrar_usuario,
+    get_db_connection
 )
 
 # Añadir al inicio del archivo
 from utils.state_manager import get_state, set_state, clear_state, user_data, user_states, estados_timestamp
 
-# Variables para seguridad de token
-token_intentos_fallidos = {}  # {chat_id: número de intentos}
-token_bloqueados = {}  # {chat_id: tiempo de desbloqueo}
-token_usados = set()  # Conjunto de tokens ya utilizados
+# Códigos de verificación: caducidad, intentos fallidos, límite de envíos y bloqueos
+from utils.tokens_verificacion import almacen as tokens, VALIDO, CADUCADO, BLOQUEADO
 
 # Estados del proceso de registro
 STATE_EMAIL = "registro_email"
 STATE_VERIFY_TOKEN = "registro_verificacion"
 STATE_CONFIRMAR_DATOS = "confirmando_datos_excel"
 
-# Configurar logger
-logger = logging.getLogger("registro")
-if not logger.handlers:
-    handler = logging.FileHandler("registro.log")
-    formatter = logging.Formatter('%(asctime)s [%(levelname)s] %(message)s')
-    handler.setFormatter(formatter)
-    logger.addHandler(handler)
-    logger.setLevel(logging.INFO)
+# Validez del código en minutos, para el mensaje y el correo
+MINUTOS_VALIDEZ = max(1, round(TOKEN_VALIDEZ / 60))
+
+# Configurar logger (los manejadores los pone utils.logs al arrancar el bot)
+logger = logging.getLogger(__name__)
+
+# Formato de correo aceptado (antes solo institucional: r'.+@(correo\.)?ugr\.es$')
+RE_EMAIL = re.compile(r'^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$')
+
+def is_valid_email(email):
+    """Verifica si el correo es válido (institucional UGR)"""
+    return RE_EMAIL.match(email) is not None
 
 def register_handlers(bot):
     """Registra todos los handlers del proceso de registro"""
@@ -76,74 +75,79 @@ def register_handlers(bot):
         user = get_user_by_telegram_id(chat_id)
         return user is not None
     
-    def send_verification_email(email, token):
-        """Envía un correo electrónico con el token de verificación"""
-        # Cargar credenciales sin valores predeterminados para datos sensibles
-        smtp_server = os.getenv("SMTP_SERVER")
-        sender_email = os.getenv("SMTP_EMAIL")
-        password = os.getenv("SMTP_PASSWORD")
-        
-        # Verificar todas las credenciales necesarias
-        if not all([smtp_server, sender_email, password]):
-            missing = []
-            if not smtp_server: missing.append("SMTP_SERVER")
-            if not sender_email: missing.append("SMTP_EMAIL")  
-            if not password: missing.append("SMTP_PASSWORD")
-            logger.error(f"Faltan credenciales en datos.env.txt: {', '.join(missing)}")
+    def rechazar_bloqueado(chat_id, email=None):
+        """
+        Corta el registro si el chat o el correo están bloqueados.
+
+        Solo se avisa la primera vez; después los mensajes se ignoran sin más.
+        """
+        restante, avisar = tokens.bloqueo(chat_id, email)
+        if not restante:
             return False
-        
-        msg = EmailMessage()
-        msg["From"] = sender_email
-        msg["To"] = email
-        msg["Subject"] = "Token tutorChatBot"
-        
-        # Create a more attractive HTML email
-        html_content = f"""
-        <html>
-        <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333; max-width: 600px; margin: 0 auto; padding: 20px;">
-            <div style="background-color: #0066cc; color: white; padding: 15px; text-align: center; border-radius: 5px 5px 0 0;">
-                <h2>Verificación de Asistente de Tutorías</h2>
-            </div>
-            <div style="padding: 20px; border: 1px solid #ddd; border-top: none; border-radius: 0 0 5px 5px;">
-                <p>Hola,</p>
-                <p>Gracias por registrarte en el <strong>Asistente de Tutorías</strong>. Para completar tu registro, utiliza el siguiente código de verificación:</p>
-                <div style="background-color: #f5f5f5; padding: 15px; text-align: center; font-size: 24px; font-weight: bold; letter-spacing: 5px; margin: 20px 0; border-radius: 5px;">
-                    {token}
-                </div>
-                <p>Este código es válido durante <strong>3 minutos</strong>. Si no has solicitado este código, puedes ignorar este correo.</p>
-                <p>Saludos,<br>El equipo del Asistente de Tutorías</p>
-            </div>
-            <div style="text-align: center; font-size: 12px; color: #777; margin-top: 20px;">
-                <p>Este es un correo automático, por favor no respondas a este mensaje.</p>
-            </div>
-        </body>
-        </html>
+        if avisar:
+            bot.send_message(
+                chat_id,
+                f"⛔ Tu cuenta está bloqueada temporalmente.\n"
+                f"Debes esperar {max(1, round(restante / 60))} minutos antes de intentarlo de nuevo.",
+                reply_markup=telebot.types.ReplyKeyboardRemove()
+            )
+        clear_state(chat_id)
+        return True
+    
+    def send_verification_email(chat_id, email, token):
         """
-        msg.set_content("Tu código de verificación es: " + token)
-        msg.add_alternative(html_content, subtype='html')
+        Encola el correo con el token de verificación.
 
-        try:
-            with smtplib.SMTP(str(smtp_server), 587) as server:
-                server.ehlo()
-                server.starttls()
-                # Add explicit type assertion since we've already validated these aren't None
-                server.login(str(sender_email), str(password))
-                server.send_message(msg)
+        El envío se hace en segundo plano (utils.correo); cuando el servidor
+        SMTP lo acepta se pide el código al usuario y, si falla, se le avisa
+        y se reinicia el registro.
+        """
+        # Plantilla precompilada: solo se codifican el destinatario y el token
+        msg = PLANTILLA_VERIFICACION.render(email, token=token, minutos=MINUTOS_VALIDEZ)
+
+        def al_terminar(error):
+            # El usuario puede haber cancelado o pedido otro código mientras tanto
+            if tokens.pendiente(chat_id) != token:
+                return
             
-            # También registramos el token en el log/consola para desarrollo
-            logger.info(f"TOKEN DE VERIFICACIÓN enviado a {email}: {token}")
-            print(f"TOKEN DE VERIFICACIÓN enviado a {email}: {token}")
-            return True
-        except Exception as e:
-            logger.error(f"Error en el envío del correo a {email}: {e}")
-            print(f"Error en el envío del correo: {e}")
-            return False
+            if error is not None:
+                tokens.descartar(chat_id)
+                bot.send_message(
+                    chat_id, 
+                    "❌ *Error al enviar el código de verificación*\n\n"
+                    "No ha sido posible enviar el email con tu código.\n"
+                    "Por favor, intenta nuevamente más tarde o contacta con soporte.\n\n"
+                    "_Para desarrollo: revisa los logs y la configuración SMTP._",
+                    parse_mode="Markdown"
+                )
+                clear_state(chat_id)
+                return
+            
+            evento(logger, "código de verificación enviado", logging.INFO, email=email)
+            # El código solo aparece en el log con DEBUG activo (para desarrollo)
+            evento(logger, "código de verificación", email=email, token=token)
+            
+            # La validez (TOKEN_VALIDEZ) cuenta desde que el correo ha salido
+            if not tokens.renovar(chat_id, token):
+                return
+            
+            # Botón para cancelar
+            markup = types.InlineKeyboardMarkup()
+            markup.add(types.InlineKeyboardButton("❌ Cancelar", callback_data="cancelar_registro"))
+            
+            bot.send_message(
+                chat_id, 
+                "🔑 *Verificación de Cuenta*\n\n"
+                "Se ha enviado un código de 6 dígitos a tu correo.\n"
+                "Por favor, introduce el código que has recibido.\n\n"
+                f"⏱️ *El código expirará en {MINUTOS_VALIDEZ} minutos*\n\n"
+                "_Si no lo recibes, verifica tu carpeta de spam._",
+                parse_mode="Markdown",
+                reply_markup=markup
+            )
+
+        enviar_correo(msg, al_terminar)
 
-    def is_valid_email(email):
-        """Verifica si el correo es válido (institucional UGR)"""
-        #return re.match(r'.+@(correo\.)?ugr\.es$', email) is not None
-        return re.match(r'^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$', email) is not None
-    
     def verificar_correo_en_bd(email):
         """Verifica si el correo existe en la tabla Usuarios de la base de datos"""
         conn = get_db_connection()
@@ -162,45 +166,18 @@ def register_handlers(bot):
     def completar_registro(chat_id):
         """Completa el registro del usuario"""
         try:
-            # Crear usuario
-            user_id = create_user(
+            # Usuario, carrera, matrículas y asignaturas-carrera en una sola transacción
+            registrar_usuario(
                 nombre=user_data[chat_id]['nombre'],
                 apellidos=user_data[chat_id]['apellidos'],
                 tipo=user_data[chat_id]['tipo'],
                 email=user_data[chat_id]['email'],
                 telegram_id=chat_id,
                 dni=user_data[chat_id].get('dni', ''),
-                carrera=user_data[chat_id].get('carrera', '')
+                carrera=user_data[chat_id].get('carrera', ''),
+                asignaturas_ids=user_data[chat_id].get('asignaturas_seleccionadas', [])
             )
             
-            # Actualizar el campo carrera en la tabla usuarios
-            update_user(user_id, Carrera=user_data[chat_id].get('carrera', ''))
-            
-            # Obtener o crear la carrera en la tabla Carreras
-            carrera_id = get_o_crear_carrera(user_data[chat_id].get('carrera', 'General'))
-            
-            # Para estudiantes, crear matrículas
-            if user_data[chat_id]['tipo'] == 'estudiante':
-                for asignatura_id in user_data[chat_id].get('asignaturas_seleccionadas', []):
-                    crear_matricula(user_id, asignatura_id)
-                    # Asegurarse de que la asignatura esté asociada a la carrera
-                    cursor = get_db_connection().cursor()
-                    cursor.execute("UPDATE Asignaturas SET Id_carrera = ? WHERE Id_asignatura = ? AND Id_carrera IS NULL", 
-                                  (carrera_id, asignatura_id))
-                    cursor.connection.commit()
-                    cursor.connection.close()
-                    
-            # Para profesores, crear asignaturas impartidas
-            elif user_data[chat_id]['tipo'] == 'profesor':
-                for asignatura_id in user_data[chat_id].get('asignaturas_seleccionadas', []):
-                    crear_matricula(user_id, asignatura_id, 'profesor')
-                    # Asegurarse de que la asignatura esté asociada a la carrera
-                    cursor = get_db_connection().cursor()
-                    cursor.execute("UPDATE Asignaturas SET Id_carrera = ? WHERE Id_asignatura = ? AND Id_carrera IS NULL", 
-                                  (carrera_id, asignatura_id))
-                    cursor.connection.commit()
-                    cursor.connection.close()
-        
             # Llamar a la función para enviar mensaje de bienvenida
             tipo = user_data[chat_id]['tipo']
             handle_registration_completion(chat_id, tipo)
@@ -282,22 +259,9 @@ def register_handlers(bot):
         chat_id = message.chat.id
         text = message.text.strip()
         
-        # Comprobar si está bloqueado
-        if chat_id in token_bloqueados:
-            if time.time() < token_bloqueados[chat_id]:
-                tiempo_restante = int((token_bloqueados[chat_id] - time.time()) / 60)
-                bot.send_message(
-                    chat_id,
-                    f"⛔ Tu cuenta está bloqueada temporalmente.\n"
-                    f"Debes esperar {tiempo_restante} minutos antes de intentarlo de nuevo.",
-                    reply_markup=telebot.types.ReplyKeyboardRemove()
-                )
-                return
-            else:
-                # Ya pasó el tiempo de bloqueo
-                del token_bloqueados[chat_id]
-                if chat_id in token_intentos_fallidos:
-                    del token_intentos_fallidos[chat_id]
+        # Comprobar si está bloqueado (sin consultar la BD ni enviar correos)
+        if rechazar_bloqueado(chat_id):
+            return
         
         # Validar el email
         email = text.lower()
@@ -311,6 +275,9 @@ def register_handlers(bot):
             )
             return
         
+        if rechazar_bloqueado(chat_id, email):
+            return
+        
         # 2. Verificar si el correo existe en la tabla Usuarios
         if not verificar_correo_en_bd(email):
             bot.send_message(
@@ -332,46 +299,28 @@ def register_handlers(bot):
             clear_state(chat_id)
             return
         
+        # Generar token seguro de 6 dígitos (si no ha pedido demasiados)
+        token, espera = tokens.emitir(chat_id, email)
+        if token is None:
+            bot.send_message(
+                chat_id,
+                f"⏳ Has solicitado demasiados códigos.\n"
+                f"Podrás pedir otro dentro de {max(1, round(espera / 60))} minutos."
+            )
+            return
+        
         # Guardar el email
         user_data[chat_id]["email"] = email
         
-        # Generar token seguro de 6 dígitos
-        token = str(random.randint(100000, 999999))
-        user_data[chat_id]["token"] = token
-        user_data[chat_id]["token_expiry"] = time.time() + 180  # Token válido por 3 minutos
-        
         # Determinar tipo de usuario por el correo
         es_estudiante = email.endswith("@correo.ugr.es")
         user_data[chat_id]["tipo"] = "estudiante" if es_estudiante else "profesor"
         
-        # Enviar token de verificación
-        if send_verification_email(email, token):
-            # Botón para cancelar
-            markup = types.InlineKeyboardMarkup()
-            markup.add(types.InlineKeyboardButton("❌ Cancelar", callback_data="cancelar_registro"))
-            
-            bot.send_message(
-                chat_id, 
-                "🔑 *Verificación de Cuenta*\n\n"
-                "Se ha enviado un código de 6 dígitos a tu correo.\n"
-                "Por favor, introduce el código que has recibido.\n\n"
-                "⏱️ *El código expirará en 3 minutos*\n\n"
-                "_Si no lo recibes, verifica tu carpeta de spam._",
-                parse_mode="Markdown",
-                reply_markup=markup
-            )
-            user_states[chat_id] = STATE_VERIFY_TOKEN
-            estados_timestamp[chat_id] = time.time()
-        else:
-            bot.send_message(
-                chat_id, 
-                "❌ *Error al enviar el código de verificación*\n\n"
-                "No ha sido posible enviar el email con tu código.\n"
-                "Por favor, intenta nuevamente más tarde o contacta con soporte.\n\n"
-                "_Para desarrollo: revisa los logs y la configuración SMTP._",
-                parse_mode="Markdown"
-            )
-            clear_state(chat_id)
+        # Enviar token de verificación en segundo plano: el código se pide al
+        # usuario cuando el servidor de correo confirma el envío
+        user_states[chat_id] = STATE_VERIFY_TOKEN
+        estados_timestamp[chat_id] = time.time()
+        send_verification_email(chat_id, email, token)
 
     def mostrar_menu_principal(message):
         """Muestra el menú principal según el tipo de usuario"""
@@ -416,21 +365,28 @@ def register_handlers(bot):
         chat_id = message.chat.id
         token_ingresado = message.text.strip()
         
+        if rechazar_bloqueado(chat_id):
+            return
+        
         # Validar el token
-        es_valido = False
-        if chat_id in user_data and "token" in user_data[chat_id]:
-            token_almacenado = user_data[chat_id].get("token")
-            token_expiry = user_data[chat_id].get("token_expiry", 0)
-            
-            if token_ingresado == token_almacenado and time.time() < token_expiry:
-                es_valido = True
-            elif time.time() >= token_expiry:
-                bot.send_message(chat_id, "⚠️ El código ha expirado. Por favor, solicita uno nuevo con /start")
-                clear_state(chat_id)
-                return
-            else:
-                bot.send_message(chat_id, "❌ Código incorrecto. Inténtalo de nuevo o cancela con /cancelar")
-                return
+        resultado, _ = tokens.verificar(chat_id, token_ingresado)
+        if resultado == CADUCADO:
+            bot.send_message(chat_id, "⚠️ El código ha expirado. Por favor, solicita uno nuevo con /start")
+            clear_state(chat_id)
+            return
+        if resultado == BLOQUEADO:
+            bot.send_message(
+                chat_id,
+                "⛔ Demasiados códigos incorrectos.\n"
+                f"Debes esperar {max(1, round(TOKEN_BLOQUEO / 60))} minutos antes de intentarlo de nuevo.",
+                reply_markup=telebot.types.ReplyKeyboardRemove()
+            )
+            clear_state(chat_id)
+            return
+        es_valido = resultado == VALIDO
+        if not es_valido:
+            bot.send_message(chat_id, "❌ Código incorrecto. Inténtalo de nuevo o cancela con /cancelar")
+            return
     
         if es_valido:
             try:
@@ -475,6 +431,7 @@ def register_handlers(bot):
     def handle_cancelar_registro(call):
         """Cancela el proceso de registro"""
         chat_id = call.message.chat.id
+        tokens.descartar(chat_id)
         
         bot.send_message(
             chat_id, 
@@ -21,28 +21,19 @@ from db.queries import (
     get_db_connection,
     get_matriculas_usuario,
     get_profesores_asignatura,
-    get_salas_profesor_asignatura
+    get_salas_profesor_asignatura,
+    get_valoraciones_agregadas,
+    solicitar_tutoria,
+    cancelar_solicitud,
+    get_solicitudes_pendientes,
+    resolver_solicitudes
 )
-
-# Añadir la función directamente en este archivo
-def escape_markdown(text: str) -> str:
-    """Escapa caracteres especiales de Markdown para evitar errores de formato"""
-    if not text:
-        return ""
-        
-    # Caracteres que necesitan escape en Markdown
-    markdown_chars = ['_', '*', '`', '[', ']', '(', ')', '#', '+', '-', '.', '!']
-    
-    # Reemplazar cada caracter especial con su versión escapada
-    result = text
-    for char in markdown_chars:
-        result = result.replace(char, '\\' + char)
-        
-    return result
-
-
-
-
+from config import SOLICITUDES_POR_MENSAJE
+from utils.respuestas import enviar_mensaje, editar_o_enviar, agrupar_mensajes
+from utils.teclados import teclado_inline
+from utils.markdown import escape_markdown
+from utils.cola_mensajes import encolar_mensaje, avisar_despachador
+from utils.logs import evento
 
 
 # Referencias externas necesarias
@@ -59,50 +50,26 @@ def register_handlers(bot):
         chat_id = message.chat.id
         user_id = message.from_user.id
         
-        print(f"\n### INICIO COMANDO TUTORIA ###")
-        print(f"Usuario ID: {user_id}, Chat ID: {chat_id}")
+        evento(logger, "inicio", handler="tutoria", user_id=user_id, chat_id=chat_id)
         
         # Obtener información del usuario
         user = get_user_by_telegram_id(user_id)
         
-        # Diagnóstico: Verificar si hay salas en la base de datos
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Contar todas las salas
-        cursor.execute("SELECT COUNT(*) as total FROM Grupos_tutoria")
-        total_salas = cursor.fetchone()['total']
-        print(f"Total de salas en la BD: {total_salas}")
-        
-        # Mostrar detalles de algunas salas para diagnóstico
-        if total_salas > 0:
-            cursor.execute("""
-                SELECT 
-                    g.id_sala, g.Id_usuario, g.Nombre_sala, g.Proposito_sala, 
-                    g.Tipo_sala, g.Id_asignatura, a.Nombre as NombreAsignatura
-                FROM Grupos_tutoria g
-                LEFT JOIN Asignaturas a ON g.Id_asignatura = a.Id_asignatura
-                LIMIT 5
-            """)
-            
-            print("Primeras 5 salas en la BD:")
-            for sala in cursor.fetchall():
-                print(f"  - ID: {sala['id_sala']}, Nombre: {sala['Nombre_sala']}")
-                print(f"    Profesor: {sala['Id_usuario']}, Asignatura: {sala['Id_asignatura']} ({sala['NombreAsignatura']})")
-                print(f"    Tipo: {sala['Tipo_sala']}, Propósito: {sala['Proposito_sala']}")
-                print("    ---")
+        # Diagnóstico de las salas (solo si se van a escribir las trazas DEBUG)
+        if logger.isEnabledFor(logging.DEBUG):
+            diagnostico_salas()
         
         if not user:
             bot.send_message(chat_id, "❌ No estás registrado. Usa /start para registrarte.")
-            print("❌ Usuario no registrado")
+            logger.debug("Usuario no registrado")
             return
         
         if user['Tipo'] != 'estudiante':
             bot.send_message(chat_id, "⚠️ Esta funcionalidad está disponible solo para estudiantes.")
-            print("⚠️ Usuario no es estudiante")
+            logger.debug("Usuario no es estudiante")
             return
         
-        print(f"✅ Estudiante: {user['Nombre']} {user['Apellidos'] or ''}")
+        logger.debug("Estudiante: %s %s", user['Nombre'], user['Apellidos'] or '')
         
         # Obtener las asignaturas del estudiante
         conn = get_db_connection()
@@ -120,10 +87,10 @@ def register_handlers(bot):
         if not asignaturas:
             bot.send_message(chat_id, "❌ No estás matriculado en ninguna asignatura.")
             conn.close()
-            print("❌ Estudiante sin asignaturas")
+            logger.debug("Estudiante sin asignaturas")
             return
         
-        print(f"✅ Asignaturas encontradas: {len(asignaturas)}")
+        logger.debug("Asignaturas encontradas: %s", len(asignaturas))
         
         # Obtener IDs de asignaturas para usar en consultas
         asignaturas_ids = [a['Id_asignatura'] for a in asignaturas]
@@ -159,7 +126,7 @@ def register_handlers(bot):
         """, asignaturas_ids + asignaturas_ids)
         
         profesores_raw = cursor.fetchall()
-        print(f"✅ Profesores encontrados: {len(profesores_raw)}")
+        logger.debug("Profesores encontrados: %s", len(profesores_raw))
         
         # Convertir a diccionario para facilitar el acceso
         profesores = {}
@@ -235,7 +202,7 @@ def register_handlers(bot):
             """, (profesor_id,))
             
             salas = cursor.fetchall()
-            print(f"Encontradas {len(salas)} salas para el profesor {profesor_id}")
+            logger.debug("Encontradas %s salas para el profesor %s", len(salas), profesor_id)
             
             # Clasificar las salas por asignatura
             for sala in salas:
@@ -255,15 +222,15 @@ def register_handlers(bot):
                     # Verificar que la asignatura existe en el diccionario del profesor
                     if asignatura_id in profesores[profesor_id]['asignaturas']:
                         profesores[profesor_id]['asignaturas'][asignatura_id]['salas'].append(sala_data)
-                        print(f"Asignada sala '{sala['Nombre_sala']}' a asignatura ID {asignatura_id}")
+                        logger.debug("Asignada sala '%s' a asignatura ID %s", sala['Nombre_sala'], asignatura_id)
                     else:
                         # Si por alguna razón la asignatura no está en el diccionario, asignar a general
                         profesores[profesor_id]['asignaturas']['general']['salas'].append(sala_data)
-                        print(f"Sala '{sala['Nombre_sala']}' asignada a 'general' (asignatura ID {asignatura_id} no encontrada)")
+                        logger.debug("Sala '%s' asignada a 'general' (asignatura ID %s no encontrada)", sala['Nombre_sala'], asignatura_id)
                 else:
                     # Si la sala no tiene asignatura, agregarla a la categoría "general"
                     profesores[profesor_id]['asignaturas']['general']['salas'].append(sala_data)
-                    print(f"Sala '{sala['Nombre_sala']}' asignada a 'general' (sin asignatura asociada)")
+                    logger.debug("Sala '%s' asignada a 'general' (sin asignatura asociada)", sala['Nombre_sala'])
 
         conn.close()
         
@@ -272,128 +239,133 @@ def register_handlers(bot):
             bot.send_message(chat_id, "❌ No se encontraron profesores para tus asignaturas.")
             return
         
+        # Valoraciones medias de todos los profesores del listado en una sola lectura
+        valoraciones = get_valoraciones_agregadas(list(profesores))
+        
         # Mejorar la parte que genera el mensaje y muestra las salas
-        for profesor_id, prof_info in profesores.items():
-            # Sección del profesor
-            mensaje = f"👨‍🏫 *Profesor: {escape_markdown(prof_info['nombre'])}*\n"
-            mensaje += f"📧 Email: {escape_markdown(prof_info['email'])}\n"
-            mensaje += f"🕗 Horario: {escape_markdown(prof_info['horario'])}\n\n"
-            
-            markup = types.InlineKeyboardMarkup()  # Crear markup para botones
-            
-            # Recopilar todas las salas del profesor desde todas las asignaturas
-            todas_las_salas = []
-            for asignatura_id, asignatura in prof_info['asignaturas'].items():
-                if 'salas' in asignatura:
-                    for sala in asignatura['salas']:
-                        sala['asignatura_id'] = asignatura_id
-                        sala['asignatura_nombre'] = asignatura['nombre']
-                        todas_las_salas.append(sala)
-            
-            print(f"Total salas para profesor {profesor_id}: {len(todas_las_salas)}")
-            
-            # Primero mostrar las asignaturas que imparte
-            mensaje += "📚 *Asignaturas:*\n"
-            
-            # Variable para controlar si hay salas privadas
-            salas_privadas = []
-            
-            for asignatura_id, asignatura in prof_info['asignaturas'].items():
-                if asignatura_id != 'general':  # Solo las asignaturas regulares, no la categoría "general"
-                    nombre = escape_markdown(asignatura['nombre'])
-                    codigo = asignatura.get('codigo', '') or ''
+        # Los profesores sin tutoría privada se agrupan en un solo mensaje
+        with agrupar_mensajes(bot, chat_id):
+            for profesor_id, prof_info in profesores.items():
+                # Sección del profesor
+                mensaje = f"👨‍🏫 *Profesor: {escape_markdown(prof_info['nombre'])}*\n"
+                mensaje += f"📧 Email: {escape_markdown(prof_info['email'])}\n"
+                mensaje += f"🕗 Horario: {escape_markdown(prof_info['horario'])}\n"
+                if profesor_id in valoraciones:
+                    valoracion = valoraciones[profesor_id]
+                    mensaje += f"⭐ Valoración: {valoracion['media']:.1f}/5 ({valoracion['total']} valoraciones)\n"
+                mensaje += "\n"
+            
+                markup = types.InlineKeyboardMarkup()  # Crear markup para botones
+            
+                # Recopilar todas las salas del profesor desde todas las asignaturas
+                todas_las_salas = []
+                for asignatura_id, asignatura in prof_info['asignaturas'].items():
+                    if 'salas' in asignatura:
+                        for sala in asignatura['salas']:
+                            sala['asignatura_id'] = asignatura_id
+                            sala['asignatura_nombre'] = asignatura['nombre']
+                            todas_las_salas.append(sala)
+            
+                logger.debug("Total salas para profesor %s: %s", profesor_id, len(todas_las_salas))
+            
+                # Primero mostrar las asignaturas que imparte
+                mensaje += "📚 *Asignaturas:*\n"
+            
+                # Variable para controlar si hay salas privadas
+                salas_privadas = []
+            
+                for asignatura_id, asignatura in prof_info['asignaturas'].items():
+                    if asignatura_id != 'general':  # Solo las asignaturas regulares, no la categoría "general"
+                        nombre = escape_markdown(asignatura['nombre'])
+                        codigo = asignatura.get('codigo', '') or ''
                     
-                    # Mostrar información de la asignatura
-                    mensaje += f"• {nombre}"
-                    if codigo:
-                        mensaje += f" ({codigo})"
-                    mensaje += "\n"
+                        # Mostrar información de la asignatura
+                        mensaje += f"• {nombre}"
+                        if codigo:
+                            mensaje += f" ({codigo})"
+                        mensaje += "\n"
                     
-                    # Filtrar salas para esta asignatura específica
-                    salas_asignatura = [s for s in asignatura.get('salas', []) if s['tipo'].lower() != 'privada']
+                        # Filtrar salas para esta asignatura específica
+                        salas_asignatura = [s for s in asignatura.get('salas', []) if s['tipo'].lower() != 'privada']
                     
-                    # Guardar salas privadas para mostrarlas al final
-                    salas_privadas.extend([s for s in asignatura.get('salas', []) if s['tipo'].lower() == 'privada'])
+                        # Guardar salas privadas para mostrarlas al final
+                        salas_privadas.extend([s for s in asignatura.get('salas', []) if s['tipo'].lower() == 'privada'])
                     
-                    # Mostrar salas de esta asignatura
-                    if salas_asignatura:
-                        for sala in salas_asignatura:
-                            proposito = sala.get('proposito', '').lower() if sala.get('proposito') else 'general'
-                            nombre_sala = escape_markdown(sala.get('nombre', 'Sala sin nombre'))
+                        # Mostrar salas de esta asignatura
+                        if salas_asignatura:
+                            for sala in salas_asignatura:
+                                proposito = sala.get('proposito', '').lower() if sala.get('proposito') else 'general'
+                                nombre_sala = escape_markdown(sala.get('nombre', 'Sala sin nombre'))
                             
-                            # Seleccionar emoji según el propósito
-                            emoji = "📢" if proposito == 'avisos' else "👥" if proposito == 'grupal' else "🔵"
+                                # Seleccionar emoji según el propósito
+                                emoji = "📢" if proposito == 'avisos' else "👥" if proposito == 'grupal' else "🔵"
                             
-                            # Mostrar como hipervínculo si tiene enlace
-                            if sala.get('enlace'):
-                                mensaje += f"  {emoji} [{nombre_sala}]({sala['enlace']})\n"
-                            else:
-                                mensaje += f"  {emoji} {nombre_sala} (sin enlace disponible)\n"
-                    else:
-                        mensaje += f"  ℹ️ No hay salas disponibles para esta asignatura\n"
+                                # Mostrar como hipervínculo si tiene enlace
+                                if sala.get('enlace'):
+                                    mensaje += f"  {emoji} [{nombre_sala}]({sala['enlace']})\n"
+                                else:
+                                    mensaje += f"  {emoji} {nombre_sala} (sin enlace disponible)\n"
+                        else:
+                            mensaje += f"  ℹ️ No hay salas disponibles para esta asignatura\n"
                     
-                    mensaje += "\n"  # Espacio entre asignaturas
+                        mensaje += "\n"  # Espacio entre asignaturas
     
-            # Mostrar salas de la categoría "general" si existen
-            salas_generales = prof_info['asignaturas'].get('general', {}).get('salas', [])
-            salas_generales_no_privadas = [s for s in salas_generales if s['tipo'].lower() != 'privada']
-            
-            # Añadir salas privadas de la categoría general
-            salas_privadas.extend([s for s in salas_generales if s['tipo'].lower() == 'privada'])
-            
-            # Mostrar salas generales si existen
-            if salas_generales_no_privadas:
-                mensaje += "🌐 *Salas Generales:*\n"
-                for sala in salas_generales_no_privadas:
-                    proposito = sala.get('proposito', '').lower() if sala.get('proposito') else 'general'
-                    nombre_sala = escape_markdown(sala.get('nombre', 'Sala sin nombre'))
+                # Mostrar salas de la categoría "general" si existen
+                salas_generales = prof_info['asignaturas'].get('general', {}).get('salas', [])
+                salas_generales_no_privadas = [s for s in salas_generales if s['tipo'].lower() != 'privada']
+            
+                # Añadir salas privadas de la categoría general
+                salas_privadas.extend([s for s in salas_generales if s['tipo'].lower() == 'privada'])
+            
+                # Mostrar salas generales si existen
+                if salas_generales_no_privadas:
+                    mensaje += "🌐 *Salas Generales:*\n"
+                    for sala in salas_generales_no_privadas:
+                        proposito = sala.get('proposito', '').lower() if sala.get('proposito') else 'general'
+                        nombre_sala = escape_markdown(sala.get('nombre', 'Sala sin nombre'))
                     
-                    # Seleccionar emoji según el propósito
-                    emoji = "📢" if proposito == 'avisos' else "👥" if proposito == 'grupal' else "🔵"
+                        # Seleccionar emoji según el propósito
+                        emoji = "📢" if proposito == 'avisos' else "👥" if proposito == 'grupal' else "🔵"
                     
-                    # Mostrar como hipervínculo si tiene enlace
-                    if sala.get('enlace'):
-                        mensaje += f"  {emoji} [{nombre_sala}]({sala['enlace']})\n"
-                    else:
-                        mensaje += f"  {emoji} {nombre_sala} (sin enlace disponible)\n"
+                        # Mostrar como hipervínculo si tiene enlace
+                        if sala.get('enlace'):
+                            mensaje += f"  {emoji} [{nombre_sala}]({sala['enlace']})\n"
+                        else:
+                            mensaje += f"  {emoji} {nombre_sala} (sin enlace disponible)\n"
                 
-                mensaje += "\n"  # Espacio después de salas generales
+                    mensaje += "\n"  # Espacio después de salas generales
             
-            # Mostrar salas privadas separadamente (de todas las asignaturas) si existen
-            if salas_privadas:
-                primera_privada = salas_privadas[0]
-                mensaje += f"🔐 *Tutoría Privada*\n"
-                
-                # Enviar mensaje primero para que aparezca el texto
-                bot.send_message(
-                    chat_id,
-                    mensaje,
-                    parse_mode="Markdown",
-                    disable_web_page_preview=True
-                )
-                mensaje = ""  # Reiniciar mensaje
+                # Mostrar salas privadas separadamente (de todas las asignaturas) si existen
+                if salas_privadas:
+                    primera_privada = salas_privadas[0]
+                    mensaje += f"🔐 *Tutoría Privada*\n"
+                    mensaje += "Haz clic en el botón para solicitar acceso:"
                 
-                # Enviar botón en mensaje separado
-                markup = types.InlineKeyboardMarkup()
-                markup.add(types.InlineKeyboardButton(
-                    "🔒 Solicitar acceso a tutoría privada", 
-                    callback_data=f"solicitar_sala_{primera_privada['id']}_{profesor_id}"
-                ))
+                    # El botón va en el mismo mensaje que el texto del profesor
+                    markup = types.InlineKeyboardMarkup()
+                    markup.add(types.InlineKeyboardButton(
+                        "🔒 Solicitar acceso a tutoría privada", 
+                        callback_data=f"solicitar_sala_{primera_privada['id']}_{profesor_id}"
+                    ))
                 
-                bot.send_message(
-                    chat_id,
-                    "Haz clic en el botón para solicitar acceso:",
-                    reply_markup=markup
-                )
-            else:
-                # Enviar mensaje solo si hay contenido y no hay salas privadas
-                if mensaje.strip():
-                    bot.send_message(
+                    enviar_mensaje(
+                        bot,
                         chat_id,
                         mensaje,
                         parse_mode="Markdown",
+                        reply_markup=markup,
                         disable_web_page_preview=True
                     )
+                else:
+                    # Enviar mensaje solo si hay contenido y no hay salas privadas
+                    if mensaje.strip():
+                        enviar_mensaje(
+                            bot,
+                            chat_id,
+                            mensaje,
+                            parse_mode="Markdown",
+                            disable_web_page_preview=True
+                        )
             
     # Aquí añadimos el resto de handlers para tutorias
     
@@ -403,9 +375,7 @@ def register_handlers(bot):
         chat_id = call.message.chat.id
         user_id = call.from_user.id
         
-        print(f"\n### INICIO SOLICITAR_SALA ###")
-        print(f"Chat ID: {chat_id}, User ID: {user_id}")
-        print(f"Callback data: {call.data}")
+        evento(logger, "inicio", handler="solicitar_sala", chat_id=chat_id, user_id=user_id, callback=call.data)
         
         try:
             # Extraer IDs de la sala y profesor del callback_data
@@ -449,11 +419,11 @@ def register_handlers(bot):
                 return
                 
             # 3. Verificar si estamos en horario de tutoría del profesor
-            print(f"Verificando horario de tutoría para profesor_id={profesor_id}")
-            print(f"Horario del profesor: {sala['HorarioProfesor']}")
+            logger.debug("Verificando horario de tutoría para profesor_id=%s", profesor_id)
+            logger.debug("Horario del profesor: %s", sala['HorarioProfesor'])
             
             es_horario_tutoria = verificar_horario_tutoria(sala['HorarioProfesor'])
-            print(f"¿Está en horario de tutoría? {es_horario_tutoria}")
+            logger.debug("¿Está en horario de tutoría? %s", es_horario_tutoria)
             
             if not es_horario_tutoria:
                 # No estamos en horario de tutoría
@@ -471,7 +441,32 @@ def register_handlers(bot):
                 )
                 return
             
-            # 4. Estamos en horario de tutoría, enviar notificación al profesor
+            # 4. Registrar la solicitud (una sola pendiente por estudiante y sala)
+            conn = get_db_connection()
+            try:
+                estado = solicitar_tutoria(conn.cursor(), sala_id, user['Id_usuario'])
+                conn.commit()
+            finally:
+                conn.close()
+            
+            markup_cancelar = teclado_inline(((("↩️ Cancelar solicitud", f"cancelar_solicitud_{sala_id}"),),))
+            
+            if estado == 'pendiente':
+                bot.answer_callback_query(call.id, "⏳ Ya tienes una solicitud pendiente para esta sala.")
+                bot.send_message(
+                    chat_id,
+                    "⏳ Tu solicitud todavía no ha sido respondida por el profesor. "
+                    "Puedes cancelarla o esperar a que la responda.",
+                    reply_markup=markup_cancelar
+                )
+                return
+            if estado == 'activo':
+                bot.answer_callback_query(call.id, "✅ Ya tienes acceso a esta sala.")
+                if sala['Enlace_invitacion']:
+                    bot.send_message(chat_id, f"Usa este enlace para unirte al grupo: {sala['Enlace_invitacion']}")
+                return
+            
+            # 5. Estamos en horario de tutoría, enviar notificación al profesor
             # Obtener datos del estudiante para la notificación
             estudiante_nombre = f"{user['Nombre']} {user['Apellidos'] or ''}".strip()
             
@@ -486,7 +481,8 @@ def register_handlers(bot):
                 mensaje_profesor += f"📚 Asignatura: {escape_markdown(sala['NombreAsignatura'])}\n"
             
             mensaje_profesor += (
-                f"\nEl estudiante ha solicitado acceso a tu sala de tutorías privadas."
+                f"\nEl estudiante ha solicitado acceso a tu sala de tutorías privadas.\n"
+                f"Usa /solicitudes para ver todas tus solicitudes pendientes."
             )
             
             # Crear botones para que el profesor pueda aprobar o rechazar
@@ -496,7 +492,7 @@ def register_handlers(bot):
                 types.InlineKeyboardButton("❌ Rechazar", callback_data=f"rechazar_tutoria_{sala_id}_{user['Id_usuario']}")
             )
             
-            # 5. Generar mensaje de confirmación para el estudiante (sin enviar enlace todavía)
+            # 6. Generar mensaje de confirmación para el estudiante (sin enviar enlace todavía)
             if sala['Enlace_invitacion']:
                 # Mensaje para el estudiante (solo confirmación de solicitud)
                 mensaje_estudiante = (
@@ -510,7 +506,8 @@ def register_handlers(bot):
                 bot.send_message(
                     chat_id,
                     mensaje_estudiante,
-                    parse_mode="Markdown"
+                    parse_mode="Markdown",
+                    reply_markup=markup_cancelar
                 )
             else:
                 # Informar que no hay enlace disponible
@@ -518,10 +515,11 @@ def register_handlers(bot):
                     chat_id,
                     "⚠️ Esta sala no tiene un enlace de invitación configurado. "
                     "El profesor deberá proporcionarte el acceso manualmente si aprueba tu solicitud.",
-                    parse_mode="Markdown"
+                    parse_mode="Markdown",
+                    reply_markup=markup_cancelar
                 )
             
-            # 6. Enviar la notificación al profesor
+            # 7. Enviar la notificación al profesor
             if sala['ProfesorTelegramID']:
                 bot.send_message(
                     sala['ProfesorTelegramID'],
@@ -546,20 +544,47 @@ def register_handlers(bot):
             bot.answer_callback_query(call.id, "❌ Ha ocurrido un error al procesar tu solicitud.")
             bot.send_message(chat_id, "Lo sentimos, ha ocurrido un error al procesar tu solicitud de tutoría.")
         
-        print("### FIN SOLICITAR_SALA ###\n")
+        evento(logger, "fin", handler="solicitar_sala")
+
+    @bot.callback_query_handler(func=lambda call: call.data.startswith("cancelar_solicitud_"))
+    def handle_cancelar_solicitud(call):
+        """Permite al estudiante retirar su solicitud pendiente de una sala"""
+        sala_id = int(call.data.split("_")[2])
+        user = get_user_by_telegram_id(call.from_user.id)
+        if not user:
+            bot.answer_callback_query(call.id, "❌ No estás registrado en el sistema.")
+            return
+        
+        conn = get_db_connection()
+        try:
+            cancelada = cancelar_solicitud(conn.cursor(), sala_id, user['Id_usuario'])
+            conn.commit()
+        finally:
+            conn.close()
+        
+        evento(logger, "solicitud cancelada", logging.INFO, estudiante=user['Id_usuario'], sala=sala_id,
+               cancelada=cancelada)
+        
+        if cancelada:
+            texto = "↩️ Has cancelado tu solicitud. Puedes volver a solicitar la tutoría cuando quieras."
+        else:
+            texto = "ℹ️ Esa solicitud ya no estaba pendiente."
+        editar_o_enviar(bot, call.message.chat.id, texto, call.message.message_id)
+        bot.answer_callback_query(call.id)
 
-    @bot.callback_query_handler(func=lambda call: call.data.startswith("aprobar_tutoria_"))
-    def handle_aprobar_tutoria(call):
-        """Maneja la aprobación de una solicitud de tutoría privada"""
+    @bot.callback_query_handler(func=lambda call: call.data.startswith("aprobar_tutoria_") or call.data.startswith("rechazar_tutoria_"))
+    def handle_resolver_tutoria(call):
+        """Maneja la aprobación o el rechazo de una solicitud de tutoría privada desde su aviso"""
         chat_id = call.message.chat.id
         user_id = call.from_user.id
+        aprobar = call.data.startswith("aprobar_")
+        handler = "aprobar_tutoria" if aprobar else "rechazar_tutoria"
         
-        print(f"\n### INICIO APROBAR_TUTORIA ###")
-        print(f"Chat ID: {chat_id}, User ID: {user_id}")
-        print(f"Callback data: {call.data}")
+        evento(logger, "inicio", handler=handler, chat_id=chat_id, user_id=user_id, callback=call.data)
         
         try:
             # Extraer los IDs necesarios del callback_data
+            # Formato: aprobar_tutoria_sala_estudiante / rechazar_tutoria_sala_estudiante
             parts = call.data.split("_")
             if len(parts) < 4:
                 bot.answer_callback_query(call.id, "❌ Formato de solicitud incorrecto.")
@@ -568,105 +593,42 @@ def register_handlers(bot):
             sala_id = int(parts[2])
             estudiante_id = int(parts[3])
             
-            # 1. Verificar que el usuario que aprueba es el profesor propietario de la sala
+            # 1. Verificar que el usuario es profesor
             profesor = get_user_by_telegram_id(user_id)
             if not profesor or profesor['Tipo'] != 'profesor':
-                bot.answer_callback_query(call.id, "⚠️ Solo el profesor propietario puede aprobar solicitudes.")
+                bot.answer_callback_query(call.id, "⚠️ Solo el profesor propietario puede resolver solicitudes.")
                 return
             
-            # 2. Obtener información de la sala y del estudiante
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            
-            # Verificar que la sala pertenece al profesor
-            cursor.execute("""
-                SELECT g.*, u.Nombre as NombreProfesor, u.Apellidos as ApellidosProfesor
-                FROM Grupos_tutoria g
-                JOIN Usuarios u ON g.Id_usuario = u.Id_usuario
-                WHERE g.id_sala = ? AND g.Id_usuario = (
-                    SELECT Id_usuario FROM Usuarios WHERE TelegramID = ?
-                )
-            """, (sala_id, user_id))
-            
-            sala = cursor.fetchone()
-            
-            if not sala:
-                bot.answer_callback_query(call.id, "❌ No tienes permisos para esta sala o no existe.")
-                conn.close()
-                return
-            
-            # 3. Obtener información del estudiante
-            cursor.execute("""
-                SELECT * 
-                FROM Usuarios 
-                WHERE Id_usuario = ? AND Tipo = 'estudiante'
-            """, (estudiante_id,))
-            
-            estudiante = cursor.fetchone()
+            # 2. Resolver la solicitud y encolar el aviso al estudiante en una transacción
+            resueltas = resolver_y_notificar(
+                profesor, aprobar, call.id, solicitudes=[(sala_id, estudiante_id)]
+            )
             
-            if not estudiante:
-                bot.answer_callback_query(call.id, "❌ No se encontró al estudiante.")
-                conn.close()
+            if not resueltas:
+                # Ya resuelta (p. ej. desde /solicitudes) o no es de una sala del profesor
+                bot.answer_callback_query(call.id, "ℹ️ Esta solicitud ya no está pendiente.")
                 return
             
-            # 4. Verificar si el estudiante ya es miembro de la sala
-            cursor.execute("""
-                SELECT * FROM Miembros_Grupo 
-                WHERE id_sala = ? AND Id_usuario = ?
-            """, (sala_id, estudiante_id))
-            
-            miembro_existente = cursor.fetchone()
-            
-            if miembro_existente:
-                # Actualizar estado a activo si estaba inactivo
-                cursor.execute("""
-                    UPDATE Miembros_Grupo 
-                    SET Estado = 'activo' 
-                    WHERE id_sala = ? AND Id_usuario = ?
-                """, (sala_id, estudiante_id))
-            else:
-                # Añadir al estudiante como miembro de la sala
-                cursor.execute("""
-                    INSERT INTO Miembros_Grupo (id_sala, Id_usuario, Estado)
-                    VALUES (?, ?, 'activo')
-                """, (sala_id, estudiante_id))
-        
-            conn.commit()
-            
-            # 5. Enviar enlace de invitación al estudiante
-            if sala['Enlace_invitacion'] and estudiante['TelegramID']:
-                mensaje_estudiante = (
-                    f"✅ *Tu solicitud de tutoría ha sido aprobada*\n\n"
-                    f"El profesor {escape_markdown(profesor['Nombre'])} {escape_markdown(profesor['Apellidos'] or '')} "
-                    f"ha aprobado tu solicitud de acceso a la sala de tutorías.\n\n"
-                    f"Usa este enlace para unirte al grupo: {sala['Enlace_invitacion']}"
-                )
-                
-                bot.send_message(
-                    estudiante['TelegramID'],
-                    mensaje_estudiante,
-                    parse_mode="Markdown"
-                )
-                print(f"✅ Enlace de invitación enviado al estudiante {estudiante['Id_usuario']}")
-            else:
+            solicitud, enlace_encolado = resueltas[0]
+            if aprobar and not enlace_encolado:
                 # Si no hay enlace o ID de Telegram
                 bot.send_message(
                     chat_id,
-                    f"⚠️ No se pudo enviar el enlace de invitación a {estudiante['Nombre']} {estudiante['Apellidos'] or ''}.\n"
+                    f"⚠️ No se pudo enviar el enlace de invitación a {solicitud['Nombre']} {solicitud['Apellidos'] or ''}.\n"
                     f"Verifique que la sala tenga un enlace de invitación configurado."
                 )
-        
-            # 6. Actualizar el mensaje de solicitud para mostrar que fue aprobada
-            nombre_completo = f"{estudiante['Nombre']} {estudiante['Apellidos'] or ''}".strip()
+            
+            # 3. Actualizar el mensaje de solicitud (sin los botones de aprobar/rechazar)
+            nombre_completo = f"{solicitud['Nombre']} {solicitud['Apellidos'] or ''}".strip()
             
             mensaje_actualizado = (
-                f"✅ *Solicitud APROBADA*\n\n"
+                f"{'✅ *Solicitud APROBADA*' if aprobar else '❌ *Solicitud RECHAZADA*'}\n\n"
                 f"👤 Estudiante: {escape_markdown(nombre_completo)}\n"
-                f"📧 Email: {escape_markdown(estudiante['Email_UGR'] or 'No disponible')}\n\n"
-                f"Acceso concedido a la sala: {escape_markdown(sala['Nombre_sala'])}"
+                f"📧 Email: {escape_markdown(solicitud['Email_UGR'] or 'No disponible')}\n\n"
+                f"{'Acceso concedido' if aprobar else 'Acceso denegado'} a la sala: "
+                f"{escape_markdown(solicitud['Nombre_sala'])}"
             )
             
-            # Eliminar los botones de aprobar/rechazar
             bot.edit_message_text(
                 mensaje_actualizado,
                 chat_id=chat_id,
@@ -674,109 +636,192 @@ def register_handlers(bot):
                 parse_mode="Markdown"
             )
             
-            bot.answer_callback_query(call.id, "✅ Solicitud aprobada con éxito")
-            
-            print(f"✅ Solicitud de tutoría aprobada: Estudiante {estudiante_id} añadido a sala {sala_id}")
+            bot.answer_callback_query(call.id, "✅ Solicitud aprobada con éxito" if aprobar else "✅ Solicitud rechazada")
             
         except Exception as e:
-            print(f"❌ Error al aprobar solicitud: {e}")
-            import traceback
-            traceback.print_exc()
-            bot.answer_callback_query(call.id, "❌ Ha ocurrido un error al procesar la aprobación")
+            logger.exception("Error al resolver solicitud: %s", e)
+            bot.answer_callback_query(call.id, "❌ Ha ocurrido un error al procesar la solicitud")
     
-        print("### FIN APROBAR_TUTORIA ###\n")
+        evento(logger, "fin", handler=handler)
 
-    @bot.callback_query_handler(func=lambda call: call.data.startswith("rechazar_tutoria_"))
-    def handle_rechazar_tutoria(call):
-        """Maneja el rechazo de una solicitud de tutoría privada"""
-        chat_id = call.message.chat.id
-        user_id = call.from_user.id
+    def mostrar_solicitudes(chat_id, profesor, message_id=None, aviso=None):
+        """Envía (o edita) la cola de solicitudes pendientes del profesor"""
+        pendientes = get_solicitudes_pendientes(profesor['Id_usuario'])
+        mensaje = f"{aviso}\n\n" if aviso else ""
+        
+        if not pendientes:
+            mensaje += "📋 *Solicitudes pendientes*\n\nNo tienes solicitudes de tutoría pendientes."
+            editar_o_enviar(bot, chat_id, mensaje, message_id, parse_mode="Markdown")
+            return
         
-        print(f"\n### INICIO RECHAZAR_TUTORIA ###")
-        print(f"Chat ID: {chat_id}, User ID: {user_id}")
-        print(f"Callback data: {call.data}")
+        mensaje += f"📋 *Solicitudes pendientes* ({len(pendientes)})\n\n"
+        filas = []
+        for i, solicitud in enumerate(pendientes[:SOLICITUDES_POR_MENSAJE], 1):
+            nombre_completo = f"{solicitud['Nombre']} {solicitud['Apellidos'] or ''}".strip()
+            mensaje += (
+                f"{i}. *{escape_markdown(nombre_completo)}* · {escape_markdown(solicitud['Nombre_sala'])}\n"
+                f"   📧 {escape_markdown(solicitud['Email_UGR'] or 'No disponible')}\n"
+                f"   🕒 {solicitud['Fecha_union']}\n\n"
+            )
+            clave = f"{solicitud['id_sala']}_{solicitud['Id_usuario']}"
+            filas.append(((f"✅ {i}", f"solicitud_a_{clave}"), (f"❌ {i}", f"solicitud_r_{clave}")))
+        
+        if len(pendientes) > SOLICITUDES_POR_MENSAJE:
+            mensaje += f"…y {len(pendientes) - SOLICITUDES_POR_MENSAJE} más.\n\n"
+        
+        # Las acciones en bloque se limitan a lo que ya estaba en la cola al mostrarla
+        hasta = "".join(c for c in pendientes[-1]['Fecha_union'] if c.isdigit())
+        filas.append((
+            (f"✅ Aprobar todas ({len(pendientes)})", f"solicitudes_a_{hasta}"),
+            (f"❌ Rechazar todas ({len(pendientes)})", f"solicitudes_r_{hasta}"),
+        ))
+        editar_o_enviar(bot, chat_id, mensaje, message_id, parse_mode="Markdown", reply_markup=teclado_inline(tuple(filas)))
+
+    @bot.message_handler(commands=['solicitudes'])
+    def handle_solicitudes(message):
+        """Muestra al profesor toda su cola de solicitudes de tutoría pendientes"""
+        profesor = get_user_by_telegram_id(message.from_user.id)
+        if not profesor or profesor['Tipo'] != 'profesor':
+            enviar_mensaje(bot, message.chat.id, "⚠️ Solo los profesores tienen solicitudes de tutoría.")
+            return
+        
+        mostrar_solicitudes(message.chat.id, profesor)
+
+    @bot.callback_query_handler(func=lambda call: call.data.startswith("solicitud_") or call.data.startswith("solicitudes_"))
+    def handle_resolver_solicitudes(call):
+        """
+        Aprueba o rechaza desde /solicitudes una solicitud (solicitud_<a|r>_<sala>_<estudiante>)
+        o todas las pendientes hasta la última mostrada (solicitudes_<a|r>_<fecha>)
+        """
+        profesor = get_user_by_telegram_id(call.from_user.id)
+        if not profesor or profesor['Tipo'] != 'profesor':
+            bot.answer_callback_query(call.id, "⚠️ Solo el profesor propietario puede resolver solicitudes.")
+            return
+        
+        parts = call.data.split("_")
+        aprobar = parts[1] == "a"
         
         try:
-            # Extraer los IDs necesarios del callback_data
-            # Formato: rechazar_tutoria_sala_estudiante
-            parts = call.data.split("_")
-            if len(parts) < 4:
-                bot.answer_callback_query(call.id, "❌ Formato de solicitud incorrecto.")
-                return
-                
-            sala_id = int(parts[2])
-            estudiante_id = int(parts[3])
-            
-            # Verificar que el usuario que rechaza es el profesor propietario de la sala
-            profesor = get_user_by_telegram_id(user_id)
-            if not profesor or profesor['Tipo'] != 'profesor':
-                bot.answer_callback_query(call.id, "⚠️ Solo el profesor propietario puede rechazar solicitudes.")
-                return
-            
-            # Obtener información del estudiante y la sala
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                SELECT * FROM Usuarios WHERE Id_usuario = ?
-            """, (estudiante_id,))
-            estudiante = cursor.fetchone()
-            
-            cursor.execute("""
-                SELECT * FROM Grupos_tutoria WHERE id_sala = ?
-            """, (sala_id,))
-            sala = cursor.fetchone()
-            
-            conn.close()
-            
-            if not estudiante or not sala:
-                bot.answer_callback_query(call.id, "❌ Datos de solicitud no encontrados.")
-                return
-            
-            # Actualizar el mensaje para mostrar que fue rechazada
-            nombre_completo = f"{estudiante['Nombre']} {estudiante['Apellidos'] or ''}".strip()
-            
-            mensaje_actualizado = (
-                f"❌ *Solicitud RECHAZADA*\n\n"
-                f"👤 Estudiante: {escape_markdown(nombre_completo)}\n"
-                f"📧 Email: {escape_markdown(estudiante['Email_UGR'] or 'No disponible')}\n\n"
-                f"Acceso denegado a la sala: {escape_markdown(sala['Nombre_sala'])}"
-            )
-            
-            # Eliminar los botones de aprobar/rechazar
-            bot.edit_message_text(
-                mensaje_actualizado,
-                chat_id=chat_id,
-                message_id=call.message.message_id,
-                parse_mode="Markdown"
-            )
-            
-            # Notificar al estudiante si tiene Telegram registrado
-            if estudiante['TelegramID']:
-                mensaje_rechazo = (
-                    f"❌ *Tu solicitud de tutoría ha sido rechazada*\n\n"
-                    f"El profesor {escape_markdown(profesor['Nombre'])} {escape_markdown(profesor['Apellidos'] or '')} "
-                    f"ha rechazado tu solicitud de acceso a la sala de tutorías.\n\n"
-                    f"Si necesitas más información, contacta directamente con el profesor."
+            if parts[0] == "solicitud":
+                resueltas = resolver_y_notificar(
+                    profesor, aprobar, call.id, solicitudes=[(int(parts[2]), int(parts[3]))]
                 )
-                
-                bot.send_message(
-                    estudiante['TelegramID'],
-                    mensaje_rechazo,
-                    parse_mode="Markdown"
+            else:
+                f = parts[2]
+                resueltas = resolver_y_notificar(
+                    profesor, aprobar, call.id, hasta=f"{f[:4]}-{f[4:6]}-{f[6:8]} {f[8:10]}:{f[10:12]}:{f[12:14]}"
                 )
-            
-            bot.answer_callback_query(call.id, "✅ Solicitud rechazada")
-            
         except Exception as e:
-            print(f"❌ Error al rechazar solicitud: {e}")
-            import traceback
-            traceback.print_exc()
-            bot.answer_callback_query(call.id, "❌ Ha ocurrido un error al procesar el rechazo")
-    
-        print("### FIN RECHAZAR_TUTORIA ###\n")
+            logger.exception("Error al resolver solicitudes: %s", e)
+            bot.answer_callback_query(call.id, "❌ Ha ocurrido un error al procesar las solicitudes")
+            return
+        
+        evento(logger, "solicitudes resueltas", logging.INFO, profesor=profesor['Id_usuario'],
+               aprobadas=len(resueltas) if aprobar else 0, rechazadas=0 if aprobar else len(resueltas))
+        
+        if not resueltas:
+            aviso = "ℹ️ Esa solicitud ya no estaba pendiente."
+        elif aprobar:
+            aviso = f"✅ {len(resueltas)} solicitud(es) aprobada(s)."
+        else:
+            aviso = f"❌ {len(resueltas)} solicitud(es) rechazada(s)."
+        
+        mostrar_solicitudes(call.message.chat.id, profesor, call.message.message_id, escape_markdown(aviso))
+        bot.answer_callback_query(call.id)
+
+    def resolver_y_notificar(profesor, aprobar, id_accion, solicitudes=None, hasta=None):
+        """
+        Resuelve solicitudes pendientes del profesor en una sola transacción y
+        encola en ella el aviso a cada estudiante (con el enlace si se aprueba).
+
+        Returns:
+            list: (solicitud, aviso_encolado) de las que estaban pendientes
+        """
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        try:
+            pendientes = get_solicitudes_pendientes(
+                profesor['Id_usuario'], hasta=hasta, solicitudes=solicitudes, cursor=cursor
+            )
+            resueltas = set(resolver_solicitudes(
+                cursor, [(s['id_sala'], s['Id_usuario']) for s in pendientes], aprobar
+            ))
+            
+            nombre_profesor = f"{escape_markdown(profesor['Nombre'])} {escape_markdown(profesor['Apellidos'] or '')}"
+            resultado = []
+            for solicitud in pendientes:
+                if (solicitud['id_sala'], solicitud['Id_usuario']) not in resueltas:
+                    continue
+                encolado = False
+                if solicitud['TelegramID'] and (solicitud['Enlace_invitacion'] or not aprobar):
+                    if aprobar:
+                        texto = (
+                            f"✅ *Tu solicitud de tutoría ha sido aprobada*\n\n"
+                            f"El profesor {nombre_profesor} "
+                            f"ha aprobado tu solicitud de acceso a la sala de tutorías.\n\n"
+                            f"Usa este enlace para unirte al grupo: {solicitud['Enlace_invitacion']}"
+                        )
+                    else:
+                        texto = (
+                            f"❌ *Tu solicitud de tutoría ha sido rechazada*\n\n"
+                            f"El profesor {nombre_profesor} "
+                            f"ha rechazado tu solicitud de acceso a la sala de tutorías.\n\n"
+                            f"Si necesitas más información, contacta directamente con el profesor."
+                        )
+                    encolado = encolar_mensaje(
+                        cursor,
+                        solicitud['TelegramID'],
+                        texto,
+                        f"tutoria_{'aprobada' if aprobar else 'rechazada'}:"
+                        f"{solicitud['id_sala']}:{solicitud['Id_usuario']}:{id_accion}",
+                        parse_mode="Markdown"
+                    )
+                resultado.append((solicitud, encolado))
+            
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        
+        if any(encolado for _, encolado in resultado):
+            avisar_despachador()
+        for solicitud, _ in resultado:
+            evento(logger, "solicitud aprobada" if aprobar else "solicitud rechazada", logging.INFO,
+                   estudiante=solicitud['Id_usuario'], sala=solicitud['id_sala'])
+        return resultado
 # Funciones auxiliares para el manejo de solicitudes de tutoría
 
+def diagnostico_salas():
+    """Escribe en el log cuántas salas hay y los datos de las primeras 5"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT COUNT(*) as total FROM Grupos_tutoria")
+        total_salas = cursor.fetchone()['total']
+        logger.debug("Total de salas en la BD: %s", total_salas)
+        
+        if total_salas > 0:
+            cursor.execute("""
+                SELECT 
+                    g.id_sala, g.Id_usuario, g.Nombre_sala, g.Proposito_sala, 
+                    g.Tipo_sala, g.Id_asignatura, a.Nombre as NombreAsignatura
+                FROM Grupos_tutoria g
+                LEFT JOIN Asignaturas a ON g.Id_asignatura = a.Id_asignatura
+                LIMIT 5
+            """)
+            for sala in cursor.fetchall():
+                evento(
+                    logger, "sala", id_sala=sala['id_sala'], nombre=sala['Nombre_sala'],
+                    profesor=sala['Id_usuario'], asignatura=sala['Id_asignatura'],
+                    nombre_asignatura=sala['NombreAsignatura'], tipo=sala['Tipo_sala'],
+                    proposito=sala['Proposito_sala']
+                )
+    finally:
+        conn.close()
+
+
 def verificar_horario_tutoria(horario_str):
     """
     Verifica si estamos en horario de tutoría del profesor
@@ -794,7 +839,7 @@ def verificar_horario_tutoria(horario_str):
     
     # Si no hay horario definido, no se puede verificar
     if not horario_str or horario_str.strip() == '':
-        print("No hay horario definido")
+        logger.debug("No hay horario definido")
         return False
         
     # Obtener día y hora actual
@@ -822,10 +867,7 @@ def verificar_horario_tutoria(horario_str):
     horario_lower = horario_str.lower()
     
     # Debug: Mostrar información para diagnóstico
-    print(f"Verificando horario: {horario_str}")
-    print(f"Día actual: {ahora.strftime('%A')} ({dia_semana_actual})")
-    print(f"Hora actual: {hora_actual}")
-    print(f"Nombres para el día actual: {nombres_dia_actual}")
+    evento(logger, "verificando horario", horario=horario_str, dia=nombres_dia_actual[0], hora=hora_actual)
     
     # Buscar patrones de horario:
     # 1. Formato "Lunes de 10:00 a 12:00"
@@ -858,15 +900,15 @@ def verificar_horario_tutoria(horario_str):
         tiempo_fin = time(hora_fin, minuto_fin)
         
         # Debug: Mostrar cada horario encontrado para diagnóstico
-        print(f"Formato 1 - Horario encontrado: {dia_horario} de {tiempo_inicio} a {tiempo_fin}")
+        logger.debug("Formato 1 - Horario encontrado: %s de %s a %s", dia_horario, tiempo_inicio, tiempo_fin)
         encontrado = True
         
         # Verificar si la hora actual está en el rango
         if tiempo_inicio <= hora_actual <= tiempo_fin:
-            print(f"✅ Dentro de horario: {tiempo_inicio} <= {hora_actual} <= {tiempo_fin}")
+            logger.debug("Dentro de horario: %s <= %s <= %s", tiempo_inicio, hora_actual, tiempo_fin)
             return True
         else:
-            print(f"❌ Fuera de horario: {hora_actual} no está entre {tiempo_inicio} y {tiempo_fin}")
+            logger.debug("Fuera de horario: %s no está entre %s y %s", hora_actual, tiempo_inicio, tiempo_fin)
     
     # Comprobar el segundo formato (Día HH:MM-HH:MM)
     for match in re.finditer(patron2, horario_lower):
@@ -889,19 +931,19 @@ def verificar_horario_tutoria(horario_str):
         tiempo_fin = time(hora_fin, minuto_fin)
         
         # Debug: Mostrar cada horario encontrado para diagnóstico
-        print(f"Formato 2 - Horario encontrado: {dia_horario} {tiempo_inicio}-{tiempo_fin}")
+        logger.debug("Formato 2 - Horario encontrado: %s %s-%s", dia_horario, tiempo_inicio, tiempo_fin)
         encontrado = True
         
         # Verificar si la hora actual está en el rango
         if tiempo_inicio <= hora_actual <= tiempo_fin:
-            print(f"✅ Dentro de horario: {tiempo_inicio} <= {hora_actual} <= {tiempo_fin}")
+            logger.debug("Dentro de horario: %s <= %s <= %s", tiempo_inicio, hora_actual, tiempo_fin)
             return True
         else:
-            print(f"❌ Fuera de horario: {hora_actual} no está entre {tiempo_inicio} y {tiempo_fin}")
+            logger.debug("Fuera de horario: %s no está entre %s y %s", hora_actual, tiempo_inicio, tiempo_fin)
     
     # Si no se encontró ninguna coincidencia para el día actual, informarlo
     if not encontrado:
-        print(f"No se encontraron horarios para el día actual ({ahora.strftime('%A')})")
+        logger.debug("No se encontraron horarios para el día actual (%s)", nombres_dia_actual[0])
     
     return False
 
@@ -914,38 +956,18 @@ def registrar_solicitud_tutoria(estudiante_id, profesor_id, sala_id):
         estudiante_id (int): ID del estudiante que solicita
         profesor_id (int): ID del profesor
         sala_id (int): ID de la sala solicitada
+    
+    Returns:
+        str: 'nueva', 'pendiente' o 'activo' (ver db.queries.solicitar_tutoria)
     """
     try:
         conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Verificar si ya existe un registro de este estudiante en esta sala
-        cursor.execute(
-            "SELECT id_miembro FROM Miembros_Grupo WHERE id_sala = ? AND Id_usuario = ?",
-            (sala_id, estudiante_id)
-        )
-        
-        miembro = cursor.fetchone()
-        
-        if miembro:
-            # Si ya existe, actualizar su estado a activo si no lo está
-            cursor.execute(
-                "UPDATE Miembros_Grupo SET Estado = 'activo' WHERE id_miembro = ?",
-                (miembro['id_miembro'],)
-            )
-        else:
-            # Si no existe, crear un nuevo registro
-            cursor.execute(
-                """
-                INSERT INTO Miembros_Grupo (id_sala, Id_usuario, Estado)
-                VALUES (?, ?, 'pendiente')
-                """,
-                (sala_id, estudiante_id)
-            )
-        
+        estado = solicitar_tutoria(conn.cursor(), sala_id, estudiante_id)
         conn.commit()
         conn.close()
-        print(f"✅ Solicitud registrada: Estudiante {estudiante_id} para sala {sala_id}")
+        evento(logger, "solicitud registrada", logging.INFO, estudiante=estudiante_id, sala=sala_id, estado=estado)
+        return estado
         
     except Exception as e:
-        print(f"❌ Error al registrar solicitud de tutoría: {e}")
\ No newline at end of file
+        logger.error("Error al registrar solicitud de tutoría: %s", e)
+        return None
\ No newline at end of file
@@ -1,33 +1,40 @@
 import telebot
 import time
 import threading
+from functools import lru_cache
 from telebot import types
 import os
 import sys
-from config import TOKEN, DB_PATH,EXCEL_PATH
+import logging
+from config import TOKEN, DB_PATH,EXCEL_PATH, METRICAS_PUERTO
 
 # Importar funciones para manejar estados
 from utils.state_manager import get_state, set_state, clear_state, user_states, user_data
 
 # Importar funciones para manejar el Excel
 from utils.excel_manager import cargar_excel, importar_datos_desde_excel
-from db.queries import get_db_connection
+from db.queries import get_db_connection, obtener_grupo_por_id, contar_miembros_sala
+from utils.transporte_telegram import configurar_transporte
+from utils.respuestas import enviar_mensaje, editar_o_enviar, agrupar_mensajes
+from utils.markdown import escape_markdown
+from utils.teclados import teclado_inline_columna
+from utils.miembros import pagina_miembros, formatear_miembros, teclado_paginas, enviar_csv_miembros
+from utils.cola_mensajes import encolar_mensaje, avisar_despachador, iniciar_despachador
+from utils.metricas import instrumentar_bot, iniciar_metricas
+from utils.salud import registrar_bot
+from utils.logs import configurar_logging, evento
+from utils.perfilador import instalar_senal_perfil
+
+logger = logging.getLogger("main")
 # Reemplaza todos los handlers universales por este ÚNICO handler al final
+# Sesión HTTP compartida (keep-alive) para todas las llamadas a la API
+configurar_transporte()
 # Inicializar el bot de Telegram
 bot = telebot.TeleBot(TOKEN) 
-
-def escape_markdown(text):
-    """Escapa caracteres especiales de Markdown"""
-    if not text:
-        return ""
-    
-    chars = ['_', '*', '`', '[', ']', '(', ')', '#', '+', '-', '.', '!']
-    for char in chars:
-        text = text.replace(char, '\\' + char)
-    
-    return text
-
-
+# Medir latencia, errores, consultas y llamadas a la API de cada handler
+instrumentar_bot(bot, "principal")
+# Publicar su estado en /health y /ready
+registrar_bot(bot, "principal")
 
 
 def setup_commands():
@@ -39,6 +46,7 @@ def setup_commands():
             telebot.types.BotCommand("/tutoria", "Ver profesores disponibles para tutoría"),
             telebot.types.BotCommand("/crear_grupo_tutoria", "Crea un grupo de tutoría"),
             telebot.types.BotCommand("/configurar_horario", "Configura tu horario de tutorías"),
+            telebot.types.BotCommand("/solicitudes", "Solicitudes de tutoría pendientes (profesores)"),
             telebot.types.BotCommand("/ver_misdatos", "Ver tus datos registrados")
         ])
         print("✅ Comandos del bot configurados correctamente")
@@ -50,6 +58,26 @@ def setup_commands():
 # Importar funciones básicas de consulta a la BD
 from db.queries import get_user_by_telegram_id
 
+@lru_cache(maxsize=None)
+def texto_ayuda(es_profesor):
+    """Construye (una sola vez por rol) el texto de ayuda ya escapado"""
+    comandos = (
+        "/start - Inicia el bot y el proceso de registro\n"
+        "/help - Muestra este mensaje de ayuda\n"
+        "/tutoria - Ver profesores disponibles para tutoría\n"
+        "/ver_misdatos - Ver tus datos registrados\n"
+    )
+    
+    if es_profesor:
+        comandos += (
+            "/configurar_horario - Configura tu horario de tutorías\n"
+            "/crear_grupo_tutoria - Crea un grupo de tutoría\n"
+            "/solicitudes - Ver y resolver tus solicitudes de tutoría pendientes\n"
+        )
+    
+    # Escapar los guiones bajos de los comandos para evitar problemas de formato
+    return "🤖 *Comandos disponibles:*\n\n" + escape_markdown(comandos)
+
 @bot.message_handler(commands=['help'])
 def handle_help(message):
     """Muestra la ayuda del bot"""
@@ -63,43 +91,21 @@ def handle_help(message):
         )
         return
     
-    help_text = (
-        "🤖 *Comandos disponibles:*\n\n"
-        "/start - Inicia el bot y el proceso de registro\n"
-        "/help - Muestra este mensaje de ayuda\n"
-        "/tutoria - Ver profesores disponibles para tutoría\n"
-        "/ver_misdatos - Ver tus datos registrados\n"
-    )
-    
-    if user['Tipo'] == 'profesor':
-        help_text += (
-            "/configurar_horario - Configura tu horario de tutorías\n"
-            "/crear_grupo_tutoria - Crea un grupo de tutoría\n"
-        )
-    
-    # Escapar los guiones bajos para evitar problemas de formato
-    help_text = help_text.replace("_", "\\_")
-    
-    try:
-        bot.send_message(chat_id, help_text, parse_mode="Markdown")
-    except Exception as e:
-        print(f"Error al enviar mensaje de ayuda: {e}")
-        # Si falla, envía sin formato
-        bot.send_message(chat_id, help_text.replace('*', ''), parse_mode=None)
+    enviar_mensaje(bot, chat_id, texto_ayuda(user['Tipo'] == 'profesor'), parse_mode="Markdown")
 
 @bot.message_handler(commands=['ver_misdatos'])
 def handle_ver_misdatos(message):
     chat_id = message.chat.id
-    print(f"\n\n### INICIO VER_MISDATOS - Usuario: {message.from_user.id} ###")
+    evento(logger, "inicio", handler="ver_misdatos", user_id=message.from_user.id)
     
     user = get_user_by_telegram_id(message.from_user.id)
     
     if not user:
-        print("⚠️ Usuario no encontrado en BD")
+        logger.debug("Usuario no encontrado en BD")
         bot.send_message(chat_id, "❌ No estás registrado. Usa /start para registrarte.")
         return
     
-    print(f"✅ Usuario encontrado: {user['Nombre']} ({user['Tipo']})")
+    logger.debug("Usuario encontrado: %s (%s)", user['Nombre'], user['Tipo'])
     
     # Convertir el objeto sqlite3.Row a diccionario
     user_dict = dict(user)
@@ -184,61 +190,77 @@ def handle_ver_misdatos(message):
             user_info += "\n*🔵 No has creado salas de tutoría todavía.*\n"
             user_info += "Usa /crear_grupo_tutoria para crear una nueva sala.\n"
     
-    # Intentar enviar el mensaje con formato Markdown
-    try:
-        bot.send_message(chat_id, user_info, parse_mode="Markdown")
+    # Datos y botones de gestión de salas en un único mensaje
+    with agrupar_mensajes(bot, chat_id):
+        enviar_mensaje(bot, chat_id, user_info, parse_mode="Markdown")
         
         # Si es profesor y tiene salas, mostrar botones para editar
         if user['Tipo'] == 'profesor' and salas and len(salas) > 0:
-            markup = types.InlineKeyboardMarkup(row_width=1)
+            # Añadir SOLO botones para editar cada sala (teclado memorizado por contenido)
+            markup = teclado_inline_columna([
+                (f"✏️ Sala: {sala['Nombre_sala']}", f"edit_sala_{sala['id_sala']}")
+                for sala in salas
+            ])
             
-            # Añadir SOLO botones para editar cada sala (quitar botones de eliminar)
-            for sala in salas:
-                sala_id = sala['id_sala']
-                
-                markup.add(types.InlineKeyboardButton(
-                    f"✏️ Sala: {sala['Nombre_sala']}",
-                    callback_data=f"edit_sala_{sala_id}"
-                ))
-            
-            bot.send_message(
+            enviar_mensaje(
+                bot,
                 chat_id,
                 "Selecciona una sala para gestionar:",
+                parse_mode="Markdown",
                 reply_markup=markup
             )
-    except Exception as e:
-        # Si falla por problemas de formato, enviar sin formato
-        print(f"Error al enviar datos de usuario: {e}")
-        bot.send_message(chat_id, user_info.replace('*', ''), parse_mode=None)
 
 # Importar y configurar los handlers desde los módulos
 from handlers.registro import register_handlers as register_registro_handlers
 from handlers.tutorias import register_handlers as register_tutorias_handlers
 from handlers.horarios import register_handlers as register_horarios_handlers
+from handlers.admin import register_handlers as register_admin_handlers
 from utils.excel_manager import verificar_excel_disponible
-from grupo_handlers.grupos import GestionGrupos
 
-# Verificar si es la primera ejecución
+from db.models import actualizar_estructura_tablas
+
+# Fichero que marca que ya se hizo la importación completa del Excel
 MARKER_FILE = os.path.join(os.path.dirname(DB_PATH), ".initialized")
-primera_ejecucion = not os.path.exists(MARKER_FILE)
 
-# Verificar que el Excel existe pero no cargar datos
-print("📊 Cargando datos académicos...")
-if verificar_excel_disponible():
+
+def sincronizar_excel():
+    """Importa los datos académicos del Excel (todo la primera vez, después solo los nuevos)"""
+    primera_ejecucion = not os.path.exists(MARKER_FILE)
+
+    print("📊 Cargando datos académicos...")
+    if not verificar_excel_disponible():
+        print("⚠️ Excel no encontrado")
+        return
+
     print("✅ Excel encontrado")
-    # Primera vez - importar todo
-    if primera_ejecucion:  # Usa alguna forma de detectar primer inicio
+    if primera_ejecucion:
         importar_datos_desde_excel(solo_nuevos=False)
         # Crear archivo marcador para futuras ejecuciones
         with open(MARKER_FILE, 'w') as f:
             f.write("Initialized")
     else:
-        # Ejecuciones posteriores - solo nuevos datos
         importar_datos_desde_excel(solo_nuevos=True)
-else:
-    print("⚠️ Excel no encontrado")
 
-# Registrar todos los handlers
+
+def inicializar_datos():
+    """
+    Prepara la base de datos antes de empezar a atender updates.
+
+    El esquema se actualiza en el momento (es inmediato y los handlers lo
+    necesitan). La sincronización con el Excel carga pandas y recorre todo el
+    fichero, así que va en segundo plano: el registro consulta el Excel por su
+    cuenta y no depende de que haya terminado.
+    """
+    # Crear las tablas auxiliares que falten en la base de datos
+    actualizar_estructura_tablas()
+
+    hilo = threading.Thread(target=sincronizar_excel, name="sincronizar_excel", daemon=True)
+    hilo.start()
+    return hilo
+
+
+# Registrar todos los handlers (solo se añaden al bot, sin llamadas a la API ni a la BD)
+register_admin_handlers(bot, "principal")
 register_registro_handlers(bot)
 register_tutorias_handlers(bot)
 register_horarios_handlers(bot)
@@ -249,25 +271,25 @@ register_horarios_handlers(bot)
 def handle_edit_sala(call):
     """Muestra opciones para editar una sala"""
     chat_id = call.message.chat.id
-    print(f"\n\n### INICIO EDIT_SALA - Callback: {call.data} ###")
+    evento(logger, "inicio", handler="edit_sala", callback=call.data)
     
     try:
         sala_id = int(call.data.split("_")[2])
-        print(f"🔍 Sala ID a editar: {sala_id}")
+        logger.debug("Sala ID a editar: %s", sala_id)
         
         # Verificar que el usuario es el propietario de la sala
         user = get_user_by_telegram_id(call.from_user.id)
-        print(f"👤 Usuario: {user['Nombre'] if user else 'No encontrado'}")
+        logger.debug("Usuario: %s", user['Nombre'] if user else 'No encontrado')
         
         if not user or user['Tipo'] != 'profesor':
-            print("⚠️ Usuario no es profesor o no existe")
+            logger.debug("Usuario no es profesor o no existe")
             bot.answer_callback_query(call.id, "⚠️ Solo los profesores propietarios pueden editar salas")
             return
         
         # Obtener datos actuales de la sala
         conn = get_db_connection()
         cursor = conn.cursor()
-        print(f"🔍 Consultando detalles de sala ID {sala_id}")
+        logger.debug("Consultando detalles de sala ID %s", sala_id)
         cursor.execute(
             """
             SELECT g.*, a.Nombre as NombreAsignatura
@@ -281,14 +303,14 @@ def handle_edit_sala(call):
         conn.close()
         
         if not sala:
-            print(f"❌ Sala no encontrada o no pertenece al usuario")
+            logger.debug("Sala no encontrada o no pertenece al usuario")
             bot.answer_callback_query(call.id, "❌ No se encontró la sala o no tienes permisos")
             return
         
-        print(f"✅ Sala encontrada: {sala['Nombre_sala']} (Chat ID: {sala['Chat_id']})")
+        logger.debug("Sala encontrada: %s (Chat ID: %s)", sala['Nombre_sala'], sala['Chat_id'])
         
         # Mostrar opciones simplificadas (solo eliminar)
-        print("🔘 Generando botón de eliminación...")
+        logger.debug("Generando botón de eliminación...")
         markup = types.InlineKeyboardMarkup(row_width=1)
         
         # Añadir opción para eliminar la sala
@@ -296,7 +318,7 @@ def handle_edit_sala(call):
             "🗑️ Eliminar sala",
             callback_data=f"eliminarsala_{sala_id}"
         ))
-        print(f"  ✓ Botón eliminar con callback: eliminarsala_{sala_id}")
+        logger.debug("Botón eliminar con callback: eliminarsala_%s", sala_id)
         
         # Botón para cancelar
         markup.add(types.InlineKeyboardButton(
@@ -308,7 +330,7 @@ def handle_edit_sala(call):
         nombre_sala = escape_markdown(sala['Nombre_sala'])
         nombre_asignatura = escape_markdown(sala['NombreAsignatura'] or 'General')
         
-        print(f"📤 Enviando mensaje de edición")
+        logger.debug("Enviando mensaje de edición")
         bot.edit_message_text(
             f"🔄 *Gestionar sala*\n\n"
             f"*Sala:* {nombre_sala}\n"
@@ -319,16 +341,14 @@ def handle_edit_sala(call):
             reply_markup=markup,
             parse_mode="Markdown"
         )
-        print("✅ Mensaje de opciones enviado")
+        logger.debug("Mensaje de opciones enviado")
     
     except Exception as e:
-        print(f"❌ ERROR en handle_edit_sala: {e}")
-        import traceback
-        print(traceback.format_exc())
+        logger.exception("Error en handle_edit_sala: %s", e)
     
     bot.answer_callback_query(call.id)
-    print("✅ Respuesta de callback enviada")
-    print(f"### FIN EDIT_SALA - Callback: {call.data} ###\n")
+    logger.debug("Respuesta de callback enviada")
+    evento(logger, "fin", handler="edit_sala")
 
 @bot.callback_query_handler(func=lambda call: call.data.startswith("cancelar_edicion_"))
 def handle_cancelar_edicion(call):
@@ -523,9 +543,9 @@ def handle_confirmar_cambio(call):
             # Primero intentar con el bot actual (aunque probablemente fallará)
             try:
                 bot.set_chat_title(telegram_chat_id, nuevo_nombre)
-                print(f"✅ Nombre del grupo actualizado a: {nuevo_nombre}")
+                logger.debug("Nombre del grupo actualizado a: %s", nuevo_nombre)
             except Exception as e:
-                print(f"⚠️ Bot principal no pudo cambiar el nombre: {e}")
+                logger.warning("Bot principal no pudo cambiar el nombre: %s", e)
                 
                 # Si falla, utilizar la función del bot de grupos
                 try:
@@ -534,11 +554,11 @@ def handle_confirmar_cambio(call):
                     
                     # Llamar a la función para cambiar el nombre
                     if cambiar_nombre_grupo_telegram(telegram_chat_id, nuevo_nombre):
-                        print(f"✅ Nombre del grupo actualizado usando el bot de grupos")
+                        logger.debug("Nombre del grupo actualizado usando el bot de grupos")
                     else:
-                        print(f"❌ No se pudo cambiar el nombre del grupo ni siquiera con el bot de grupos")
+                        logger.debug("No se pudo cambiar el nombre del grupo ni siquiera con el bot de grupos")
                 except Exception as e:
-                    print(f"❌ Error al intentar utilizar la función del bot de grupos: {e}")
+                    logger.error("Error al intentar utilizar la función del bot de grupos: %s", e)
         
         # 4. Gestionar miembros según la decisión
         if decision_miembros == "eliminar":
@@ -552,8 +572,12 @@ def handle_confirmar_cambio(call):
                 """,
                 (sala_id, sala_id)
             )
+        else:
+            # Avisar a los miembros que se mantienen, en la misma transacción
+            notificar_cambio_sala(cursor, sala_id, nuevo_proposito, call.id)
         
         conn.commit()
+        avisar_despachador()
         
         # Obtener información actualizada de la sala
         cursor.execute(
@@ -607,27 +631,12 @@ def handle_confirmar_cambio(call):
                 "👥 Se han mantenido todos los miembros anteriores.\n"
                 "Se ha notificado a los miembros del cambio de propósito."
             )
-            # Notificar a los miembros del cambio
-            notificar_cambio_sala(sala_id, nuevo_proposito)
         
-        # Editar mensaje con confirmación
-        try:
-            bot.edit_message_text(
-                mensaje_exito,
-                chat_id=chat_id,
-                message_id=call.message.message_id,
-                parse_mode="Markdown"
-            )
-        except telebot.apihelper.ApiTelegramException as e:
-            if "message is not modified" in str(e):
-                pass  # Ignorar este error específico
-            else:
-                # Manejar otros errores
-                print(f"Error al editar mensaje de confirmación: {e}")
-                bot.send_message(chat_id, mensaje_exito, parse_mode="Markdown")
+        # Editar mensaje con confirmación (o enviarlo si ya no se puede editar)
+        editar_o_enviar(bot, chat_id, mensaje_exito, call.message.message_id, parse_mode="Markdown")
         
     except Exception as e:
-        print(f"Error al actualizar sala: {e}")
+        logger.error("Error al actualizar sala: %s", e)
         bot.answer_callback_query(call.id, "❌ Error al actualizar la sala")
     finally:
         conn.close()
@@ -636,7 +645,10 @@ def handle_confirmar_cambio(call):
 
 @bot.callback_query_handler(func=lambda call: call.data.startswith("ver_miembros_"))
 def handle_ver_miembros(call):
-    """Muestra la lista de miembros de la sala antes de decidir"""
+    """
+    Muestra la lista de miembros de la sala antes de decidir, por páginas
+    (ver_miembros_<sala>_<propósito>[_<a|s>_<id>])
+    """
     chat_id = call.message.chat.id
     data = call.data.split("_")
     sala_id = int(data[2])
@@ -648,89 +660,70 @@ def handle_ver_miembros(call):
         bot.answer_callback_query(call.id, "⚠️ No tienes permisos para esta acción")
         return
     
-    # Obtener lista de miembros
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute(
-        """
-        SELECT u.Nombre, u.Apellidos, u.Email_UGR, mg.Fecha_union, mg.Estado
-        FROM Miembros_Grupo mg
-        JOIN Usuarios u ON mg.Id_usuario = u.Id_usuario
-        WHERE mg.id_sala = ? AND mg.Estado = 'activo'
-        ORDER BY mg.Fecha_union DESC
-        """,
-        (sala_id,)
-    )
-    
-    miembros = cursor.fetchall()
-    
-    # Obtener información de la sala
-    cursor.execute(
-        "SELECT Nombre_sala FROM Grupos_tutoria WHERE id_sala = ?",
-        (sala_id,)
-    )
-    sala = cursor.fetchone()
-    conn.close()
+    # Obtener una página de miembros
+    miembros, hay_anterior, hay_siguiente = pagina_miembros(sala_id, data[4:])
     
-    if not miembros:
+    if not miembros and not data[4:]:
         # No hay miembros, cambiar directamente
         bot.answer_callback_query(call.id, "No hay miembros en esta sala")
         realizar_cambio_proposito(chat_id, call.message.message_id, sala_id, nuevo_proposito, user['Id_usuario'])
         return
     
-    # Crear mensaje con lista de miembros
-    mensaje = f"👥 *Miembros de la sala \"{sala['Nombre_sala']}\":*\n\n"
-    
-    for i, m in enumerate(miembros, 1):
-        nombre_completo = f"{m['Nombre']} {m['Apellidos'] or ''}"
-        fecha = m['Fecha_union'].split(' ')[0] if m['Fecha_union'] else 'Desconocida'
-        mensaje += f"{i}. *{nombre_completo}*\n   📧 {m['Email_UGR']}\n   📅 Unido: {fecha}\n\n"
+    # Información de la sala y total de miembros
+    sala = obtener_grupo_por_id(sala_id)
+    total = contar_miembros_sala(sala_id)
     
-    # Botones para continuar
-    markup = types.InlineKeyboardMarkup(row_width=1)
-    
-    markup.add(types.InlineKeyboardButton(
-        f"✅ Mantener a los {len(miembros)} miembros",
-        callback_data=f"confirmar_cambio_{sala_id}_{nuevo_proposito}_mantener"
-    ))
-    
-    markup.add(types.InlineKeyboardButton(
-        "❌ Eliminar a todos los miembros",
-        callback_data=f"confirmar_cambio_{sala_id}_{nuevo_proposito}_eliminar"
-    ))
+    # Crear mensaje con la página de miembros
+    mensaje = (
+        f"👥 *Miembros de la sala \"{escape_markdown(sala['Nombre_sala'])}\"* ({total}):\n\n"
+        + formatear_miembros(miembros, con_email=True)
+    )
     
-    markup.add(types.InlineKeyboardButton(
-        "↩️ Cancelar cambio",
-        callback_data=f"cancelar_edicion_{sala_id}"
-    ))
+    # Botones de página, exportación y para continuar
+    markup = teclado_paginas(
+        f"ver_miembros_{sala_id}_{nuevo_proposito}", miembros, hay_anterior, hay_siguiente,
+        filas_extra=(
+            (("📄 Exportar CSV", f"exportar_miembros_{sala_id}"),),
+            ((f"✅ Mantener a los {total} miembros", f"confirmar_cambio_{sala_id}_{nuevo_proposito}_mantener"),),
+            (("❌ Eliminar a todos los miembros", f"confirmar_cambio_{sala_id}_{nuevo_proposito}_eliminar"),),
+            (("↩️ Cancelar cambio", f"cancelar_edicion_{sala_id}"),),
+        )
+    )
     
     # Enviar mensaje con lista y opciones
-    bot.edit_message_text(
-        mensaje,
-        chat_id=chat_id,
-        message_id=call.message.message_id,
-        reply_markup=markup,
-        parse_mode="Markdown"
-    )
+    editar_o_enviar(bot, chat_id, mensaje, call.message.message_id, parse_mode="Markdown", reply_markup=markup)
     
     bot.answer_callback_query(call.id)
 
-@bot.callback_query_handler(func=lambda call: call.data.startswith("cancelar_edicion_"))
-def handle_cancelar_edicion(call):
-    """Cancela la edición de la sala"""
-    bot.edit_message_text(
-        "❌ Operación cancelada. No se realizaron cambios.",
-        chat_id=call.message.chat.id,
-        message_id=call.message.message_id
-    )
-    bot.answer_callback_query(call.id)
-
-def notificar_cambio_sala(sala_id, nuevo_proposito):
-    """Notifica a los miembros de la sala sobre el cambio de propósito"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+@bot.callback_query_handler(func=lambda call: call.data.startswith("exportar_miembros_"))
+def handle_exportar_miembros(call):
+    """Envía la lista completa de miembros de la sala como CSV (solo a su profesor)"""
+    sala_id = int(call.data.split("_")[2])
+    user = get_user_by_telegram_id(call.from_user.id)
+    sala = obtener_grupo_por_id(sala_id)
+    
+    if not user or not sala or sala['Id_usuario'] != user['Id_usuario']:
+        bot.answer_callback_query(call.id, "⚠️ No tienes permisos para esta acción")
+        return
     
+    bot.answer_callback_query(call.id, "Generando el CSV...")
+    try:
+        if not enviar_csv_miembros(bot, call.message.chat.id, sala_id, sala['Nombre_sala']):
+            bot.send_message(call.message.chat.id, "📊 La sala no tiene miembros que exportar.")
+    except Exception as e:
+        logger.error("Error exportando los miembros de la sala %s: %s", sala_id, e)
+        bot.send_message(call.message.chat.id, "❌ No se ha podido exportar la lista de miembros.")
+
+def notificar_cambio_sala(cursor, sala_id, nuevo_proposito, id_operacion):
+    """
+    Encola el aviso del cambio de propósito para los miembros de la sala.
+
+    Usa el cursor de la transacción que hace el cambio, así el aviso solo queda
+    registrado si el cambio se confirma.
+
+    Returns:
+        int: Número de avisos encolados
+    """
     # Obtener datos de la sala
     cursor.execute(
         """
@@ -745,8 +738,7 @@ def notificar_cambio_sala(sala_id, nuevo_proposito):
     sala = cursor.fetchone()
     
     if not sala:
-        conn.close()
-        return
+        return 0
     
     # Obtener miembros de la sala
     cursor.execute(
@@ -759,7 +751,6 @@ def notificar_cambio_sala(sala_id, nuevo_proposito):
         (sala_id,)
     )
     miembros = cursor.fetchall()
-    conn.close()
     
     # Textos para los propósitos (simplificado)
     propositos = {
@@ -779,24 +770,25 @@ def notificar_cambio_sala(sala_id, nuevo_proposito):
         )
     }
     
-    # Notificar a cada miembro
+    mensaje = (
+        f"ℹ️ *Cambio en sala de tutoría*\n\n"
+        f"El profesor *{escape_markdown(sala['NombreProfesor'])}* ha modificado el propósito "
+        f"de la sala *{escape_markdown(sala['Nombre_sala'])}*.\n\n"
+        f"*Nuevo propósito:* {propositos.get(nuevo_proposito, 'General')}\n"
+        f"*Asignatura:* {escape_markdown(sala['NombreAsignatura'] or 'General')}\n\n"
+        f"{explicaciones.get(nuevo_proposito, '')}\n\n"
+        f"Tu acceso a la sala se mantiene, pero la forma de interactuar "
+        f"podría cambiar según el nuevo propósito."
+    )
+    
+    # Encolar un aviso por miembro; la clave evita duplicados si se repite la operación
+    encolados = 0
     for miembro in miembros:
         if miembro['TelegramID']:
-            try:
-                bot.send_message(
-                    miembro['TelegramID'],
-                    f"ℹ️ *Cambio en sala de tutoría*\n\n"
-                    f"El profesor *{sala['NombreProfesor']}* ha modificado el propósito "
-                    f"de la sala *{sala['Nombre_sala']}*.\n\n"
-                    f"*Nuevo propósito:* {propositos.get(nuevo_proposito, 'General')}\n"
-                    f"*Asignatura:* {sala['NombreAsignatura'] or 'General'}\n\n"
-                    f"{explicaciones.get(nuevo_proposito, '')}\n\n"
-                    f"Tu acceso a la sala se mantiene, pero la forma de interactuar "
-                    f"podría cambiar según el nuevo propósito.",
-                    parse_mode="Markdown"
-                )
-            except Exception as e:
-                print(f"Error al notificar a usuario {miembro['Id_usuario']}: {e}")
+            clave = f"cambio_sala:{sala_id}:{id_operacion}:{miembro['TelegramID']}"
+            if encolar_mensaje(cursor, miembro['TelegramID'], mensaje, clave, parse_mode="Markdown"):
+                encolados += 1
+    return encolados
 
 def realizar_cambio_proposito(chat_id, message_id, sala_id, nuevo_proposito, user_id):
     """Realiza el cambio de propósito cuando no hay miembros que gestionar"""
@@ -858,9 +850,9 @@ def realizar_cambio_proposito(chat_id, message_id, sala_id, nuevo_proposito, use
             # Primero intentar con el bot actual (aunque probablemente fallará)
             try:
                 bot.set_chat_title(telegram_chat_id, nuevo_nombre)
-                print(f"✅ Nombre del grupo actualizado a: {nuevo_nombre}")
+                logger.debug("Nombre del grupo actualizado a: %s", nuevo_nombre)
             except Exception as e:
-                print(f"⚠️ Bot principal no pudo cambiar el nombre: {e}")
+                logger.warning("Bot principal no pudo cambiar el nombre: %s", e)
                 
                 # Si falla, utilizar la función del bot de grupos
                 try:
@@ -869,11 +861,11 @@ def realizar_cambio_proposito(chat_id, message_id, sala_id, nuevo_proposito, use
                     
                     # Llamar a la función para cambiar el nombre
                     if cambiar_nombre_grupo_telegram(telegram_chat_id, nuevo_nombre):
-                        print(f"✅ Nombre del grupo actualizado usando el bot de grupos")
+                        logger.debug("Nombre del grupo actualizado usando el bot de grupos")
                     else:
-                        print(f"❌ No se pudo cambiar el nombre del grupo ni siquiera con el bot de grupos")
+                        logger.debug("No se pudo cambiar el nombre del grupo ni siquiera con el bot de grupos")
                 except Exception as e:
-                    print(f"❌ Error al intentar utilizar la función del bot de grupos: {e}")
+                    logger.error("Error al intentar utilizar la función del bot de grupos: %s", e)
         
         conn.commit()
         
@@ -909,7 +901,7 @@ def realizar_cambio_proposito(chat_id, message_id, sala_id, nuevo_proposito, use
         )
         
     except Exception as e:
-        print(f"Error al actualizar sala: {e}")
+        logger.error("Error al actualizar sala: %s", e)
         bot.send_message(chat_id, "❌ Error al actualizar la sala")
     finally:
         conn.close()
@@ -929,17 +921,17 @@ def obtener_nombre_profesor(user_id):
 def handle_eliminar_sala(call):
     """Maneja la solicitud de eliminación de una sala"""
     chat_id = call.message.chat.id
-    print(f"\n\n### INICIO ELIMINAR_SALA - Callback: {call.data} ###")
+    evento(logger, "inicio", handler="eliminar_sala", callback=call.data)
     
     try:
         sala_id = int(call.data.split("_")[1])
-        print(f"🔍 Sala ID a eliminar: {sala_id}")
+        logger.debug("Sala ID a eliminar: %s", sala_id)
         
         # Verificar que el usuario es el propietario de la sala
         user = get_user_by_telegram_id(call.from_user.id)
         
         if not user or user['Tipo'] != 'profesor':
-            print("⚠️ Usuario no es profesor o no existe")
+            logger.debug("Usuario no es profesor o no existe")
             bot.answer_callback_query(call.id, "⚠️ Solo los profesores propietarios pueden eliminar salas")
             return
         
@@ -958,12 +950,12 @@ def handle_eliminar_sala(call):
         sala = cursor.fetchone()
         
         if not sala:
-            print(f"❌ Sala no encontrada o no pertenece al usuario")
+            logger.debug("Sala no encontrada o no pertenece al usuario")
             bot.answer_callback_query(call.id, "❌ No se encontró la sala o no tienes permisos")
             conn.close()
             return
         
-        print(f"✅ Sala encontrada: {sala['Nombre_sala']} (Chat ID: {sala['Chat_id']})")
+        logger.debug("Sala encontrada: %s (Chat ID: %s)", sala['Nombre_sala'], sala['Chat_id'])
         
         # Contar miembros actuales
         cursor.execute(
@@ -1006,28 +998,26 @@ def handle_eliminar_sala(call):
         )
         
     except Exception as e:
-        print(f"❌ ERROR en handle_eliminar_sala: {e}")
-        import traceback
-        print(traceback.format_exc())
+        logger.exception("Error en handle_eliminar_sala: %s", e)
     
     bot.answer_callback_query(call.id)
-    print("### FIN ELIMINAR_SALA ###")
+    evento(logger, "fin", handler="eliminar_sala")
 
 @bot.callback_query_handler(func=lambda call: call.data.startswith("confirmar_eliminar_"))
 def handle_confirmar_eliminar(call):
     """Confirma y ejecuta la eliminación de la sala"""
     chat_id = call.message.chat.id
-    print(f"\n\n### INICIO CONFIRMAR_ELIMINAR - Callback: {call.data} ###")
+    evento(logger, "inicio", handler="confirmar_eliminar", callback=call.data)
     
     try:
         sala_id = int(call.data.split("_")[2])
-        print(f"🔍 Sala ID a eliminar definitivamente: {sala_id}")
+        logger.debug("Sala ID a eliminar definitivamente: %s", sala_id)
         
         # Verificar que el usuario es el propietario de la sala
         user = get_user_by_telegram_id(call.from_user.id)
         
         if not user or user['Tipo'] != 'profesor':
-            print("⚠️ Usuario no es profesor o no existe")
+            logger.debug("Usuario no es profesor o no existe")
             bot.answer_callback_query(call.id, "⚠️ Solo los profesores propietarios pueden eliminar salas")
             return
         
@@ -1046,56 +1036,77 @@ def handle_confirmar_eliminar(call):
         sala = cursor.fetchone()
         
         if not sala:
-            print(f"❌ Sala no encontrada o no pertenece al usuario")
+            logger.debug("Sala no encontrada o no pertenece al usuario")
             bot.answer_callback_query(call.id, "❌ No se encontró la sala o no tienes permisos")
             conn.close()
             return
         
         nombre_sala = sala['Nombre_sala']
         telegram_chat_id = sala['Chat_id']
-        print(f"✅ Ejecutando eliminación de sala: {nombre_sala} (ID: {sala_id}, Chat ID: {telegram_chat_id})")
+        logger.debug("Ejecutando eliminación de sala: %s (ID: %s, Chat ID: %s)", nombre_sala, sala_id, telegram_chat_id)
+        
+        # Avisar a los estudiantes de la sala (se encola en la misma transacción)
+        cursor.execute(
+            """
+            SELECT u.TelegramID
+            FROM Miembros_Grupo mg
+            JOIN Usuarios u ON mg.Id_usuario = u.Id_usuario
+            WHERE mg.id_sala = ? AND u.Tipo = 'estudiante' AND mg.Estado = 'activo'
+            """,
+            (sala_id,)
+        )
+        aviso = (
+            f"ℹ️ *Sala de tutoría eliminada*\n\n"
+            f"El profesor *{escape_markdown(user['Nombre'])}* ha eliminado la sala "
+            f"*{escape_markdown(nombre_sala)}*."
+        )
+        for miembro in cursor.fetchall():
+            if miembro['TelegramID']:
+                encolar_mensaje(cursor, miembro['TelegramID'], aviso,
+                                f"sala_eliminada:{sala_id}:{miembro['TelegramID']}", parse_mode="Markdown")
         
         # 1. Eliminar todos los miembros de la sala
-        print("1️⃣ Eliminando miembros...")
+        logger.debug("Eliminando miembros...")
         cursor.execute(
             "DELETE FROM Miembros_Grupo WHERE id_sala = ?",
             (sala_id,)
         )
-        print(f"  ✓ Miembros eliminados de la BD")
+        logger.debug("Miembros eliminados de la BD")
         
         # 2. Eliminar la sala de la base de datos
-        print("2️⃣ Eliminando registro de sala...")
+        logger.debug("Eliminando registro de sala...")
         cursor.execute(
             "DELETE FROM Grupos_tutoria WHERE id_sala = ? AND Id_usuario = ?",
             (sala_id, user['Id_usuario'])
         )
-        print(f"  ✓ Sala eliminada de la BD")
+        logger.debug("Sala eliminada de la BD")
         
         # Confirmar cambios en la base de datos
         conn.commit()
         conn.close()
-        print("✅ Cambios en BD confirmados")
+        avisar_despachador()
+        logger.debug("Cambios en BD confirmados")
         
         # 3. Intentar salir del grupo de Telegram
-        print("3️⃣ Intentando salir del grupo de Telegram...")
+        logger.debug("Intentando salir del grupo de Telegram...")
         try:
             bot.leave_chat(telegram_chat_id)
-            print(f"  ✓ Bot salió del grupo de Telegram: {telegram_chat_id}")
+            logger.debug("Bot salió del grupo de Telegram: %s", telegram_chat_id)
         except Exception as e:
-            print(f"  ⚠️ No se pudo salir del grupo de Telegram: {e}")
+            logger.warning("No se pudo salir del grupo de Telegram: %s", e)
             
             # Intentar con el bot de grupos si está disponible
             try:
                 from grupo_handlers.grupos import salir_de_grupo
                 if salir_de_grupo(telegram_chat_id):
-                    print("  ✓ Bot de grupos salió del grupo")
+                    logger.debug("Bot de grupos salió del grupo")
                 else:
-                    print("  ⚠️ Bot de grupos no pudo salir del grupo")
+                    logger.debug("Bot de grupos no pudo salir del grupo")
             except Exception as e:
-                print(f"  ⚠️ Error al usar la función del bot de grupos: {e}")
+                logger.warning("Error al usar la función del bot de grupos: %s", e)
         
         # 4. Enviar mensaje de confirmación
-        print("4️⃣ Enviando confirmación al usuario...")
+        logger.debug("Enviando confirmación al usuario...")
         bot.edit_message_text(
             f"✅ *Sala eliminada con éxito*\n\n"
             f"La sala \"{escape_markdown(nombre_sala)}\" ha sido eliminada completamente.\n"
@@ -1104,12 +1115,10 @@ def handle_confirmar_eliminar(call):
             message_id=call.message.message_id,
             parse_mode="Markdown"
         )
-        print("  ✓ Mensaje de confirmación enviado")
+        logger.debug("Mensaje de confirmación enviado")
         
     except Exception as e:
-        print(f"❌ ERROR en handle_confirmar_eliminar: {e}")
-        import traceback
-        print(traceback.format_exc())
+        logger.exception("Error en handle_confirmar_eliminar: %s", e)
         bot.edit_message_text(
             "❌ Ha ocurrido un error al intentar eliminar la sala. Por favor, inténtalo de nuevo.",
             chat_id=chat_id,
@@ -1117,11 +1126,11 @@ def handle_confirmar_eliminar(call):
         )
     
     bot.answer_callback_query(call.id)
-    print("### FIN CONFIRMAR_ELIMINAR ###")
+    evento(logger, "fin", handler="confirmar_eliminar")
 
 @bot.message_handler(commands=['crear_grupo_tutoria'])
-def crear_grupo(message):
-    """Proporciona instrucciones para crear un grupo de tutoría en Telegram"""
+def crear_grupo(message, message_id=None):
+    """Proporciona instrucciones para crear un grupo de tutoría en Telegram (editando message_id si se indica)"""
     chat_id = message.chat.id
     user = get_user_by_telegram_id(message.from_user.id)
     
@@ -1179,13 +1188,9 @@ def crear_grupo(message):
     
     # Enviar mensaje SIN formato markdown para evitar errores
     try:
-        bot.send_message(
-            chat_id,
-            instrucciones,
-            reply_markup=markup
-        )
+        editar_o_enviar(bot, chat_id, instrucciones, message_id, reply_markup=markup)
     except Exception as e:
-        print(f"Error al enviar instrucciones de creación de grupo: {e}")
+        logger.error("Error al enviar instrucciones de creación de grupo: %s", e)
         bot.send_message(
             chat_id,
             "Para crear un grupo de tutoría: 1) Cree un grupo, 2) Añada al bot como administrador, "
@@ -1202,21 +1207,18 @@ def handler_ver_salas(call):
     user_id = call.from_user.id
     
     # Depuración adicional
-    print(f"\n\n### INICIO VER_SALAS CALLBACK ###")
-    print(f"🔍 Callback data: {call.data}")
-    print(f"👤 User ID: {user_id}, Chat ID: {chat_id}")
-    print(f"📝 Message ID: {call.message.message_id}")
+    evento(logger, "inicio", handler="ver_salas", callback=call.data, user_id=user_id, chat_id=chat_id, message_id=call.message.message_id)
     
     # Responder al callback inmediatamente para evitar el error de "query is too old"
     try:
         bot.answer_callback_query(call.id)
-        print("✅ Callback respondido correctamente")
+        logger.debug("Callback respondido correctamente")
     except Exception as e:
-        print(f"❌ Error al responder al callback: {e}")
+        logger.error("Error al responder al callback: %s", e)
     
     # Solución para evitar crear un mensaje simulado
     try:
-        print("🔄 Llamando directamente a handle_ver_misdatos...")
+        logger.debug("Llamando directamente a handle_ver_misdatos...")
         
         # En lugar de crear un mensaje simulado, llamamos directamente a la función
         # y proporcionamos los datos mínimos necesarios
@@ -1238,15 +1240,36 @@ def handler_ver_salas(call):
         
         # Llamar directamente a la función de manejo
         handle_ver_misdatos(msg)
-        print("✅ handle_ver_misdatos llamado con éxito")
+        logger.debug("handle_ver_misdatos llamado con éxito")
     except Exception as e:
-        print(f"❌ Error al llamar a handle_ver_misdatos: {str(e)}")
-        import traceback
-        print("📋 Traza de error completa:")
-        traceback.print_exc()
+        logger.exception("Error al llamar a handle_ver_misdatos: %s", e)
         bot.send_message(chat_id, "❌ Error al mostrar tus salas. Intenta usar /ver_misdatos directamente.")
     
-    print("### FIN VER_SALAS CALLBACK ###\n\n")
+    evento(logger, "fin", handler="ver_salas")
+
+
+# Preguntas frecuentes sobre grupos (texto fijo: se valida una sola vez al enviarlo)
+TEXTO_FAQ_GRUPO = (
+    "❓ Preguntas frecuentes sobre grupos de tutoría\n\n"
+    
+    "¿Puedo crear varios grupos para la misma asignatura?\n"
+    "No, solamente un grupo para avisos por asignatura y despues una sala unica para tutorias individuales.\n\n"
+    
+    "¿Es necesario hacer administrador al bot?\n"
+    "Sí, el bot necesita permisos administrativos para poder gestioanr el grupo.\n\n"
+    
+    "¿Quién puede acceder al grupo?\n"
+    "Depende del tipo: los de avisos acceden todos los matriculados en la asignatura, los de tutoría individual requieren aprobación por parte del profeser siempre y cuando se encuentre en horario de tutorias.\n\n"
+    
+    "¿Puedo cambiar el tipo de grupo después?\n"
+    "Sí, use /ver_misdatos y seleccione la sala para modificar su propósito.\n\n"
+    
+    "¿Cómo eliminar un grupo?\n"
+    "Use /ver_misdatos, seleccione la sala y elija la opción de eliminar.\n\n"
+    
+    "¿Los estudiantes pueden crear grupos?\n"
+    "No, solo los profesores pueden crear grupos de tutoría oficiales."
+)
 
 
 @bot.callback_query_handler(func=lambda call: call.data == "faq_grupo")
@@ -1256,76 +1279,31 @@ def handler_faq_grupo(call):
     message_id = call.message.message_id
     
     # Depuración adicional
-    print(f"\n\n### INICIO FAQ_GRUPO CALLBACK ###")
-    print(f"🔍 Callback data: {call.data}")
-    print(f"👤 User ID: {call.from_user.id}, Chat ID: {chat_id}")
-    print(f"📝 Message ID: {message_id}")
+    evento(logger, "inicio", handler="faq_grupo", callback=call.data, user_id=call.from_user.id, chat_id=chat_id, message_id=message_id)
     
     # Responder al callback inmediatamente
     try:
         bot.answer_callback_query(call.id)
-        print("✅ Callback respondido correctamente")
+        logger.debug("Callback respondido correctamente")
     except Exception as e:
-        print(f"❌ Error al responder al callback: {e}")
+        logger.error("Error al responder al callback: %s", e)
     
     # FAQ sin formato Markdown para evitar problemas de formato
-    faq = (
-        "❓ Preguntas frecuentes sobre grupos de tutoría\n\n"
-        
-        "¿Puedo crear varios grupos para la misma asignatura?\n"
-        "No, solamente un grupo para avisos por asignatura y despues una sala unica para tutorias individuales.\n\n"
-        
-        "¿Es necesario hacer administrador al bot?\n"
-        "Sí, el bot necesita permisos administrativos para poder gestioanr el grupo.\n\n"
-        
-        "¿Quién puede acceder al grupo?\n"
-        "Depende del tipo: los de avisos acceden todos los matriculados en la asignatura, los de tutoría individual requieren aprobación por parte del profeser siempre y cuando se encuentre en horario de tutorias.\n\n"
-        
-        "¿Puedo cambiar el tipo de grupo después?\n"
-        "Sí, use /ver_misdatos y seleccione la sala para modificar su propósito.\n\n"
-        
-        "¿Cómo eliminar un grupo?\n"
-        "Use /ver_misdatos, seleccione la sala y elija la opción de eliminar.\n\n"
-        
-        "¿Los estudiantes pueden crear grupos?\n"
-        "No, solo los profesores pueden crear grupos de tutoría oficiales."
-    )
+    faq = TEXTO_FAQ_GRUPO
     
     # Botón para volver a las instrucciones
     markup = types.InlineKeyboardMarkup(row_width=1)
     markup.add(types.InlineKeyboardButton("🔙 Volver", callback_data="volver_instrucciones"))
-    print("✅ Markup de botones creado")
+    logger.debug("Markup de botones creado")
     
     try:
-        print("🔄 Intentando editar el mensaje actual...")
-        # Intentar editar el mensaje actual
-        bot.edit_message_text(
-            text=faq,
-            chat_id=chat_id,
-            message_id=message_id,
-            reply_markup=markup
-        )
-        print("✅ FAQ enviado con éxito (mensaje editado)")
+        # Editar el mensaje actual (si no se puede, se envía como mensaje nuevo)
+        editar_o_enviar(bot, chat_id, faq, message_id, reply_markup=markup)
+        logger.debug("FAQ enviado con éxito")
     except Exception as e:
-        print(f"❌ Error al editar mensaje para FAQ: {e}")
-        import traceback
-        print("📋 Traza de error completa:")
-        traceback.print_exc()
-        
-        # En caso de error, enviar como mensaje nuevo
-        try:
-            print("🔄 Intentando enviar como mensaje nuevo...")
-            bot.send_message(
-                chat_id,
-                faq,
-                reply_markup=markup
-            )
-            print("✅ FAQ enviado con éxito (mensaje nuevo)")
-        except Exception as e2:
-            print(f"❌ Error al enviar mensaje nuevo: {e2}")
-            traceback.print_exc()
+        logger.exception("Error al mostrar FAQ: %s", e)
     
-    print("### FIN FAQ_GRUPO CALLBACK ###\n\n")
+    evento(logger, "fin", handler="faq_grupo")
 
 
 @bot.callback_query_handler(func=lambda call: call.data == "volver_instrucciones")
@@ -1335,21 +1313,18 @@ def handler_volver_instrucciones(call):
     user_id = call.from_user.id
     
     # Depuración adicional
-    print(f"\n\n### INICIO VOLVER_INSTRUCCIONES CALLBACK ###")
-    print(f"🔍 Callback data: {call.data}")
-    print(f"👤 User ID: {user_id}, Chat ID: {chat_id}")
-    print(f"📝 Message ID: {call.message.message_id}")
+    evento(logger, "inicio", handler="volver_instrucciones", callback=call.data, user_id=user_id, chat_id=chat_id, message_id=call.message.message_id)
     
     # Responder al callback inmediatamente
     try:
         bot.answer_callback_query(call.id)
-        print("✅ Callback respondido correctamente")
+        logger.debug("Callback respondido correctamente")
     except Exception as e:
-        print(f"❌ Error al responder al callback: {e}")
+        logger.error("Error al responder al callback: %s", e)
     
     # Solución para evitar crear un mensaje simulado
     try:
-        print("🔄 Preparando llamada a crear_grupo...")
+        logger.debug("Preparando llamada a crear_grupo...")
         
         # Crear una clase simple que emule lo necesario de Message
         class SimpleMessage:
@@ -1361,18 +1336,15 @@ def handler_volver_instrucciones(call):
         # Crear el mensaje simplificado
         msg = SimpleMessage(chat_id, user_id, '/crear_grupo_tutoria')
         
-        # Llamar directamente a la función
-        print("🔄 Llamando a crear_grupo...")
-        crear_grupo(msg)
-        print("✅ crear_grupo llamado con éxito")
+        # Llamar directamente a la función reutilizando el mensaje actual
+        logger.debug("Llamando a crear_grupo...")
+        crear_grupo(msg, message_id=call.message.message_id)
+        logger.debug("crear_grupo llamado con éxito")
     except Exception as e:
-        print(f"❌ Error al llamar a crear_grupo: {str(e)}")
-        import traceback
-        print("📋 Traza de error completa:")
-        traceback.print_exc()
+        logger.exception("Error al llamar a crear_grupo: %s", e)
         bot.send_message(chat_id, "❌ Error al volver a las instrucciones. Intenta usar /crear_grupo_tutoria directamente.")
     
-    print("### FIN VOLVER_INSTRUCCIONES CALLBACK ###\n\n")
+    evento(logger, "fin", handler="volver_instrucciones")
 
 # Añadir al final del archivo, después de la función obtener_nombre_profesor
 
@@ -1386,6 +1358,12 @@ def setup_polling():
         else:
             print("⚠️ Error al configurar comandos")
         
+        # Enviar los avisos pendientes (incluidos los que quedaron antes de un reinicio)
+        iniciar_despachador(bot)
+        
+        # Endpoint local de métricas y resumen periódico en el log
+        iniciar_metricas(METRICAS_PUERTO)
+        
         # Agregar esta línea:
         print("⚙️ Configurando polling con eventos de grupo...")
         
@@ -1417,5 +1395,14 @@ if __name__ == "__main__":
     print(f"📊 Excel de datos: {EXCEL_PATH}")
     print("="*50)
     
+    # Logging asíncrono a consola y bot_principal.log (niveles en LOG_NIVEL / LOG_NIVELES)
+    configurar_logging("bot_principal.log")
+    
+    # Perfilado por muestreo bajo demanda con SIGUSR2 (también con /perfil)
+    instalar_senal_perfil("principal")
+    
+    # Esquema de la BD y sincronización del Excel (en segundo plano)
+    inicializar_datos()
+    
     # Iniciar el bot
     setup_polling()
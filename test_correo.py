@@ -0,0 +1,278 @@
+"""
+Pruebas del envío de correo (utils/correo.py) contra un servidor SMTP local.
+
+El servidor es un socket que habla lo justo de SMTP (EHLO, STARTTLS, AUTH
+PLAIN, MAIL, RCPT, DATA, QUIT) y al que se le puede pedir que corte la conexión
+o responda 421 en los próximos mensajes. El certificado para STARTTLS se genera
+con openssl al empezar; sin openssl las pruebas se saltan.
+
+Uso:
+    python -m unittest test_correo
+"""
+import socketserver
+import smtplib
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+import unittest
+import os
+from email.message import EmailMessage
+
+from utils import correo
+
+USUARIO = "bot@ugr.es"
+PASSWORD = "secreto"
+INACTIVIDAD = 0.5
+
+
+class _ManejadorSMTP(socketserver.StreamRequestHandler):
+    """Una conexión SMTP con el servidor de pruebas"""
+
+    def _responder(self, linea):
+        self.wfile.write(linea.encode() + b"\r\n")
+        self.wfile.flush()
+
+    def _ehlo(self):
+        extensiones = ["AUTH PLAIN"] if self.tls else ["STARTTLS"]
+        self._responder("250-localhost")
+        for extension in extensiones[:-1]:
+            self._responder(f"250-{extension}")
+        self._responder(f"250 {extensiones[-1]}")
+
+    def handle(self):
+        servidor = self.server
+        self.tls = False
+        with servidor.lock:
+            servidor.conexiones += 1
+        self._responder("220 localhost SMTP de pruebas")
+
+        while True:
+            linea = self.rfile.readline()
+            if not linea:
+                return
+            comando = linea.decode().strip()
+            verbo = comando.split(" ", 1)[0].upper()
+
+            if verbo in ("EHLO", "HELO"):
+                self._ehlo()
+            elif verbo == "STARTTLS":
+                self._responder("220 Listo para TLS")
+                self.request = servidor.contexto_tls.wrap_socket(self.request, server_side=True)
+                self.rfile = self.request.makefile("rb")
+                self.wfile = self.request.makefile("wb")
+                self.tls = True
+            elif verbo == "AUTH":
+                self._responder("235 Autenticado")
+            elif verbo == "MAIL":
+                with servidor.lock:
+                    accion = servidor.acciones.pop(0) if servidor.acciones else "ok"
+                if accion == "cortar":
+                    self.request.close()
+                    return
+                if accion == "421":
+                    self._responder("421 Demasiados mensajes en esta conexión")
+                    return
+                self._responder("250 OK")
+            elif verbo == "RCPT":
+                destinatario = comando.split(":", 1)[1].strip("<> ")
+                self._responder("250 OK")
+            elif verbo == "DATA":
+                self._responder("354 Fin con <CRLF>.<CRLF>")
+                while self.rfile.readline() not in (b".\r\n", b""):
+                    pass
+                with servidor.lock:
+                    servidor.recibidos.append(destinatario)
+                self._responder("250 Aceptado")
+            elif verbo == "RSET" or verbo == "NOOP":
+                self._responder("250 OK")
+            elif verbo == "QUIT":
+                with servidor.lock:
+                    servidor.quits += 1
+                self._responder("221 Adiós")
+                return
+            else:
+                self._responder("502 No implementado")
+
+    def finish(self):
+        try:
+            super().finish()
+        except OSError:
+            pass
+        if self.tls:
+            self.request.close()
+
+
+class ServidorSMTP(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, contexto_tls):
+        super().__init__(("127.0.0.1", 0), _ManejadorSMTP)
+        self.contexto_tls = contexto_tls
+        self.lock = threading.Lock()
+        self.reiniciar()
+
+    def reiniciar(self, acciones=()):
+        """Vacía los contadores; acciones se aplica a los próximos MAIL ('ok', 'cortar' o '421')"""
+        with self.lock:
+            self.acciones = list(acciones)
+            self.recibidos = []
+            self.conexiones = 0
+            self.quits = 0
+
+    @property
+    def puerto(self):
+        return self.server_address[1]
+
+
+def _mensaje(destinatario):
+    mensaje = EmailMessage()
+    mensaje["From"] = USUARIO
+    mensaje["To"] = destinatario
+    mensaje["Subject"] = "Código de verificación"
+    mensaje.set_content("Tu código es 123456")
+    return mensaje
+
+
+def _esperar(condicion, segundos=5):
+    limite = time.monotonic() + segundos
+    while time.monotonic() < limite:
+        if condicion():
+            return True
+        time.sleep(0.02)
+    return condicion()
+
+
+_servidor = None
+_directorio = None
+_sesion_hilo = None
+
+
+def setUpModule():
+    global _servidor, _directorio, _sesion_hilo
+    _directorio = tempfile.TemporaryDirectory()
+    certificado = os.path.join(_directorio.name, "cert.pem")
+    clave = os.path.join(_directorio.name, "clave.pem")
+    try:
+        subprocess.run(
+            ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+             "-subj", "/CN=localhost", "-keyout", clave, "-out", certificado],
+            check=True, capture_output=True
+        )
+    except (OSError, subprocess.CalledProcessError) as e:
+        _directorio.cleanup()
+        raise unittest.SkipTest(f"No se puede generar el certificado de pruebas: {e}")
+
+    contexto = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    contexto.load_cert_chain(certificado, clave)
+    _servidor = ServidorSMTP(contexto)
+    threading.Thread(target=_servidor.serve_forever, daemon=True).start()
+
+    # Un solo hilo de envío contra el servidor local (nunca el SMTP de config)
+    correo.CORREO_MAX_INACTIVIDAD = INACTIVIDAD
+    _sesion_hilo = correo.SesionSMTP("127.0.0.1", _servidor.puerto, USUARIO, PASSWORD)
+    with correo._lock_hilos:
+        assert not correo._hilos, "El envío de correo ya estaba iniciado"
+        hilo = threading.Thread(target=correo._bucle_envio, args=(_sesion_hilo,), name="correo_pruebas", daemon=True)
+        hilo.start()
+        correo._hilos.append(hilo)
+
+
+def tearDownModule():
+    _sesion_hilo.cerrar()
+    _servidor.shutdown()
+    _servidor.server_close()
+    _directorio.cleanup()
+
+
+class PruebasSesionSMTP(unittest.TestCase):
+    """SesionSMTP.enviar: reutilización de la sesión, reconexión y reintento"""
+
+    def setUp(self):
+        _servidor.reiniciar()
+        self.sesion = correo.SesionSMTP("127.0.0.1", _servidor.puerto, USUARIO, PASSWORD)
+
+    def tearDown(self):
+        self.sesion.cerrar()
+
+    def test_reutiliza_la_sesion(self):
+        for i in range(3):
+            self.sesion.enviar(_mensaje(f"alumno{i}@correo.ugr.es"))
+        self.assertEqual(self.sesion.conexiones, 1)
+        self.assertEqual(_servidor.conexiones, 1)
+        self.assertEqual(len(_servidor.recibidos), 3)
+
+    def test_reconecta_si_el_servidor_corta(self):
+        self.sesion.enviar(_mensaje("primero@correo.ugr.es"))
+        _servidor.reiniciar(["cortar"])
+        self.sesion.enviar(_mensaje("segundo@correo.ugr.es"))
+        self.assertEqual(self.sesion.conexiones, 2)
+        self.assertEqual(_servidor.recibidos, ["segundo@correo.ugr.es"])
+
+    def test_reconecta_tras_421(self):
+        _servidor.reiniciar(["421"])
+        self.sesion.enviar(_mensaje("alumno@correo.ugr.es"))
+        self.assertEqual(self.sesion.conexiones, 2)
+        self.assertEqual(_servidor.recibidos, ["alumno@correo.ugr.es"])
+
+    def test_solo_reintenta_una_vez(self):
+        _servidor.reiniciar(["421", "cortar"])
+        with self.assertRaises(smtplib.SMTPServerDisconnected):
+            self.sesion.enviar(_mensaje("alumno@correo.ugr.es"))
+        self.assertEqual(_servidor.recibidos, [])
+
+
+class PruebasEnvioEnSegundoPlano(unittest.TestCase):
+    """enviar_correo y el hilo de envío: notificación, lotes e inactividad"""
+
+    def setUp(self):
+        _servidor.reiniciar()
+
+    def _enviar(self, destinatarios):
+        """Encola los correos y devuelve los errores notificados, en orden de destinatario"""
+        errores = {}
+        hechos = threading.Event()
+
+        def al_terminar(destinatario):
+            def notificar(error):
+                errores[destinatario] = error
+                if len(errores) == len(destinatarios):
+                    hechos.set()
+            return notificar
+
+        for destinatario in destinatarios:
+            correo.enviar_correo(_mensaje(destinatario), al_terminar(destinatario))
+        self.assertTrue(hechos.wait(5), "No se han notificado todos los correos")
+        return [errores[d] for d in destinatarios]
+
+    def test_entrega_notifica_sin_error(self):
+        self.assertEqual(self._enviar(["alumno@correo.ugr.es"]), [None])
+        self.assertEqual(_servidor.recibidos, ["alumno@correo.ugr.es"])
+        self.assertEqual(correo.correos_en_cola(), 0)
+
+    def test_lote_por_la_misma_sesion(self):
+        destinatarios = [f"alumno{i}@correo.ugr.es" for i in range(correo.CORREO_LOTE + 3)]
+        self.assertEqual(self._enviar(destinatarios), [None] * len(destinatarios))
+        self.assertEqual(sorted(_servidor.recibidos), sorted(destinatarios))
+        self.assertLessEqual(_servidor.conexiones, 1)
+
+    def test_fallo_definitivo_notifica_el_error(self):
+        _servidor.reiniciar(["421", "421"])
+        error, = self._enviar(["alumno@correo.ugr.es"])
+        self.assertIsInstance(error, smtplib.SMTPResponseException)
+        self.assertEqual(error.smtp_code, 421)
+        self.assertEqual(_servidor.recibidos, [])
+
+        # El hilo sigue enviando después del fallo
+        self.assertEqual(self._enviar(["otro@correo.ugr.es"]), [None])
+
+    def test_cierra_la_sesion_inactiva(self):
+        self._enviar(["alumno@correo.ugr.es"])
+        self.assertTrue(_esperar(lambda: _sesion_hilo._smtp is None, INACTIVIDAD * 4))
+        self.assertTrue(_esperar(lambda: _servidor.quits == 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,216 @@
+"""
+Peticiones de valoración al terminar una sesión de tutoría.
+
+Los handlers que terminan la sesión de un estudiante solo apuntan el fin de
+sesión con programar_valoracion(), sin consultas ni envíos. Un hilo espera
+VALORACION_AGRUPAR segundos para juntar los fines de sesión que llegan seguidos
+(p. ej. un profesor que cierra la tutoría de todo un grupo) y procesa el lote
+con tres consultas, sea cual sea su tamaño: las salas con su profesor, los
+estudiantes y las valoraciones que ya han hecho hoy en esas salas.
+
+A cada estudiante que todavía no ha valorado la sesión se le encola la petición
+en Mensajes_Pendientes, que envía el despachador del bot de grupos con su ritmo
+limitado (COLA_MENSAJES_POR_SEGUNDO). La sesión es la sala y el día: la clave de
+idempotencia de la petición incluye los dos, así que terminar dos veces la misma
+sesión no repite la petición.
+
+Los fines de sesión se guardan en memoria hasta procesar el lote; si el bot se
+para en esos segundos, esas peticiones se pierden.
+"""
+import collections
+import datetime
+import queue
+import threading
+import time
+import logging
+import sys
+import os
+
+# Añadir directorio padre al path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import VALORACION_AGRUPAR
+from db.queries import get_db_connection, sumar_periodos_valoracion
+from utils.cola_mensajes import encolar_mensaje, avisar_despachador, BOT_GRUPOS
+from utils.markdown import escape_markdown
+from utils.teclados import teclado_inline
+
+logger = logging.getLogger(__name__)
+
+# Fines de sesión como máximo por lote (limita el tamaño de los IN de las consultas)
+MAX_LOTE = 500
+
+# Fines de sesión pendientes: (chat_id de la sala, TelegramID del estudiante, fecha)
+_eventos = queue.Queue()
+_hilos = []
+_lock_hilos = threading.Lock()
+
+
+def programar_valoracion(chat_id, telegram_id, fecha=None):
+    """
+    Apunta el fin de la sesión de un estudiante para pedirle la valoración.
+
+    Args:
+        chat_id: Chat de la sala de tutoría
+        telegram_id: TelegramID del estudiante
+        fecha: Momento en que termina la sesión (ahora si no se indica)
+    """
+    iniciar_avisos_valoracion()
+    _eventos.put((str(chat_id), int(telegram_id), fecha or datetime.datetime.now()))
+
+
+def _cargar_lote(cursor, eventos):
+    """
+    Resuelve un lote de fines de sesión en las peticiones que hay que enviar.
+
+    Returns:
+        list: Un dict por petición, sin estudiantes repetidos por sala ni
+        estudiantes que ya han valorado la sesión
+    """
+    chats = sorted({chat_id for chat_id, _, _ in eventos})
+    telegram_ids = sorted({telegram_id for _, telegram_id, _ in eventos})
+
+    cursor.execute(f"""
+        SELECT g.id_sala, g.Chat_id, g.Nombre_sala, g.Id_usuario AS profesor_id, p.Nombre AS profesor_nombre
+        FROM Grupos_tutoria g
+        JOIN Usuarios p ON p.Id_usuario = g.Id_usuario
+        WHERE g.Chat_id IN ({", ".join("?" * len(chats))})
+    """, chats)
+    salas = {fila['Chat_id']: fila for fila in cursor.fetchall()}
+    if not salas:
+        return []
+
+    cursor.execute(f"""
+        SELECT Id_usuario, TelegramID FROM Usuarios
+        WHERE Tipo = 'estudiante' AND TelegramID IN ({", ".join("?" * len(telegram_ids))})
+    """, telegram_ids)
+    estudiantes = {fila['TelegramID']: fila['Id_usuario'] for fila in cursor.fetchall()}
+    if not estudiantes:
+        return []
+
+    # Valoraciones ya hechas en estas salas desde el primer día del lote
+    ids_salas = [sala['id_sala'] for sala in salas.values()]
+    ids_estudiantes = list(estudiantes.values())
+    desde = min(fecha for _, _, fecha in eventos).strftime("%Y-%m-%d")
+    cursor.execute(f"""
+        SELECT evaluador_id, id_sala, substr(fecha, 1, 10) AS dia FROM Valoraciones
+        WHERE id_sala IN ({", ".join("?" * len(ids_salas))})
+          AND evaluador_id IN ({", ".join("?" * len(ids_estudiantes))})
+          AND fecha >= ?
+    """, ids_salas + ids_estudiantes + [desde])
+    valoradas = {(fila['evaluador_id'], fila['id_sala'], fila['dia']) for fila in cursor.fetchall()}
+
+    peticiones = {}
+    for chat_id, telegram_id, fecha in eventos:
+        sala = salas.get(chat_id)
+        estudiante_id = estudiantes.get(telegram_id)
+        if sala is None or estudiante_id is None:
+            continue
+        dia = fecha.strftime("%Y-%m-%d")
+        clave = (sala['id_sala'], estudiante_id, dia)
+        if (estudiante_id, sala['id_sala'], dia) in valoradas or clave in peticiones:
+            continue
+        peticiones[clave] = {
+            "telegram_id": telegram_id,
+            "estudiante_id": estudiante_id,
+            "id_sala": sala['id_sala'],
+            "nombre_sala": sala['Nombre_sala'],
+            "profesor_id": sala['profesor_id'],
+            "profesor_nombre": sala['profesor_nombre'],
+            "fecha": fecha,
+        }
+    return list(peticiones.values())
+
+
+def _encolar_peticiones(cursor, peticiones):
+    """
+    Encola las peticiones con el cursor (y la transacción) del llamador y las
+    cuenta en Valoraciones_Periodos.
+
+    Returns:
+        int: Peticiones encoladas (las ya encoladas antes no se repiten)
+    """
+    solicitudes = collections.Counter()
+    for peticion in peticiones:
+        texto = (
+            "📝 *Valora tu tutoría*\n\n"
+            f"Has terminado tu sesión en *{escape_markdown(peticion['nombre_sala'])}* "
+            f"con *{escape_markdown(peticion['profesor_nombre'])}*.\n\n"
+            "¿Qué tal ha ido? Tu valoración ayuda a mejorar las tutorías."
+        )
+        markup = teclado_inline(((
+            ("⭐ Valorar la tutoría", f"valorar_{peticion['profesor_id']}_{peticion['id_sala']}"),
+        ),))
+        clave = f"valoracion:{peticion['id_sala']}:{peticion['estudiante_id']}:{peticion['fecha']:%Y-%m-%d}"
+        if encolar_mensaje(cursor, peticion['telegram_id'], texto, clave, parse_mode="Markdown",
+                           reply_markup=markup, bot_nombre=BOT_GRUPOS):
+            solicitudes[(peticion['profesor_id'], peticion['id_sala'], peticion['fecha'].date())] += 1
+
+    # Una suma por profesor, sala y día para la tasa de respuesta
+    for (profesor_id, id_sala, dia), total in solicitudes.items():
+        sumar_periodos_valoracion(cursor, dia, profesor_id, id_sala, solicitudes=total)
+    return sum(solicitudes.values())
+
+
+def procesar_lote(eventos):
+    """
+    Resuelve y encola un lote de fines de sesión en una transacción.
+
+    Returns:
+        int: Peticiones encoladas
+    """
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        encoladas = _encolar_peticiones(cursor, _cargar_lote(cursor, eventos))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    if encoladas:
+        avisar_despachador(BOT_GRUPOS)
+    return encoladas
+
+
+def _bucle_avisos():
+    """Junta los fines de sesión durante VALORACION_AGRUPAR segundos y los procesa por lotes"""
+    while True:
+        lote = [_eventos.get()]
+        limite = time.monotonic() + VALORACION_AGRUPAR
+        while len(lote) < MAX_LOTE:
+            espera = limite - time.monotonic()
+            try:
+                lote.append(_eventos.get(timeout=espera) if espera > 0 else _eventos.get_nowait())
+            except queue.Empty:
+                break
+
+        inicio = time.perf_counter()
+        try:
+            encoladas = procesar_lote(lote)
+            logger.info("Peticiones de valoración: %d fines de sesión, %d encoladas en %.0fms",
+                        len(lote), encoladas, (time.perf_counter() - inicio) * 1000)
+        except Exception:
+            logger.exception("Error al encolar %d peticiones de valoración", len(lote))
+        finally:
+            for _ in lote:
+                _eventos.task_done()
+
+
+def iniciar_avisos_valoracion():
+    """Arranca (una sola vez) el hilo que agrupa y encola las peticiones de valoración"""
+    with _lock_hilos:
+        if _hilos:
+            return _hilos[0]
+        hilo = threading.Thread(target=_bucle_avisos, name="avisos_valoracion", daemon=True)
+        hilo.start()
+        _hilos.append(hilo)
+        logger.info("Peticiones de valoración agrupadas cada %.1fs", VALORACION_AGRUPAR)
+        return hilo
+
+
+def valoraciones_en_espera():
+    """Fines de sesión que todavía no se han procesado"""
+    return _eventos.unfinished_tasks
@@ -0,0 +1,247 @@
+"""
+Cola de salida de mensajes guardada en la base de datos (tabla Mensajes_Pendientes).
+
+Los avisos se registran con encolar_mensaje en la misma transacción que el cambio
+de estado que los provoca, y un hilo por bot los envía por lotes con un ritmo
+limitado y reintentos. Un mensaje solo se marca como enviado después de que
+Telegram lo acepte, así que la entrega es "al menos una vez": si el proceso muere
+a mitad de un lote, al reiniciar se reenvían los mensajes de ese lote.
+"""
+import threading
+import time
+import logging
+import sqlite3
+import sys
+import os
+
+from telebot.apihelper import ApiTelegramException
+
+# Añadir directorio padre al path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import (
+    COLA_LOTE,
+    COLA_MENSAJES_POR_SEGUNDO,
+    COLA_MAX_INTENTOS,
+    COLA_INTERVALO,
+    COLA_DIAS_RETENCION
+)
+from db.queries import get_db_connection
+from utils.markdown import formato_validado
+from utils.teclados import TecladoCongelado
+
+logger = logging.getLogger(__name__)
+
+# Nombres de los bots que comparten la cola
+BOT_PRINCIPAL = "principal"
+BOT_GRUPOS = "grupos"
+
+# Espera máxima entre reintentos de un mismo mensaje (segundos)
+MAX_ESPERA_REINTENTO = 300
+
+# Eventos para despertar al despachador de cada bot y sus hilos
+_avisos = {}
+_hilos = {}
+_lock_hilos = threading.Lock()
+
+
+def encolar_mensaje(cursor, chat_id, texto, clave, parse_mode=None, reply_markup=None, bot_nombre=BOT_PRINCIPAL):
+    """
+    Registra un mensaje pendiente usando el cursor (y la transacción) del llamador.
+
+    Args:
+        cursor: Cursor de la transacción que realiza el cambio de estado
+        chat_id: Chat de destino
+        texto: Texto del mensaje
+        clave: Clave de idempotencia; encolar dos veces la misma clave no duplica el envío
+        parse_mode: Formato del texto (se valida ahora para no fallar al enviarlo)
+        reply_markup: Teclado opcional
+        bot_nombre: Bot que debe enviar el mensaje
+
+    Returns:
+        bool: True si se ha encolado, False si la clave ya existía
+    """
+    if parse_mode:
+        parse_mode = formato_validado(texto, parse_mode)
+
+    cursor.execute(
+        """
+        INSERT OR IGNORE INTO Mensajes_Pendientes
+        (Clave, Bot, Chat_id, Texto, Parse_mode, Reply_markup)
+        VALUES (?, ?, ?, ?, ?, ?)
+        """,
+        (clave, bot_nombre, chat_id, texto, parse_mode,
+         reply_markup.to_json() if reply_markup is not None else None)
+    )
+    return cursor.rowcount > 0
+
+
+def avisar_despachador(bot_nombre=BOT_PRINCIPAL):
+    """Despierta al despachador después de confirmar la transacción que encoló mensajes"""
+    evento = _avisos.get(bot_nombre)
+    if evento:
+        evento.set()
+
+
+def _espera_reintento(intentos):
+    """Backoff exponencial entre reintentos"""
+    return min(MAX_ESPERA_REINTENTO, 5 * (2 ** intentos))
+
+
+def procesar_lote(bot, bot_nombre=BOT_PRINCIPAL, lote=COLA_LOTE):
+    """
+    Envía un lote de mensajes pendientes y guarda el resultado en una sola transacción.
+
+    Returns:
+        tuple: (mensajes procesados, segundos que hay que esperar por límite de Telegram)
+    """
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            SELECT id, Chat_id, Texto, Parse_mode, Reply_markup, Intentos
+            FROM Mensajes_Pendientes
+            WHERE Estado = 'pendiente' AND Bot = ? AND Proximo_intento <= ?
+            ORDER BY id
+            LIMIT ?
+            """,
+            (bot_nombre, time.time(), lote)
+        )
+        filas = cursor.fetchall()
+        if not filas:
+            return 0, 0
+
+        intervalo = 1.0 / COLA_MENSAJES_POR_SEGUNDO if COLA_MENSAJES_POR_SEGUNDO > 0 else 0
+        enviados = []
+        reintentos = []
+        fallidos = []
+        espera_limite = 0
+
+        for fila in filas:
+            inicio = time.monotonic()
+            try:
+                markup = TecladoCongelado.desde_json(fila['Reply_markup']) if fila['Reply_markup'] else None
+                bot.send_message(fila['Chat_id'], fila['Texto'], parse_mode=fila['Parse_mode'], reply_markup=markup)
+                enviados.append((fila['id'],))
+            except ApiTelegramException as e:
+                if e.error_code == 429:
+                    # Límite de Telegram: parar el lote y reintentar cuando indique
+                    espera_limite = (e.result_json or {}).get('parameters', {}).get('retry_after', 5)
+                    break
+                if e.error_code in (400, 403):
+                    # Chat inexistente, bot bloqueado...: reintentar no lo arregla
+                    fallidos.append((str(e), fila['id']))
+                else:
+                    reintentos.append((time.time() + _espera_reintento(fila['Intentos']), str(e),
+                                       COLA_MAX_INTENTOS, fila['id']))
+            except Exception as e:
+                reintentos.append((time.time() + _espera_reintento(fila['Intentos']), str(e),
+                                   COLA_MAX_INTENTOS, fila['id']))
+
+            restante = intervalo - (time.monotonic() - inicio)
+            if restante > 0:
+                time.sleep(restante)
+
+        cursor.executemany(
+            "UPDATE Mensajes_Pendientes SET Estado = 'enviado', Fecha_envio = CURRENT_TIMESTAMP WHERE id = ?",
+            enviados
+        )
+        cursor.executemany(
+            """
+            UPDATE Mensajes_Pendientes
+            SET Intentos = Intentos + 1, Proximo_intento = ?, Ultimo_error = ?,
+                Estado = CASE WHEN Intentos + 1 >= ? THEN 'fallido' ELSE 'pendiente' END
+            WHERE id = ?
+            """,
+            reintentos
+        )
+        cursor.executemany(
+            "UPDATE Mensajes_Pendientes SET Estado = 'fallido', Intentos = Intentos + 1, Ultimo_error = ? WHERE id = ?",
+            fallidos
+        )
+        conn.commit()
+
+        if reintentos or fallidos:
+            logger.warning(f"Cola {bot_nombre}: {len(reintentos)} mensajes a reintentar, {len(fallidos)} fallidos")
+        return len(enviados) + len(reintentos) + len(fallidos), espera_limite
+    finally:
+        conn.close()
+
+
+def contar_pendientes():
+    """Devuelve {bot: mensajes pendientes de enviar}"""
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT Bot, COUNT(*) FROM Mensajes_Pendientes WHERE Estado = 'pendiente' GROUP BY Bot"
+        )
+        return {bot_nombre: cantidad for bot_nombre, cantidad in cursor.fetchall()}
+    finally:
+        conn.close()
+
+
+def limpiar_enviados(dias=COLA_DIAS_RETENCION):
+    """Borra los mensajes ya enviados hace más de 'dias' días"""
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            "DELETE FROM Mensajes_Pendientes WHERE Estado = 'enviado' AND Fecha_envio < datetime('now', ?)",
+            (f"-{dias} days",)
+        )
+        conn.commit()
+        return cursor.rowcount
+    finally:
+        conn.close()
+
+
+def _bucle_despachador(bot, bot_nombre, evento):
+    """Vacía la cola del bot de forma continua"""
+    ultima_limpieza = 0
+    while True:
+        procesados, espera = 0, 0
+        try:
+            procesados, espera = procesar_lote(bot, bot_nombre)
+
+            if time.time() - ultima_limpieza > 3600:
+                borrados = limpiar_enviados()
+                if borrados:
+                    logger.info(f"Cola {bot_nombre}: {borrados} mensajes enviados antiguos eliminados")
+                ultima_limpieza = time.time()
+        except sqlite3.Error as e:
+            logger.error(f"Error de base de datos en la cola de mensajes ({bot_nombre}): {e}")
+        except Exception as e:
+            logger.error(f"Error en la cola de mensajes ({bot_nombre}): {e}")
+
+        if espera:
+            time.sleep(espera)
+        elif not procesados:
+            evento.wait(COLA_INTERVALO)
+            evento.clear()
+
+
+def iniciar_despachador(bot, bot_nombre=BOT_PRINCIPAL):
+    """
+    Arranca (una sola vez por bot) el hilo que envía los mensajes pendientes.
+
+    Al arrancar, lo primero que hace es enviar lo que quedó pendiente antes de
+    un reinicio.
+    """
+    with _lock_hilos:
+        if bot_nombre in _hilos:
+            return _hilos[bot_nombre]
+
+        evento = threading.Event()
+        _avisos[bot_nombre] = evento
+        hilo = threading.Thread(
+            target=_bucle_despachador,
+            args=(bot, bot_nombre, evento),
+            name=f"cola_mensajes_{bot_nombre}",
+            daemon=True
+        )
+        hilo.start()
+        _hilos[bot_nombre] = hilo
+        logger.info(f"Despachador de la cola de mensajes iniciado para el bot {bot_nombre}")
+        return hilo
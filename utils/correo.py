@@ -0,0 +1,188 @@
+"""
+Envío de correos en segundo plano con sesiones SMTP persistentes.
+
+Los handlers encolan el mensaje con enviar_correo() y siguen: no esperan al
+EHLO/STARTTLS/LOGIN ni al envío. CORREO_SESIONES hilos vacían la cola, cada
+uno con su propia sesión autenticada que se reutiliza entre envíos. Cada hilo
+recoge por lotes lo que haya en la cola (hasta CORREO_LOTE) y lo envía por la
+misma sesión. Si el servidor corta la conexión, se reabre y se reintenta ese
+mensaje una vez. Una sesión sin uso durante CORREO_MAX_INACTIVIDAD segundos se
+cierra, antes de que lo haga el servidor.
+
+Los mensajes pueden ser un EmailMessage o un CorreoRenderizado de
+utils.plantillas_correo, que ya viene codificado y se envía tal cual.
+
+Cuando el servidor acepta el mensaje (o falla definitivamente) se llama a la
+función al_terminar(error) del llamador, con error None si se ha entregado.
+"""
+import queue
+import smtplib
+import threading
+import time
+import logging
+import sys
+import os
+
+# Añadir directorio padre al path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import (
+    SMTP_SERVER,
+    SMTP_PUERTO,
+    SMTP_EMAIL,
+    SMTP_PASSWORD,
+    CORREO_SESIONES,
+    CORREO_LOTE,
+    CORREO_MAX_INACTIVIDAD,
+    CORREO_TIMEOUT
+)
+from utils.plantillas_correo import CorreoRenderizado
+
+logger = logging.getLogger(__name__)
+
+# Errores tras los que merece la pena reconectar y reintentar el mensaje
+_ERRORES_CONEXION = (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError)
+
+# Mensajes pendientes: (EmailMessage o CorreoRenderizado, al_terminar)
+_cola = queue.Queue()
+_hilos = []
+_lock_hilos = threading.Lock()
+
+
+class SesionSMTP:
+    """Conexión SMTP autenticada que se reutiliza entre envíos y se reabre si se cae"""
+
+    def __init__(self, servidor=SMTP_SERVER, puerto=SMTP_PUERTO, usuario=SMTP_EMAIL, password=SMTP_PASSWORD):
+        self.servidor = servidor
+        self.puerto = puerto
+        self.usuario = usuario
+        self.password = password
+        self._smtp = None
+        self.conexiones = 0
+
+    def _conectar(self):
+        faltan = [nombre for nombre, valor in (
+            ("SMTP_SERVER", self.servidor), ("SMTP_EMAIL", self.usuario), ("SMTP_PASSWORD", self.password)
+        ) if not valor]
+        if faltan:
+            raise ValueError(f"Faltan credenciales en datos.env.txt: {', '.join(faltan)}")
+
+        smtp = smtplib.SMTP(str(self.servidor), self.puerto, timeout=CORREO_TIMEOUT)
+        try:
+            smtp.ehlo()
+            smtp.starttls()
+            smtp.ehlo()
+            smtp.login(str(self.usuario), str(self.password))
+        except Exception:
+            smtp.close()
+            raise
+        self._smtp = smtp
+        self.conexiones += 1
+        logger.debug("Sesión SMTP abierta con %s:%s", self.servidor, self.puerto)
+
+    def cerrar(self):
+        """Cierra la sesión (QUIT si el servidor sigue respondiendo)"""
+        smtp, self._smtp = self._smtp, None
+        if smtp is None:
+            return
+        try:
+            smtp.quit()
+        except Exception:
+            smtp.close()
+
+    def enviar(self, mensaje):
+        """Envía el mensaje por la sesión abierta; reconecta y reintenta una vez si se había caído"""
+        for intento in range(2):
+            if self._smtp is None:
+                self._conectar()
+            try:
+                if isinstance(mensaje, CorreoRenderizado):
+                    self._smtp.sendmail(mensaje.remitente, [mensaje.destinatario], mensaje.datos)
+                else:
+                    self._smtp.send_message(mensaje)
+                return
+            except _ERRORES_CONEXION:
+                self.cerrar()
+                if intento:
+                    raise
+            except smtplib.SMTPResponseException as e:
+                # 421: el servidor cierra la sesión (p.ej. demasiados mensajes por conexión)
+                if e.smtp_code != 421:
+                    raise
+                self.cerrar()
+                if intento:
+                    raise
+
+
+def _destinatario(mensaje):
+    if isinstance(mensaje, CorreoRenderizado):
+        return mensaje.destinatario
+    return mensaje["To"]
+
+
+def _notificar(al_terminar, error):
+    if al_terminar is None:
+        return
+    try:
+        al_terminar(error)
+    except Exception:
+        logger.exception("Error en la notificación de un correo enviado")
+
+
+def _bucle_envio(sesion):
+    """Envía por lotes los correos de la cola usando siempre la misma sesión"""
+    while True:
+        try:
+            lote = [_cola.get(timeout=CORREO_MAX_INACTIVIDAD)]
+        except queue.Empty:
+            sesion.cerrar()
+            continue
+
+        while len(lote) < CORREO_LOTE:
+            try:
+                lote.append(_cola.get_nowait())
+            except queue.Empty:
+                break
+
+        inicio = time.perf_counter()
+        for mensaje, al_terminar in lote:
+            error = None
+            try:
+                sesion.enviar(mensaje)
+            except Exception as e:
+                error = e
+                logger.error("Error en el envío del correo a %s: %s", _destinatario(mensaje), e)
+            _notificar(al_terminar, error)
+            _cola.task_done()
+        logger.debug("Lote de %d correos enviado en %.0fms", len(lote), (time.perf_counter() - inicio) * 1000)
+
+
+def iniciar_envio_correo(sesiones=CORREO_SESIONES):
+    """Arranca (una sola vez) los hilos que envían los correos encolados"""
+    with _lock_hilos:
+        if _hilos:
+            return _hilos
+        for i in range(max(1, sesiones)):
+            hilo = threading.Thread(target=_bucle_envio, args=(SesionSMTP(),), name=f"correo_{i}", daemon=True)
+            hilo.start()
+            _hilos.append(hilo)
+        logger.info("Envío de correo en segundo plano iniciado (%d sesiones SMTP)", len(_hilos))
+        return _hilos
+
+
+def enviar_correo(mensaje, al_terminar=None):
+    """
+    Encola un correo para enviarlo en segundo plano.
+
+    Args:
+        mensaje: EmailMessage ya construido o CorreoRenderizado de una plantilla
+        al_terminar: Función (error) a la que se llama desde el hilo de envío
+            cuando el servidor acepta el mensaje (error None) o falla
+    """
+    iniciar_envio_correo()
+    _cola.put((mensaje, al_terminar))
+
+
+def correos_en_cola():
+    """Correos encolados que todavía no se han enviado"""
+    return _cola.unfinished_tasks
@@ -1,4 +1,3 @@
-import pandas as pd
 import os
 import sys
 import logging
@@ -6,12 +5,14 @@ import traceback
 from pathlib import Path
 import sqlite3
 from datetime import datetime
-import openpyxl
 
 # Añadir directorio raíz al path
 sys.path.append(str(Path(__file__).parent.parent))
 from db.queries import get_db_connection, get_o_crear_carrera
 
+# pandas y openpyxl se importan dentro de las funciones que los usan: tardan
+# casi un segundo en cargarse y no hacen falta para arrancar los bots
+
 # Configurar logger
 logger = logging.getLogger(__name__)
 
@@ -19,10 +20,12 @@ logger = logging.getLogger(__name__)
 usuarios_excel = {}  # {email: {datos...}}
 excel_cargado = False
 excel_last_updated = None
+excel_generacion = 0  # Se incrementa cada vez que se recarga usuarios_excel
 
 def cargar_excel_en_memoria():
     """Carga todo el Excel en memoria una vez"""
-    global usuarios_excel, excel_cargado, excel_last_updated
+    import openpyxl
+    global usuarios_excel, excel_cargado, excel_last_updated, excel_generacion
     
     try:
         # Buscar el Excel
@@ -84,6 +87,7 @@ def cargar_excel_en_memoria():
         print(f"📧 Emails cargados: {list(usuarios_excel.keys())}")
         
         excel_cargado = True
+        excel_generacion += 1
         from datetime import datetime
         excel_last_updated = datetime.now().strftime("%Y-%m-%d %H:%M")
         
@@ -143,6 +147,7 @@ def cargar_excel(ruta_excel=None):
 
 def cargar_excel_a_base_de_datos():
     """Carga datos del Excel a la base de datos"""
+    import pandas as pd
     try:
         # Buscar el Excel en la carpeta data y en raíz
         excel_path = None
@@ -313,8 +318,18 @@ def get_last_updated():
     """Retorna fecha de última actualización de datos"""
     return excel_last_updated
 
+def estado_excel():
+    """Resumen de los datos del Excel en memoria (para /health)"""
+    return {
+        "cargado": excel_cargado,
+        "generacion": excel_generacion,
+        "usuarios": len(usuarios_excel),
+        "actualizado": excel_last_updated,
+    }
+
 def importar_datos_por_email(email):
     """Importa los datos de un usuario desde el Excel por su email"""
+    import pandas as pd
     try:
         # Buscar el Excel en múltiples ubicaciones
         excel_path = None
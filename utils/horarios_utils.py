@@ -1,13 +1,7 @@
 import re
 import logging
 
-logger = logging.getLogger("horarios")
-if not logger.handlers:
-    handler = logging.FileHandler("horarios.log")
-    formatter = logging.Formatter('%(asctime)s [%(levelname)s] %(message)s')
-    handler.setFormatter(formatter)
-    logger.addHandler(handler)
-    logger.setLevel(logging.INFO)
+logger = logging.getLogger(__name__)
 
 def parsear_horario_string(horario_str):
     """Convierte un horario en formato string a diccionario"""
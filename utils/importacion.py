@@ -0,0 +1,62 @@
+"""
+Importaciones diferidas para dependencias pesadas u opcionales.
+
+Un módulo puede declarar a nivel global un nombre que no se importa de verdad
+hasta que se usa por primera vez (al leer un atributo o al llamarlo). Así
+importar el módulo no cuesta nada ni falla aunque la dependencia no esté
+instalada, y el error aparece solo en el código que la necesita.
+"""
+import importlib
+import threading
+
+
+class ImportacionDiferida:
+    """Sustituto de un módulo (o de un atributo suyo) que se importa al primer uso"""
+
+    def __init__(self, modulo, atributo=None):
+        """
+        Args:
+            modulo: Nombre del módulo, p.ej. "telegram.ext"
+            atributo: Nombre dentro del módulo, p.ej. "ConversationHandler" (None = el propio módulo)
+        """
+        self._modulo = modulo
+        self._atributo = atributo
+        self._objeto = None
+        self._lock = threading.Lock()
+
+    def _resolver(self):
+        if self._objeto is None:
+            with self._lock:
+                if self._objeto is None:
+                    objeto = importlib.import_module(self._modulo)
+                    if self._atributo:
+                        objeto = getattr(objeto, self._atributo)
+                    self._objeto = objeto
+        return self._objeto
+
+    def __getattr__(self, nombre):
+        # Solo llega aquí para atributos que no son del propio sustituto
+        return getattr(self._resolver(), nombre)
+
+    def __call__(self, *args, **kwargs):
+        return self._resolver()(*args, **kwargs)
+
+    def __repr__(self):
+        nombre = f"{self._modulo}.{self._atributo}" if self._atributo else self._modulo
+        estado = "cargado" if self._objeto is not None else "sin cargar"
+        return f"<ImportacionDiferida {nombre} ({estado})>"
+
+
+def importar_diferido(modulo, *atributos):
+    """
+    Devuelve sustitutos diferidos del módulo o de los atributos indicados.
+
+    Ejemplos:
+        pd = importar_diferido("pandas")
+        Update, Markup = importar_diferido("telegram", "Update", "InlineKeyboardMarkup")
+    """
+    if not atributos:
+        return ImportacionDiferida(modulo)
+    if len(atributos) == 1:
+        return ImportacionDiferida(modulo, atributos[0])
+    return tuple(ImportacionDiferida(modulo, atributo) for atributo in atributos)
@@ -0,0 +1,193 @@
+"""
+Configuración única del logging de los bots.
+
+Cada proceso llama una vez a configurar_logging() al arrancar. Los handlers
+solo ponen el registro en una cola (QueueHandler) y un hilo aparte
+(QueueListener) lo escribe en consola y en el fichero rotativo del bot, así
+que la E/S nunca bloquea el procesamiento de los updates.
+
+Los registros se escriben como pares clave=valor (ts, nivel, logger, hilo,
+msg, los campos que se pasen en 'extra' o con evento() y el id de la traza
+del update si se está trazando, ver utils.trazas). El nivel general y
+los de cada módulo se configuran con LOG_NIVEL y LOG_NIVELES, y las trazas
+DEBUG se muestrean por update: solo se escriben las de 1 de cada
+LOG_MUESTREO_DEBUG, completas, para poder seguirlas de principio a fin.
+"""
+import logging
+import logging.handlers
+import threading
+import itertools
+import atexit
+import queue
+import json
+import copy
+import sys
+import os
+
+# Añadir directorio padre al path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import LOG_DIR, LOG_NIVEL, LOG_NIVELES, LOG_MUESTREO_DEBUG, LOG_MAX_MB, LOG_COPIAS
+from utils.trazas import id_traza_actual
+
+# Atributos propios de LogRecord: el resto son campos añadidos con 'extra'
+_ATRIBUTOS_REGISTRO = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+# Decisión de muestreo del update que procesa cada hilo
+_muestreo = threading.local()
+_contador_updates = itertools.count()
+
+_listener = None
+_lock = threading.Lock()
+
+
+def _valor(valor):
+    """Formatea un valor para clave=valor (entre comillas si hace falta)"""
+    texto = str(valor)
+    if texto and not any(c in texto for c in ' ="\n\t'):
+        return texto
+    return json.dumps(texto, ensure_ascii=False)
+
+
+class FormatoClaveValor(logging.Formatter):
+    """Escribe cada registro como una línea de pares clave=valor"""
+
+    def format(self, record):
+        campos = [
+            ("ts", self.formatTime(record)),
+            ("nivel", record.levelname),
+            ("logger", record.name),
+            ("hilo", record.threadName),
+            ("msg", record.getMessage()),
+        ]
+        campos += [(k, v) for k, v in vars(record).items() if k not in _ATRIBUTOS_REGISTRO]
+        linea = " ".join(f"{clave}={_valor(valor)}" for clave, valor in campos)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            linea += "\n" + record.exc_text
+        return linea
+
+
+class ManejadorCola(logging.handlers.QueueHandler):
+    """QueueHandler que deja el registro listo para escribir sin formatearlo en el hilo del handler"""
+
+    def prepare(self, record):
+        # Los argumentos pueden cambiar después: el mensaje se resuelve ya,
+        # pero el formato clave=valor lo hace el hilo de escritura
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        # Correlación con la traza del update (solo existe si se está trazando)
+        traza = id_traza_actual()
+        if traza is not None:
+            record.traza = traza
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class FiltroMuestreo(logging.Filter):
+    """Deja pasar las trazas DEBUG solo de los updates elegidos por el muestreo"""
+
+    def __init__(self, cada):
+        super().__init__()
+        self.cada = max(1, cada)
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or self.cada == 1:
+            return True
+        elegido = getattr(_muestreo, "elegido", None)
+        if elegido is None:
+            # Fuera de un update (hilos de fondo): muestreo por registro
+            elegido = next(_contador_updates) % self.cada == 0
+        if elegido:
+            record.muestreo = self.cada
+        return elegido
+
+
+def nuevo_update():
+    """Decide si se escriben las trazas DEBUG del update que empieza en este hilo"""
+    _muestreo.elegido = next(_contador_updates) % max(1, LOG_MUESTREO_DEBUG) == 0
+
+
+def fin_update():
+    """Olvida la decisión de muestreo del update que acaba de terminar en este hilo"""
+    _muestreo.elegido = None
+
+
+def evento(logger, mensaje, nivel=logging.DEBUG, **campos):
+    """
+    Registra un mensaje con campos clave=valor.
+
+    No construye nada si el nivel está desactivado para ese logger, así que
+    se puede dejar en los caminos calientes.
+    """
+    if logger.isEnabledFor(nivel):
+        logger.log(nivel, mensaje, extra=campos, stacklevel=2)
+
+
+def _niveles_por_modulo(especificacion):
+    """Convierte "modulo=NIVEL,otro=NIVEL" en [(modulo, nivel)]"""
+    niveles = []
+    for parte in especificacion.split(","):
+        if "=" not in parte:
+            continue
+        nombre, nivel = (p.strip() for p in parte.split("=", 1))
+        if nombre and nivel:
+            niveles.append((nombre, nivel.upper()))
+    return niveles
+
+
+def configurar_logging(fichero):
+    """
+    Configura el logging del proceso (solo la primera vez que se llama).
+
+    Args:
+        fichero: Nombre del fichero de log del bot (dentro de LOG_DIR, por defecto la raíz del proyecto)
+
+    Returns:
+        QueueListener que escribe los registros
+    """
+    global _listener
+
+    with _lock:
+        if _listener is not None:
+            return _listener
+
+        formato = FormatoClaveValor()
+        consola = logging.StreamHandler(sys.stdout)
+        archivo = logging.handlers.RotatingFileHandler(
+            LOG_DIR / fichero, maxBytes=LOG_MAX_MB * 1024 * 1024, backupCount=LOG_COPIAS, encoding="utf-8"
+        )
+        for manejador in (consola, archivo):
+            manejador.setFormatter(formato)
+
+        cola = queue.SimpleQueue()
+        manejador_cola = ManejadorCola(cola)
+        manejador_cola.addFilter(FiltroMuestreo(LOG_MUESTREO_DEBUG))
+
+        raiz = logging.getLogger()
+        for manejador in list(raiz.handlers):
+            raiz.removeHandler(manejador)
+        raiz.addHandler(manejador_cola)
+        raiz.setLevel(LOG_NIVEL)
+
+        # telebot añade su propio StreamHandler; todo pasa por la cola
+        logging.getLogger("TeleBot").handlers.clear()
+        for nombre, nivel in _niveles_por_modulo(LOG_NIVELES):
+            logging.getLogger(nombre).setLevel(nivel)
+
+        _listener = logging.handlers.QueueListener(cola, consola, archivo, respect_handler_level=True)
+        _listener.start()
+
+        def detener():
+            # Lo que se registre después (informes al salir) se escribe directamente
+            _listener.stop()
+            raiz.removeHandler(manejador_cola)
+            raiz.addHandler(consola)
+            raiz.addHandler(archivo)
+
+        atexit.register(detener)
+        return _listener
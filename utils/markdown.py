@@ -0,0 +1,168 @@
+"""
+Renderizado de Markdown para los mensajes de Telegram.
+Tablas de escape precompiladas para Markdown y MarkdownV2, validación local
+de entidades y caché de textos estáticos ya validados.
+
+Las tablas son pares (carácter, escapado) y solo se reemplazan los caracteres
+presentes en el texto: con textos con acentos y emojis es bastante más rápido
+que str.translate (ver benchmarks/bench_markdown.py).
+"""
+import re
+from functools import lru_cache
+
+# Caracteres que Telegram permite escapar en cada modo
+CARACTERES_MARKDOWN = "_*`["
+CARACTERES_MARKDOWN_V2 = "\\_*[]()~`>#+-=|{}.!"
+
+_TABLA_MARKDOWN = tuple((c, "\\" + c) for c in CARACTERES_MARKDOWN)
+# La barra invertida va primero para no duplicar los escapes añadidos después
+_TABLA_MARKDOWN_V2 = tuple((c, "\\" + c) for c in CARACTERES_MARKDOWN_V2)
+
+# Markdown clásico: escapes y entidades completas se saltan, un marcador suelto es un error
+_RE_ENTIDADES_MARKDOWN = re.compile(
+    r"\\.|```.*?```|`[^`]*`|\*[^*]*\*|_[^_]*_|\[[^\]]*\](?:\([^)]*\)|(?!\())|[*_`\[]",
+    re.DOTALL
+)
+_RE_ESPECIALES_MARKDOWN = re.compile(r"[\\*_`\[]")
+_RE_ESPECIALES_MARKDOWN_V2 = re.compile(r"[\\_*\[\]()~`>#+\-=|{}.!]")
+_RESERVADOS_V2 = frozenset("_*[]()~`>#+-=|{}.!")
+
+
+def _escapar(text, tabla):
+    """Aplica la tabla de escape reemplazando solo los caracteres presentes"""
+    if not text:
+        return ""
+    text = str(text)
+    for caracter, escapado in tabla:
+        if caracter in text:
+            text = text.replace(caracter, escapado)
+    return text
+
+
+def escape_markdown(text):
+    """Escapa los caracteres especiales del Markdown clásico de Telegram"""
+    return _escapar(text, _TABLA_MARKDOWN)
+
+
+def escape_markdown_v2(text):
+    """Escapa los caracteres especiales de MarkdownV2"""
+    return _escapar(text, _TABLA_MARKDOWN_V2)
+
+
+def _validar_markdown(texto):
+    """Comprueba que las entidades del Markdown clásico están bien cerradas"""
+    if not _RE_ESPECIALES_MARKDOWN.search(texto):
+        return True
+    for coincidencia in _RE_ENTIDADES_MARKDOWN.finditer(texto):
+        if len(coincidencia.group()) == 1:
+            return False
+    return True
+
+
+def _buscar_cierre_v2(texto, inicio, delim):
+    """Busca el delimitador de cierre saltando los caracteres escapados"""
+    i = inicio
+    n = len(texto)
+    while i < n:
+        if texto[i] == "\\":
+            i += 2
+            continue
+        if texto.startswith(delim, i):
+            return i
+        i += 1
+    return -1
+
+
+def _validar_markdown_v2(texto):
+    """Comprueba escapes y anidamiento de entidades en MarkdownV2"""
+    if not _RE_ESPECIALES_MARKDOWN_V2.search(texto):
+        return True
+
+    pila = []
+    i = 0
+    n = len(texto)
+    while i < n:
+        c = texto[i]
+        if c == "\\":
+            i += 2
+            continue
+        if c == "`":
+            delim = "```" if texto.startswith("```", i) else "`"
+            fin = _buscar_cierre_v2(texto, i + len(delim), delim)
+            if fin == -1:
+                return False
+            i = fin + len(delim)
+            continue
+        if c == "_" and texto.startswith("__", i):
+            marca = "__"
+        elif c == "|" and texto.startswith("||", i):
+            marca = "||"
+        elif c in "*_~":
+            marca = c
+        elif c == "[":
+            pila.append("[")
+            i += 1
+            continue
+        elif c == "]":
+            if not pila or pila[-1] != "[":
+                return False
+            pila.pop()
+            if i + 1 < n and texto[i + 1] == "(":
+                fin_url = _buscar_cierre_v2(texto, i + 2, ")")
+                if fin_url == -1:
+                    return False
+                i = fin_url + 1
+                continue
+            return False
+        elif c == ">" and (i == 0 or texto[i - 1] == "\n"):
+            i += 1
+            continue
+        elif c in _RESERVADOS_V2:
+            return False
+        else:
+            i += 1
+            continue
+
+        if pila and pila[-1] == marca:
+            pila.pop()
+        else:
+            pila.append(marca)
+        i += len(marca)
+    return not pila
+
+
+def markdown_valido(texto, parse_mode="Markdown"):
+    """
+    Valida localmente que Telegram podrá interpretar el formato del texto.
+
+    Args:
+        texto: Texto a enviar
+        parse_mode: "Markdown", "MarkdownV2" o cualquier otro valor (se acepta)
+
+    Returns:
+        bool: True si el texto se puede enviar con ese parse_mode
+    """
+    if not texto or not parse_mode:
+        return True
+    modo = parse_mode.lower()
+    if modo == "markdown":
+        return _validar_markdown(texto)
+    if modo == "markdownv2":
+        return _validar_markdown_v2(texto)
+    return True
+
+
+@lru_cache(maxsize=256)
+def formato_validado(texto, parse_mode="Markdown"):
+    """
+    Devuelve el parse_mode con el que se puede enviar el texto.
+
+    El resultado se recuerda, así los textos fijos (ayuda, FAQ, menús) solo se
+    validan la primera vez.
+
+    Returns:
+        str o None: parse_mode a usar; None si el Markdown no es válido
+    """
+    if markdown_valido(texto, parse_mode):
+        return parse_mode
+    return None
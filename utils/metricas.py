@@ -0,0 +1,355 @@
+"""
+Instrumentación de los handlers de los bots.
+
+Cada handler registrado (mensajes, callbacks, cambios de miembros y pasos
+siguientes) se envuelve para medir llamadas, errores, histograma de latencia y
+el número de consultas a la BD y de llamadas a la API de Telegram que hace por
+cada update. Los datos se publican en formato Prometheus en un endpoint HTTP
+local (/metrics) y en un resumen periódico en el log. El mismo endpoint sirve
+/health y /ready con el estado del proceso (utils.salud).
+"""
+import threading
+import time
+import logging
+import functools
+import json
+import sys
+import os
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Añadir directorio padre al path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import METRICAS_HOST, METRICAS_RESUMEN_INTERVALO
+from utils.logs import nuevo_update, fin_update
+from utils.trazas import iniciar_traza, finalizar_traza, registrar_span
+
+logger = logging.getLogger(__name__)
+
+# Límites superiores de los buckets del histograma de latencia (segundos)
+BUCKETS_LATENCIA = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Métodos de TeleBot que registran handlers y que se interceptan
+_METODOS_REGISTRO = (
+    "add_message_handler",
+    "add_edited_message_handler",
+    "add_callback_query_handler",
+    "add_my_chat_member_handler",
+    "add_chat_member_handler",
+    "add_chat_join_request_handler",
+)
+
+# Métricas por (bot, handler)
+_metricas = {}
+_lock_metricas = threading.Lock()
+
+# Contadores del update que está procesando cada hilo
+_contexto = threading.local()
+
+# Último update procesado y último error de cada bot (para /health)
+_actividad = {}
+
+_servidor = None
+_iniciado = False
+_lock_servidor = threading.Lock()
+
+
+def _nuevas_metricas():
+    return {
+        "llamadas": 0,
+        "errores": 0,
+        "tiempo_total": 0.0,
+        "tiempo_max": 0.0,
+        "buckets": [0] * len(BUCKETS_LATENCIA),
+        "consultas_db": 0,
+        "llamadas_api": 0,
+    }
+
+
+def en_actualizacion():
+    """Indica si el hilo actual está ejecutando un handler instrumentado"""
+    return getattr(_contexto, "activo", False)
+
+
+def contar_consulta(_sql=None):
+    """Suma una consulta a la BD al update en curso (se usa como trace callback de sqlite3)"""
+    if getattr(_contexto, "activo", False):
+        _contexto.consultas_db += 1
+
+
+def contar_llamada_api():
+    """Suma una llamada a la API de Telegram al update en curso"""
+    if getattr(_contexto, "activo", False):
+        _contexto.llamadas_api += 1
+
+
+def registrar_ejecucion(bot_nombre, handler, duracion, error, consultas_db=0, llamadas_api=0):
+    """Acumula el resultado de una ejecución de un handler"""
+    with _lock_metricas:
+        clave = (bot_nombre, handler)
+        datos = _metricas.get(clave)
+        if datos is None:
+            datos = _nuevas_metricas()
+            _metricas[clave] = datos
+        datos["llamadas"] += 1
+        datos["tiempo_total"] += duracion
+        if duracion > datos["tiempo_max"]:
+            datos["tiempo_max"] = duracion
+        for i, limite in enumerate(BUCKETS_LATENCIA):
+            if duracion <= limite:
+                datos["buckets"][i] += 1
+                break
+        if error:
+            datos["errores"] += 1
+        datos["consultas_db"] += consultas_db
+        datos["llamadas_api"] += llamadas_api
+
+
+def instrumentar(funcion, bot_nombre):
+    """Envuelve un handler para medir su latencia, errores, consultas y llamadas a la API"""
+    if getattr(funcion, "_instrumentado", False):
+        return funcion
+
+    nombre = f"{funcion.__module__}.{funcion.__name__}"
+
+    @functools.wraps(funcion)
+    def envoltura(*args, **kwargs):
+        # Guardar el contexto anterior por si un handler se ejecuta dentro de otro
+        anterior = (
+            getattr(_contexto, "activo", False),
+            getattr(_contexto, "consultas_db", 0),
+            getattr(_contexto, "llamadas_api", 0),
+        )
+        token_traza = None
+        if not anterior[0]:
+            # Un update nuevo: decidir si se escriben sus trazas DEBUG y si se traza
+            nuevo_update()
+            token_traza = iniciar_traza(bot_nombre, nombre, args[0] if args else None)
+        _contexto.activo = True
+        _contexto.consultas_db = 0
+        _contexto.llamadas_api = 0
+        inicio = time.perf_counter()
+        error = False
+        try:
+            return funcion(*args, **kwargs)
+        except Exception as e:
+            error = True
+            _actividad.setdefault(bot_nombre, {})["ultimo_error"] = {
+                "fecha": time.time(), "handler": nombre, "error": repr(e)[:300]
+            }
+            raise
+        finally:
+            duracion = time.perf_counter() - inicio
+            registrar_ejecucion(
+                bot_nombre, nombre, duracion, error,
+                _contexto.consultas_db, _contexto.llamadas_api
+            )
+            registrar_span("handler", nombre, inicio, duracion, error=error)
+            _contexto.activo, _contexto.consultas_db, _contexto.llamadas_api = anterior
+            if token_traza is not None:
+                finalizar_traza(token_traza)
+            if not anterior[0]:
+                _actividad.setdefault(bot_nombre, {})["ultimo_update"] = time.time()
+                fin_update()
+
+    envoltura._instrumentado = True
+    return envoltura
+
+
+def instrumentar_bot(bot, bot_nombre):
+    """
+    Instrumenta todos los handlers del bot, los ya registrados y los que se registren después.
+
+    Se llama justo después de crear el TeleBot, antes de los decoradores.
+    """
+    if getattr(bot, "_instrumentado", False):
+        return bot
+
+    for metodo in _METODOS_REGISTRO:
+        original = getattr(bot, metodo)
+
+        def registrar(handler_dict, _original=original):
+            handler_dict["function"] = instrumentar(handler_dict["function"], bot_nombre)
+            return _original(handler_dict)
+
+        setattr(bot, metodo, registrar)
+
+    # Los pasos siguientes (register_next_step_handler) también son handlers
+    original_paso = bot.register_next_step_handler
+
+    def registrar_paso(message, callback, *args, **kwargs):
+        return original_paso(message, instrumentar(callback, bot_nombre), *args, **kwargs)
+
+    bot.register_next_step_handler = registrar_paso
+
+    # Handlers registrados antes de instrumentar el bot
+    for lista in ("message_handlers", "edited_message_handlers", "callback_query_handlers",
+                  "my_chat_member_handlers", "chat_member_handlers", "chat_join_request_handlers"):
+        for handler_dict in getattr(bot, lista, []):
+            handler_dict["function"] = instrumentar(handler_dict["function"], bot_nombre)
+
+    bot._instrumentado = True
+    return bot
+
+
+def actividad_bots():
+    """Devuelve {bot: {ultimo_update, ultimo_error}} (fechas en epoch)"""
+    return {bot_nombre: dict(datos) for bot_nombre, datos in list(_actividad.items())}
+
+
+def obtener_metricas():
+    """Devuelve una copia de las métricas por (bot, handler)"""
+    with _lock_metricas:
+        return {
+            clave: dict(datos, buckets=list(datos["buckets"]))
+            for clave, datos in _metricas.items()
+        }
+
+
+def reiniciar_metricas():
+    """Pone a cero las métricas de todos los handlers"""
+    with _lock_metricas:
+        _metricas.clear()
+
+
+def exportar_prometheus():
+    """Genera las métricas en el formato de texto de Prometheus"""
+    metricas = obtener_metricas()
+    lineas = [
+        "# HELP bot_handler_llamadas_total Updates procesados por handler",
+        "# TYPE bot_handler_llamadas_total counter",
+    ]
+    for (bot_nombre, handler), datos in sorted(metricas.items()):
+        lineas.append(f'bot_handler_llamadas_total{{bot="{bot_nombre}",handler="{handler}"}} {datos["llamadas"]}')
+
+    lineas += [
+        "# HELP bot_handler_errores_total Excepciones no capturadas por handler",
+        "# TYPE bot_handler_errores_total counter",
+    ]
+    for (bot_nombre, handler), datos in sorted(metricas.items()):
+        lineas.append(f'bot_handler_errores_total{{bot="{bot_nombre}",handler="{handler}"}} {datos["errores"]}')
+
+    lineas += [
+        "# HELP bot_handler_duracion_segundos Latencia de los handlers",
+        "# TYPE bot_handler_duracion_segundos histogram",
+    ]
+    for (bot_nombre, handler), datos in sorted(metricas.items()):
+        etiquetas = f'bot="{bot_nombre}",handler="{handler}"'
+        acumulado = 0
+        for limite, cantidad in zip(BUCKETS_LATENCIA, datos["buckets"]):
+            acumulado += cantidad
+            lineas.append(f'bot_handler_duracion_segundos_bucket{{{etiquetas},le="{limite}"}} {acumulado}')
+        lineas.append(f'bot_handler_duracion_segundos_bucket{{{etiquetas},le="+Inf"}} {datos["llamadas"]}')
+        lineas.append(f'bot_handler_duracion_segundos_sum{{{etiquetas}}} {datos["tiempo_total"]:.6f}')
+        lineas.append(f'bot_handler_duracion_segundos_count{{{etiquetas}}} {datos["llamadas"]}')
+
+    lineas += [
+        "# HELP bot_handler_consultas_db_total Consultas SQL ejecutadas durante los updates",
+        "# TYPE bot_handler_consultas_db_total counter",
+    ]
+    for (bot_nombre, handler), datos in sorted(metricas.items()):
+        lineas.append(f'bot_handler_consultas_db_total{{bot="{bot_nombre}",handler="{handler}"}} {datos["consultas_db"]}')
+
+    lineas += [
+        "# HELP bot_handler_llamadas_api_total Llamadas a la API de Telegram durante los updates",
+        "# TYPE bot_handler_llamadas_api_total counter",
+    ]
+    for (bot_nombre, handler), datos in sorted(metricas.items()):
+        lineas.append(f'bot_handler_llamadas_api_total{{bot="{bot_nombre}",handler="{handler}"}} {datos["llamadas_api"]}')
+
+    return "\n".join(lineas) + "\n"
+
+
+def resumen_metricas():
+    """Formatea las métricas ordenadas por tiempo total consumido"""
+    metricas = obtener_metricas()
+    if not metricas:
+        return "Sin updates procesados por los handlers"
+
+    lineas = ["Handlers (handler: llamadas, errores, media, máx, consultas/update, API/update):"]
+    for (bot_nombre, handler), datos in sorted(metricas.items(), key=lambda e: e[1]["tiempo_total"], reverse=True):
+        llamadas = datos["llamadas"] or 1
+        lineas.append(
+            f"  [{bot_nombre}] {handler}: {datos['llamadas']}, {datos['errores']}, "
+            f"{datos['tiempo_total'] / llamadas * 1000:.1f}ms, {datos['tiempo_max'] * 1000:.1f}ms, "
+            f"{datos['consultas_db'] / llamadas:.1f}, {datos['llamadas_api'] / llamadas:.1f}"
+        )
+    return "\n".join(lineas)
+
+
+class _ManejadorMetricas(BaseHTTPRequestHandler):
+    """Sirve /metrics (Prometheus), /health y /ready (JSON, 503 si el bot no está bien)"""
+
+    def do_GET(self):
+        ruta = self.path.split("?", 1)[0]
+        if ruta == "/metrics":
+            self._responder(200, exportar_prometheus(), "text/plain; version=0.0.4; charset=utf-8")
+        elif ruta in ("/health", "/ready"):
+            # Importación diferida: utils.salud importa este módulo
+            from utils.salud import estado_salud
+            sano, listo, detalle = estado_salud()
+            correcto = sano if ruta == "/health" else listo
+            self._responder(200 if correcto else 503, json.dumps(detalle, ensure_ascii=False, indent=2),
+                            "application/json; charset=utf-8")
+        else:
+            self.send_error(404)
+
+    def _responder(self, codigo, texto, tipo):
+        cuerpo = texto.encode("utf-8")
+        self.send_response(codigo)
+        self.send_header("Content-Type", tipo)
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, format, *args):
+        # Las peticiones del scraper no se escriben en el log
+        pass
+
+
+def iniciar_metricas(puerto, host=METRICAS_HOST):
+    """
+    Arranca el endpoint HTTP de métricas y el resumen periódico en el log.
+
+    Args:
+        puerto: Puerto local del endpoint (0 o None lo desactiva)
+        host: Interfaz en la que escuchar (por defecto solo local)
+
+    Returns:
+        ThreadingHTTPServer o None si no se ha podido arrancar
+    """
+    global _servidor, _iniciado
+
+    with _lock_servidor:
+        if _iniciado:
+            return _servidor
+        _iniciado = True
+
+        if METRICAS_RESUMEN_INTERVALO > 0:
+            hilo = threading.Thread(target=_resumen_periodico, name="resumen_metricas", daemon=True)
+            hilo.start()
+
+        if not puerto:
+            return None
+
+        try:
+            _servidor = ThreadingHTTPServer((host, puerto), _ManejadorMetricas)
+        except OSError as e:
+            logger.error(f"No se pudo abrir el endpoint de métricas en {host}:{puerto}: {e}")
+            return None
+
+        _servidor.daemon_threads = True
+        hilo = threading.Thread(target=_servidor.serve_forever, name="servidor_metricas", daemon=True)
+        hilo.start()
+        logger.info(f"Métricas disponibles en http://{host}:{puerto}/metrics (estado en /health y /ready)")
+        return _servidor
+
+
+def _resumen_periodico():
+    """Escribe periódicamente el resumen de los handlers en el log"""
+    while True:
+        time.sleep(METRICAS_RESUMEN_INTERVALO)
+        try:
+            logger.info(resumen_metricas())
+        except Exception as e:
+            logger.error(f"Error al generar resumen de métricas: {e}")
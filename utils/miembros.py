@@ -0,0 +1,114 @@
+"""
+Listado por páginas y exportación a CSV de los miembros de una sala.
+
+Los dos bots muestran los miembros de MIEMBROS_POR_PAGINA en MIEMBROS_POR_PAGINA
+con botones de página anterior y siguiente (paginación por clave, ver
+db.queries.get_pagina_miembros), y ofrecen la lista completa como fichero CSV.
+
+El CSV se escribe fila a fila mientras se leen los miembros de la base de datos,
+en un fichero temporal que pasa a disco al superar MIEMBROS_CSV_MEMORIA bytes:
+una sala grande nunca está entera en memoria, ni como filas ni como texto.
+"""
+import csv
+import io
+import tempfile
+import sys
+import os
+
+# Añadir directorio padre al path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import MIEMBROS_POR_PAGINA, MIEMBROS_CSV_MEMORIA
+from db.queries import get_pagina_miembros, iterar_miembros_sala
+from utils.markdown import escape_markdown
+from utils.teclados import teclado_inline
+
+# Columnas del CSV exportado (mismos nombres que en la base de datos)
+COLUMNAS_CSV = ("Id_usuario", "Nombre", "Apellidos", "Email_UGR", "TelegramID", "Tipo", "Fecha_union", "Estado")
+
+
+def pagina_miembros(id_sala, partes=(), **filtros):
+    """
+    Página de miembros a partir del final del callback_data.
+
+    Args:
+        partes: [] para la primera página o ["s", id] / ["a", id] para la
+            siguiente o la anterior a la que tenía ese Id_usuario en el borde
+        filtros: estado y tipo, como en get_pagina_miembros
+
+    Returns:
+        tuple: (miembros, hay_anterior, hay_siguiente)
+    """
+    desde = {}
+    if len(partes) >= 2:
+        desde = {"despues_de" if partes[0] == "s" else "antes_de": int(partes[1])}
+    return get_pagina_miembros(id_sala, limite=MIEMBROS_POR_PAGINA, **desde, **filtros)
+
+
+def formatear_miembros(miembros, con_email=False):
+    """Texto Markdown de una página de miembros"""
+    lineas = []
+    for m in miembros:
+        nombre_completo = escape_markdown(f"{m['Nombre']} {m['Apellidos'] or ''}".strip())
+        fecha = m['Fecha_union'].split(' ')[0] if m['Fecha_union'] else 'Desconocida'
+        linea = f"• *{nombre_completo}*\n"
+        if con_email and m['Email_UGR']:
+            linea += f"   📧 {escape_markdown(m['Email_UGR'])}\n"
+        linea += f"   📅 Unido: {fecha}\n"
+        lineas.append(linea)
+    return "\n".join(lineas)
+
+
+def teclado_paginas(prefijo, miembros, hay_anterior, hay_siguiente, filas_extra=()):
+    """
+    Botones de página anterior y siguiente (callback prefijo_a_<id> y
+    prefijo_s_<id>) más las filas de botones que se añadan debajo.
+    """
+    navegacion = []
+    if hay_anterior and miembros:
+        navegacion.append(("⬅️ Anterior", f"{prefijo}_a_{miembros[0]['Id_usuario']}"))
+    if hay_siguiente and miembros:
+        navegacion.append(("Siguiente ➡️", f"{prefijo}_s_{miembros[-1]['Id_usuario']}"))
+    filas = ((tuple(navegacion),) if navegacion else ()) + tuple(filas_extra)
+    return teclado_inline(filas) if filas else None
+
+
+def csv_miembros(id_sala):
+    """
+    Escribe todos los miembros de la sala en un CSV temporal.
+
+    Returns:
+        tuple: (fichero binario al principio, número de miembros); el llamador
+        debe cerrarlo
+    """
+    fichero = tempfile.SpooledTemporaryFile(max_size=MIEMBROS_CSV_MEMORIA)
+    # utf-8-sig para que Excel reconozca las tildes al abrirlo
+    texto = io.TextIOWrapper(fichero, encoding="utf-8-sig", newline="")
+    escritor = csv.writer(texto)
+    escritor.writerow(COLUMNAS_CSV)
+    filas = 0
+    for miembro in iterar_miembros_sala(id_sala):
+        escritor.writerow([miembro[columna] for columna in COLUMNAS_CSV])
+        filas += 1
+    texto.flush()
+    texto.detach()
+    fichero.seek(0)
+    return fichero, filas
+
+
+def enviar_csv_miembros(bot, chat_id, id_sala, nombre_sala):
+    """
+    Envía la lista completa de miembros de la sala como documento CSV.
+
+    Returns:
+        int: Miembros exportados (0 si no hay y no se envía nada)
+    """
+    fichero, filas = csv_miembros(id_sala)
+    with fichero:
+        if filas:
+            bot.send_document(
+                chat_id, fichero,
+                visible_file_name=f"miembros_sala_{id_sala}.csv",
+                caption=f"👥 {nombre_sala}: {filas} miembros"
+            )
+    return filas
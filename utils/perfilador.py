@@ -0,0 +1,147 @@
+"""
+Perfilador por muestreo para los bots en ejecución.
+
+Un hilo aparte toma cada PERFIL_INTERVALO_MS una muestra de la pila de todos
+los hilos (sys._current_frames) durante el tiempo indicado, sin reiniciar el
+bot ni instrumentar nada. El resultado se escribe en formato "collapsed
+stacks" (una línea "hilo;marco;marco;... N" por pila), que entienden
+flamegraph.pl, speedscope o inferno.
+
+Se lanza con el comando /perfil (handlers/admin.py) o enviando SIGUSR2 al
+proceso. Solo puede haber un perfilado a la vez.
+"""
+import collections
+import threading
+import signal
+import time
+import logging
+import sys
+import os
+
+# Añadir directorio padre al path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import LOG_DIR, PERFIL_DURACION, PERFIL_DURACION_MAX, PERFIL_INTERVALO_MS
+
+logger = logging.getLogger(__name__)
+
+_activo = None
+_lock = threading.Lock()
+
+
+def _nombre_marco(codigo):
+    """'modulo:función' de un marco, igual que en el perfilado SQL"""
+    fichero = os.path.splitext(os.path.basename(codigo.co_filename))[0]
+    return f"{fichero}:{codigo.co_name}"
+
+
+class PerfiladorMuestreo(threading.Thread):
+    """Hilo que muestrea las pilas del proceso y escribe el fichero collapsed"""
+
+    def __init__(self, ruta, duracion, intervalo, al_terminar=None):
+        super().__init__(name="perfilador", daemon=True)
+        self.ruta = ruta
+        self.duracion = duracion
+        self.intervalo = intervalo
+        self.al_terminar = al_terminar
+        self.pilas = collections.Counter()
+        self.muestras = 0
+
+    def _muestrear(self, nombres_hilos):
+        propio = threading.get_ident()
+        for ident, marco in sys._current_frames().items():
+            if ident == propio:
+                continue
+            pila = []
+            while marco is not None:
+                pila.append(_nombre_marco(marco.f_code))
+                marco = marco.f_back
+            pila.append(nombres_hilos.get(ident, f"hilo-{ident}"))
+            pila.reverse()
+            self.pilas[";".join(pila)] += 1
+        self.muestras += 1
+
+    def run(self):
+        global _activo
+
+        try:
+            fin = time.monotonic() + self.duracion
+            siguiente = time.monotonic()
+            while siguiente < fin:
+                nombres_hilos = {h.ident: h.name for h in threading.enumerate()}
+                self._muestrear(nombres_hilos)
+                siguiente += self.intervalo
+                espera = siguiente - time.monotonic()
+                if espera > 0:
+                    time.sleep(espera)
+            self._escribir()
+            logger.info("Perfil guardado en %s (%d muestras, %d pilas distintas)",
+                        self.ruta, self.muestras, len(self.pilas))
+        except Exception:
+            logger.exception("Error durante el perfilado")
+            self.ruta = None
+        finally:
+            with _lock:
+                _activo = None
+
+        if self.al_terminar is not None:
+            try:
+                self.al_terminar(self.ruta, self.muestras)
+            except Exception:
+                logger.exception("Error al entregar el perfil")
+
+    def _escribir(self):
+        with open(self.ruta, "w", encoding="utf-8") as f:
+            for pila, cantidad in self.pilas.most_common():
+                f.write(f"{pila} {cantidad}\n")
+
+
+def iniciar_perfil(bot_nombre, duracion=PERFIL_DURACION, al_terminar=None):
+    """
+    Empieza un perfilado en segundo plano si no hay otro en marcha.
+
+    Args:
+        bot_nombre: Se usa en el nombre del fichero
+        duracion: Segundos de muestreo (se limita a PERFIL_DURACION_MAX)
+        al_terminar: Función (ruta, muestras) a la que se llama al acabar;
+            ruta es None si el perfilado falló
+
+    Returns:
+        Ruta del fichero que se va a escribir o None si ya hay un perfilado activo
+    """
+    global _activo
+
+    duracion = max(1, min(duracion, PERFIL_DURACION_MAX))
+    with _lock:
+        if _activo is not None:
+            return None
+        ruta = LOG_DIR / f"perfil_{bot_nombre}_{time.strftime('%Y%m%d_%H%M%S')}.folded"
+        _activo = PerfiladorMuestreo(ruta, duracion, PERFIL_INTERVALO_MS / 1000, al_terminar)
+        _activo.start()
+
+    logger.info("Perfilado iniciado: %ds cada %sms -> %s", duracion, PERFIL_INTERVALO_MS, ruta)
+    return ruta
+
+
+def instalar_senal_perfil(bot_nombre):
+    """
+    Lanza un perfilado de PERFIL_DURACION segundos al recibir SIGUSR2.
+
+    Se llama desde el hilo principal (las señales solo se atienden ahí). En
+    Windows no existe SIGUSR2 y solo queda el comando /perfil.
+    """
+    senal = getattr(signal, "SIGUSR2", None)
+    if senal is None:
+        return False
+
+    def lanzar():
+        if iniciar_perfil(bot_nombre) is None:
+            logger.warning("SIGUSR2 ignorada: ya hay un perfilado en marcha")
+
+    def al_recibir(_signum, _frame):
+        # Fuera del manejador de la señal: puede haber interrumpido al hilo
+        # principal con el lock del logging cogido
+        threading.Thread(target=lanzar, name="senal_perfil", daemon=True).start()
+
+    signal.signal(senal, al_recibir)
+    return True
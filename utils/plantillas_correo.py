@@ -0,0 +1,154 @@
+"""
+Plantillas de correo precompiladas.
+
+Cada plantilla se construye y se codifica en MIME (texto + HTML alternativo,
+quoted-printable) una sola vez, con marcadores en el lugar de los campos
+variables. El resultado se parte en trozos de bytes ya codificados, de modo
+que cada envío solo codifica los valores de sus campos (p.ej. el token) y
+une los trozos: no se vuelve a crear un EmailMessage ni a codificar el HTML.
+
+Los campos se escriben como {campo} en el texto y el HTML (sin formato,
+solo el nombre) y deben ser de una sola línea. En el HTML se escapan.
+"""
+import collections
+import html
+import quopri
+import string
+import sys
+import os
+from email import policy
+from email.message import EmailMessage
+
+# Añadir directorio padre al path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import SMTP_EMAIL
+
+# Correo ya codificado listo para smtplib.SMTP.sendmail
+CorreoRenderizado = collections.namedtuple("CorreoRenderizado", ["remitente", "destinatario", "datos"])
+
+_DESTINATARIO = "destinatario"
+
+
+def _marcador(campo):
+    # Solo caracteres que quoted-printable deja tal cual
+    return f"QQ{campo.upper()}QQ"
+
+
+def _codificar_qp(valor):
+    return quopri.encodestring(valor.encode("utf-8"))
+
+
+class PlantillaCorreo:
+    """Correo (texto + HTML) codificado una vez; render() solo rellena los campos"""
+
+    def __init__(self, asunto, texto, html_plantilla, remitente=SMTP_EMAIL):
+        self.asunto = asunto
+        self.remitente = remitente
+        campos_texto = self._campos(texto)
+        campos_html = self._campos(html_plantilla)
+        if _DESTINATARIO in campos_texto | campos_html:
+            raise ValueError(f"{_DESTINATARIO!r} está reservado para la dirección del destinatario")
+        self.campos = campos_texto | campos_html
+
+        msg = EmailMessage()
+        msg["From"] = remitente
+        msg["To"] = _marcador(_DESTINATARIO)
+        msg["Subject"] = asunto
+        msg.set_content(self._con_marcadores(texto, campos_texto), cte="quoted-printable")
+        msg.add_alternative(self._con_marcadores(html_plantilla, campos_html), subtype="html", cte="quoted-printable")
+        crudo = msg.as_bytes(policy=policy.SMTP)
+
+        # Trozos fijos y, entre ellos, (campo, escapar_html) en el orden del mensaje
+        self._trozos, self._huecos = self._partir(crudo, campos_texto, campos_html)
+
+    @staticmethod
+    def _campos(plantilla):
+        campos = set()
+        for _, campo, formato, conversion in string.Formatter().parse(plantilla):
+            if campo is None:
+                continue
+            if not campo.isidentifier() or formato or conversion:
+                raise ValueError(f"Campo no válido en la plantilla de correo: {campo!r}")
+            campos.add(campo)
+        return campos
+
+    @staticmethod
+    def _con_marcadores(plantilla, campos):
+        return plantilla.format(**{campo: _marcador(campo) for campo in campos})
+
+    @staticmethod
+    def _partir(crudo, campos_texto, campos_html):
+        # El cuerpo de texto va antes que el HTML: se reparte cada marcador según la parte
+        inicio_html = crudo.index(b"Content-Type: text/html")
+        buscados = [(_DESTINATARIO, False)]
+        buscados += [(campo, False) for campo in campos_texto]
+        buscados += [(campo, True) for campo in campos_html]
+
+        posiciones = []
+        for campo, es_html in buscados:
+            marcador = _marcador(campo).encode("ascii")
+            desde, hasta = (inicio_html, len(crudo)) if es_html else (0, inicio_html)
+            if crudo.count(marcador, desde, hasta) != 1:
+                raise ValueError(f"El campo {campo!r} debe aparecer una sola vez en cada parte de la plantilla")
+            posiciones.append((crudo.find(marcador, desde, hasta), len(marcador), campo, es_html))
+        posiciones.sort()
+
+        trozos, huecos, anterior = [], [], 0
+        for pos, longitud, campo, es_html in posiciones:
+            trozos.append(crudo[anterior:pos])
+            huecos.append((campo, es_html))
+            anterior = pos + longitud
+        trozos.append(crudo[anterior:])
+        return trozos, huecos
+
+    def render(self, destinatario, **valores):
+        """
+        Devuelve el correo para un destinatario con los campos rellenos.
+
+        Raises:
+            ValueError: si falta algún campo, sobra alguno o el destinatario no es válido
+        """
+        if set(valores) != self.campos:
+            raise ValueError(f"Campos de la plantilla: {sorted(self.campos)}, recibidos: {sorted(valores)}")
+        if "\r" in destinatario or "\n" in destinatario:
+            raise ValueError("Destinatario no válido")
+
+        partes = [self._trozos[0]]
+        for (campo, es_html), trozo in zip(self._huecos, self._trozos[1:]):
+            if campo == _DESTINATARIO:
+                partes.append(destinatario.encode("ascii"))
+            else:
+                valor = str(valores[campo])
+                partes.append(_codificar_qp(html.escape(valor) if es_html else valor))
+            partes.append(trozo)
+        return CorreoRenderizado(self.remitente, destinatario, b"".join(partes))
+
+
+VERIFICACION_TEXTO = "Tu código de verificación es: {token}\nEs válido durante {minutos} minutos.\n"
+
+VERIFICACION_HTML = """
+        <html>
+        <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333; max-width: 600px; margin: 0 auto; padding: 20px;">
+            <div style="background-color: #0066cc; color: white; padding: 15px; text-align: center; border-radius: 5px 5px 0 0;">
+                <h2>Verificación de Asistente de Tutorías</h2>
+            </div>
+            <div style="padding: 20px; border: 1px solid #ddd; border-top: none; border-radius: 0 0 5px 5px;">
+                <p>Hola,</p>
+                <p>Gracias por registrarte en el <strong>Asistente de Tutorías</strong>. Para completar tu registro, utiliza el siguiente código de verificación:</p>
+                <div style="background-color: #f5f5f5; padding: 15px; text-align: center; font-size: 24px; font-weight: bold; letter-spacing: 5px; margin: 20px 0; border-radius: 5px;">
+                    {token}
+                </div>
+                <p>Este código es válido durante
+                <strong>{minutos} minutos</strong>. Si no has solicitado este código, puedes ignorar este correo.</p>
+                <p>Saludos,<br>El equipo del Asistente de Tutorías</p>
+            </div>
+            <div style="text-align: center; font-size: 12px; color: #777; margin-top: 20px;">
+                <p>Este es un correo automático, por favor no respondas a este mensaje.</p>
+            </div>
+        </body>
+        </html>
+        """
+
+# Las llaves literales (p.ej. CSS en un <style>) se escriben dobles: {{ }}
+PLANTILLA_VERIFICACION = PlantillaCorreo("Token tutorChatBot", VERIFICACION_TEXTO, VERIFICACION_HTML)
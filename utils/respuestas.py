@@ -0,0 +1,180 @@
+"""
+Capa de respuestas compartida por los dos bots.
+Agrupa mensajes consecutivos al mismo chat, edita en lugar de reenviar cuando
+el flujo lo permite y valida el Markdown antes de enviarlo.
+"""
+import threading
+import logging
+from contextlib import contextmanager
+
+from telebot.apihelper import ApiTelegramException
+
+from utils.markdown import formato_validado
+
+logger = logging.getLogger(__name__)
+
+# Límite de caracteres de un mensaje de Telegram
+MAX_LONGITUD_MENSAJE = 4096
+SEPARADOR_AGRUPADOS = "\n\n"
+
+# Mensajes pendientes de la agrupación activa en cada hilo: {chat_id: [pendiente, ...]}
+_local = threading.local()
+
+
+def _preparar_formato(texto, parse_mode):
+    """Devuelve el parse_mode a usar: None si el Markdown no es válido"""
+    if not parse_mode or not texto:
+        return parse_mode
+    modo = formato_validado(texto, parse_mode)
+    if modo is None:
+        logger.warning(f"Markdown inválido, se envía como texto plano: {texto[:60]!r}")
+    return modo
+
+
+def _es_error_formato(error):
+    """Indica si Telegram rechazó el mensaje por no poder interpretar el formato"""
+    return "can't parse entities" in str(error).lower()
+
+
+def _partir_texto(texto, limite=MAX_LONGITUD_MENSAJE):
+    """Parte un texto demasiado largo por párrafos, líneas o, si no queda otra, a la fuerza"""
+    partes = []
+    while len(texto) > limite:
+        corte = texto.rfind(SEPARADOR_AGRUPADOS, 0, limite)
+        if corte <= 0:
+            corte = texto.rfind("\n", 0, limite)
+        if corte <= 0:
+            corte = limite
+        partes.append(texto[:corte])
+        texto = texto[corte:].lstrip("\n")
+    partes.append(texto)
+    return partes
+
+
+def _enviar_directo(bot, chat_id, texto, parse_mode=None, reply_markup=None, **kwargs):
+    """
+    Envía un mensaje ya validado; solo reintenta en texto plano si falló el formato.
+
+    Un texto de más de MAX_LONGITUD_MENSAJE caracteres se envía en varios
+    mensajes (cada parte con su formato validado) y el teclado va en el último.
+    """
+    if len(texto) > MAX_LONGITUD_MENSAJE:
+        partes = _partir_texto(texto)
+        for parte in partes[:-1]:
+            _enviar_directo(bot, chat_id, parte, _preparar_formato(parte, parse_mode), **kwargs)
+        return _enviar_directo(bot, chat_id, partes[-1], _preparar_formato(partes[-1], parse_mode),
+                               reply_markup, **kwargs)
+
+    try:
+        return bot.send_message(chat_id, texto, parse_mode=parse_mode, reply_markup=reply_markup, **kwargs)
+    except ApiTelegramException as e:
+        if parse_mode and _es_error_formato(e):
+            logger.warning(f"Telegram rechazó el formato, reenviando sin formato: {e}")
+            return bot.send_message(chat_id, texto, parse_mode=None, reply_markup=reply_markup, **kwargs)
+        raise
+
+
+def enviar_mensaje(bot, chat_id, texto, parse_mode=None, reply_markup=None, **kwargs):
+    """
+    Envía un mensaje validando antes el formato.
+
+    Si hay una agrupación activa para el chat (agrupar_mensajes), el mensaje se
+    acumula y se envía junto con los demás al salir del bloque.
+
+    Returns:
+        Message o None si el mensaje quedó pendiente de agrupación
+    """
+    parse_mode = _preparar_formato(texto, parse_mode)
+
+    pendientes = getattr(_local, "pendientes", None)
+    if pendientes is not None and chat_id in pendientes:
+        pendientes[chat_id].append((texto, parse_mode, reply_markup, kwargs))
+        return None
+
+    return _enviar_directo(bot, chat_id, texto, parse_mode, reply_markup, **kwargs)
+
+
+def editar_o_enviar(bot, chat_id, texto, message_id=None, parse_mode=None, reply_markup=None):
+    """
+    Edita el mensaje indicado o, si no se puede editar, envía uno nuevo.
+
+    Returns:
+        Message, True (edición sin cambios) o None
+    """
+    parse_mode = _preparar_formato(texto, parse_mode)
+
+    if message_id:
+        try:
+            return bot.edit_message_text(
+                texto,
+                chat_id=chat_id,
+                message_id=message_id,
+                parse_mode=parse_mode,
+                reply_markup=reply_markup
+            )
+        except ApiTelegramException as e:
+            if "message is not modified" in str(e):
+                return True
+            if parse_mode and _es_error_formato(e):
+                return editar_o_enviar(bot, chat_id, texto, message_id, None, reply_markup)
+            logger.warning(f"No se pudo editar el mensaje {message_id}, se envía uno nuevo: {e}")
+
+    return enviar_mensaje(bot, chat_id, texto, parse_mode=parse_mode, reply_markup=reply_markup)
+
+
+def _vaciar_pendientes(bot, chat_id, pendientes):
+    """Une los mensajes acumulados en el menor número de envíos posible"""
+    textos = []
+    modo_actual = None
+    opciones_actuales = {}
+    enviados = []
+
+    def enviar_grupo(reply_markup=None):
+        if textos:
+            enviados.append(_enviar_directo(
+                bot, chat_id, SEPARADOR_AGRUPADOS.join(textos),
+                parse_mode=modo_actual, reply_markup=reply_markup, **opciones_actuales
+            ))
+            textos.clear()
+
+    for texto, parse_mode, reply_markup, kwargs in pendientes:
+        longitud = sum(len(t) + len(SEPARADOR_AGRUPADOS) for t in textos) + len(texto)
+        if textos and (parse_mode != modo_actual or kwargs != opciones_actuales
+                       or longitud > MAX_LONGITUD_MENSAJE):
+            enviar_grupo()
+        modo_actual = parse_mode
+        opciones_actuales = kwargs
+        textos.append(texto)
+        # El teclado va siempre en la última parte del mensaje agrupado
+        if reply_markup is not None:
+            enviar_grupo(reply_markup)
+
+    enviar_grupo()
+    return enviados
+
+
+@contextmanager
+def agrupar_mensajes(bot, chat_id):
+    """
+    Acumula los mensajes enviados con enviar_mensaje al chat dentro del bloque
+    y los envía unidos al salir.
+
+    Los mensajes consecutivos con el mismo parse_mode y opciones se unen en uno
+    solo; un mensaje con teclado cierra el grupo y el teclado queda en el último texto.
+    """
+    pendientes = getattr(_local, "pendientes", None)
+    if pendientes is None:
+        pendientes = _local.pendientes = {}
+
+    if chat_id in pendientes:
+        # Agrupación anidada: la externa se encarga del envío
+        yield
+        return
+
+    pendientes[chat_id] = []
+    try:
+        yield
+    finally:
+        mensajes = pendientes.pop(chat_id)
+        if mensajes:
+            _vaciar_pendientes(bot, chat_id, mensajes)
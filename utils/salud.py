@@ -0,0 +1,120 @@
+"""
+Estado de salud de los bots para /health y /ready.
+
+Se sirve en el mismo endpoint local que /metrics (utils.metricas). Un
+supervisor puede reiniciar el bot si /health devuelve 503: el polling lleva
+más de SALUD_MAX_SIN_POLLING segundos sin un getUpdates correcto o la base
+de datos no responde. /ready solo indica que el bot ya ha empezado a recibir
+updates y que la base de datos responde.
+"""
+import time
+import sys
+import os
+
+# Añadir directorio padre al path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import SALUD_MAX_SIN_POLLING
+from db.perfil import uso_conexiones
+from db import cache
+from utils import state_manager
+from utils.metricas import actividad_bots
+from utils.transporte_telegram import obtener_estadisticas
+from utils.cola_mensajes import contar_pendientes
+from utils.correo import correos_en_cola
+from utils.avisos_valoracion import valoraciones_en_espera
+from utils.tokens_verificacion import almacen as tokens_verificacion
+
+_inicio = time.time()
+
+# Bots registrados en este proceso: {nombre: TeleBot}
+_bots = {}
+
+
+def registrar_bot(bot, bot_nombre):
+    """Registra el bot cuyo estado se publica (cola de updates de sus hilos)"""
+    _bots[bot_nombre] = bot
+
+
+def _antiguedad(fecha, ahora):
+    return round(ahora - fecha, 1) if fecha else None
+
+
+def _updates_en_cola():
+    """Updates recibidos que esperan un hilo libre de telebot, por bot"""
+    en_cola = {}
+    for bot_nombre, bot in _bots.items():
+        pool = getattr(bot, "worker_pool", None)
+        en_cola[bot_nombre] = pool.tasks.qsize() if pool is not None else 0
+    return en_cola
+
+
+def _estado_bd():
+    """Mensajes pendientes de la cola de salida; de paso comprueba que la BD responde"""
+    try:
+        return {"ok": True, "mensajes_pendientes": contar_pendientes()}
+    except Exception as e:
+        return {"ok": False, "error": repr(e)[:300]}
+
+
+def _ultimo_error(error):
+    if not error:
+        return None
+    return {**error, "fecha": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(error["fecha"]))}
+
+
+def _estado_excel():
+    # Solo si ya se ha importado: no cargar el gestor del Excel para responder
+    excel = sys.modules.get("utils.excel_manager")
+    return excel.estado_excel() if excel is not None else None
+
+
+def estado_salud():
+    """
+    Reúne el estado del proceso.
+
+    Returns:
+        tuple: (sano, listo, dict con el detalle)
+    """
+    ahora = time.time()
+    get_updates = obtener_estadisticas().get("getUpdates", {})
+    ultimo_polling = get_updates.get("ultima_correcta")
+    sin_polling = _antiguedad(ultimo_polling, ahora)
+    bd = _estado_bd()
+
+    # Antes del primer getUpdates el bot sigue arrancando: cuenta desde el inicio
+    polling_parado = (sin_polling if sin_polling is not None else ahora - _inicio) > SALUD_MAX_SIN_POLLING
+    sano = bd["ok"] and not polling_parado
+    listo = bd["ok"] and ultimo_polling is not None
+
+    actividad = actividad_bots()
+    detalle = {
+        "estado": "ok" if sano else "degradado",
+        "listo": listo,
+        "uptime_s": round(ahora - _inicio, 1),
+        "polling": {
+            "segundos_desde_get_updates": sin_polling,
+            "get_updates_errores": get_updates.get("errores", 0),
+            "max_sin_polling_s": SALUD_MAX_SIN_POLLING,
+        },
+        "bots": {
+            bot_nombre: {
+                "segundos_desde_ultimo_update": _antiguedad(datos.get("ultimo_update"), ahora),
+                "ultimo_error": _ultimo_error(datos.get("ultimo_error")),
+            }
+            for bot_nombre, datos in actividad.items()
+        },
+        "updates_en_cola": _updates_en_cola(),
+        "correos_en_cola": correos_en_cola(),
+        "valoraciones_en_espera": valoraciones_en_espera(),
+        "bd": {**bd, "conexiones": uso_conexiones()},
+        "estados": {
+            "user_states": len(state_manager.user_states),
+            "user_data": len(state_manager.user_data),
+            "estados_timestamp": len(state_manager.estados_timestamp),
+        },
+        "tokens_verificacion": tokens_verificacion.estadisticas(),
+        "cache": {"salas": cache.salas.estadisticas(), "usuarios": cache.usuarios.estadisticas()},
+        "excel": _estado_excel(),
+    }
+    return sano, listo, detalle
@@ -0,0 +1,87 @@
+"""
+Caché de teclados y menús de Telegram.
+Los teclados fijos se construyen y serializan una sola vez; los dinámicos se
+memorizan por su contenido (texto y callback de cada botón).
+"""
+from functools import lru_cache
+
+from telebot import types
+
+
+class TecladoCongelado(types.JsonSerializable):
+    """Teclado ya serializado a JSON; se puede reutilizar en cualquier envío o edición"""
+
+    __slots__ = ("_json",)
+
+    def __init__(self, markup):
+        self._json = markup.to_json()
+
+    @classmethod
+    def desde_json(cls, json_markup):
+        """Reconstruye un teclado a partir del JSON ya serializado (p. ej. guardado en BD)"""
+        teclado = cls.__new__(cls)
+        teclado._json = json_markup
+        return teclado
+
+    def to_json(self):
+        return self._json
+
+    def __eq__(self, otro):
+        return isinstance(otro, TecladoCongelado) and otro._json == self._json
+
+    def __hash__(self):
+        return hash(self._json)
+
+
+def congelar(markup):
+    """Serializa un teclado una sola vez para reutilizarlo"""
+    if isinstance(markup, TecladoCongelado):
+        return markup
+    return TecladoCongelado(markup)
+
+
+@lru_cache(maxsize=512)
+def teclado_inline(filas):
+    """
+    Teclado inline memorizado por contenido.
+
+    Args:
+        filas: Tupla de filas; cada fila es una tupla de (texto, callback_data)
+               o (texto, None, url) para botones con enlace
+
+    Returns:
+        TecladoCongelado: Teclado listo para reply_markup
+    """
+    markup = types.InlineKeyboardMarkup()
+    for fila in filas:
+        botones = []
+        for boton in fila:
+            if len(boton) > 2 and boton[2]:
+                botones.append(types.InlineKeyboardButton(boton[0], url=boton[2]))
+            else:
+                botones.append(types.InlineKeyboardButton(boton[0], callback_data=boton[1]))
+        markup.row(*botones)
+    return TecladoCongelado(markup)
+
+
+def teclado_inline_columna(botones):
+    """Teclado inline con un botón por fila a partir de pares (texto, callback_data)"""
+    return teclado_inline(tuple((tuple(boton),) for boton in botones))
+
+
+@lru_cache(maxsize=64)
+def teclado_respuesta(filas, resize_keyboard=True, one_time_keyboard=False):
+    """
+    Teclado de respuesta (ReplyKeyboard) memorizado por contenido.
+
+    Args:
+        filas: Tupla de filas; cada fila es una tupla de textos de botón
+    """
+    markup = types.ReplyKeyboardMarkup(resize_keyboard=resize_keyboard, one_time_keyboard=one_time_keyboard)
+    for fila in filas:
+        markup.row(*[types.KeyboardButton(texto) for texto in fila])
+    return TecladoCongelado(markup)
+
+
+# Teclados fijos más usados
+QUITAR_TECLADO = TecladoCongelado(types.ReplyKeyboardRemove())
@@ -0,0 +1,315 @@
+"""
+Almacén de códigos de verificación del registro.
+
+Guarda el código de cada chat con su caducidad (TOKEN_VALIDEZ), cuenta los
+intentos fallidos por chat y por correo, y limita los envíos de códigos por
+chat y por correo (TOKEN_MAX_ENVIOS cada TOKEN_VENTANA_ENVIOS segundos). Tras
+TOKEN_MAX_FALLOS fallos se anula el código y se bloquean el chat y el correo
+durante TOKEN_BLOQUEO segundos.
+
+Todas las estructuras tienen una duración fija, así que se guardan en
+diccionarios ordenados por caducidad: la limpieza solo mira el principio y es
+O(1) por entrada caducada. Comprobar un bloqueo es una consulta a un
+diccionario, sin tocar la base de datos ni la cola de correo: un cliente
+bloqueado se rechaza enseguida y solo se le avisa la primera vez.
+
+Con TOKEN_PERSISTENCIA=1 los códigos y los bloqueos se guardan también en la
+tabla Tokens_Verificacion, para que sobrevivan a un reinicio del bot.
+"""
+import collections
+import threading
+import secrets
+import hmac
+import json
+import time
+import logging
+import sys
+import os
+
+# Añadir directorio padre al path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import (
+    TOKEN_VALIDEZ,
+    TOKEN_MAX_FALLOS,
+    TOKEN_BLOQUEO,
+    TOKEN_MAX_ENVIOS,
+    TOKEN_VENTANA_ENVIOS,
+    TOKEN_PERSISTENCIA
+)
+
+logger = logging.getLogger(__name__)
+
+# Resultados de verificar()
+VALIDO = "valido"
+INCORRECTO = "incorrecto"
+CADUCADO = "caducado"
+BLOQUEADO = "bloqueado"
+
+
+class _Caducables:
+    """
+    Diccionario con caducidad por entrada, ordenado por caducidad.
+
+    Todas las entradas duran lo mismo, así que al (re)insertar al final el
+    orden de inserción es el de caducidad y purgar() solo mira el principio.
+    """
+
+    def __init__(self, duracion):
+        self.duracion = duracion
+        self._datos = collections.OrderedDict()  # clave: (caduca, valor)
+
+    def poner(self, clave, valor, ahora):
+        self._datos[clave] = (ahora + self.duracion, valor)
+        self._datos.move_to_end(clave)
+        return ahora + self.duracion
+
+    def obtener(self, clave, ahora):
+        entrada = self._datos.get(clave)
+        if entrada is None or entrada[0] <= ahora:
+            return None
+        return entrada[1]
+
+    def cambiar(self, clave, valor):
+        """Cambia el valor sin alargar la caducidad (ni mover la entrada)"""
+        self._datos[clave] = (self._datos[clave][0], valor)
+
+    def caducidad(self, clave):
+        entrada = self._datos.get(clave)
+        return entrada[0] if entrada else None
+
+    def quitar(self, clave):
+        return self._datos.pop(clave, None)
+
+    def purgar(self, ahora):
+        while self._datos:
+            clave, (caduca, _) = next(iter(self._datos.items()))
+            if caduca > ahora:
+                break
+            del self._datos[clave]
+
+    def cargar(self, clave, valor, caduca):
+        # Solo al cargar de la base de datos, en orden de caducidad
+        self._datos[clave] = (caduca, valor)
+
+    def __len__(self):
+        return len(self._datos)
+
+
+class AlmacenTokens:
+    """Códigos pendientes, contadores de fallos y envíos, y bloqueos"""
+
+    def __init__(self, persistencia=TOKEN_PERSISTENCIA):
+        self.persistencia = persistencia
+        self._lock = threading.Lock()
+        self._tokens = _Caducables(TOKEN_VALIDEZ)           # chat_id: {token, email, fallos}
+        self._fallos = _Caducables(TOKEN_BLOQUEO)           # ("chat"|"email", id): fallos
+        self._envios = _Caducables(TOKEN_VENTANA_ENVIOS)    # ("chat"|"email", id): [fechas]
+        self._bloqueos = _Caducables(TOKEN_BLOQUEO)         # ("chat"|"email", id): avisado
+        self._cargado = not persistencia
+
+    # ----- Persistencia opcional -----
+
+    def _conexion(self):
+        from db.queries import get_db_connection
+        return get_db_connection()
+
+    def _cargar(self, ahora):
+        """Recupera los códigos y bloqueos vigentes de la base de datos (una vez)"""
+        self._cargado = True
+        try:
+            conn = self._conexion()
+            try:
+                cursor = conn.cursor()
+                cursor.execute("DELETE FROM Tokens_Verificacion WHERE Caduca <= ?", (ahora,))
+                cursor.execute("SELECT Clave, Datos, Caduca FROM Tokens_Verificacion ORDER BY Caduca")
+                for fila in cursor.fetchall():
+                    tipo, _, resto = fila['Clave'].partition(":")
+                    datos = json.loads(fila['Datos'])
+                    if tipo == "token":
+                        self._tokens.cargar(int(resto), datos, fila['Caduca'])
+                    elif tipo == "bloqueo":
+                        self._bloqueos.cargar(tuple(datos["clave"]), False, fila['Caduca'])
+                conn.commit()
+            finally:
+                conn.close()
+            logger.info("Tokens de verificación recuperados: %d códigos, %d bloqueos",
+                        len(self._tokens), len(self._bloqueos))
+        except Exception:
+            logger.exception("No se han podido recuperar los tokens de verificación")
+
+    def _guardar(self, filas=(), borrar=()):
+        """Escribe (clave, datos, caduca) y borra claves en Tokens_Verificacion"""
+        if not self.persistencia:
+            return
+        try:
+            conn = self._conexion()
+            try:
+                cursor = conn.cursor()
+                cursor.executemany(
+                    "INSERT OR REPLACE INTO Tokens_Verificacion (Clave, Datos, Caduca) VALUES (?, ?, ?)",
+                    [(clave, json.dumps(datos), caduca) for clave, datos, caduca in filas]
+                )
+                cursor.executemany("DELETE FROM Tokens_Verificacion WHERE Clave = ?", [(c,) for c in borrar])
+                conn.commit()
+            finally:
+                conn.close()
+        except Exception:
+            logger.exception("No se han podido guardar los tokens de verificación")
+
+    def _preparar(self):
+        """Hora actual tras cargar (si hace falta) y purgar lo caducado; con el lock cogido"""
+        ahora = time.time()
+        if not self._cargado:
+            self._cargar(ahora)
+        for estructura in (self._tokens, self._fallos, self._envios, self._bloqueos):
+            estructura.purgar(ahora)
+        return ahora
+
+    # ----- Bloqueos -----
+
+    def _bloquear(self, claves, ahora, avisado=()):
+        filas = []
+        for clave in claves:
+            caduca = self._bloqueos.poner(clave, clave in avisado, ahora)
+            self._fallos.quitar(clave)
+            filas.append((f"bloqueo:{clave[0]}:{clave[1]}", {"clave": list(clave)}, caduca))
+        return filas
+
+    def bloqueo(self, chat_id, email=None):
+        """
+        Comprueba si el chat (o el correo) está bloqueado.
+
+        Returns:
+            tuple: (segundos que faltan, avisar) con 0 si no hay bloqueo; avisar
+            solo es True la primera vez, para no responder a cada mensaje
+        """
+        with self._lock:
+            ahora = self._preparar()
+            for clave in (("chat", chat_id), ("email", email)):
+                avisado = self._bloqueos.obtener(clave, ahora) if clave[1] is not None else None
+                if avisado is None:
+                    continue
+                if not avisado:
+                    self._bloqueos.cambiar(clave, True)
+                return self._bloqueos.caducidad(clave) - ahora, not avisado
+            return 0, False
+
+    # ----- Códigos -----
+
+    def emitir(self, chat_id, email):
+        """
+        Genera un código nuevo para el chat si no supera el límite de envíos.
+
+        Returns:
+            tuple: (código, 0) o (None, segundos hasta poder pedir otro)
+        """
+        with self._lock:
+            ahora = self._preparar()
+            claves = (("chat", chat_id), ("email", email))
+            envios = {clave: self._envios.obtener(clave, ahora) or [] for clave in claves}
+            for clave, fechas in envios.items():
+                vigentes = [f for f in fechas if f > ahora - TOKEN_VENTANA_ENVIOS]
+                envios[clave] = vigentes
+                if len(vigentes) >= TOKEN_MAX_ENVIOS:
+                    return None, vigentes[0] + TOKEN_VENTANA_ENVIOS - ahora
+
+            for clave, fechas in envios.items():
+                self._envios.poner(clave, fechas + [ahora], ahora)
+
+            token = str(100000 + secrets.randbelow(900000))
+            datos = {"token": token, "email": email, "fallos": 0}
+            caduca = self._tokens.poner(chat_id, datos, ahora)
+        self._guardar([(f"token:{chat_id}", datos, caduca)])
+        return token, 0
+
+    def renovar(self, chat_id, token):
+        """
+        Reinicia la validez del código desde ahora (al salir el correo).
+
+        Returns:
+            bool: False si el código ya no es el vigente del chat
+        """
+        with self._lock:
+            ahora = self._preparar()
+            datos = self._tokens.obtener(chat_id, ahora)
+            if datos is None or datos["token"] != token:
+                return False
+            caduca = self._tokens.poner(chat_id, datos, ahora)
+        self._guardar([(f"token:{chat_id}", datos, caduca)])
+        return True
+
+    def verificar(self, chat_id, token):
+        """
+        Comprueba el código introducido y lleva la cuenta de fallos.
+
+        Returns:
+            tuple: (resultado, email) con resultado VALIDO, INCORRECTO, CADUCADO
+            o BLOQUEADO; email solo si es VALIDO
+        """
+        filas, borrar = [], []
+        with self._lock:
+            ahora = self._preparar()
+            if self._bloqueos.obtener(("chat", chat_id), ahora) is not None:
+                return BLOQUEADO, None
+
+            datos = self._tokens.obtener(chat_id, ahora)
+            if datos is None:
+                return CADUCADO, None
+
+            if hmac.compare_digest(datos["token"].encode(), token.strip().encode()):
+                self._tokens.quitar(chat_id)
+                for clave in (("chat", chat_id), ("email", datos["email"])):
+                    self._fallos.quitar(clave)
+                resultado = VALIDO, datos["email"]
+                borrar.append(f"token:{chat_id}")
+            else:
+                datos["fallos"] += 1
+                superados = []
+                for clave in (("chat", chat_id), ("email", datos["email"])):
+                    fallos = (self._fallos.obtener(clave, ahora) or 0) + 1
+                    self._fallos.poner(clave, fallos, ahora)
+                    if fallos >= TOKEN_MAX_FALLOS:
+                        superados.append(clave)
+                if superados:
+                    # Se bloquean el chat y el correo y se anula el código
+                    self._tokens.quitar(chat_id)
+                    borrar.append(f"token:{chat_id}")
+                    # Al chat se le avisa ahora, con la respuesta a este intento
+                    filas = self._bloquear((("chat", chat_id), ("email", datos["email"])), ahora,
+                                           avisado=(("chat", chat_id),))
+                    logger.warning("Verificación bloqueada tras %d fallos: chat %s", TOKEN_MAX_FALLOS, chat_id)
+                    resultado = BLOQUEADO, None
+                else:
+                    filas.append((f"token:{chat_id}", datos, self._tokens.caducidad(chat_id)))
+                    resultado = INCORRECTO, None
+        self._guardar(filas, borrar)
+        return resultado
+
+    def descartar(self, chat_id):
+        """Anula el código pendiente del chat (registro cancelado)"""
+        with self._lock:
+            if self._tokens.quitar(chat_id) is None:
+                return
+        self._guardar(borrar=[f"token:{chat_id}"])
+
+    def pendiente(self, chat_id):
+        """Código vigente del chat o None"""
+        with self._lock:
+            datos = self._tokens.obtener(chat_id, time.time())
+            return datos["token"] if datos else None
+
+    def estadisticas(self):
+        """Tamaño de cada estructura (para /health)"""
+        with self._lock:
+            self._preparar()
+            return {
+                "codigos": len(self._tokens),
+                "contadores_fallos": len(self._fallos),
+                "contadores_envios": len(self._envios),
+                "bloqueos": len(self._bloqueos),
+            }
+
+
+# Almacén compartido por los handlers del bot
+almacen = AlmacenTokens()
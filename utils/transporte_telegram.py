@@ -0,0 +1,173 @@
+"""
+Capa de transporte HTTP compartida por los dos bots para hablar con la API de Telegram.
+Sesión keep-alive con pool de conexiones, reintentos con backoff y
+contadores de latencia y errores por endpoint.
+"""
+import threading
+import time
+import logging
+import sys
+import os
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from telebot import apihelper
+
+# Añadir directorio padre al path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import (
+    TELEGRAM_POOL_SIZE,
+    TELEGRAM_CONNECT_TIMEOUT,
+    TELEGRAM_READ_TIMEOUT,
+    TELEGRAM_MAX_REINTENTOS,
+    TELEGRAM_BACKOFF,
+    TELEGRAM_RESUMEN_INTERVALO
+)
+from utils.metricas import contar_llamada_api
+from utils.trazas import registrar_span
+
+logger = logging.getLogger(__name__)
+
+# Sesión única del proceso (se crea en configurar_transporte)
+_sesion = None
+_lock_config = threading.Lock()
+
+# Estadísticas por endpoint: {metodo: {llamadas, errores, tiempo_total, tiempo_max, ultima_correcta}}
+_estadisticas = {}
+_lock_estadisticas = threading.Lock()
+
+
+def crear_sesion(pool_size=TELEGRAM_POOL_SIZE, max_reintentos=TELEGRAM_MAX_REINTENTOS, backoff=TELEGRAM_BACKOFF):
+    """Crea una sesión requests con pool de conexiones persistentes y reintentos"""
+    reintentos = Retry(
+        total=max_reintentos,
+        connect=max_reintentos,
+        read=0,  # No reintentar lecturas: un sendMessage podría duplicarse
+        status=max_reintentos,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=None,
+        backoff_factor=backoff,
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+    adaptador = HTTPAdapter(
+        pool_connections=pool_size,
+        pool_maxsize=pool_size,
+        max_retries=reintentos,
+        pool_block=False
+    )
+
+    sesion = requests.Session()
+    sesion.mount("https://", adaptador)
+    sesion.mount("http://", adaptador)
+    sesion.headers.update({"Connection": "keep-alive"})
+    return sesion
+
+
+def _registrar_llamada(endpoint, duracion, error):
+    """Acumula la latencia y el resultado de una llamada a la API"""
+    with _lock_estadisticas:
+        datos = _estadisticas.get(endpoint)
+        if datos is None:
+            datos = {"llamadas": 0, "errores": 0, "tiempo_total": 0.0, "tiempo_max": 0.0, "ultima_correcta": None}
+            _estadisticas[endpoint] = datos
+        datos["llamadas"] += 1
+        datos["tiempo_total"] += duracion
+        if duracion > datos["tiempo_max"]:
+            datos["tiempo_max"] = duracion
+        if error:
+            datos["errores"] += 1
+        else:
+            # Para /health: un getUpdates reciente indica que el polling sigue vivo
+            datos["ultima_correcta"] = time.time()
+
+
+def _enviar_peticion(method, url, **kwargs):
+    """Envía la petición por la sesión compartida midiendo su latencia (CUSTOM_REQUEST_SENDER)"""
+    endpoint = url.rsplit("/", 1)[-1]
+    inicio = time.perf_counter()
+    estado = None
+    try:
+        respuesta = _sesion.request(method, url, **kwargs)
+        estado = respuesta.status_code
+        return respuesta
+    finally:
+        duracion = time.perf_counter() - inicio
+        _registrar_llamada(endpoint, duracion, estado is None or estado >= 400)
+        contar_llamada_api()
+        registrar_span("api", endpoint, inicio, duracion, estado=estado)
+
+
+def configurar_transporte():
+    """
+    Configura telebot para usar la sesión compartida del proceso.
+
+    Se puede llamar varias veces: solo la primera crea la sesión.
+
+    Returns:
+        requests.Session: La sesión compartida
+    """
+    global _sesion
+
+    with _lock_config:
+        if _sesion is not None:
+            return _sesion
+
+        _sesion = crear_sesion()
+
+        # Todos los hilos de telebot comparten la misma sesión y no se recrea por TTL
+        apihelper.session = _sesion
+        apihelper.SESSION_TIME_TO_LIVE = None
+        apihelper.CONNECT_TIMEOUT = TELEGRAM_CONNECT_TIMEOUT
+        apihelper.READ_TIMEOUT = TELEGRAM_READ_TIMEOUT
+        apihelper.CUSTOM_REQUEST_SENDER = _enviar_peticion
+
+        if TELEGRAM_RESUMEN_INTERVALO > 0:
+            hilo = threading.Thread(target=_resumen_periodico, name="resumen_api_telegram", daemon=True)
+            hilo.start()
+
+        logger.info(
+            f"Transporte Telegram configurado (pool={TELEGRAM_POOL_SIZE}, "
+            f"reintentos={TELEGRAM_MAX_REINTENTOS}, backoff={TELEGRAM_BACKOFF}s)"
+        )
+        return _sesion
+
+
+def obtener_estadisticas():
+    """Devuelve una copia de las estadísticas por endpoint"""
+    with _lock_estadisticas:
+        return {endpoint: dict(datos) for endpoint, datos in _estadisticas.items()}
+
+
+def reiniciar_estadisticas():
+    """Pone a cero los contadores de todos los endpoints"""
+    with _lock_estadisticas:
+        _estadisticas.clear()
+
+
+def resumen_estadisticas():
+    """Formatea las estadísticas ordenadas por tiempo total consumido"""
+    estadisticas = obtener_estadisticas()
+    if not estadisticas:
+        return "Sin llamadas a la API de Telegram registradas"
+
+    lineas = ["Latencia API Telegram (endpoint: llamadas, errores, media, máx, total):"]
+    for endpoint, datos in sorted(estadisticas.items(), key=lambda e: e[1]["tiempo_total"], reverse=True):
+        media = datos["tiempo_total"] / datos["llamadas"] if datos["llamadas"] else 0
+        lineas.append(
+            f"  {endpoint}: {datos['llamadas']}, {datos['errores']}, "
+            f"{media * 1000:.1f}ms, {datos['tiempo_max'] * 1000:.1f}ms, {datos['tiempo_total']:.2f}s"
+        )
+    return "\n".join(lineas)
+
+
+def _resumen_periodico():
+    """Escribe periódicamente el resumen de latencias en el log"""
+    while True:
+        time.sleep(TELEGRAM_RESUMEN_INTERVALO)
+        try:
+            logger.info(resumen_estadisticas())
+        except Exception as e:
+            logger.error(f"Error al generar resumen de la API de Telegram: {e}")
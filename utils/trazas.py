@@ -0,0 +1,211 @@
+"""
+Trazas por update con identificador de correlación.
+
+Cuando el muestreo está activo (TRAZAS_MUESTREO=N traza 1 de cada N updates),
+cada update elegido abre una traza en una ContextVar del hilo que lo procesa.
+Mientras está abierta se le añaden spans: los handlers (utils.metricas), cada
+sentencia SQL (db.perfil) y cada llamada a la API de Telegram
+(utils.transporte_telegram). Al terminar el update la traza se guarda en un
+buffer circular en memoria (las últimas TRAZAS_BUFFER, se consultan con
+/trazas) y, si se indica TRAZAS_FICHERO, en un fichero JSONL.
+
+Con el muestreo desactivado el coste es leer una ContextVar por span.
+"""
+import contextvars
+import collections
+import itertools
+import threading
+import time
+import uuid
+import json
+import logging
+import sys
+import os
+
+# Añadir directorio padre al path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import TRAZAS_MUESTREO, TRAZAS_BUFFER, TRAZAS_FICHERO, LOG_DIR
+
+logger = logging.getLogger(__name__)
+
+# Traza del update que se está procesando en el contexto actual
+_traza_actual = contextvars.ContextVar("traza_actual", default=None)
+_contador_updates = itertools.count()
+
+# Últimas trazas terminadas (dict ya serializables)
+_buffer = collections.deque(maxlen=max(1, TRAZAS_BUFFER))
+_lock_buffer = threading.Lock()
+_lock_fichero = threading.Lock()
+
+
+class Traza:
+    """Spans de un update: handlers, sentencias SQL y llamadas a la API"""
+
+    __slots__ = ("id", "bot", "datos", "fecha", "inicio", "spans")
+
+    def __init__(self, bot_nombre, **datos):
+        self.id = uuid.uuid4().hex[:16]
+        self.bot = bot_nombre
+        self.datos = datos
+        self.fecha = time.time()
+        self.inicio = time.perf_counter()
+        self.spans = []
+
+    def añadir(self, tipo, nombre, inicio, duracion, **campos):
+        """
+        Añade un span ya medido.
+
+        Args:
+            tipo: "handler", "db" o "api"
+            nombre: Handler, SQL normalizado o método de la API
+            inicio: time.perf_counter() al empezar
+            duracion: Segundos
+        """
+        span = {
+            "tipo": tipo,
+            "nombre": nombre,
+            "inicio_ms": round((inicio - self.inicio) * 1000, 3),
+            "ms": round(duracion * 1000, 3),
+        }
+        if campos:
+            span.update(campos)
+        # list.append es atómico: no hace falta lock aunque otro hilo añada spans
+        self.spans.append(span)
+
+    def como_dict(self):
+        """Resumen por tipo de span y lista completa de spans"""
+        total = time.perf_counter() - self.inicio
+        por_tipo = {}
+        for span in self.spans:
+            if span["tipo"] == "handler":
+                continue
+            acumulado = por_tipo.setdefault(span["tipo"], {"n": 0, "ms": 0.0})
+            acumulado["n"] += 1
+            acumulado["ms"] = round(acumulado["ms"] + span["ms"], 3)
+        return {
+            "traza": self.id,
+            "bot": self.bot,
+            "fecha": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.fecha)),
+            "ms": round(total * 1000, 3),
+            **self.datos,
+            "resumen": por_tipo,
+            # Las sentencias SQL se apuntan al cerrarse: ordenar por inicio
+            "spans": sorted(self.spans, key=lambda span: span["inicio_ms"]),
+        }
+
+
+def traza_actual():
+    """Devuelve la traza abierta en el contexto actual o None"""
+    return _traza_actual.get()
+
+
+def id_traza_actual():
+    """Identificador de correlación de la traza abierta (None si no hay)"""
+    traza = _traza_actual.get()
+    return traza.id if traza is not None else None
+
+
+def _datos_update(update):
+    """Usuario, chat y comando (o callback) de un mensaje o callback de telebot"""
+    datos = {}
+    usuario = getattr(update, "from_user", None)
+    if usuario is not None:
+        datos["usuario"] = usuario.id
+    chat = getattr(update, "chat", None) or getattr(getattr(update, "message", None), "chat", None)
+    if chat is not None:
+        datos["chat"] = chat.id
+    texto = getattr(update, "text", None)
+    if isinstance(texto, str) and texto.startswith("/"):
+        # Solo el comando: el resto del texto puede contener datos personales
+        datos["comando"] = texto.split()[0]
+    elif isinstance(getattr(update, "data", None), str):
+        datos["callback"] = update.data[:64]
+    return datos
+
+
+def iniciar_traza(bot_nombre, handler, update=None):
+    """
+    Abre una traza para el update que empieza si le toca según el muestreo.
+
+    Args:
+        bot_nombre: "principal" o "grupos"
+        handler: Nombre del handler que recibe el update
+        update: Mensaje o callback que recibe el handler
+
+    Returns:
+        Token para finalizar_traza() o None si el update no se traza
+    """
+    if TRAZAS_MUESTREO <= 0 or next(_contador_updates) % TRAZAS_MUESTREO:
+        return None
+    return _traza_actual.set(Traza(bot_nombre, handler=handler, **_datos_update(update)))
+
+
+def finalizar_traza(token):
+    """Cierra la traza abierta con iniciar_traza() y la exporta"""
+    traza = _traza_actual.get()
+    _traza_actual.reset(token)
+    if traza is None:
+        return None
+
+    registro = traza.como_dict()
+    with _lock_buffer:
+        _buffer.append(registro)
+    if TRAZAS_FICHERO:
+        _escribir(registro)
+    return registro
+
+
+def registrar_span(tipo, nombre, inicio, duracion, **campos):
+    """Añade un span a la traza abierta (no hace nada si no hay ninguna)"""
+    traza = _traza_actual.get()
+    if traza is not None:
+        traza.añadir(tipo, nombre, inicio, duracion, **campos)
+
+
+def _escribir(registro):
+    """Añade la traza como una línea JSON a TRAZAS_FICHERO"""
+    linea = json.dumps(registro, ensure_ascii=False, default=str)
+    try:
+        with _lock_fichero:
+            with open(LOG_DIR / TRAZAS_FICHERO, "a", encoding="utf-8") as f:
+                f.write(linea + "\n")
+    except OSError as e:
+        logger.error("No se pudo escribir en el fichero de trazas: %s", e)
+
+
+def obtener_trazas(limite=None):
+    """Devuelve las últimas trazas del buffer, de la más antigua a la más reciente"""
+    with _lock_buffer:
+        trazas = list(_buffer)
+    if limite:
+        trazas = trazas[-limite:]
+    return trazas
+
+
+def exportar_jsonl(trazas=None):
+    """Serializa las trazas (por defecto todo el buffer) en formato JSONL"""
+    if trazas is None:
+        trazas = obtener_trazas()
+    return "".join(json.dumps(t, ensure_ascii=False, default=str) + "\n" for t in trazas)
+
+
+def resumen_trazas(limite=10):
+    """Formatea las últimas trazas: tiempo total y reparto entre SQL, API y resto"""
+    if TRAZAS_MUESTREO <= 0:
+        return "Trazas desactivadas (TRAZAS_MUESTREO=0)"
+    trazas = obtener_trazas(limite)
+    if not trazas:
+        return f"Sin trazas todavía (se traza 1 de cada {TRAZAS_MUESTREO} updates)"
+
+    lineas = [f"Últimas {len(trazas)} trazas (1 de cada {TRAZAS_MUESTREO} updates):"]
+    for traza in reversed(trazas):
+        db = traza["resumen"].get("db", {"n": 0, "ms": 0.0})
+        api = traza["resumen"].get("api", {"n": 0, "ms": 0.0})
+        resto = max(0.0, traza["ms"] - db["ms"] - api["ms"])
+        lineas.append(
+            f"{traza['fecha']} [{traza['bot']}] {traza.get('handler', '?')} {traza['traza']}\n"
+            f"  total {traza['ms']:.1f}ms | SQL {db['n']}× {db['ms']:.1f}ms | "
+            f"API {api['n']}× {api['ms']:.1f}ms | resto {resto:.1f}ms"
+        )
+    return "\n".join(lineas)